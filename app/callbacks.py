@@ -2,11 +2,11 @@ from aiogram.filters.callback_data import CallbackData
 
 
 class MenuCb(CallbackData, prefix="m"):
-    section: str  # admin|student_schedule|parent_children|tz
+    section: str  # admin|student_schedule|parent_children|tz|calendar|calendar_reset
 
 
 class AdminCb(CallbackData, prefix="a"):
-    action: str  # students|student|create_student|lessons_add|add_rule|keys_student|keys_parent|lessons
+    action: str  # students|student|create_student|lessons_add|add_rule|keys_student|keys_parent|lessons|today|invoice_period|analytics|export|hw_group|grading
     student_id: int | None = None
     page: int = 1
 
@@ -31,15 +31,39 @@ class FsmNavCb(CallbackData, prefix="fsm"):
     student_id: int | None = None
 
 class HomeworkCb(CallbackData, prefix="hw"):
-    action: str
+    action: str  # view|done|edit|grade|back|attach|detach|files
     homework_id: int
     student_id: int
     offset: int = 0
 
+class HomeworkListCb(CallbackData, prefix="hwl"):
+    student_id: int
+    flt: str = "all"   # all|open|done|graded
+    after: int = 0     # id последнего ДЗ предыдущей страницы (0 — первая страница)
+
+class HwGroupCb(CallbackData, prefix="hwg"):
+    action: str        # tpl|copy|new|toggle|all|none|page|assign|cancel
+    item_id: int = 0   # tpl: id шаблона, copy: id ДЗ-образца, toggle: id ученика
+    page: int = 1
+
+class GroupCb(CallbackData, prefix="grp"):
+    action: str        # view|new|members|toggle|all|none|page|save|rule|done|cancel
+    group_id: int = 0
+    item_id: int = 0   # toggle: id ученика, done: id группового занятия
+    page: int = 1
+
+class GradeQueueCb(CallbackData, prefix="gq"):
+    action: str          # grade|skip|restart|finish
+    homework_id: int = 0
+    grade: int = 0
+
+class HwSearchCb(CallbackData, prefix="hws"):
+    page: int = 1  # сам запрос — в данных FSM (в callback_data не влезет)
+
 class SubCb(CallbackData, prefix="sub"):
-    action: str            # "add"
+    action: str            # add | fix | history
     student_id: int
-    qty: int
+    qty: int               # add: размер пакета, fix: ±уроков
 
 class BoardCb(CallbackData, prefix="b"):
     action: str        # "edit"
@@ -49,4 +73,24 @@ class LessonPayCb(CallbackData, prefix="lp"):
     action: str  # paid
     lesson_id: int
     student_id: int
-    offset: int
\ No newline at end of file
+    offset: int
+
+class NotifyCb(CallbackData, prefix="nt"):
+    action: str  # digest | lesson_24h | lesson_1h | quiet
+
+class TodayCb(CallbackData, prefix="td"):
+    action: str  # toggle | done
+    lesson_id: int = 0
+
+class PromptCb(CallbackData, prefix="lpr"):
+    action: str  # done | cancel
+    lesson_id: int
+
+class UnpaidCb(CallbackData, prefix="up"):
+    action: str  # page | pay | pay_confirm | import
+    student_id: int = 0
+    after: int = 0  # keyset: последний student_id предыдущей страницы
+
+class ExportCb(CallbackData, prefix="ex"):
+    period: str  # month | prev_month | year
+    fmt: str  # csv | xlsx
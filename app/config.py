@@ -10,5 +10,30 @@ class Settings(BaseSettings):
 
     auto_create_tables: int = 0  # 1 = создать таблицы при старте (для MVP)
 
+    # уведомления одному получателю, которые наступят в ближайшие N секунд, склеиваются в одно сообщение
+    notify_coalesce_window_sec: int = 60
+
+    # через сколько минут после конца урока спросить учителя «Проведён?»
+    lesson_prompt_delay_min: int = 5
+
+    # за сколько часов до дедлайна ДЗ напомнить ученику и родителям (если ДЗ выдано позже — сразу)
+    hw_due_lead_hours: int = 24
+
+    # в какой TZ считать границы недель/месяцев для периодических счетов родителям
+    invoice_timezone: str = "Europe/Moscow"
+
+    # предупреждать об абонементе, если остатка не хватает на planned-уроки за столько дней вперёд
+    low_balance_window_days: int = 7
+
+    # в какой TZ резать дни для аналитики (daily_stats)
+    stats_timezone: str = "Europe/Moscow"
+
+    # HTTP рядом с ботом (iCal-ленты); public_base_url — как адрес виден снаружи (для ссылок в боте)
+    web_host: str = "0.0.0.0"
+    web_port: int = 8080
+    public_base_url: str = "http://localhost:8080"
+    # сколько секунд отдавать ленту из памяти, не сверяя версии расписания с БД
+    ical_cache_ttl_sec: int = 60
+
 
 settings = Settings()
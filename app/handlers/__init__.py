@@ -1,8 +1,10 @@
-from . import start, menu, admin, student, parent
+from . import start, menu, notify_settings, calendar, admin, student, parent
 
 routers = [
     start.router,
     menu.router,
+    notify_settings.router,
+    calendar.router,
     admin.router,
     student.router,
     parent.router,
@@ -10,6 +10,14 @@ from .board import router as board_router
 from .lessons import router as admin_lessons_router
 from .homeworks import router as admin_homeworks_router
 from .payments import router as admin_payments_router
+from .today import router as admin_today_router
+from .unpaid import router as admin_unpaid_router
+from .analytics import router as admin_analytics_router
+from .export import router as admin_export_router
+from .hw_group import router as admin_hw_group_router
+from .grading import router as admin_grading_router
+from .hw_search import router as admin_hw_search_router
+from .groups import router as admin_groups_router
 
 router = Router()
 router.include_router(root_router)
@@ -21,4 +29,12 @@ router.include_router(subscription_router)
 router.include_router(board_router)
 router.include_router(admin_lessons_router)
 router.include_router(admin_homeworks_router)
-router.include_router(admin_payments_router)
\ No newline at end of file
+router.include_router(admin_payments_router)
+router.include_router(admin_today_router)
+router.include_router(admin_unpaid_router)
+router.include_router(admin_analytics_router)
+router.include_router(admin_export_router)
+router.include_router(admin_hw_group_router)
+router.include_router(admin_grading_router)
+router.include_router(admin_hw_search_router)
+router.include_router(admin_groups_router)
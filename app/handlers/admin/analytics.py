@@ -0,0 +1,40 @@
+from aiogram import Router, F
+from aiogram.types import CallbackQuery
+
+from ...callbacks import AdminCb
+from ...keyboards import analytics_kb
+from ...services.analytics import monthly_stats
+from .common import get_user, ensure_teacher
+
+router = Router()
+
+MONTHS_SHOWN = 12
+
+
+def format_monthly_stats(rows) -> str:
+    if not rows:
+        return "Аналитика\n\nДанных пока нет."
+
+    lines = ["Аналитика по месяцам", ""]
+    for month, done, canceled, revenue, packages, avg_grade in rows:
+        lines.append(
+            f"{month:%Y-%m}: проведено {done}, отменено {canceled}, "
+            f"выручка {revenue}, пакетов {packages}, "
+            f"ср. оценка ДЗ {avg_grade if avg_grade is not None else '-'}"
+        )
+    lines.append("")
+    lines.append(
+        "Выручка — начисления по разовой оплате за проведённые уроки и групповые занятия. "
+        "Данные обновляются раз в 10 минут."
+    )
+    return "\n".join(lines)
+
+
+@router.callback_query(AdminCb.filter(F.action == "analytics"))
+async def admin_analytics(call: CallbackQuery, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    rows = await monthly_stats(session, MONTHS_SHOWN)
+    await call.message.edit_text(format_monthly_stats(rows), reply_markup=analytics_kb())
+    await call.answer()
@@ -8,6 +8,7 @@ from ...callbacks import BoardCb
 from ...models import Student
 from .common import get_user, ensure_teacher
 from ...keyboards import student_card_kb
+from ...services.schedule import bump_schedule_version
 
 router = Router()
 
@@ -48,6 +49,7 @@ async def board_edit_set(message: Message, state: FSMContext, session):
 
     st = (await session.execute(select(Student).where(Student.id == student_id))).scalar_one()
     st.board_url = url
+    await bump_schedule_version(session, [student_id])
     await session.commit()
     await state.clear()
 
@@ -0,0 +1,74 @@
+import tempfile
+from datetime import datetime, date, timezone
+from zoneinfo import ZoneInfo
+
+from aiogram import Router, F
+from aiogram.types import CallbackQuery, FSInputFile
+
+from ...callbacks import AdminCb, ExportCb
+from ...keyboards import export_kb, EXPORT_PERIOD_TITLES
+from ...services.export import export_data, xlsx_available
+from .common import get_user, ensure_teacher
+
+router = Router()
+
+
+def export_period_bounds(period: str, today: date) -> tuple[date, date]:
+    # [start, end) в локальных датах учителя
+    month_start = today.replace(day=1)
+    next_month = date(month_start.year + month_start.month // 12, month_start.month % 12 + 1, 1)
+    if period == "month":
+        return month_start, next_month
+    if period == "prev_month":
+        prev = date(month_start.year - (month_start.month == 1), (month_start.month - 2) % 12 + 1, 1)
+        return prev, month_start
+    if period == "year":
+        return date(today.year, 1, 1), date(today.year + 1, 1, 1)
+    raise ValueError(f"Unknown export period: {period}")
+
+
+def _local_midnight_utc(d: date, tz: ZoneInfo) -> datetime:
+    return datetime(d.year, d.month, d.day, tzinfo=tz).astimezone(timezone.utc)
+
+
+@router.callback_query(AdminCb.filter(F.action == "export"))
+async def admin_export(call: CallbackQuery, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    text = (
+        "Выгрузка данных\n\n"
+        "Уроки, начисления и домашние задания за выбранный период придут файлами.\n"
+        "CSV — по файлу на раздел (разделитель «;»)."
+    )
+    if xlsx_available():
+        text += " XLSX — одна книга с листами."
+    await call.message.edit_text(text, reply_markup=export_kb(xlsx_available()))
+    await call.answer()
+
+
+@router.callback_query(ExportCb.filter())
+async def export_run(call: CallbackQuery, callback_data: ExportCb, session, bot):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    if callback_data.fmt == "xlsx" and not xlsx_available():
+        await call.answer("XLSX недоступен, выберите CSV", show_alert=True)
+        return
+
+    tzname = user.timezone or "Europe/Moscow"
+    tz = ZoneInfo(tzname)
+    start, end = export_period_bounds(callback_data.period, datetime.now(timezone.utc).astimezone(tz).date())
+    await call.answer("Готовлю выгрузку…")
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = await export_data(
+            session, _local_midnight_utc(start, tz), _local_midnight_utc(end, tz), tzname, callback_data.fmt, directory,
+        )
+        for path in paths:
+            await bot.send_document(call.from_user.id, FSInputFile(path))
+
+    await call.message.answer(
+        f"Выгрузка готова: {EXPORT_PERIOD_TITLES[callback_data.period].lower()} "
+        f"({start:%Y-%m-%d} — {end:%Y-%m-%d}, не включая)."
+    )
@@ -0,0 +1,107 @@
+from datetime import datetime, timezone
+
+from aiogram import Router, F
+from aiogram.types import CallbackQuery
+
+from ...callbacks import AdminCb, GradeQueueCb
+from ...keyboards import grading_kb
+from ...services.homework import GradingState, grading_queue_next, grade_from_queue
+from ...jobs_notifications import queue_grade_notifications
+from ...utils_time import fmt_dt_for_tz
+from .common import get_user, ensure_teacher
+
+router = Router()
+
+
+def format_grading(state: GradingState, tzname: str, sent: int = 0) -> str:
+    sent_line = f"Оценки разосланы ученикам и родителям: {sent}.\n\n" if sent else ""
+    if state.item is None:
+        text = "Очередь проверки пройдена."
+        if state.remaining:
+            text += f" Пропущено: {state.remaining}."
+        return sent_line + text
+
+    item = state.item
+    return (
+        f"{sent_line}"
+        f"Проверка ДЗ (в очереди: {state.remaining})\n\n"
+        f"Ученик: {item.full_name}\n"
+        f"ДЗ: {item.title}\n"
+        f"Сдано: {fmt_dt_for_tz(item.student_done_at, tzname)} ({tzname})\n\n"
+        f"{item.description}\n\n"
+        "Оценка:"
+    )
+
+
+async def show_grading(call: CallbackQuery, session, tzname: str, after_id: int | None = None) -> None:
+    state = await grading_queue_next(session, after_id)
+    sent = 0
+    if state.item is None and state.buffered:
+        # конец прохода — накопленные оценки уходят одним сообщением каждому получателю
+        sent = await queue_grade_notifications(session, datetime.now(timezone.utc))
+        await session.commit()
+        state = state._replace(buffered=0)
+
+    await call.message.edit_text(
+        format_grading(state, tzname, sent),
+        reply_markup=grading_kb(
+            state.item.homework_id if state.item else None,
+            state.buffered,
+            restart=state.item is None and state.remaining > 0,
+        ),
+    )
+
+
+@router.callback_query(AdminCb.filter(F.action == "grading"))
+async def admin_grading(call: CallbackQuery, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    await show_grading(call, session, user.timezone or "Europe/Moscow")
+    await call.answer()
+
+
+@router.callback_query(GradeQueueCb.filter())
+async def grading_action(call: CallbackQuery, callback_data: GradeQueueCb, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+    tzname = user.timezone or "Europe/Moscow"
+
+    if callback_data.action == "grade":
+        if not 1 <= callback_data.grade <= 10:
+            await call.answer("Оценка 1–10", show_alert=True)
+            return
+        student_id = await grade_from_queue(
+            session, callback_data.homework_id, callback_data.grade, datetime.now(timezone.utc),
+        )
+        await session.commit()
+        await show_grading(call, session, tzname, after_id=callback_data.homework_id)
+        await call.answer("Сохранено" if student_id is not None else "Уже оценено")
+        return
+
+    if callback_data.action == "skip":
+        await show_grading(call, session, tzname, after_id=callback_data.homework_id)
+        await call.answer()
+        return
+
+    if callback_data.action == "restart":
+        await show_grading(call, session, tzname)
+        await call.answer()
+        return
+
+    if callback_data.action == "finish":
+        sent = await queue_grade_notifications(session, datetime.now(timezone.utc))
+        await session.commit()
+        state = await grading_queue_next(session)
+        await call.message.edit_text(
+            format_grading(state, tzname, sent),
+            reply_markup=grading_kb(
+                state.item.homework_id if state.item else None,
+                state.buffered,
+                restart=state.item is None and state.remaining > 0,
+            ),
+        )
+        await call.answer()
+        return
+
+    await call.answer("Неизвестное действие", show_alert=True)
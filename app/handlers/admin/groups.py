@@ -0,0 +1,256 @@
+from datetime import datetime, timezone, time as dtime
+from zoneinfo import ZoneInfo
+
+from aiogram import Router, F
+from aiogram.types import CallbackQuery, Message
+from aiogram.fsm.state import StatesGroup, State
+from aiogram.fsm.context import FSMContext
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from ...callbacks import AdminCb, GroupCb
+from ...keyboards import groups_kb, group_card_kb, group_members_kb, group_cancel_kb
+from ...models import Student, LessonGroup
+from ...services.groups import (
+    list_groups, create_group, group_members, set_group_members, add_group_rule, group_rules, next_group_lessons,
+)
+from ...services.billing import mark_group_lesson_done
+from ...jobs_notifications import plan_lesson_notifications
+from ...utils_time import fmt_dt_for_tz
+from .common import get_user, ensure_teacher
+
+router = Router()
+
+MEMBERS_PAGE_SIZE = 20
+WEEKDAYS = ["ПН", "ВТ", "СР", "ЧТ", "ПТ", "СБ", "ВС"]
+
+
+class GroupFSM(StatesGroup):
+    title = State()
+    members = State()
+    rule = State()
+
+
+RULE_PROMPT = (
+    "Введите занятие одной строкой: день недели (1=ПН … 7=ВС), время HH:MM (время группы) и длительность в минутах.\n"
+    "Например: 2 18:30 90"
+)
+
+
+async def render_group_card(message: Message, session, group_id: int, *, edit: bool = True):
+    group = await session.get(LessonGroup, group_id)
+    if group is None:
+        await message.answer("Группа не найдена.")
+        return
+
+    members = await group_members(session, group_id)
+    rules = await group_rules(session, group_id)
+    lessons = await next_group_lessons(session, group_id)
+
+    members_line = ", ".join(name for _sid, name in members) or "нет участников"
+    rules_lines = "\n".join(
+        f"• {WEEKDAYS[r.weekday]} {r.time_local.strftime('%H:%M')}, {r.duration_min} мин" for r in rules
+    ) or "• нет"
+    text = (
+        f"Группа: {group.title} ({group.timezone})\n"
+        f"Участники ({len(members)}): {members_line}\n\n"
+        f"Расписание:\n{rules_lines}\n\n"
+        + ("Ближайшие занятия — нажмите, чтобы отметить «Проведено»:" if lessons else "Запланированных занятий нет.")
+    )
+    markup = group_card_kb(
+        group_id, [(gl.id, fmt_dt_for_tz(gl.start_at, group.timezone)) for gl in lessons],
+    )
+    if edit:
+        await message.edit_text(text, reply_markup=markup)
+    else:
+        await message.answer(text, reply_markup=markup)
+
+
+async def render_member_picker(message: Message, session, state: FSMContext, group_id: int, page: int):
+    selected = set((await state.get_data()).get("selected", []))
+    rows = (await session.execute(
+        select(Student.id, Student.full_name)
+        .order_by(Student.full_name, Student.id)
+        .offset((page - 1) * MEMBERS_PAGE_SIZE)
+        .limit(MEMBERS_PAGE_SIZE + 1)
+    )).all()
+    has_next = len(rows) > MEMBERS_PAGE_SIZE
+    await message.edit_text(
+        f"Выбрано учеников: {len(selected)}\n\nОтметьте участников группы:",
+        reply_markup=group_members_kb(
+            group_id, [tuple(r) for r in rows[:MEMBERS_PAGE_SIZE]], selected, page, has_next,
+        ),
+    )
+
+
+@router.callback_query(AdminCb.filter(F.action == "groups"))
+async def groups_list(call: CallbackQuery, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    await state.clear()
+    groups = await list_groups(session)
+    text = "Группы\n\n" + ("Выберите группу:" if groups else "Групп пока нет — создайте первую.")
+    await call.message.edit_text(text, reply_markup=groups_kb(groups))
+    await call.answer()
+
+
+@router.callback_query(GroupCb.filter(F.action == "new"))
+async def group_new(call: CallbackQuery, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    await state.clear()
+    await state.set_state(GroupFSM.title)
+    await call.message.edit_text("Введите название группы:", reply_markup=group_cancel_kb())
+    await call.answer()
+
+
+@router.message(GroupFSM.title)
+async def group_set_title(message: Message, state: FSMContext, session):
+    user = await get_user(session, message.from_user.id)
+    ensure_teacher(user)
+
+    title = (message.text or "").strip()
+    if len(title) < 2:
+        await message.answer("Название слишком короткое. Повторите.")
+        return
+
+    # время занятий группы — во времени учителя
+    try:
+        group_id = await create_group(session, title, user.timezone or "Europe/Moscow")
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+        await message.answer("Группа с таким названием уже есть. Введите другое.")
+        return
+
+    await state.clear()
+    await render_group_card(message, session, group_id, edit=False)
+
+
+@router.callback_query(GroupCb.filter(F.action == "view"))
+async def group_view(call: CallbackQuery, callback_data: GroupCb, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    await state.clear()
+    await render_group_card(call.message, session, callback_data.group_id)
+    await call.answer()
+
+
+@router.callback_query(GroupCb.filter(F.action == "members"))
+async def group_members_start(call: CallbackQuery, callback_data: GroupCb, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    current = [sid for sid, _name in await group_members(session, callback_data.group_id)]
+    await state.clear()
+    await state.update_data(selected=current)
+    await state.set_state(GroupFSM.members)
+    await render_member_picker(call.message, session, state, callback_data.group_id, page=1)
+    await call.answer()
+
+
+@router.callback_query(GroupFSM.members, GroupCb.filter(F.action.in_({"toggle", "all", "none", "page"})))
+async def group_members_pick(call: CallbackQuery, callback_data: GroupCb, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    selected = set((await state.get_data()).get("selected", []))
+    if callback_data.action == "toggle":
+        selected ^= {callback_data.item_id}
+    elif callback_data.action == "all":
+        selected = set((await session.execute(select(Student.id))).scalars().all())
+    elif callback_data.action == "none":
+        selected = set()
+
+    await state.update_data(selected=sorted(selected))
+    await render_member_picker(call.message, session, state, callback_data.group_id, page=callback_data.page)
+    await call.answer()
+
+
+@router.callback_query(GroupFSM.members, GroupCb.filter(F.action == "save"))
+async def group_members_save(call: CallbackQuery, callback_data: GroupCb, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    selected = (await state.get_data()).get("selected", [])
+    await set_group_members(session, callback_data.group_id, selected)
+    # новым участникам — напоминания о занятиях группы
+    await plan_lesson_notifications(session, datetime.now(timezone.utc))
+    await session.commit()
+    await state.clear()
+
+    await render_group_card(call.message, session, callback_data.group_id)
+    await call.answer("Состав сохранён")
+
+
+@router.callback_query(GroupCb.filter(F.action == "rule"))
+async def group_rule_start(call: CallbackQuery, callback_data: GroupCb, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    await state.clear()
+    await state.update_data(group_id=callback_data.group_id)
+    await state.set_state(GroupFSM.rule)
+    await call.message.edit_text(RULE_PROMPT, reply_markup=group_cancel_kb(callback_data.group_id))
+    await call.answer()
+
+
+@router.message(GroupFSM.rule)
+async def group_rule_set(message: Message, state: FSMContext, session):
+    user = await get_user(session, message.from_user.id)
+    ensure_teacher(user)
+
+    group_id = (await state.get_data())["group_id"]
+    try:
+        wd_raw, time_raw, dur_raw = (message.text or "").split()
+        wd_user, dur = int(wd_raw), int(dur_raw)
+        hh, mm = time_raw.split(":")
+        t = dtime(hour=int(hh), minute=int(mm))
+        if not 1 <= wd_user <= 7 or not 0 < dur <= 600:
+            raise ValueError
+    except ValueError:
+        await message.answer("Неверный формат.\n" + RULE_PROMPT, reply_markup=group_cancel_kb(group_id))
+        return
+
+    group = await session.get(LessonGroup, group_id)
+    today = datetime.now(ZoneInfo(group.timezone)).date()
+    created = await add_group_rule(session, group_id, wd_user - 1, t, dur, today)
+    await plan_lesson_notifications(session, datetime.now(timezone.utc))
+    await session.commit()
+    await state.clear()
+
+    await message.answer(f"Расписание добавлено, занятий создано: {created}.")
+    await render_group_card(message, session, group_id, edit=False)
+
+
+@router.callback_query(GroupCb.filter(F.action == "done"))
+async def group_lesson_done(call: CallbackQuery, callback_data: GroupCb, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    result = await mark_group_lesson_done(session, callback_data.item_id)
+    if result is None:
+        await call.answer("Уже отмечено", show_alert=True)
+        return
+
+    note = f"Проведено. Списано с пакетов: {result['charged']}, начислено: {result['charges']}."
+    if result["skipped"]:
+        note += f" Без цены занятия: {len(result['skipped'])}."
+    await render_group_card(call.message, session, callback_data.group_id)
+    await call.answer(note, show_alert=True)
+
+
+@router.callback_query(GroupCb.filter(F.action == "cancel"))
+async def group_cancel(call: CallbackQuery, callback_data: GroupCb, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    await state.clear()
+    if callback_data.group_id:
+        await render_group_card(call.message, session, callback_data.group_id)
+    else:
+        await call.message.edit_text("Группы", reply_markup=groups_kb(await list_groups(session)))
+    await call.answer()
@@ -7,17 +7,25 @@ from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
 from sqlalchemy import select
-from sqlalchemy.sql import nulls_last
 from sqlalchemy.dialects.postgresql import insert
 
 from ...config import settings
 from ...models import (
     User, Role, Student, Homework,
-    ParentStudent, Parent, Notification, NotificationStatus
+    ParentStudent, Parent, Notification, NotificationStatus, NotificationPriority
+)
+from ...callbacks import AdminCb, HomeworkCb, HomeworkListCb, FsmNavCb
+from ...keyboards import (
+    HW_FILTER_TITLES, homework_kb, student_homework_kb, student_homeworks_list_kb, fsm_nav_kb, after_hw_added_kb,
+    hw_attach_kb,
 )
-from ...callbacks import AdminCb, HomeworkCb, FsmNavCb
-from ...keyboards import homework_kb, student_homework_kb, student_homeworks_list_kb, fsm_nav_kb, after_hw_added_kb
 from ...utils_time import fmt_dt_for_tz
+from ...services.schedule import bump_schedule_version
+from ...services.homework import HW_FILTERS, homework_page
+from ...services.attachments import (
+    MAX_ATTACHMENTS, incoming_file, save_file, attach_files, detach_files, homework_files, attachment_count, send_files,
+)
+from ...jobs_notifications import retire_hw_due
 from .common import ensure_teacher
 from ..student import render_student_card
 
@@ -28,6 +36,7 @@ class HomeworkFSM(StatesGroup):
     description = State()
     due_at = State()
     grade = State()
+    files = State()
 
 async def render_homework(
     call: CallbackQuery,
@@ -66,6 +75,10 @@ async def render_homework(
         f"Оценка: {hw.grade if hw.grade is not None else '-'} / 10",
     ]
 
+    files = await attachment_count(session, hw.id)
+    if files:
+        text.append(f"Вложения: {files}")
+
     if hw.due_at:
         due_when = fmt_dt_for_tz(hw.due_at, tz)
         text.insert(2, f"Сдать до: {due_when} ({tz})")  # после имени
@@ -76,38 +89,42 @@ async def render_homework(
         text.append(f"Статус: выполнено (отмечено {done_when} ({tz}))")
 
     if for_student:
-        markup = student_homework_kb(homework_id=homework_id, student_id=student_id)
+        markup = student_homework_kb(homework_id=homework_id, student_id=student_id, files=files)
     else:
-        markup = homework_kb(homework_id=homework_id, student_id=student_id, offset=offset)
+        markup = homework_kb(homework_id=homework_id, student_id=student_id, offset=offset, files=files)
 
     await call.message.edit_text("\n".join(text), reply_markup=markup)
 
 
-async def render_student_homeworks(call, session, student_id: int):
+async def render_student_homeworks(call, session, student_id: int, flt: str = "all", after_id: int | None = None):
     st = (await session.execute(select(Student).where(Student.id == student_id))).scalar_one()
 
-    q = (
-        select(Homework)
-        .where(Homework.student_id == student_id)
-        .order_by(nulls_last(Homework.due_at.desc()), Homework.created_at.desc())
-    )
-    homeworks = (await session.execute(q)).scalars().all()
+    # в SQL уходят и фильтр, и LIMIT: в сообщении и клавиатуре всегда не больше страницы
+    homeworks, has_more = await homework_page(session, student_id, flt, after_id)
 
     tz = st.timezone or "Europe/Moscow"
 
-    lines = [f"{st.full_name}", "", "Домашние задания:"]
+    title = "Домашние задания:" if flt == "all" else f"Домашние задания ({HW_FILTER_TITLES[flt].lower()}):"
+    lines = [f"{st.full_name}", "", title]
     if not homeworks:
-        lines.append("— пока нет —")
+        lines.append("— пока нет —" if not after_id else "— больше нет —")
     else:
-        for hw in homeworks[:30]:
+        for hw in homeworks:
             parts = [f"• {hw.title or 'ДЗ'}"]
             if hw.due_at:
                 parts.append(f"до {fmt_dt_for_tz(hw.due_at, tz)}")
-            if hw.student_done_at:
+            if hw.grade is not None:
+                parts.append(f"оценка {hw.grade}/10")
+            elif hw.student_done_at:
                 parts.append("выполнено")
             lines.append(" ".join(parts))
 
-    markup = student_homeworks_list_kb(student_id, homeworks)
+    markup = student_homeworks_list_kb(
+        student_id, homeworks,
+        flt=flt,
+        next_after=homeworks[-1].id if has_more else None,
+        paged=bool(after_id),
+    )
     await call.message.edit_text("\n".join(lines), reply_markup=markup)
 
 
@@ -120,6 +137,21 @@ async def admin_student_homeworks(call: CallbackQuery, callback_data: AdminCb, s
     await call.answer()
 
 
+@router.callback_query(HomeworkListCb.filter())
+async def admin_student_homeworks_page(call: CallbackQuery, callback_data: HomeworkListCb, session):
+    user = (await session.execute(select(User).where(User.tg_id == call.from_user.id))).scalar_one()
+    ensure_teacher(user)
+
+    if callback_data.flt not in HW_FILTERS:
+        await call.answer("Неизвестный фильтр", show_alert=True)
+        return
+
+    await render_student_homeworks(
+        call, session, student_id=callback_data.student_id, flt=callback_data.flt, after_id=callback_data.after or None,
+    )
+    await call.answer()
+
+
 @router.callback_query(AdminCb.filter(F.action == "hw_create"))
 async def admin_hw_create_start(call: CallbackQuery, callback_data: AdminCb, state: FSMContext, session):
     user = (await session.execute(select(User).where(User.tg_id == call.from_user.id))).scalar_one()
@@ -154,7 +186,7 @@ async def homework_menu(call: CallbackQuery, callback_data: HomeworkCb, state: F
     # РЕЖИМ УЧЕНИКА
     # ==========================
     if user.role == Role.student:
-        if callback_data.action not in {"view", "done"}:
+        if callback_data.action not in {"view", "done", "files"}:
             await call.answer("Недоступно", show_alert=True)
             return
 
@@ -192,10 +224,16 @@ async def homework_menu(call: CallbackQuery, callback_data: HomeworkCb, state: F
             await call.answer()
             return
 
+        if callback_data.action == "files":
+            await send_files(call.bot, call.from_user.id, await homework_files(session, hw.id))
+            await call.answer()
+            return
+
         # --- done ---
         first_time = hw.student_done_at is None
         if first_time:
             hw.student_done_at = datetime.now(timezone.utc)
+            await retire_hw_due(session, hw.id)
             await session.commit()
 
             tz = st.timezone or "Europe/Moscow"
@@ -251,6 +289,9 @@ async def homework_menu(call: CallbackQuery, callback_data: HomeworkCb, state: F
         return
 
     if callback_data.action == "view":
+        # «Готово» после прикрепления файлов тоже ведёт сюда
+        if await state.get_state() == HomeworkFSM.files.state:
+            await state.clear()
         await render_homework(
             call,
             session,
@@ -270,6 +311,30 @@ async def homework_menu(call: CallbackQuery, callback_data: HomeworkCb, state: F
         await call.answer()
         return
 
+    if callback_data.action == "files":
+        await send_files(call.bot, call.from_user.id, await homework_files(session, hw.id))
+        await call.answer()
+        return
+
+    if callback_data.action == "attach":
+        await state.clear()
+        await state.update_data(homework_id=homework_id, student_id=cb_student_id, offset=offset)
+        await state.set_state(HomeworkFSM.files)
+        await call.message.edit_text(
+            f"Пришлите файлы или фото к ДЗ «{hw.title}» (до {MAX_ATTACHMENTS}).",
+            reply_markup=hw_attach_kb(homework_id, cb_student_id, offset),
+        )
+        await call.answer()
+        return
+
+    if callback_data.action == "detach":
+        await detach_files(session, hw.id)
+        await session.commit()
+        await state.clear()
+        await render_homework(call, session, homework_id=homework_id, student_id=cb_student_id, offset=offset)
+        await call.answer("Вложения убраны")
+        return
+
     if callback_data.action == "grade":
         await state.clear()
         await state.update_data(homework_id=homework_id, student_id=cb_student_id, offset=offset)
@@ -324,12 +389,55 @@ async def hw_set_description(message, state: FSMContext, session):
     await state.set_state(HomeworkFSM.due_at)
 
     await message.answer(
-        "Введите дедлайн в формате `YYYY-MM-DD HH:MM`, например `2026-02-11 12:00` или \"-\" чтобы без дедлайна.",
+        "Введите дедлайн в формате `YYYY-MM-DD HH:MM`, например `2026-02-11 12:00` или \"-\" чтобы без дедлайна.\n"
+        "Файлы и фото к заданию можно прислать до дедлайна.",
         parse_mode="Markdown",
         reply_markup=fsm_nav_kb("hw_create", student_id)
     )
 
 
+async def add_homework_file(message, session, homework_id: int) -> int | None:
+    # возвращает, сколько теперь вложений у ДЗ; None — лимит исчерпан
+    f = incoming_file(message)
+    count = await attachment_count(session, homework_id)
+    if count >= MAX_ATTACHMENTS:
+        return None
+    file_id = await save_file(session, f)
+    await attach_files(session, [homework_id], [file_id], start=count)
+    await session.commit()
+    return await attachment_count(session, homework_id)
+
+
+@router.message(HomeworkFSM.due_at, F.photo | F.document)
+@router.message(HomeworkFSM.files, F.photo | F.document)
+async def hw_add_file(message, state: FSMContext, session):
+    user = (await session.execute(select(User).where(User.tg_id == message.from_user.id))).scalar_one()
+    ensure_teacher(user)
+
+    data = await state.get_data()
+    homework_id = data.get("homework_id")
+    if homework_id is None:
+        await message.answer("Ошибка: не найдено ДЗ для вложения.")
+        await state.clear()
+        return
+
+    count = await add_homework_file(message, session, homework_id)
+    if count is None:
+        await message.answer(f"Не больше {MAX_ATTACHMENTS} вложений на одно ДЗ.")
+        return
+
+    if await state.get_state() == HomeworkFSM.files.state:
+        markup = hw_attach_kb(homework_id, data["student_id"], data.get("offset", 0))
+        await message.answer(f"Прикреплено файлов: {count}. Пришлите ещё или нажмите «Готово».", reply_markup=markup)
+    else:
+        await message.answer(f"Прикреплено файлов: {count}. Теперь введите дедлайн или \"-\".")
+
+
+@router.message(HomeworkFSM.files)
+async def hw_files_expected(message, state: FSMContext, session):
+    await message.answer("Пришлите документ или фото либо нажмите «Готово».")
+
+
 @router.message(HomeworkFSM.due_at)
 async def hw_set_due_at(message, state: FSMContext, session):
     user = (await session.execute(select(User).where(User.tg_id == message.from_user.id))).scalar_one()
@@ -360,6 +468,7 @@ async def hw_set_due_at(message, state: FSMContext, session):
     # "-" означает "без дедлайна"
     if raw == "-":
         hw.due_at = None
+        await retire_hw_due(session, hw.id)
         await session.commit()
         await state.clear()
         await message.answer("Дедлайн убран. Домашнее задание сохранено.")
@@ -378,6 +487,8 @@ async def hw_set_due_at(message, state: FSMContext, session):
 
     dt_local = dt_local.replace(tzinfo=tz)          # локальная TZ ученика
     hw.due_at = dt_local.astimezone(timezone.utc)   # храним в UTC
+    # напоминания по старому дедлайну снимаем, по новому их поставит планировщик
+    await retire_hw_due(session, hw.id)
 
     await session.commit()
     await state.clear()
@@ -423,6 +534,8 @@ async def hw_set_grade(message, state: FSMContext, session):
 
     hw.grade = grade
     hw.graded_at = datetime.now(timezone.utc)
+    # средняя оценка показывается на экране расписания
+    await bump_schedule_version(session, [student_id])
 
     st = (await session.execute(select(Student).where(Student.id == student_id))).scalar_one()
 
@@ -475,6 +588,7 @@ async def hw_set_grade(message, state: FSMContext, session):
             "type": "hw_graded",
             "entity_id": hw.id,
             "send_at": now,
+            "priority": NotificationPriority.bulk,
             "payload": payload,
             "status": NotificationStatus.pending
         })
@@ -0,0 +1,251 @@
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from aiogram import Router, F
+from aiogram.types import CallbackQuery, Message
+from aiogram.fsm.state import StatesGroup, State
+from aiogram.fsm.context import FSMContext
+from sqlalchemy import select
+
+from ...callbacks import AdminCb, HwGroupCb
+from ...keyboards import admin_menu, hw_group_templates_kb, hw_group_students_kb, hw_group_cancel_kb
+from ...models import Student, Homework, HomeworkTemplate
+from ...services.homework import create_homework_bulk, recent_templates, touch_template
+from ...services.attachments import (
+    MAX_ATTACHMENTS, incoming_file, save_file, attach_files, homework_file_ids, template_file_ids, set_template_files,
+)
+from ...jobs_notifications import plan_hw_assigned_notifications
+from ...utils_time import fmt_dt_for_tz
+from .common import get_user, ensure_teacher
+
+router = Router()
+
+STUDENTS_PAGE_SIZE = 20
+
+
+class HwGroupFSM(StatesGroup):
+    title = State()
+    description = State()
+    due_at = State()
+    students = State()
+
+
+DUE_PROMPT = (
+    "Введите дедлайн в формате YYYY-MM-DD HH:MM (ваше время), например 2026-02-11 12:00, "
+    "или \"-\" чтобы без дедлайна.\n"
+    "Файлы и фото к заданию можно прислать до дедлайна."
+)
+
+
+async def render_student_picker(message: Message, session, state: FSMContext, page: int, *, edit: bool = True):
+    data = await state.get_data()
+    selected = set(data.get("selected", []))
+
+    rows = (await session.execute(
+        select(Student.id, Student.full_name)
+        .order_by(Student.full_name, Student.id)
+        .offset((page - 1) * STUDENTS_PAGE_SIZE)
+        .limit(STUDENTS_PAGE_SIZE + 1)
+    )).all()
+    has_next = len(rows) > STUDENTS_PAGE_SIZE
+
+    due_at = datetime.fromisoformat(data["due_at"]) if data.get("due_at") else None
+    due_line = f"{fmt_dt_for_tz(due_at, data['tz'])} ({data['tz']})" if due_at else "без дедлайна"
+    files_line = f"Вложения: {len(data['files'])}\n" if data.get("files") else ""
+    text = (
+        f"ДЗ: {data['title']}\n"
+        f"Дедлайн: {due_line}\n"
+        f"{files_line}"
+        f"Выбрано учеников: {len(selected)}\n\n"
+        "Отметьте учеников:"
+    )
+    markup = hw_group_students_kb([tuple(r) for r in rows[:STUDENTS_PAGE_SIZE]], selected, page, has_next)
+    if edit:
+        await message.edit_text(text, reply_markup=markup)
+    else:
+        await message.answer(text, reply_markup=markup)
+
+
+@router.callback_query(AdminCb.filter(F.action == "hw_group"))
+async def hw_group_start(call: CallbackQuery, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    await state.clear()
+    templates = await recent_templates(session)
+    text = "ДЗ группе учеников\n\n" + (
+        "Выберите задание из библиотеки или создайте новое:" if templates else "Создайте новое задание:"
+    )
+    await call.message.edit_text(text, reply_markup=hw_group_templates_kb(templates))
+    await call.answer()
+
+
+@router.callback_query(HwGroupCb.filter(F.action == "new"))
+async def hw_group_new(call: CallbackQuery, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    await state.clear()
+    await state.set_state(HwGroupFSM.title)
+    await call.message.edit_text("Введите название домашнего задания:", reply_markup=hw_group_cancel_kb())
+    await call.answer()
+
+
+@router.callback_query(HwGroupCb.filter(F.action.in_({"tpl", "copy"})))
+async def hw_group_template(call: CallbackQuery, callback_data: HwGroupCb, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    # образец — шаблон из библиотеки или старое ДЗ (из поиска)
+    model = HomeworkTemplate if callback_data.action == "tpl" else Homework
+    found = (await session.execute(
+        select(model.title, model.description).where(model.id == callback_data.item_id)
+    )).one_or_none()
+    if found is None:
+        await call.answer("Шаблон не найден" if model is HomeworkTemplate else "ДЗ не найдено", show_alert=True)
+        return
+    title, description = found
+    # вложения образца переиспользуются по id — файлы не копируются
+    if model is HomeworkTemplate:
+        files = await template_file_ids(session, callback_data.item_id)
+    else:
+        files = await homework_file_ids(session, callback_data.item_id)
+
+    await state.clear()
+    await state.update_data(title=title, description=description, files=files)
+    await state.set_state(HwGroupFSM.due_at)
+    files_line = f"Вложения: {len(files)}\n" if files else ""
+    await call.message.edit_text(
+        f"ДЗ: {title}\n{description}\n{files_line}\n{DUE_PROMPT}",
+        reply_markup=hw_group_cancel_kb(),
+    )
+    await call.answer()
+
+
+@router.message(HwGroupFSM.title)
+async def hw_group_set_title(message: Message, state: FSMContext, session):
+    user = await get_user(session, message.from_user.id)
+    ensure_teacher(user)
+
+    title = (message.text or "").strip()
+    if len(title) < 2:
+        await message.answer("Название слишком короткое. Повторите.")
+        return
+
+    await state.update_data(title=title)
+    await state.set_state(HwGroupFSM.description)
+    await message.answer("Введите описание домашнего задания:", reply_markup=hw_group_cancel_kb())
+
+
+@router.message(HwGroupFSM.description)
+async def hw_group_set_description(message: Message, state: FSMContext, session):
+    user = await get_user(session, message.from_user.id)
+    ensure_teacher(user)
+
+    desc = (message.text or "").strip()
+    if len(desc) < 2:
+        await message.answer("Описание слишком короткое. Повторите.")
+        return
+
+    await state.update_data(description=desc)
+    await state.set_state(HwGroupFSM.due_at)
+    await message.answer(DUE_PROMPT, reply_markup=hw_group_cancel_kb())
+
+
+@router.message(HwGroupFSM.due_at, F.photo | F.document)
+async def hw_group_add_file(message: Message, state: FSMContext, session):
+    user = await get_user(session, message.from_user.id)
+    ensure_teacher(user)
+
+    files = (await state.get_data()).get("files", [])
+    if len(files) >= MAX_ATTACHMENTS:
+        await message.answer(f"Не больше {MAX_ATTACHMENTS} вложений на одно ДЗ.")
+        return
+
+    file_id = await save_file(session, incoming_file(message))
+    await session.commit()
+    if file_id not in files:
+        files = files + [file_id]
+    await state.update_data(files=files)
+    await message.answer(f"Прикреплено файлов: {len(files)}. Теперь введите дедлайн или \"-\".")
+
+
+@router.message(HwGroupFSM.due_at)
+async def hw_group_set_due_at(message: Message, state: FSMContext, session):
+    user = await get_user(session, message.from_user.id)
+    ensure_teacher(user)
+
+    # у учеников группы могут быть разные TZ — дедлайн вводится во времени учителя
+    tz_name = user.timezone or "Europe/Moscow"
+    raw = (message.text or "").strip()
+    due_at = None
+    if raw != "-":
+        try:
+            dt_local = datetime.strptime(raw, "%Y-%m-%d %H:%M")
+        except ValueError:
+            await message.answer("Неверный формат. Нужно YYYY-MM-DD HH:MM или -.")
+            return
+        due_at = dt_local.replace(tzinfo=ZoneInfo(tz_name)).astimezone(timezone.utc)
+
+    await state.update_data(due_at=due_at.isoformat() if due_at else None, tz=tz_name, selected=[])
+    await state.set_state(HwGroupFSM.students)
+    await render_student_picker(message, session, state, page=1, edit=False)
+
+
+@router.callback_query(HwGroupFSM.students, HwGroupCb.filter(F.action.in_({"toggle", "all", "none", "page"})))
+async def hw_group_pick(call: CallbackQuery, callback_data: HwGroupCb, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    selected = set((await state.get_data()).get("selected", []))
+    if callback_data.action == "toggle":
+        selected ^= {callback_data.item_id}
+    elif callback_data.action == "all":
+        selected = set((await session.execute(select(Student.id))).scalars().all())
+    elif callback_data.action == "none":
+        selected = set()
+
+    await state.update_data(selected=sorted(selected))
+    await render_student_picker(call.message, session, state, page=callback_data.page)
+    await call.answer()
+
+
+@router.callback_query(HwGroupFSM.students, HwGroupCb.filter(F.action == "assign"))
+async def hw_group_assign(call: CallbackQuery, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    data = await state.get_data()
+    selected = data.get("selected", [])
+    if not selected:
+        await call.answer("Не выбран ни один ученик", show_alert=True)
+        return
+
+    # одна транзакция на всю группу: многострочный INSERT ДЗ, один INSERT ... SELECT уведомлений
+    now = datetime.now(timezone.utc)
+    due_at = datetime.fromisoformat(data["due_at"]) if data.get("due_at") else None
+    files = data.get("files", [])
+    homework_ids = await create_homework_bulk(session, selected, data["title"], data["description"], due_at)
+    await attach_files(session, homework_ids, files)
+    await plan_hw_assigned_notifications(session, homework_ids, now)
+    template_id = await touch_template(session, data["title"], data["description"], now)
+    await set_template_files(session, template_id, files)
+    await session.commit()
+    await state.clear()
+
+    await call.message.edit_text(
+        f"ДЗ «{data['title']}» выдано ученикам: {len(homework_ids)}. "
+        "Уведомления ученикам и родителям поставлены в очередь.",
+        reply_markup=admin_menu(),
+    )
+    await call.answer()
+
+
+@router.callback_query(HwGroupCb.filter(F.action == "cancel"))
+async def hw_group_cancel(call: CallbackQuery, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    await state.clear()
+    await call.message.edit_text("Выдача ДЗ отменена.", reply_markup=admin_menu())
+    await call.answer()
@@ -0,0 +1,60 @@
+from aiogram import Router
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery, Message
+
+from ...callbacks import HwSearchCb
+from ...keyboards import hw_search_kb
+from ...services.homework import HW_SEARCH_PAGE_SIZE, search_homework
+from .common import get_user, ensure_teacher
+
+router = Router()
+
+
+async def render_hw_search(session, query: str, page: int) -> tuple[str, object]:
+    hits, total = await search_homework(session, query, page, HW_SEARCH_PAGE_SIZE)
+    if not hits:
+        return f"Поиск ДЗ: «{query}»\n\nНичего не найдено.", None
+
+    first = (page - 1) * HW_SEARCH_PAGE_SIZE
+    lines = [f"Поиск ДЗ: «{query}» — найдено {total}", ""]
+    for n, hit in enumerate(hits, start=first + 1):
+        lines.append(f"{n}. {hit.title} — {hit.full_name} ({hit.created_at:%Y-%m-%d})")
+    lines.append("")
+    lines.append("Откройте ДЗ или «↻ Выдать» — выдать его заново группе учеников.")
+    return "\n".join(lines), hw_search_kb(hits, page, has_next=first + len(hits) < total, start=first + 1)
+
+
+@router.message(Command("hw_search"))
+async def hw_search_cmd(message: Message, command: CommandObject, state: FSMContext, session):
+    user = await get_user(session, message.from_user.id)
+    ensure_teacher(user)
+
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer(
+            "Поиск по названию и описанию ДЗ всех учеников:\n"
+            "/hw_search дроби\n"
+            "/hw_search \"present perfect\" -тест"
+        )
+        return
+
+    # запрос нужен для листания страниц, а в callback_data он может не влезть
+    await state.update_data(hw_search=query)
+    text, markup = await render_hw_search(session, query, page=1)
+    await message.answer(text, reply_markup=markup)
+
+
+@router.callback_query(HwSearchCb.filter())
+async def hw_search_page(call: CallbackQuery, callback_data: HwSearchCb, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    query = (await state.get_data()).get("hw_search")
+    if not query:
+        await call.answer("Повторите поиск: /hw_search текст", show_alert=True)
+        return
+
+    text, markup = await render_hw_search(session, query, callback_data.page)
+    await call.message.edit_text(text, reply_markup=markup)
+    await call.answer()
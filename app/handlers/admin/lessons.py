@@ -5,14 +5,21 @@ from aiogram.types import CallbackQuery
 from sqlalchemy import select, delete, or_, and_, exists
 
 from ...models import Lesson, LessonStatus, Student, ScheduleRule, LessonCharge, ChargeStatus, BillingMode, User
-from ...callbacks import LessonCb, AdminCb
+from ...callbacks import LessonCb, AdminCb, PromptCb
 from ...keyboards import lesson_actions_kb, student_card_kb
 from ...utils_time import fmt_dt_for_tz
 from ...services.billing import mark_lesson_done
+from ...services.schedule import cancel_planned_lesson, bump_schedule_version
+from ...jobs_stats import lesson_days, rollup_days
 from .common import ensure_teacher
 
 router = Router()
 
+CANCEL_RESULTS = {
+    "deleted": "Разовое занятие отменено и удалено из календаря.",
+    "canceled": "Занятие отменено.",
+}
+
 async def render_lesson_card(call: CallbackQuery, session, student_id: int, offset: int):
     st = (await session.execute(select(Student).where(Student.id == student_id))).scalar_one()
 
@@ -113,26 +120,11 @@ async def lesson_action(call: CallbackQuery, callback_data: LessonCb, session, b
         return
 
     if callback_data.action == "cancel":
-        lesson = (await session.execute(select(Lesson).where(Lesson.id == callback_data.lesson_id))).scalar_one()
-
-        # Разовое: отмена = удалить из календаря
-        if lesson.source_rule_id is None:
-            await session.delete(lesson)
-            await session.commit()
-            await call.message.edit_text(
-                "Разовое занятие отменено и удалено из календаря.",
-                reply_markup=student_card_kb(student_id)
-            )
-            await call.answer()
+        res = await cancel_planned_lesson(session, callback_data.lesson_id)
+        if res is None:
+            await call.answer("Урок уже проведён или отменён.", show_alert=True)
             return
-
-        # Еженедельное: отменяем только ближайшее занятие (НЕ удаляем, чтобы генератор не пересоздал)
-        lesson.status = LessonStatus.canceled
-        await session.commit()
-        await call.message.edit_text(
-            "Ближайшее занятие из еженедельного цикла отменено.",
-            reply_markup=student_card_kb(student_id)
-        )
+        await call.message.edit_text(CANCEL_RESULTS[res], reply_markup=student_card_kb(student_id))
         await call.answer()
         return
 
@@ -148,15 +140,17 @@ async def lesson_action(call: CallbackQuery, callback_data: LessonCb, session, b
 
         # ВАЖНО: сначала удаляем будущие уроки, потом удаляем правило.
         # Иначе из-за FK ondelete="SET NULL" уроки потеряют source_rule_id и станут выглядеть как разовые.
-        await session.execute(
-            delete(Lesson).where(
-                Lesson.source_rule_id == rule_id,
-                Lesson.start_at >= now
-            )
-        )
+        series = (Lesson.source_rule_id == rule_id, Lesson.start_at >= now)
+        # среди будущих могут быть отменённые — их дни в статистике пересчитываем после удаления
+        stats_days = await lesson_days(session, *series)
+        await session.execute(delete(Lesson).where(*series))
 
         rule = (await session.execute(select(ScheduleRule).where(ScheduleRule.id == rule_id))).scalar_one()
         await session.delete(rule)
+        await bump_schedule_version(session, [lesson.student_id])
+        await session.flush()
+        if stats_days:
+            await rollup_days(session, stats_days)
 
         await session.commit()
         await call.message.edit_text(
@@ -175,3 +169,26 @@ async def lesson_action(call: CallbackQuery, callback_data: LessonCb, session, b
 
         await call.answer()
         return
+
+
+@router.callback_query(PromptCb.filter())
+async def lesson_prompt_action(call: CallbackQuery, callback_data: PromptCb, session, bot):
+    # кнопки под автоматическим вопросом «Урок закончился — отметить?»
+    user = (await session.execute(select(User).where(User.tg_id == call.from_user.id))).scalar_one()
+    ensure_teacher(user)
+
+    lesson_id = callback_data.lesson_id
+
+    if callback_data.action == "done":
+        try:
+            res = await mark_lesson_done(session, bot, lesson_id)
+        except ValueError as e:
+            await call.answer(str(e), show_alert=True)
+            return
+        result = "✅ Отмечен проведённым." if res.done else "Урок уже был отмечен ранее."
+    else:
+        res = await cancel_planned_lesson(session, lesson_id)
+        result = f"❌ {CANCEL_RESULTS[res]}" if res else "Урок уже был отмечен ранее."
+
+    await call.message.edit_text(f"{call.message.text}\n\n{result}")
+    await call.answer()
@@ -11,6 +11,7 @@ from ....callbacks import AdminCb
 from ....keyboards import fsm_nav_kb, after_single_added_kb
 from ....models import Student, Lesson, LessonStatus
 from ....jobs_notifications import plan_lesson_notifications_job
+from ....services.schedule import bump_schedule_version
 from ..common import get_user, ensure_teacher, local_to_utc
 from .states import AddSingleLessonFSM
 
@@ -128,6 +129,8 @@ async def add_single_duration(message: Message, state: FSMContext, session):
     session.add(lesson)
 
     try:
+        await session.flush()
+        await bump_schedule_version(session, [student_id])
         await session.commit()
     except IntegrityError:
         await session.rollback()
@@ -16,7 +16,14 @@ async def admin_root(call: CallbackQuery, session):
     text = (
         "Админка\n\n"
         "• Ученики — список учеников и управление конкретным учеником.\n"
-        "• Создать ученика — добавьте нового ученика (ФИО, TZ, тариф).\n\n"
+        "• Создать ученика — добавьте нового ученика (ФИО, TZ, тариф).\n"
+        "• Уроки сегодня — отметить проведёнными все уроки дня разом.\n"
+        "• Неоплаченные — долги по всем ученикам, отметка оплаты и импорт банковской выписки.\n"
+        "• ДЗ группе — одно задание (новое или из библиотеки) сразу нескольким ученикам.\n"
+        "• Проверка ДЗ — все сданные задания по очереди; оценки уходят одним сообщением в конце.\n"
+        "• Группы — групповые занятия: состав, еженедельное расписание, отметка «Проведено».\n"
+        "• Аналитика — уроки, выручка, пакеты и оценки по месяцам.\n"
+        "• Выгрузка данных — уроки, начисления и ДЗ файлом (CSV/XLSX).\n\n"
         "Подсказка: у ученика можно добавить разовое занятие или еженедельный цикл."
     )
     await call.message.edit_text(text, reply_markup=admin_menu())
@@ -6,6 +6,7 @@ from sqlalchemy import select, delete, exists, and_
 from ...models import User, Student, Lesson, RegistrationKey, Notification, ParentStudent, Parent
 from ...callbacks import AdminCb
 from ...keyboards import admin_menu, student_delete_confirm_kb
+from ...jobs_stats import student_days, rollup_days
 from .common import get_user, ensure_teacher
 
 router = Router()
@@ -79,6 +80,7 @@ async def student_delete_confirm(call: CallbackQuery, callback_data: AdminCb, se
 
     await session.execute(delete(RegistrationKey).where(RegistrationKey.student_id == student_id))
 
+    stats_days = await student_days(session, student_id)
     await session.delete(st)
 
     if student_user_id:
@@ -87,6 +89,10 @@ async def student_delete_confirm(call: CallbackQuery, callback_data: AdminCb, se
     if parent_user_ids_to_delete:
         await session.execute(delete(User).where(User.id.in_(parent_user_ids_to_delete)))
 
+    # удалённые уроки/начисления не оставляют следа для инкрементального пересчёта
+    await session.flush()
+    if stats_days:
+        await rollup_days(session, stats_days)
     await session.commit()
 
     await call.message.edit_text("Ученик и связанные данные удалены.", reply_markup=admin_menu())
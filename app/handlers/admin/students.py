@@ -6,9 +6,11 @@ from aiogram.types import CallbackQuery
 
 from sqlalchemy import select, func
 
-from ...models import User, Role, Student, RegistrationKey, BillingMode, StudentBalance, LessonCharge, ChargeStatus
+from ...models import (
+    User, Role, Student, RegistrationKey, BillingMode, InvoicePeriod, StudentBalance, LessonCharge, ChargeStatus,
+)
 from ...callbacks import AdminCb
-from ...keyboards import students_list_kb, student_card_kb
+from ...keyboards import students_list_kb, student_card_kb, INVOICE_PERIOD_TITLES
 from .common import get_user, ensure_teacher
 
 router = Router()
@@ -67,7 +69,10 @@ async def admin_student_card(call: CallbackQuery, callback_data: AdminCb, sessio
                 LessonCharge.status == ChargeStatus.pending
             )
         )).scalar_one()
-        unpaid_line = f"Проведено, но не оплачено: {unpaid_cnt}\n"
+        unpaid_line = (
+            f"Проведено, но не оплачено: {unpaid_cnt}\n"
+            f"Счета родителям: {INVOICE_PERIOD_TITLES[st.invoice_period.value]}\n"
+        )
 
     txt = (
         f"Ученик: {st.full_name}\n"
@@ -86,11 +91,29 @@ async def admin_student_card(call: CallbackQuery, callback_data: AdminCb, sessio
 
     await call.message.edit_text(
         txt,
-        reply_markup=student_card_kb(st.id, show_subscription=show_sub_buttons)
+        reply_markup=student_card_kb(
+            st.id,
+            show_subscription=show_sub_buttons,
+            invoice_period=st.invoice_period.value if st.billing_mode == BillingMode.single else None,
+        )
     )
     await call.answer()
 
 
+@router.callback_query(AdminCb.filter(F.action == "invoice_period"))
+async def admin_student_invoice_period(call: CallbackQuery, callback_data: AdminCb, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    # по кругу: после урока -> раз в неделю -> раз в месяц
+    order = list(InvoicePeriod)
+    st = (await session.execute(select(Student).where(Student.id == callback_data.student_id))).scalar_one()
+    st.invoice_period = order[(order.index(st.invoice_period) + 1) % len(order)]
+    await session.commit()
+
+    await admin_student_card(call, AdminCb(action="student", student_id=st.id), session)
+
+
 async def create_key(session, role_target: Role, student_id: int) -> str:
     key = secrets.token_urlsafe(10)
     rk = RegistrationKey(
@@ -3,12 +3,22 @@ from aiogram.types import CallbackQuery
 from sqlalchemy import select
 
 from ...callbacks import SubCb
-from ...models import User
+from ...keyboards import back_to_student_kb
+from ...models import Student
 from .common import get_user, ensure_teacher
-from ...services.billing import add_subscription_package
+from ...services.billing import add_subscription_package, correct_balance, balance_history
+from ...utils_time import fmt_dt_for_tz
 
 router = Router()
 
+REASON_TITLES = {
+    "package": "абонемент",
+    "lesson": "урок",
+    "correction": "корректировка",
+    "opening": "начальный остаток",
+}
+
+
 @router.callback_query(SubCb.filter(F.action == "add"))
 async def sub_add(call: CallbackQuery, callback_data: SubCb, session):
     user = await get_user(session, call.from_user.id)
@@ -21,3 +31,36 @@ async def sub_add(call: CallbackQuery, callback_data: SubCb, session):
         return
 
     await call.answer(f"Добавлено {callback_data.qty}. Осталось: {left} уроков", show_alert=True)
+
+
+@router.callback_query(SubCb.filter(F.action == "fix"))
+async def sub_fix(call: CallbackQuery, callback_data: SubCb, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    try:
+        left = await correct_balance(session, callback_data.student_id, callback_data.qty, comment="вручную")
+    except ValueError as e:
+        await call.answer(str(e), show_alert=True)
+        return
+
+    await call.answer(f"Корректировка {callback_data.qty:+d}. Осталось: {left} уроков", show_alert=True)
+
+
+@router.callback_query(SubCb.filter(F.action == "history"))
+async def sub_history(call: CallbackQuery, callback_data: SubCb, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    st = (await session.execute(select(Student).where(Student.id == callback_data.student_id))).scalar_one()
+    entries = await balance_history(session, st.id)
+
+    lines = [
+        f"{fmt_dt_for_tz(e.created_at, user.timezone)}  {e.delta:+d}  {REASON_TITLES.get(e.reason.value, e.reason.value)}"
+        + (f" ({e.comment})" if e.comment else "")
+        for e in entries
+    ]
+    text = f"История баланса: {st.full_name}\n\n" + ("\n".join(lines) if lines else "Движений пока нет.")
+
+    await call.message.edit_text(text, reply_markup=back_to_student_kb(st.id))
+    await call.answer()
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from aiogram import Router, F
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery
+from sqlalchemy import select
+
+from ...callbacks import AdminCb, TodayCb
+from ...keyboards import today_lessons_kb
+from ...models import Lesson, LessonStatus, Student
+from ...services.billing import mark_lessons_done_bulk
+from ...utils_time import fmt_dt_for_tz
+from .common import get_user, ensure_teacher
+
+router = Router()
+
+
+async def today_lessons(session, tzname: str) -> list[tuple[int, str]]:
+    # planned-уроки всех учеников за сегодня (локальный день учителя)
+    local_now = datetime.now(timezone.utc).astimezone(ZoneInfo(tzname))
+    day_start = local_now.replace(hour=0, minute=0, second=0, microsecond=0)
+    day_end = day_start + timedelta(days=1)
+
+    rows = (await session.execute(
+        select(Lesson.id, Lesson.start_at, Student.full_name)
+        .join(Student, Student.id == Lesson.student_id)
+        .where(
+            Lesson.status == LessonStatus.planned,
+            Lesson.start_at >= day_start,
+            Lesson.start_at < day_end,
+        )
+        .order_by(Lesson.start_at, Student.full_name)
+    )).all()
+
+    return [(lesson_id, f"{fmt_dt_for_tz(start_at, tzname)[-5:]} {name}") for lesson_id, start_at, name in rows]
+
+
+async def render_today(call: CallbackQuery, session, state: FSMContext, user, header: str = "") -> None:
+    tzname = user.timezone or "Europe/Moscow"
+    rows = await today_lessons(session, tzname)
+    excluded = set((await state.get_data()).get("today_excluded", []))
+    # «Отметить проведёнными» действует только на показанные уроки: добавленный или
+    # перенесённый в этот день позже попадёт в отметку лишь после перерисовки экрана
+    await state.update_data(today_shown=[lesson_id for lesson_id, _ in rows])
+
+    if rows:
+        text = (
+            "Уроки сегодня\n\n"
+            "Нажмите на урок, чтобы исключить его (⛔), затем «Отметить проведёнными»."
+        )
+    else:
+        text = "Уроки сегодня\n\nНепроведённых уроков на сегодня нет."
+    if header:
+        text = f"{header}\n\n{text}"
+
+    await call.message.edit_text(text, reply_markup=today_lessons_kb(rows, excluded))
+
+
+@router.callback_query(AdminCb.filter(F.action == "today"))
+async def admin_today(call: CallbackQuery, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    await state.update_data(today_excluded=[])
+    await render_today(call, session, state, user)
+    await call.answer()
+
+
+@router.callback_query(TodayCb.filter(F.action == "toggle"))
+async def today_toggle(call: CallbackQuery, callback_data: TodayCb, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    excluded = set((await state.get_data()).get("today_excluded", []))
+    excluded ^= {callback_data.lesson_id}
+    await state.update_data(today_excluded=sorted(excluded))
+
+    await render_today(call, session, state, user)
+    await call.answer()
+
+
+@router.callback_query(TodayCb.filter(F.action == "done"))
+async def today_done(call: CallbackQuery, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    data = await state.get_data()
+    excluded = set(data.get("today_excluded", []))
+    lesson_ids = [lesson_id for lesson_id in data.get("today_shown", []) if lesson_id not in excluded]
+
+    res = await mark_lessons_done_bulk(session, lesson_ids)
+
+    header = (
+        f"Отмечено проведёнными: {res['done']}\n"
+        f"Списано с абонементов: {res['charged']}\n"
+        f"Начислений к оплате: {res['charges']}"
+    )
+    if res["skipped"]:
+        header += f"\nНе отмечено (single без цены за урок): {len(res['skipped'])}"
+
+    await render_today(call, session, state, user, header=header)
+    await call.answer("Готово")
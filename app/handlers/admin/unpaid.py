@@ -0,0 +1,135 @@
+import os
+import tempfile
+
+from aiogram import Router, F
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import StatesGroup, State
+from aiogram.types import CallbackQuery, Message
+from sqlalchemy import select
+
+from ...callbacks import UnpaidCb
+from ...keyboards import unpaid_kb, unpaid_pay_confirm_kb
+from ...models import Student
+from ...services.bank_import import import_statement
+from ...services.billing import unpaid_totals, unpaid_by_student, mark_student_charges_paid
+from .common import get_user, ensure_teacher
+
+router = Router()
+
+PAGE_SIZE = 10
+# сколько несопоставленных строк показывать в отчёте
+UNMATCHED_SHOWN = 20
+
+
+class BankImportFSM(StatesGroup):
+    file = State()
+
+
+def format_import_report(result: dict) -> str:
+    lines = [f"Импорт выписки: оплачено {result['paid']} ур. на сумму {result['sum']}"]
+    unmatched = result["unmatched"]
+    if unmatched:
+        lines.append(f"\nНе сопоставлено строк: {len(unmatched)}")
+        for item in unmatched[:UNMATCHED_SHOWN]:
+            if isinstance(item, int):
+                lines.append(f"- стр. {item}: не удалось разобрать")
+            else:
+                lines.append(f"- стр. {item.line_no}: {item.paid_on:%Y-%m-%d} {item.amount} {item.text[:60]}")
+        if len(unmatched) > UNMATCHED_SHOWN:
+            lines.append(f"... и ещё {len(unmatched) - UNMATCHED_SHOWN}")
+    return "\n".join(lines)
+
+
+async def render_unpaid(call: CallbackQuery, session, after: int = 0, header: str = "") -> None:
+    students, charges, total = await unpaid_totals(session)
+
+    # берём на одну строку больше — так узнаём, есть ли следующая страница
+    rows = await unpaid_by_student(session, after_student_id=after, limit=PAGE_SIZE + 1)
+    next_after = rows[PAGE_SIZE - 1][0] if len(rows) > PAGE_SIZE else None
+    rows = rows[:PAGE_SIZE]
+
+    if charges:
+        text = (
+            "Неоплаченные уроки\n\n"
+            f"Всего: {charges} ур. на сумму {total} (учеников: {students})\n\n"
+            "Нажмите на ученика, чтобы отметить все его уроки оплаченными."
+        )
+    else:
+        text = "Неоплаченные уроки\n\nВсё оплачено."
+    if header:
+        text = f"{header}\n\n{text}"
+
+    await call.message.edit_text(text, reply_markup=unpaid_kb(rows, after, next_after))
+
+
+@router.callback_query(UnpaidCb.filter(F.action == "page"))
+async def unpaid_page(call: CallbackQuery, callback_data: UnpaidCb, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    await render_unpaid(call, session, after=callback_data.after)
+    await call.answer()
+
+
+@router.callback_query(UnpaidCb.filter(F.action == "pay"))
+async def unpaid_pay(call: CallbackQuery, callback_data: UnpaidCb, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    st = (await session.execute(select(Student).where(Student.id == callback_data.student_id))).scalar_one()
+    rows = await unpaid_by_student(session, limit=1, student_id=st.id)
+    if not rows:
+        await call.answer("У ученика нет неоплаченных уроков", show_alert=True)
+        return
+    _sid, _name, cnt, total = rows[0]
+
+    await call.message.edit_text(
+        f"{st.full_name}: {cnt} ур. на сумму {total}.\n\nОтметить все как оплаченные?",
+        reply_markup=unpaid_pay_confirm_kb(st.id, callback_data.after),
+    )
+    await call.answer()
+
+
+@router.callback_query(UnpaidCb.filter(F.action == "pay_confirm"))
+async def unpaid_pay_confirm(call: CallbackQuery, callback_data: UnpaidCb, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    cnt, total = await mark_student_charges_paid(session, callback_data.student_id)
+
+    await render_unpaid(call, session, after=callback_data.after, header=f"Оплачено: {cnt} ур. на сумму {total}")
+    await call.answer()
+
+
+@router.callback_query(UnpaidCb.filter(F.action == "import"))
+async def unpaid_import_start(call: CallbackQuery, state: FSMContext, session):
+    user = await get_user(session, call.from_user.id)
+    ensure_teacher(user)
+
+    await state.set_state(BankImportFSM.file)
+    await call.message.edit_text(
+        "Отправьте выписку из банка файлом (CSV).\n\n"
+        "Нужны колонки «Дата» и «Сумма», имя ученика ищется в назначении платежа / описании. "
+        "Совпавшие платежи отметят уроки оплаченными."
+    )
+    await call.answer()
+
+
+@router.message(BankImportFSM.file, F.document)
+async def unpaid_import_file(message: Message, state: FSMContext, session, bot):
+    user = await get_user(session, message.from_user.id)
+    ensure_teacher(user)
+
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        await bot.download(message.document, destination=path)
+        result = await import_statement(session, path)
+    except ValueError as e:
+        await message.answer(f"Не удалось прочитать выписку: {e}\nОтправьте другой файл.")
+        return
+    finally:
+        os.remove(path)
+
+    await state.clear()
+    await message.answer(format_import_report(result))
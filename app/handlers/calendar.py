@@ -0,0 +1,40 @@
+from aiogram import Router, F
+from aiogram.types import CallbackQuery
+
+from ..callbacks import MenuCb
+from ..config import settings
+from ..keyboards import calendar_kb
+from ..models import Role
+from ..services.ical import ensure_ical_token, reset_ical_token
+from .menu import get_user, safe_edit
+
+router = Router()
+
+
+def calendar_text(token: str) -> str:
+    url = f"{settings.public_base_url.rstrip('/')}/ical/{token}.ics"
+    return (
+        "Календарь уроков\n\n"
+        "Подпишитесь на ленту в Google/Apple/Outlook-календаре (\"Добавить по URL\"):\n"
+        f"{url}\n\n"
+        "Ссылка личная: по ней видны все ваши уроки. Если она попала к кому-то ещё — перевыпустите её, "
+        "старая перестанет работать."
+    )
+
+
+@router.callback_query(MenuCb.filter(F.section.in_({"calendar", "calendar_reset"})))
+async def calendar_feed(call: CallbackQuery, callback_data: MenuCb, session):
+    user = await get_user(session, call.from_user.id)
+    if user.role not in (Role.student, Role.parent):
+        await call.answer("Недоступно", show_alert=True)
+        return
+
+    if callback_data.section == "calendar_reset":
+        token = await reset_ical_token(session, user)
+        answer = "Ссылка перевыпущена"
+    else:
+        token = await ensure_ical_token(session, user)
+        answer = None
+
+    await safe_edit(call.message, calendar_text(token), reply_markup=calendar_kb())
+    await call.answer(answer)
@@ -66,7 +66,8 @@ def help_text(user: User | None) -> str:
               "2) В карточке ученика → Добавить правило расписания\n"
               "3) Там же → Сгенерировать ключи ученика и родителя\n"
               "4) В «Ближайших уроках» → «Проведён»\n"
-              "5) Получаете уведомления, когда ученик нажимает «Задание выполнено»\n\n"
+              "5) Получаете уведомления, когда ученик нажимает «Задание выполнено»\n"
+              "6) /hw_search текст — найти старое ДЗ и выдать его заново\n\n"
               "Проверьте часовой пояс в меню."
         )
 
@@ -0,0 +1,114 @@
+from datetime import datetime, time, timezone
+
+from aiogram import Router, F
+from aiogram.types import CallbackQuery, Message
+
+from ..callbacks import MenuCb, NotifyCb
+from ..jobs_notifications import replan_user_notifications
+from ..keyboards import notify_settings_kb
+from ..services.notifications import get_notification_settings, save_notification_settings
+from .menu import get_user, safe_edit
+
+router = Router()
+
+# варианты тихих часов по кругу: выкл -> 22–08 -> 23–07 -> 21–09 -> выкл
+QUIET_PRESETS: list[tuple[time, time] | None] = [
+    None,
+    (time(22, 0), time(8, 0)),
+    (time(23, 0), time(7, 0)),
+    (time(21, 0), time(9, 0)),
+]
+
+# какие уже запланированные уведомления пересобрать после изменения настройки
+# (групповые занятия управляются теми же настройками, что и уроки)
+REPLAN_TYPES = {
+    "digest": ("lesson_24h", "group_lesson_24h", "daily_digest"),
+    "lesson_24h": ("lesson_24h", "group_lesson_24h"),
+    "lesson_1h": ("lesson_1h", "group_lesson_1h"),
+    "quiet": ("lesson_24h", "lesson_1h", "group_lesson_24h", "group_lesson_1h", "hw_due", "daily_digest"),
+}
+
+
+def fmt_quiet(quiet_start: time | None, quiet_end: time | None) -> str:
+    if quiet_start is None or quiet_end is None:
+        return "выключены"
+    return f"{quiet_start:%H:%M}–{quiet_end:%H:%M}"
+
+
+def next_quiet_preset(quiet_start: time | None, quiet_end: time | None) -> tuple[time, time] | None:
+    current = (quiet_start, quiet_end) if quiet_start is not None and quiet_end is not None else None
+    try:
+        i = QUIET_PRESETS.index(current)
+    except ValueError:
+        i = 0
+    return QUIET_PRESETS[(i + 1) % len(QUIET_PRESETS)]
+
+
+async def render_notify_settings(message: Message, session, user) -> None:
+    ns = await get_notification_settings(session, user.id)
+    tzname = user.timezone or "Europe/Moscow"
+
+    text = (
+        "Уведомления\n\n"
+        f"Напоминание за 24 часа: {'включено' if ns.lesson_24h else 'выключено'}\n"
+        f"Напоминание за 1 час: {'включено' if ns.lesson_1h else 'выключено'}\n"
+        f"Дайджест на день: {'включён' if ns.daily_digest else 'выключен'}\n"
+        f"Время дайджеста: {ns.digest_hour:02d}:00 ({tzname})\n"
+        f"Тихие часы: {fmt_quiet(ns.quiet_start, ns.quiet_end)} ({tzname})\n\n"
+        "Дайджест — одно утреннее сообщение со всеми уроками дня "
+        "вместо отдельных напоминаний за 24 часа. Напоминание за 1 час остаётся.\n"
+        "Напоминания, попавшие в тихие часы, приходят в конце тихого окна "
+        "(если урок к этому времени ещё не начался)."
+    )
+    await safe_edit(message, text, reply_markup=notify_settings_kb(ns))
+
+
+async def apply_settings_change(session, user_id: int, action: str, **values) -> None:
+    await save_notification_settings(session, user_id, **values)
+    await replan_user_notifications(session, user_id, datetime.now(timezone.utc), REPLAN_TYPES[action])
+    await session.commit()
+
+
+@router.callback_query(MenuCb.filter(F.section == "notify"))
+async def notify_settings(call: CallbackQuery, session):
+    user = await get_user(session, call.from_user.id)
+    await render_notify_settings(call.message, session, user)
+    await call.answer()
+
+
+@router.callback_query(NotifyCb.filter(F.action == "digest"))
+async def notify_toggle_digest(call: CallbackQuery, session):
+    user = await get_user(session, call.from_user.id)
+
+    ns = await get_notification_settings(session, user.id)
+    enabled = not ns.daily_digest
+    await apply_settings_change(session, user.id, "digest", daily_digest=enabled)
+
+    await render_notify_settings(call.message, session, user)
+    await call.answer("Дайджест включён" if enabled else "Дайджест выключен")
+
+
+@router.callback_query(NotifyCb.filter(F.action.in_({"lesson_24h", "lesson_1h"})))
+async def notify_toggle_reminder(call: CallbackQuery, callback_data: NotifyCb, session):
+    user = await get_user(session, call.from_user.id)
+
+    ns = await get_notification_settings(session, user.id)
+    kind = callback_data.action
+    enabled = not getattr(ns, kind)
+    await apply_settings_change(session, user.id, kind, **{kind: enabled})
+
+    await render_notify_settings(call.message, session, user)
+    await call.answer("Напоминание включено" if enabled else "Напоминание выключено")
+
+
+@router.callback_query(NotifyCb.filter(F.action == "quiet"))
+async def notify_cycle_quiet(call: CallbackQuery, session):
+    user = await get_user(session, call.from_user.id)
+
+    ns = await get_notification_settings(session, user.id)
+    preset = next_quiet_preset(ns.quiet_start, ns.quiet_end)
+    quiet_start, quiet_end = preset if preset else (None, None)
+    await apply_settings_change(session, user.id, "quiet", quiet_start=quiet_start, quiet_end=quiet_end)
+
+    await render_notify_settings(call.message, session, user)
+    await call.answer(f"Тихие часы: {fmt_quiet(quiet_start, quiet_end)}")
@@ -1,84 +1,99 @@
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from aiogram import Router, F
 from aiogram.types import CallbackQuery
 from sqlalchemy import select
 
-from ..models import User, Role, Parent, ParentStudent, Student, Lesson, LessonStatus
+from ..models import User, Role, Student, BillingMode
 from ..callbacks import MenuCb, ChildCb
 from ..keyboards import parent_children_kb
 from ..utils_time import fmt_dt_for_tz
 from ..services.homework import homework_avg_last_n
+from ..services.parent_overview import ChildOverview, parent_overview
+from ..services.schedule_cache import CachedView, schedule_views, upcoming_lessons, upcoming_group_lessons, earliest
 
 router = Router()
 
 
+def format_child_overview(child: ChildOverview, tzname: str) -> str:
+    if child.next_lessons:
+        lessons_line = "Ближайшие уроки: " + ", ".join(fmt_dt_for_tz(dt, tzname) for dt in child.next_lessons)
+    else:
+        lessons_line = "Ближайшие уроки: нет"
+
+    if child.billing_mode == BillingMode.subscription:
+        pay_line = f"Осталось уроков: {child.lessons_left or 0}"
+    elif child.unpaid_count:
+        pay_line = f"К оплате: {child.unpaid_sum:.2f} ({child.unpaid_count} ур.)"
+    else:
+        pay_line = "К оплате: нет"
+
+    avg_line = "нет данных" if child.hw_avg is None else f"{child.hw_avg:.2f}/10"
+    return f"{child.full_name}\n{lessons_line}\n{pay_line}\nСредняя оценка ДЗ: {avg_line}"
+
+
 @router.callback_query(MenuCb.filter(F.section == "parent_children"))
 async def parent_children(call: CallbackQuery, session):
-    user = (await session.execute(select(User).where(User.tg_id == call.from_user.id))).scalar_one()
-    if user.role != Role.parent:
+    # сводка по всем детям — один запрос и одно редактирование сообщения
+    overview = await parent_overview(session, call.from_user.id, datetime.now(timezone.utc))
+    if overview is None or overview.role != Role.parent:
         await call.answer("Недоступно", show_alert=True)
         return
 
-    parent = (await session.execute(select(Parent).where(Parent.user_id == user.id))).scalar_one()
-
-    student_ids = (await session.execute(
-        select(ParentStudent.student_id).where(ParentStudent.parent_id == parent.id)
-    )).scalars().all()
-
-    if not student_ids:
+    if not overview.children:
         await call.message.edit_text("К вам не привязан ни один ученик.")
         await call.answer()
         return
 
-    children = (await session.execute(
-        select(Student.id, Student.full_name).where(Student.id.in_(student_ids)).order_by(Student.full_name)
-    )).all()
-
-    await call.message.edit_text("Выберите ребёнка:", reply_markup=parent_children_kb(children))
+    tzname = overview.timezone or "Europe/Moscow"
+    blocks = [format_child_overview(child, tzname) for child in overview.children]
+    await call.message.edit_text(
+        f"Дети (время: {tzname})\n\n" + "\n\n".join(blocks) + "\n\nПодробнее — выберите ребёнка:",
+        reply_markup=parent_children_kb([(c.student_id, c.full_name) for c in overview.children]),
+    )
     await call.answer()
 
 
 @router.callback_query(ChildCb.filter())
 async def parent_child_schedule(call: CallbackQuery, callback_data: ChildCb, session):
-    user = (await session.execute(select(User).where(User.tg_id == call.from_user.id))).scalar_one()
-    if user.role != Role.parent:
+    row = (await session.execute(
+        select(User.role, User.timezone, Student.schedule_version)
+        .join(Student, Student.id == callback_data.student_id)
+        .where(User.tg_id == call.from_user.id)
+    )).one()
+    if row.role != Role.parent:
         await call.answer("Недоступно", show_alert=True)
         return
 
-    student = (await session.execute(select(Student).where(Student.id == callback_data.student_id))).scalar_one()
-
-    # средняя оценка ДЗ за последние N (по умолчанию 10)
-    avg = await homework_avg_last_n(session, student.id, n=10)
-    if avg is None:
-        avg_line = "Средняя оценка ДЗ (последние 10): нет данных\n"
-    else:
-        avg_line = f"Средняя оценка ДЗ (последние 10): {avg:.2f}/10\n"
-
     now = datetime.now(timezone.utc)
-    horizon = now + timedelta(days=7)
-
-    lessons = (await session.execute(
-        select(Lesson)
-        .where(
-            Lesson.student_id == student.id,
-            Lesson.status == LessonStatus.planned,
-            Lesson.start_at >= now,
-            Lesson.start_at <= horizon
-        )
-        .order_by(Lesson.start_at)
-    )).scalars().all()
-
-    if not lessons:
-        await call.message.edit_text(f"{student.full_name}\n{avg_line}\nНа ближайшие 7 дней уроков нет.")
-        await call.answer()
-        return
-
-    tzname = user.timezone or "Europe/Moscow"
-    lines = []
-    for l in lessons:
-        lines.append(f"- {fmt_dt_for_tz(l.start_at, tzname)} ({tzname})")
-
-    await call.message.edit_text(
-        f"{student.full_name}\n{avg_line}\nУроки (7 дней):\n" + "\n".join(lines)
+    tzname = row.timezone or "Europe/Moscow"
+
+    async def build() -> CachedView:
+        student = (await session.execute(select(Student).where(Student.id == callback_data.student_id))).scalar_one()
+
+        # средняя оценка ДЗ за последние N (по умолчанию 10)
+        avg = await homework_avg_last_n(session, student.id, n=10)
+        if avg is None:
+            avg_line = "Средняя оценка ДЗ (последние 10): нет данных\n"
+        else:
+            avg_line = f"Средняя оценка ДЗ (последние 10): {avg:.2f}/10\n"
+
+        lessons, valid_until = await upcoming_lessons(session, student.id, now)
+        group_lessons, group_valid_until = await upcoming_group_lessons(session, student.id, now)
+        valid_until = earliest(valid_until, group_valid_until)
+
+        if not lessons and not group_lessons:
+            return CachedView(row.schedule_version, valid_until, f"{student.full_name}\n{avg_line}\nНа ближайшие 7 дней уроков нет.", None)
+
+        lines = []
+        for l in lessons:
+            lines.append(f"- {fmt_dt_for_tz(l.start_at, tzname)} ({tzname})")
+        for g in group_lessons:
+            lines.append(f"- {fmt_dt_for_tz(g.start_at, tzname)} ({tzname}) — группа «{g.title}»")
+        text = f"{student.full_name}\n{avg_line}\nУроки (7 дней):\n" + "\n".join(sorted(lines))
+        return CachedView(row.schedule_version, valid_until, text, None)
+
+    view = await schedule_views.get_or_build(
+        ("parent", callback_data.student_id, tzname), row.schedule_version, now, build,
     )
+    await call.message.edit_text(view.text, reply_markup=view.markup)
     await call.answer()
@@ -6,7 +6,7 @@ from sqlalchemy import select
 
 from ..config import settings
 from ..models import User
-from ..services.auth import ensure_teacher_user, register_by_key
+from ..services.auth import ensure_teacher_user, register_by_key, unblock_user
 from ..keyboards import tz_kb
 
 router = Router()
@@ -24,12 +24,15 @@ async def start(message: Message, state: FSMContext, session):
     # 1) если это учитель — создаём/находим автоматически
     teacher = await ensure_teacher_user(session, tg_id, full_name, settings.teacher_tg_id)
     if teacher:
+        await unblock_user(session, teacher)
         await message.answer("Вы вошли как учитель. Напишите /menu")
         return
 
     # 2) если уже зарегистрирован
     user = (await session.execute(select(User).where(User.tg_id == tg_id))).scalar_one_or_none()
     if user:
+        await unblock_user(session, user)
+
         # попросим TZ, если нет
         if not user.timezone:
             await message.answer("Выберите ваш часовой пояс:", reply_markup=tz_kb())
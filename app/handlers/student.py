@@ -1,14 +1,15 @@
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from sqlalchemy import select, func
 
 from .admin.common import ensure_teacher, get_user
-from ..models import User, Role, Student, Lesson, LessonStatus, BillingMode, StudentBalance, LessonCharge, ChargeStatus
+from ..models import User, Role, Student, BillingMode, StudentBalance, LessonCharge, ChargeStatus
 from ..callbacks import MenuCb, AdminCb
 from ..utils_time import fmt_dt_for_tz
 from ..services.homework import homework_avg_last_n
+from ..services.schedule_cache import CachedView, schedule_views, upcoming_lessons, upcoming_group_lessons, earliest
 from ..keyboards import student_schedule_homework_kb, student_card_kb  # <-- убедись, что импорт есть
 
 router = Router()
@@ -16,55 +17,60 @@ router = Router()
 
 @router.callback_query(MenuCb.filter(F.section == "student_schedule"))
 async def student_schedule(call: CallbackQuery, session):
-    user = (await session.execute(select(User).where(User.tg_id == call.from_user.id))).scalar_one()
-    if user.role != Role.student:
+    # один лёгкий запрос: роль, TZ и версия расписания; остальное — только при промахе кэша
+    row = (await session.execute(
+        select(User.role, User.timezone, Student.id, Student.timezone.label("student_tz"), Student.schedule_version)
+        .outerjoin(Student, Student.user_id == User.id)
+        .where(User.tg_id == call.from_user.id)
+    )).one()
+    if row.role != Role.student:
         await call.answer("Недоступно", show_alert=True)
         return
 
-    student = (await session.execute(select(Student).where(Student.user_id == user.id))).scalar_one()
-
-    board_line = ""
-    if getattr(student, "board_url", None):
-        board_line = f"Ваша доска: {student.board_url}\n\n"
-
-    # средняя оценка ДЗ за последние N (по умолчанию 10)
-    avg = await homework_avg_last_n(session, student.id, n=10)
-    if avg is None:
-        avg_line = "Средняя оценка ДЗ (последние 10): нет данных\n\n"
-    else:
-        avg_line = f"Средняя оценка ДЗ (последние 10): {avg:.2f}/10\n\n"
-
     now = datetime.now(timezone.utc)
-    horizon = now + timedelta(days=7)
-
-    lessons = (await session.execute(
-        select(Lesson)
-        .where(
-            Lesson.student_id == student.id,
-            Lesson.status == LessonStatus.planned,
-            Lesson.start_at >= now,
-            Lesson.start_at <= horizon
+    tzname = row.timezone or row.student_tz or "Europe/Moscow"
+
+    async def build() -> CachedView:
+        student = (await session.execute(select(Student).where(Student.id == row.id))).scalar_one()
+
+        board_line = ""
+        if getattr(student, "board_url", None):
+            board_line = f"Ваша доска: {student.board_url}\n\n"
+
+        # средняя оценка ДЗ за последние N (по умолчанию 10)
+        avg = await homework_avg_last_n(session, student.id, n=10)
+        if avg is None:
+            avg_line = "Средняя оценка ДЗ (последние 10): нет данных\n\n"
+        else:
+            avg_line = f"Средняя оценка ДЗ (последние 10): {avg:.2f}/10\n\n"
+
+        lessons, valid_until = await upcoming_lessons(session, student.id, now)
+        group_lessons, group_valid_until = await upcoming_group_lessons(session, student.id, now)
+        valid_until = earliest(valid_until, group_valid_until)
+
+        group_block = ""
+        if group_lessons:
+            group_block = "Групповые занятия (7 дней):\n" + "\n".join(
+                f"- {fmt_dt_for_tz(g.start_at, tzname)} ({tzname}) — {g.title}" for g in group_lessons
+            ) + "\n\n"
+
+        if not lessons:
+            text = board_line + avg_line + (group_block or "На ближайшие 7 дней уроков нет.")
+            return CachedView(row.schedule_version, valid_until, text.rstrip("\n"), None)
+
+        lines = [f"- {fmt_dt_for_tz(l.start_at, tzname)} ({tzname})" for l in lessons]
+        text = (
+            board_line
+            + avg_line
+            + group_block
+            + "Ваши уроки (7 дней):\n"
+            + "\n".join(lines)
+            + "\n\nНажмите «ДЗ» для просмотра."
         )
-        .order_by(Lesson.start_at)
-    )).scalars().all()
-
-    tzname = user.timezone or student.timezone or "Europe/Moscow"
+        return CachedView(row.schedule_version, valid_until, text, student_schedule_homework_kb(student.id, lessons))
 
-    if not lessons:
-        await call.message.edit_text(board_line + avg_line + "На ближайшие 7 дней уроков нет.")
-        await call.answer()
-        return
-
-    lines = [f"- {fmt_dt_for_tz(l.start_at, tzname)} ({tzname})" for l in lessons]
-
-    await call.message.edit_text(
-        board_line
-        + avg_line
-        + "Ваши уроки (7 дней):\n"
-        + "\n".join(lines)
-        + "\n\nНажмите «ДЗ» для просмотра.",
-        reply_markup=student_schedule_homework_kb(student.id, lessons),
-    )
+    view = await schedule_views.get_or_build(("student", row.id, tzname), row.schedule_version, now, build)
+    await call.message.edit_text(view.text, reply_markup=view.markup)
     await call.answer()
 
 
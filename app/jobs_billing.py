@@ -0,0 +1,281 @@
+import logging
+from datetime import datetime, date, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import select, update, func, text, literal, exists, cast, values, column, Integer, String
+from sqlalchemy.dialects.postgresql import insert, aggregate_order_by
+
+from . import db
+from .config import settings
+from .models import (
+    StudentBalance, BalanceEntry, BalanceReason,
+    Student, BillingMode, InvoicePeriod, Lesson, LessonCharge, ChargeStatus, GroupLesson,
+    Parent, ParentStudent, User, Notification, notification_priority, LessonStatus,
+)
+from .jobs_notifications import lesson_recipients
+from .services.schedule import lesson_occurrences
+
+log = logging.getLogger(__name__)
+
+
+async def reconcile_balances(session) -> list[int]:
+    """
+    Пересчитывает снимки student_balance из журнала одним агрегирующим запросом.
+    Возвращает student_id, у которых снимок разошёлся с журналом (и был исправлен).
+    """
+    # на время сверки новые списания/пополнения ждут: иначе посчитанная сумма может
+    # перетереть движение, закоммиченное между агрегацией и upsert'ом
+    await session.execute(text("LOCK TABLE student_balance IN SHARE ROW EXCLUSIVE MODE"))
+
+    # балансы из до-журнальных времён без единого движения: фиксируем текущий остаток как начальный
+    # (при первом движении opening пишет сам биллинг — см. _open_ledger)
+    await session.execute(
+        insert(BalanceEntry).from_select(
+            ["student_id", "delta", "reason"],
+            select(
+                StudentBalance.student_id,
+                StudentBalance.lessons_left,
+                literal(BalanceReason.opening, BalanceEntry.reason.type),
+            ).where(
+                StudentBalance.lessons_left != 0,
+                ~exists().where(BalanceEntry.student_id == StudentBalance.student_id),
+            ),
+        )
+    )
+
+    totals = (
+        select(BalanceEntry.student_id, func.sum(BalanceEntry.delta).label("total"))
+        .group_by(BalanceEntry.student_id)
+    )
+    stmt = insert(StudentBalance).from_select(["student_id", "lessons_left"], totals)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[StudentBalance.student_id],
+        set_={"lessons_left": stmt.excluded.lessons_left, "updated_at": func.now()},
+        where=StudentBalance.lessons_left.is_distinct_from(stmt.excluded.lessons_left),
+    ).returning(StudentBalance.student_id)
+
+    return list((await session.execute(stmt)).scalars().all())
+
+
+async def reconcile_balances_job():
+    async with db.SessionMaker() as session:
+        drifted = await reconcile_balances(session)
+        await session.commit()
+
+    if drifted:
+        log.warning("Balance snapshots drifted from ledger and were fixed: students=%s", sorted(drifted))
+    else:
+        log.info("Balance snapshots match ledger")
+
+
+INVOICE_TITLES = {
+    InvoicePeriod.weekly: "Сводка за неделю",
+    InvoicePeriod.monthly: "Сводка за месяц",
+}
+
+
+def invoice_periods_due(local_day: date) -> list[InvoicePeriod]:
+    # сводки уходят в первый день нового периода
+    due = []
+    if local_day.weekday() == 0:
+        due.append(InvoicePeriod.weekly)
+    if local_day.day == 1:
+        due.append(InvoicePeriod.monthly)
+    return due
+
+
+async def plan_invoices(session, period: InvoicePeriod, boundary: datetime, local_day: date) -> None:
+    """
+    Один агрегирующий INSERT ... SELECT на период: каждому родителю — одна сводка по всем его
+    детям с периодическими счетами (неоплаченные уроки до границы периода и итог).
+    Текст собирается в БД (string_agg), отправка — обычной очередью уведомлений.
+    """
+    kind = f"invoice_{period.value}"
+    tz = func.coalesce(User.timezone, "Europe/Moscow")
+    # начисление — за индивидуальный урок или за групповое занятие
+    start_at = func.coalesce(Lesson.start_at, GroupLesson.start_at)
+    line = (
+        "- " + func.to_char(func.timezone(tz, start_at), "YYYY-MM-DD HH24:MI")
+        + " — " + cast(LessonCharge.amount, String)
+    )
+
+    per_student = (
+        select(
+            User.id.label("user_id"),
+            Student.full_name.label("full_name"),
+            func.sum(LessonCharge.amount).label("total"),
+            (
+                Student.full_name + ":\n"
+                + func.string_agg(line, aggregate_order_by(literal("\n"), start_at))
+                + "\nИтого: " + cast(func.sum(LessonCharge.amount), String)
+            ).label("block"),
+        )
+        .select_from(LessonCharge)
+        .outerjoin(Lesson, Lesson.id == LessonCharge.lesson_id)
+        .outerjoin(GroupLesson, GroupLesson.id == LessonCharge.group_lesson_id)
+        .join(Student, Student.id == LessonCharge.student_id)
+        .join(ParentStudent, ParentStudent.student_id == Student.id)
+        .join(Parent, Parent.id == ParentStudent.parent_id)
+        .join(User, User.id == Parent.user_id)
+        .where(
+            LessonCharge.status == ChargeStatus.pending,
+            Student.billing_mode == BillingMode.single,
+            Student.invoice_period == period,
+            start_at < boundary,
+            User.blocked_at.is_(None),
+        )
+        .group_by(User.id, Student.id, Student.full_name)
+        .subquery("per_student")
+    )
+
+    header = f"{INVOICE_TITLES[period]}: неоплаченные уроки на {local_day:%Y-%m-%d}\n\n"
+    payload = (
+        header
+        + func.string_agg(per_student.c.block, aggregate_order_by(literal("\n\n"), per_student.c.full_name))
+        + "\n\nВсего к оплате: " + cast(func.sum(per_student.c.total), String)
+    )
+
+    sel = (
+        select(
+            per_student.c.user_id,
+            literal(kind),
+            literal(int(local_day.strftime("%Y%m%d"))),
+            literal(boundary),
+            literal(int(notification_priority(kind))),
+            payload,
+        )
+        .group_by(per_student.c.user_id)
+    )
+    stmt = insert(Notification).from_select(["user_id", "type", "entity_id", "send_at", "priority", "payload"], sel)
+    stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "type", "entity_id", "send_at"])
+    await session.execute(stmt)
+
+
+async def plan_invoices_job():
+    now = datetime.now(timezone.utc)
+    tz = ZoneInfo(settings.invoice_timezone)
+    local_day = now.astimezone(tz).date()
+    periods = invoice_periods_due(local_day)
+    if not periods:
+        return
+
+    # граница периода — локальная полночь; она же send_at, поэтому повторный запуск в тот же день — no-op
+    boundary = datetime(local_day.year, local_day.month, local_day.day, tzinfo=tz).astimezone(timezone.utc)
+    async with db.SessionMaker() as session:
+        for period in periods:
+            await plan_invoices(session, period, boundary, local_day)
+        await session.commit()
+
+
+def low_balance_text(full_name: str, lessons_left: int, planned: int, days: int) -> str:
+    return (
+        "Абонемент заканчивается.\n"
+        f"Ученик: {full_name}\n"
+        f"Осталось уроков: {lessons_left}, запланировано на ближайшие {days} дн.: {planned}.\n"
+        "Пополните абонемент, чтобы уроки списывались с него."
+    )
+
+
+async def plan_low_balance_alerts(session, now: datetime) -> list[int]:
+    """
+    Ученики на абонементе, чей остаток меньше числа planned-уроков в окне: одно предупреждение
+    родителям и учителю на каждое пересечение порога. Флаг low_balance_notified_at ставится
+    атомарно вместе с выборкой (UPDATE ... RETURNING) и сбрасывается, когда остатка снова хватает.
+    Возвращает student_id, по которым поставлены предупреждения.
+    """
+    days = settings.low_balance_window_days
+    # групповые занятия списываются с каждого участника — считаем их наравне с уроками
+    occ = lesson_occurrences()
+    upcoming = (
+        select(occ.c.student_id, func.count().label("planned"))
+        .where(
+            occ.c.status == LessonStatus.planned,
+            occ.c.start_at >= now,
+            occ.c.start_at < now + timedelta(days=days),
+        )
+        .group_by(occ.c.student_id)
+        .subquery("upcoming")
+    )
+
+    # абонемент без строки баланса (ещё ни одного пакета) — это 0 уроков: заводим строку, иначе не предупредим
+    await session.execute(
+        insert(StudentBalance)
+        .from_select(
+            ["student_id", "lessons_left"],
+            select(Student.id, literal(0))
+            .join(upcoming, upcoming.c.student_id == Student.id)
+            .where(Student.billing_mode == BillingMode.subscription),
+        )
+        .on_conflict_do_nothing(index_elements=[StudentBalance.student_id])
+    )
+
+    # порог пройден обратно (пополнили или уроков стало меньше) — следующее пересечение снова предупредим
+    occ_planned = lesson_occurrences()
+    planned_count = (
+        select(func.count())
+        .select_from(occ_planned)
+        .where(
+            occ_planned.c.student_id == StudentBalance.student_id,
+            occ_planned.c.status == LessonStatus.planned,
+            occ_planned.c.start_at >= now,
+            occ_planned.c.start_at < now + timedelta(days=days),
+        )
+        .scalar_subquery()
+    )
+    await session.execute(
+        update(StudentBalance)
+        .where(StudentBalance.low_balance_notified_at.is_not(None), StudentBalance.lessons_left >= planned_count)
+        .values(low_balance_notified_at=None)
+        .execution_options(synchronize_session=False)
+    )
+
+    crossed = (await session.execute(
+        update(StudentBalance)
+        .where(
+            StudentBalance.student_id == upcoming.c.student_id,
+            StudentBalance.student_id == Student.id,
+            Student.billing_mode == BillingMode.subscription,
+            StudentBalance.low_balance_notified_at.is_(None),
+            StudentBalance.lessons_left < upcoming.c.planned,
+        )
+        .values(low_balance_notified_at=now)
+        .returning(StudentBalance.student_id, Student.full_name, StudentBalance.lessons_left, upcoming.c.planned)
+        .execution_options(synchronize_session=False)
+    )).all()
+    if not crossed:
+        return []
+
+    alerts = values(column("student_id", Integer), column("payload", String), name="alerts").data([
+        (student_id, low_balance_text(full_name, lessons_left, planned, days))
+        for student_id, full_name, lessons_left, planned in crossed
+    ])
+    rec = lesson_recipients(include_teacher=True, include_student=False)
+    sel = (
+        select(
+            rec.c.user_id,
+            literal("low_balance"),
+            alerts.c.student_id,
+            literal(now),
+            literal(int(notification_priority("low_balance"))),
+            alerts.c.payload,
+        )
+        .select_from(alerts)
+        .join(rec, rec.c.student_id == alerts.c.student_id)
+        .join(User, User.id == rec.c.user_id)
+        .where(User.blocked_at.is_(None))
+    )
+    stmt = insert(Notification).from_select(["user_id", "type", "entity_id", "send_at", "priority", "payload"], sel)
+    stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "type", "entity_id", "send_at"])
+    await session.execute(stmt)
+
+    return [student_id for student_id, *_ in crossed]
+
+
+async def plan_low_balance_alerts_job():
+    async with db.SessionMaker() as session:
+        now = datetime.now(timezone.utc)
+        students = await plan_low_balance_alerts(session, now)
+        await session.commit()
+
+    if students:
+        log.info("Low balance alerts planned: students=%s", sorted(students))
@@ -6,6 +6,7 @@ from sqlalchemy.dialects.postgresql import insert
 
 from . import db
 from .models import ScheduleRule, Student, Lesson, LessonStatus
+from .services.schedule import bump_schedule_version, generate_group_lessons
 
 HORIZON_DAYS = 60
 
@@ -24,8 +25,14 @@ def to_utc(student_tz: str, d: date, t_local) -> datetime:
 
 async def generate_lessons_job():
     async with db.SessionMaker() as session:
+        now_utc = datetime.now(timezone.utc)
+
+        # занятия групп — строка на занятие, не на ученика
+        await generate_group_lessons(session, now_utc=now_utc, horizon_days=HORIZON_DAYS)
+        await session.commit()
+
         rules = (await session.execute(
-            select(ScheduleRule).where(ScheduleRule.active == True)
+            select(ScheduleRule).where(ScheduleRule.active == True, ScheduleRule.student_id.is_not(None))
         )).scalars().all()
 
         if not rules:
@@ -35,7 +42,6 @@ async def generate_lessons_job():
         students = (await session.execute(select(Student).where(Student.id.in_(student_ids)))).scalars().all()
         tz_map = {s.id: s.timezone for s in students}
 
-        now_utc = datetime.now(timezone.utc)
         start_day = now_utc.date()
         end_day = (now_utc + timedelta(days=HORIZON_DAYS)).date()
 
@@ -62,6 +68,7 @@ async def generate_lessons_job():
             return
 
         stmt = insert(Lesson).values(rows)
-        stmt = stmt.on_conflict_do_nothing(index_elements=["student_id", "start_at"])
-        await session.execute(stmt)
+        stmt = stmt.on_conflict_do_nothing(index_elements=["student_id", "start_at"]).returning(Lesson.student_id)
+        inserted = (await session.execute(stmt)).scalars().all()
+        await bump_schedule_version(session, inserted)
         await session.commit()
@@ -1,151 +1,831 @@
-from datetime import datetime, timedelta, timezone
-from sqlalchemy import select, update
+import logging
+from datetime import datetime, timedelta, timezone, date
+from zoneinfo import ZoneInfo
+
+from aiogram.exceptions import TelegramForbiddenError
+from sqlalchemy import (
+    select, update, delete, union_all, values, column, literal, cast, func, case,
+    and_, or_, true, false, Integer, SmallInteger, String, Interval, Date, Time,
+)
 from sqlalchemy.dialects.postgresql import insert
 
 from . import db
+from .config import settings
 from .models import (
-    Lesson, LessonStatus, Student, ParentStudent, Parent, User,
-    Notification, NotificationStatus
+    Lesson, LessonStatus, Student, Homework, StudentBalance, ParentStudent, Parent, User, LessonCharge,
+    LessonGroup, LessonGroupMember, GroupLesson, ChargeStatus, InvoicePeriod,
+    Notification, NotificationStatus, NotificationPriority, NotificationSettings, notification_priority
 )
+from .keyboards import lesson_prompt_kb
+from .services.billing import lesson_done_text
+from .services.schedule import bump_schedule_version, lesson_occurrences
+from .services.attachments import files_by_homework, send_files
+from .services.notifications import allocate_batch, queue_stats, format_queue_stats, mark_user_blocked
 from .utils_time import fmt_dt_for_tz
 
+log = logging.getLogger(__name__)
+
 HORIZON_DAYS = 7
+DIGEST_HORIZON_DAYS = 2  # планируем дайджесты на сегодня/завтра
+# учитель бросил проверку посреди очереди: через столько после последней оценки рассылаем накопленное
+GRADE_NOTIFY_IDLE = timedelta(minutes=15)
+
+
+def lesson_recipients(*, include_teacher: bool = False, include_student: bool = True):
+    """(user_id, student_id): кому интересны уроки ученика — сам ученик и его родители (+ учитель)."""
+    parts = [
+        select(Parent.user_id.label("user_id"), ParentStudent.student_id.label("student_id"))
+        .join(ParentStudent, ParentStudent.parent_id == Parent.id),
+    ]
+    if include_student:
+        parts.append(
+            select(Student.user_id.label("user_id"), Student.id.label("student_id"))
+            .where(Student.user_id.is_not(None))
+        )
+    if include_teacher:
+        parts.append(
+            select(User.id.label("user_id"), Student.id.label("student_id"))
+            .join(Student, true())
+            .where(User.tg_id == settings.teacher_tg_id)
+        )
+    return union_all(*parts).subquery("recipients")
+
+
+LESSON_REMINDERS = (
+    ("lesson_24h", timedelta(hours=24)),
+    ("lesson_1h", timedelta(hours=1)),
+)
+# у групповых занятий свои типы (entity_id — id из group_lessons), настройки — те же, что у уроков
+REMINDER_SOURCES = (("lesson", ""), ("group", "group_"))
+
+
+def quiet_hours_shift(send_at, tz, quiet_start, quiet_end):
+    """
+    SQL-выражение: если send_at попадает в тихие часы пользователя [quiet_start, quiet_end)
+    (в его локальном времени), переносит его на конец тихого окна.
+    """
+    local = func.timezone(tz, send_at)
+    t = cast(local, Time)
+
+    in_quiet = case(
+        (or_(quiet_start.is_(None), quiet_end.is_(None), quiet_start == quiet_end), false()),
+        (quiet_start < quiet_end, and_(t >= quiet_start, t < quiet_end)),
+        else_=or_(t >= quiet_start, t < quiet_end),  # окно через полночь, напр. 22:00–08:00
+    )
+    # конец окна: сегодня в quiet_end, либо завтра, если quiet_end сегодня уже прошёл
+    quiet_end_local = (
+        cast(local, Date) + quiet_end
+        + case((t >= quiet_end, literal(timedelta(days=1))), else_=literal(timedelta(0)))
+    )
+    return case((in_quiet, func.timezone(tz, quiet_end_local)), else_=send_at)
+
+
+async def plan_lesson_notifications(session, now: datetime, *, user_id: int | None = None) -> None:
+    """
+    Один INSERT ... SELECT: уроки и групповые занятия x получатели x виды напоминаний.
+    Групповое занятие раскладывается на участников здесь же, в SQL (DISTINCT склеит родителя
+    двух участников в одно напоминание). Настройки пользователя применяются здесь же:
+    выключенные виды не пишутся, попавшие в тихие часы переносятся на их конец,
+    а если это уже после начала урока — отбрасываются.
+    """
+    horizon = now + timedelta(days=HORIZON_DAYS)
+
+    rec = lesson_recipients()
+    occ = lesson_occurrences()
+    kinds = values(
+        column("source", String),
+        column("kind", String),
+        column("setting", String),
+        column("lead", Interval),
+        column("priority", SmallInteger),
+        name="kinds",
+    ).data([
+        (source, prefix + kind, kind, lead, int(notification_priority(prefix + kind)))
+        for source, prefix in REMINDER_SOURCES
+        for kind, lead in LESSON_REMINDERS
+    ])
+
+    ns = NotificationSettings
+    tz = func.coalesce(User.timezone, "Europe/Moscow")
+    send_at = quiet_hours_shift(occ.c.start_at - kinds.c.lead, tz, ns.quiet_start, ns.quiet_end)
+
+    enabled = case(
+        # при дайджесте напоминание за 24ч заменяется утренним сообщением
+        (kinds.c.setting == "lesson_24h",
+         and_(func.coalesce(ns.lesson_24h, true()), ~func.coalesce(ns.daily_digest, false()))),
+        (kinds.c.setting == "lesson_1h", func.coalesce(ns.lesson_1h, true())),
+        else_=true(),
+    )
+
+    sel = (
+        select(rec.c.user_id, kinds.c.kind, occ.c.entity_id, send_at, kinds.c.priority)
+        .select_from(rec)
+        .join(occ, occ.c.student_id == rec.c.student_id)
+        .join(User, User.id == rec.c.user_id)
+        .join(kinds, kinds.c.source == occ.c.source)
+        .outerjoin(ns, ns.user_id == User.id)
+        .where(
+            occ.c.status == LessonStatus.planned,
+            occ.c.start_at > now,
+            occ.c.start_at <= horizon,
+            # заблокировавшим бота не планируем: всё равно не доставится
+            User.blocked_at.is_(None),
+            enabled,
+            send_at > now,
+            send_at < occ.c.start_at,
+        )
+        .distinct()
+    )
+    if user_id is not None:
+        sel = sel.where(rec.c.user_id == user_id)
+
+    stmt = insert(Notification).from_select(["user_id", "type", "entity_id", "send_at", "priority"], sel)
+    stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "type", "entity_id", "send_at"])
+    await session.execute(stmt)
 
 
 async def plan_lesson_notifications_job():
     async with db.SessionMaker() as session:
         now = datetime.now(timezone.utc)
-        horizon = now + timedelta(days=HORIZON_DAYS)
-
-        lessons = (await session.execute(
-            select(Lesson).where(
-                Lesson.status == LessonStatus.planned,
-                Lesson.start_at > now,
-                Lesson.start_at <= horizon
-            )
-        )).scalars().all()
-
-        if not lessons:
-            return
-
-        students = (await session.execute(
-            select(Student).where(Student.id.in_([l.student_id for l in lessons]))
-        )).scalars().all()
-        st_map = {s.id: s for s in students}
-
-        rows = []
-        for lesson in lessons:
-            st = st_map[lesson.student_id]
-            targets_user_ids: list[int] = []
-
-            # ученик (если зарегистрировался)
-            if st.user_id:
-                targets_user_ids.append(st.user_id)
-
-            # родители
-            parent_ids = (await session.execute(
-                select(ParentStudent.parent_id).where(ParentStudent.student_id == st.id)
-            )).scalars().all()
-            if parent_ids:
-                parent_user_ids = (await session.execute(
-                    select(Parent.user_id).where(Parent.id.in_(parent_ids))
-                )).scalars().all()
-                targets_user_ids.extend(parent_user_ids)
-
-            for uid in set(targets_user_ids):
-                for kind, delta in (("lesson_24h", timedelta(hours=24)), ("lesson_1h", timedelta(hours=1))):
-                    send_at = lesson.start_at - delta
-                    if send_at <= now:
-                        continue
-                    rows.append({
-                        "user_id": uid,
-                        "type": kind,
-                        "entity_id": lesson.id,
-                        "send_at": send_at,
-                        "payload": None,
-                        "status": NotificationStatus.pending
-                    })
-
-        if not rows:
-            return
-
-        stmt = insert(Notification).values(rows)
-        stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "type", "entity_id", "send_at"])
-        await session.execute(stmt)
+        await plan_lesson_notifications(session, now)
         await session.commit()
 
 
+PROMPT_LOOKBACK = timedelta(days=1)  # если воркер простаивал — спросим и про недавно закончившиеся
+PROMPT_LOOKAHEAD = timedelta(days=1)
+
+
+def lesson_prompt_at(start_at, duration_min):
+    # SQL-выражение: когда спросить учителя про урок (конец урока + задержка)
+    return (
+        start_at
+        + func.make_interval(0, 0, 0, 0, 0, duration_min)
+        + func.make_interval(0, 0, 0, 0, 0, settings.lesson_prompt_delay_min)
+    )
+
+
+async def plan_lesson_prompts(session, now: datetime) -> None:
+    """
+    Один INSERT ... SELECT: учителю — вопрос «Проведён?» после конца каждого planned-урока.
+    Уже отмеченные к моменту отправки уроки отсеиваются при рендере.
+    """
+    send_at = lesson_prompt_at(Lesson.start_at, Lesson.duration_min)
+    sel = (
+        select(
+            User.id,
+            literal("lesson_prompt"),
+            Lesson.id,
+            send_at,
+            literal(int(notification_priority("lesson_prompt"))),
+        )
+        .select_from(Lesson)
+        .join(User, User.tg_id == settings.teacher_tg_id)
+        .where(
+            Lesson.status == LessonStatus.planned,
+            User.blocked_at.is_(None),
+            send_at > now - PROMPT_LOOKBACK,
+            send_at <= now + PROMPT_LOOKAHEAD,
+        )
+    )
+    stmt = insert(Notification).from_select(["user_id", "type", "entity_id", "send_at", "priority"], sel)
+    stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "type", "entity_id", "send_at"])
+    await session.execute(stmt)
+
+
+async def plan_lesson_prompts_job():
+    async with db.SessionMaker() as session:
+        now = datetime.now(timezone.utc)
+        await plan_lesson_prompts(session, now)
+        await session.commit()
+
+
+def hw_due_send_at(due_at, created_at):
+    # SQL-выражение: за hw_due_lead_hours до дедлайна, но не раньше выдачи ДЗ (выдано впритык — сразу)
+    return func.greatest(due_at - timedelta(hours=settings.hw_due_lead_hours), created_at)
+
+
+async def plan_hw_due_notifications(session, now: datetime, *, user_id: int | None = None) -> None:
+    """
+    Один INSERT ... SELECT: открытые ДЗ с дедлайном в горизонте x ученик и родители.
+    Выборка идёт по частичному индексу ix_homeworks_open_due; время отправки детерминировано,
+    поэтому повторный прогон ничего не дублирует. Сданные/оценённые ДЗ отсеиваются при рендере,
+    а при «Задание выполнено» и смене дедлайна ожидающие напоминания удаляются (retire_hw_due).
+    """
+    rec = lesson_recipients()
+    ns = NotificationSettings
+    tz = func.coalesce(User.timezone, "Europe/Moscow")
+    send_at = quiet_hours_shift(hw_due_send_at(Homework.due_at, Homework.created_at), tz, ns.quiet_start, ns.quiet_end)
+
+    sel = (
+        select(
+            rec.c.user_id,
+            literal("hw_due"),
+            Homework.id,
+            send_at,
+            literal(int(notification_priority("hw_due"))),
+        )
+        .select_from(rec)
+        .join(Homework, Homework.student_id == rec.c.student_id)
+        .join(User, User.id == rec.c.user_id)
+        .outerjoin(ns, ns.user_id == User.id)
+        .where(
+            Homework.student_done_at.is_(None),
+            Homework.grade.is_(None),
+            Homework.due_at.is_not(None),
+            Homework.due_at > now,
+            Homework.due_at <= now + timedelta(days=HORIZON_DAYS),
+            User.blocked_at.is_(None),
+            send_at < Homework.due_at,
+        )
+        .distinct()
+    )
+    if user_id is not None:
+        sel = sel.where(rec.c.user_id == user_id)
+
+    stmt = insert(Notification).from_select(["user_id", "type", "entity_id", "send_at", "priority"], sel)
+    stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "type", "entity_id", "send_at"])
+    await session.execute(stmt)
+
+
+async def plan_hw_due_notifications_job():
+    async with db.SessionMaker() as session:
+        now = datetime.now(timezone.utc)
+        await plan_hw_due_notifications(session, now)
+        await session.commit()
+
+
+async def plan_hw_assigned_notifications(session, homework_ids: list[int], now: datetime) -> None:
+    # выданное ДЗ: ученику и родителям каждого — одним INSERT ... SELECT на всю группу
+    if not homework_ids:
+        return
+    rec = lesson_recipients()
+    sel = (
+        select(
+            rec.c.user_id,
+            literal("hw_assigned"),
+            Homework.id,
+            literal(now, Notification.send_at.type),
+            literal(int(notification_priority("hw_assigned"))),
+        )
+        .select_from(rec)
+        .join(Homework, Homework.student_id == rec.c.student_id)
+        .join(User, User.id == rec.c.user_id)
+        .where(Homework.id.in_(homework_ids), User.blocked_at.is_(None))
+        .distinct()
+    )
+    stmt = insert(Notification).from_select(["user_id", "type", "entity_id", "send_at", "priority"], sel)
+    stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "type", "entity_id", "send_at"])
+    await session.execute(stmt)
+
+
+def grades_posted_text(lines: list[tuple[str, str, int]]) -> str:
+    return "Выставлены оценки за домашние задания:\n" + "\n".join(
+        f"• {full_name}: {title} — {grade}/10" for full_name, title, grade in lines
+    )
+
+
+async def queue_grade_notifications(session, now: datetime) -> int:
+    """
+    Рассылка оценок, выставленных в очереди проверки: снимаем флаг grade_notify_pending
+    и ставим каждому ученику/родителю одно сообщение со всеми его оценками.
+    Возвращает число разосланных оценок.
+    """
+    graded = (await session.execute(
+        update(Homework)
+        .where(Homework.grade_notify_pending.is_(True))
+        .values(grade_notify_pending=False)
+        .returning(Homework.id, Homework.student_id)
+    )).all()
+    if not graded:
+        return 0
+    # средняя оценка на экранах расписания
+    await bump_schedule_version(session, {student_id for _hid, student_id in graded})
+
+    rec = lesson_recipients()
+    rows = (await session.execute(
+        select(rec.c.user_id, Homework.id, Student.full_name, Homework.title, Homework.grade)
+        .select_from(rec)
+        .join(Homework, Homework.student_id == rec.c.student_id)
+        .join(Student, Student.id == Homework.student_id)
+        .join(User, User.id == rec.c.user_id)
+        .where(Homework.id.in_([hid for hid, _sid in graded]), User.blocked_at.is_(None))
+        .distinct()
+        .order_by(rec.c.user_id, Student.full_name, Homework.id)
+    )).all()
+
+    by_user: dict[int, list] = {}
+    for user_id, hid, full_name, title, grade in rows:
+        by_user.setdefault(user_id, []).append((hid, full_name, title, grade))
+
+    if by_user:
+        stmt = insert(Notification).values([
+            {
+                "user_id": user_id,
+                "type": "hw_graded",
+                # ключ уникальности: первое ДЗ пачки получателя
+                "entity_id": items[0][0],
+                "send_at": now,
+                "priority": int(notification_priority("hw_graded")),
+                "payload": grades_posted_text([item[1:] for item in items]),
+            }
+            for user_id, items in by_user.items()
+        ])
+        await session.execute(stmt.on_conflict_do_nothing(index_elements=["user_id", "type", "entity_id", "send_at"]))
+    return len(graded)
+
+
+async def flush_stale_grade_notifications(session, now: datetime) -> int:
+    # пока учитель ставит оценки, не мешаем: ждём паузы, чтобы всё ушло одним сообщением
+    last_graded = (await session.execute(
+        select(func.max(Homework.graded_at)).where(Homework.grade_notify_pending.is_(True))
+    )).scalar_one()
+    if last_graded is None or last_graded > now - GRADE_NOTIFY_IDLE:
+        return 0
+    return await queue_grade_notifications(session, now)
+
+
+async def flush_stale_grade_notifications_job():
+    async with db.SessionMaker() as session:
+        sent = await flush_stale_grade_notifications(session, datetime.now(timezone.utc))
+        await session.commit()
+    if sent:
+        log.info("Grade notifications flushed after idle grading pass: %s", sent)
+
+
+async def retire_hw_due(session, homework_id: int) -> None:
+    # ДЗ сдано или дедлайн сдвинут: ещё не отправленные напоминания больше не нужны
+    await session.execute(
+        delete(Notification).where(
+            Notification.type == "hw_due",
+            Notification.entity_id == homework_id,
+            Notification.status == NotificationStatus.pending,
+        )
+    )
+
+
+async def plan_daily_digest(session, now: datetime, *, user_id: int | None = None) -> None:
+    # один INSERT ... SELECT: строка на (пользователь, локальный день с уроками)
+    horizon = now + timedelta(days=DIGEST_HORIZON_DAYS)
+
+    rec = lesson_recipients(include_teacher=True)
+    occ = lesson_occurrences()
+    tz = func.coalesce(User.timezone, "Europe/Moscow")
+    local_day = func.date_trunc("day", func.timezone(tz, occ.c.start_at))
+    ns = NotificationSettings
+    # дайджест в тихие часы переносится на их конец — как и остальные напоминания
+    send_at = quiet_hours_shift(
+        func.timezone(tz, local_day + func.make_interval(0, 0, 0, 0, ns.digest_hour)),
+        tz, ns.quiet_start, ns.quiet_end,
+    )
+    day_key = cast(func.to_char(local_day, "YYYYMMDD"), Integer)
+
+    sel = (
+        select(
+            rec.c.user_id,
+            literal("daily_digest"),
+            day_key,
+            send_at,
+            literal(int(NotificationPriority.normal)),
+        )
+        .select_from(rec)
+        .join(occ, occ.c.student_id == rec.c.student_id)
+        .join(User, User.id == rec.c.user_id)
+        .join(ns, ns.user_id == User.id)
+        .where(
+            ns.daily_digest.is_(True),
+            User.blocked_at.is_(None),
+            occ.c.status == LessonStatus.planned,
+            occ.c.start_at > now,
+            occ.c.start_at <= horizon,
+            send_at > now,
+        )
+        .distinct()
+    )
+
+    if user_id is not None:
+        sel = sel.where(rec.c.user_id == user_id)
+
+    stmt = insert(Notification).from_select(["user_id", "type", "entity_id", "send_at", "priority"], sel)
+    stmt = stmt.on_conflict_do_nothing(index_elements=["user_id", "type", "entity_id", "send_at"])
+    await session.execute(stmt)
+
+
+async def plan_daily_digest_job():
+    async with db.SessionMaker() as session:
+        now = datetime.now(timezone.utc)
+        await plan_daily_digest(session, now)
+        await session.commit()
+
+
+async def replan_user_notifications(session, user_id: int, now: datetime, types: tuple[str, ...]) -> None:
+    # после смены настроек: будущие напоминания затронутых видов пересобираем по новым правилам
+    await session.execute(
+        delete(Notification).where(
+            Notification.user_id == user_id,
+            Notification.status == NotificationStatus.pending,
+            Notification.type.in_(types),
+            Notification.send_at > now,
+        )
+    )
+    await plan_lesson_notifications(session, now, user_id=user_id)
+    await plan_daily_digest(session, now, user_id=user_id)
+    await plan_hw_due_notifications(session, now, user_id=user_id)
+
+
+async def render_daily_digest(session, n: Notification, u: User) -> str | None:
+    tzname = u.timezone or "Europe/Moscow"
+    day = date(n.entity_id // 10000, n.entity_id // 100 % 100, n.entity_id % 100)
+    day_start = datetime(day.year, day.month, day.day, tzinfo=ZoneInfo(tzname))
+    next_day = day + timedelta(days=1)
+    day_end = datetime(next_day.year, next_day.month, next_day.day, tzinfo=ZoneInfo(tzname))
+
+    rec = lesson_recipients(include_teacher=True)
+    my_students = select(rec.c.student_id).where(rec.c.user_id == u.id)
+    lessons = (
+        select(Lesson.start_at.label("start_at"), Student.full_name.label("name"))
+        .join(Student, Student.id == Lesson.student_id)
+        .where(
+            Lesson.student_id.in_(my_students),
+            Lesson.status == LessonStatus.planned,
+            Lesson.start_at >= day_start,
+            Lesson.start_at < day_end,
+        )
+    )
+    # групповое занятие — одной строкой, сколько бы «своих» учеников в нём ни было
+    group_lessons = (
+        select(GroupLesson.start_at, literal("группа ") + LessonGroup.title)
+        .join(LessonGroup, LessonGroup.id == GroupLesson.group_id)
+        .where(
+            GroupLesson.group_id.in_(
+                select(LessonGroupMember.group_id).where(LessonGroupMember.student_id.in_(my_students))
+            ),
+            GroupLesson.status == LessonStatus.planned,
+            GroupLesson.start_at >= day_start,
+            GroupLesson.start_at < day_end,
+        )
+    )
+    day_lessons = union_all(lessons, group_lessons).subquery("day_lessons")
+    rows = (await session.execute(
+        select(day_lessons.c.start_at, day_lessons.c.name).order_by(day_lessons.c.start_at, day_lessons.c.name)
+    )).all()
+
+    if not rows:
+        # уроки за это время отменили — дайджест не нужен
+        return None
+
+    lines = [f"- {fmt_dt_for_tz(start_at, tzname)[-5:]} {name}" for start_at, name in rows]
+    return f"Уроки на {day:%Y-%m-%d} ({tzname}):\n" + "\n".join(lines)
+
+
+async def render_group_lesson_done(session, n: Notification, u: User) -> str | None:
+    # родителю — по своим детям из группы: одно сообщение, сколько бы их там ни было
+    rows = (await session.execute(
+        select(GroupLesson.start_at, LessonGroup.title, Student.full_name, LessonCharge.status, LessonCharge.amount)
+        .join(LessonGroup, LessonGroup.id == GroupLesson.group_id)
+        .join(LessonCharge, LessonCharge.group_lesson_id == GroupLesson.id)
+        .join(Student, Student.id == LessonCharge.student_id)
+        .join(ParentStudent, ParentStudent.student_id == Student.id)
+        .join(Parent, Parent.id == ParentStudent.parent_id)
+        .where(
+            GroupLesson.id == n.entity_id,
+            Parent.user_id == u.id,
+            # периодические счета придут сводкой
+            Student.invoice_period == InvoicePeriod.per_lesson,
+        )
+        .order_by(Student.full_name)
+    )).all()
+    if not rows:
+        return None
+
+    tzname = u.timezone or "Europe/Moscow"
+    lines = [
+        "Групповое занятие проведено.",
+        f"Группа: {rows[0].title}",
+        f"Дата/время: {fmt_dt_for_tz(rows[0].start_at, u.timezone)} ({tzname})",
+    ]
+    for r in rows:
+        pay = "оплата отмечена" if r.status == ChargeStatus.paid else f"к оплате: {r.amount}"
+        lines.append(f"{r.full_name} — {pay}")
+    return "\n".join(lines)
+
+
+TG_MESSAGE_LIMIT = 4096
+COALESCE_SEPARATOR = "\n\n"
+
+
+class UnknownNotificationType(Exception):
+    pass
+
+
+async def render_notification(session, n: Notification, u: User) -> str | None:
+    if n.type in ("lesson_24h", "lesson_1h"):
+        lesson = (await session.execute(
+            select(Lesson).where(Lesson.id == n.entity_id)
+        )).scalar_one()
+
+        student = (await session.execute(
+            select(Student).where(Student.id == lesson.student_id)
+        )).scalar_one()
+
+        when = fmt_dt_for_tz(lesson.start_at, u.timezone)
+        tzname = u.timezone or "Europe/Moscow"
+        return (
+            "Напоминание: урок скоро.\n"
+            f"Ученик: {student.full_name}\n"
+            f"Время: {when} ({tzname})"
+        )
+
+    if n.type in ("group_lesson_24h", "group_lesson_1h"):
+        row = (await session.execute(
+            select(GroupLesson.start_at, GroupLesson.status, LessonGroup.title)
+            .join(LessonGroup, LessonGroup.id == GroupLesson.group_id)
+            .where(GroupLesson.id == n.entity_id)
+        )).one_or_none()
+        if row is None or row.status != LessonStatus.planned:
+            return None
+        tzname = u.timezone or "Europe/Moscow"
+        return (
+            "Напоминание: групповое занятие скоро.\n"
+            f"Группа: {row.title}\n"
+            f"Время: {fmt_dt_for_tz(row.start_at, u.timezone)} ({tzname})"
+        )
+
+    if n.type == "group_lesson_done":
+        return await render_group_lesson_done(session, n, u)
+
+    if n.type == "hw_graded":
+        # payload формируем при выставлении оценки (ученик+родители),
+        # поэтому тут просто отправляем готовый текст
+        return n.payload or "Выставлена оценка за домашнее задание."
+
+    if n.type == "daily_digest":
+        return await render_daily_digest(session, n, u)
+
+    if n.type == "hw_assigned":
+        row = (await session.execute(
+            select(Homework, Student.full_name)
+            .join(Student, Student.id == Homework.student_id)
+            .where(Homework.id == n.entity_id)
+        )).one_or_none()
+        if row is None:
+            return None
+        hw, full_name = row
+        tzname = u.timezone or "Europe/Moscow"
+        due_line = f"\nСдать до: {fmt_dt_for_tz(hw.due_at, tzname)} ({tzname})" if hw.due_at else ""
+        return (
+            "Новое домашнее задание.\n"
+            f"Ученик: {full_name}\n"
+            f"ДЗ: {hw.title}\n"
+            f"{hw.description}"
+            f"{due_line}"
+        )
+
+    if n.type == "hw_due":
+        row = (await session.execute(
+            select(Homework, Student.full_name)
+            .join(Student, Student.id == Homework.student_id)
+            .where(Homework.id == n.entity_id)
+        )).one_or_none()
+        if row is None:
+            return None
+        hw, full_name = row
+        # уже сдано/оценено или дедлайн убран/прошёл
+        if hw.student_done_at is not None or hw.grade is not None or hw.due_at is None:
+            return None
+        if hw.due_at <= datetime.now(timezone.utc):
+            return None
+        tzname = u.timezone or "Europe/Moscow"
+        return (
+            "Напоминание: скоро дедлайн домашнего задания.\n"
+            f"Ученик: {full_name}\n"
+            f"ДЗ: {hw.title}\n"
+            f"Сдать до: {fmt_dt_for_tz(hw.due_at, tzname)} ({tzname})"
+        )
+
+    if n.type in ("invoice_weekly", "invoice_monthly"):
+        # сводка целиком собрана при планировании (jobs_billing.plan_invoices)
+        return n.payload
+
+    if n.type == "low_balance":
+        # флаг сброшен — абонемент уже пополнили, предупреждать не о чем
+        notified_at = (await session.execute(
+            select(StudentBalance.low_balance_notified_at).where(StudentBalance.student_id == n.entity_id)
+        )).scalar_one_or_none()
+        return n.payload if notified_at is not None else None
+
+    if n.type == "lesson_prompt":
+        row = (await session.execute(
+            select(Lesson, Student.full_name)
+            .join(Student, Student.id == Lesson.student_id)
+            .where(Lesson.id == n.entity_id)
+        )).one_or_none()
+        if row is None:
+            return None
+        lesson, full_name = row
+        expected_at = (
+            lesson.start_at
+            + timedelta(minutes=lesson.duration_min + settings.lesson_prompt_delay_min)
+        )
+        # урок уже отмечен/отменён или перенесён (для нового времени есть своя строка)
+        if lesson.status != LessonStatus.planned or n.send_at != expected_at:
+            return None
+        tzname = u.timezone or "Europe/Moscow"
+        return (
+            "Урок закончился — отметить?\n"
+            f"Ученик: {full_name}\n"
+            f"Время: {fmt_dt_for_tz(lesson.start_at, tzname)} ({tzname})"
+        )
+
+    if n.type == "lesson_done":
+        # ставится пакетным «Проведён» (mark_lessons_done_bulk); оплата — на момент отправки
+        lesson, student, charge = (await session.execute(
+            select(Lesson, Student, LessonCharge)
+            .join(Student, Student.id == Lesson.student_id)
+            .join(LessonCharge, LessonCharge.lesson_id == Lesson.id)
+            .where(Lesson.id == n.entity_id)
+        )).one()
+        tzname = u.timezone or "Europe/Moscow"
+        return lesson_done_text(
+            student.full_name, fmt_dt_for_tz(lesson.start_at, tzname), tzname, charge.status, charge.amount
+        )
+
+    raise UnknownNotificationType(f"Unknown notification type: {n.type}")
+
+
+# такие уведомления идут отдельным сообщением со своими кнопками
+NOT_COALESCED = {"lesson_prompt"}
+
+
+def notification_markup(n: Notification):
+    if n.type == "lesson_prompt":
+        return lesson_prompt_kb(n.entity_id)
+    return None
+
+
+def coalesce_texts(rendered: list[tuple[int, str]], limit: int = TG_MESSAGE_LIMIT) -> list[tuple[list[int], str]]:
+    # склеиваем тексты одного получателя, не превышая лимит сообщения Telegram;
+    # для каждого сообщения помним, какие строки очереди оно закрывает
+    messages: list[tuple[list[int], str]] = []
+    for nid, text in rendered:
+        if messages and len(messages[-1][1]) + len(COALESCE_SEPARATOR) + len(text) <= limit:
+            ids, msg = messages[-1]
+            messages[-1] = (ids + [nid], msg + COALESCE_SEPARATOR + text)
+        else:
+            messages.append(([nid], text))
+    return messages
+
+
+async def _set_status(session, ids: list[int], status: NotificationStatus, error: str | None) -> None:
+    # все строки одного сообщения меняют статус одним UPDATE в одной транзакции
+    await session.execute(
+        update(Notification).where(Notification.id.in_(ids))
+        .values(status=status, last_error=error)
+    )
+    await session.commit()
+
+
 async def send_notifications_job(bot, batch_size: int = 50):
+    result = {"sent": 0, "failed": 0, "suppressed": 0, "skipped": 0, "messages": 0, "saved": 0}
+
     async with db.SessionMaker() as session:
         now = datetime.now(timezone.utc)
 
-        notifs = (await session.execute(
-            select(Notification)
-            .where(Notification.status == NotificationStatus.pending, Notification.send_at <= now)
-            .order_by(Notification.send_at)
-            .limit(batch_size)
-        )).scalars().all()
+        # глубина и lag по полосам; по ним же делим batch (lesson_1h — всегда первыми)
+        stats = await queue_stats(session, now)
+        if not stats:
+            return result
+        log.info("Notification lanes: %s", format_queue_stats(stats))
+
+        alloc = allocate_batch({p: depth for p, (depth, _lag) in stats.items()}, batch_size)
+
+        notifs = []
+        for priority in sorted(alloc):
+            if not alloc[priority]:
+                continue
+            notifs.extend((await session.execute(
+                select(Notification)
+                .where(
+                    Notification.status == NotificationStatus.pending,
+                    Notification.priority == priority,
+                    Notification.send_at <= now,
+                )
+                .order_by(Notification.send_at, Notification.id)
+                .limit(alloc[priority])
+            )).scalars().all())
 
         if not notifs:
-            return
+            return result
 
         user_ids = list({n.user_id for n in notifs})
+
+        # то, что этим же получателям придёт в ближайшее окно, отправим сейчас одним сообщением
+        window = timedelta(seconds=settings.notify_coalesce_window_sec)
+        if window:
+            notifs.extend((await session.execute(
+                select(Notification)
+                .where(
+                    Notification.status == NotificationStatus.pending,
+                    Notification.user_id.in_(user_ids),
+                    Notification.send_at > now,
+                    Notification.send_at <= now + window,
+                )
+                .order_by(Notification.priority, Notification.send_at, Notification.id)
+            )).scalars().all())
+
         users = (await session.execute(select(User).where(User.id.in_(user_ids)))).scalars().all()
         u_map = {u.id: u for u in users}
 
+        # группы по получателю; порядок групп — по самому важному уведомлению
+        groups: dict[int, list[Notification]] = {}
         for n in notifs:
-            u = u_map.get(n.user_id)
+            groups.setdefault(n.user_id, []).append(n)
+
+        for user_id, group in groups.items():
+            ids = [n.id for n in group]
+            u = u_map.get(user_id)
             if not u:
                 # пользователь мог быть удалён (например, удалили ученика/родителя)
-                await session.execute(
-                    update(Notification).where(Notification.id == n.id)
-                    .values(status=NotificationStatus.failed, last_error="User not found")
-                )
-                await session.commit()
+                await _set_status(session, ids, NotificationStatus.failed, "User not found")
+                result["failed"] += len(ids)
                 continue
 
-            try:
-                if n.type in ("lesson_24h", "lesson_1h"):
-                    lesson = (await session.execute(
-                        select(Lesson).where(Lesson.id == n.entity_id)
-                    )).scalar_one()
-
-                    student = (await session.execute(
-                        select(Student).where(Student.id == lesson.student_id)
-                    )).scalar_one()
-
-                    when = fmt_dt_for_tz(lesson.start_at, u.timezone)
-                    tzname = u.timezone or "Europe/Moscow"
-                    msg = (
-                        "Напоминание: урок скоро.\n"
-                        f"Ученик: {student.full_name}\n"
-                        f"Время: {when} ({tzname})"
-                    )
-                    await bot.send_message(u.tg_id, msg)
-
-                elif n.type == "hw_graded":
-                    # payload формируем при выставлении оценки (ученик+родители),
-                    # поэтому тут просто отправляем готовый текст
-                    await bot.send_message(u.tg_id, n.payload or "Выставлена оценка за домашнее задание.")
+            if u.blocked_at is not None:
+                # бот заблокирован — не тратим запрос к Telegram
+                await _set_status(session, ids, NotificationStatus.failed, "User blocked the bot")
+                result["suppressed"] += len(ids)
+                continue
 
+            rendered: list[tuple[int, str]] = []
+            standalone: list[tuple[list[int], str, object]] = []
+            for n in group:
+                try:
+                    text = await render_notification(session, n, u)
+                except Exception as e:
+                    # битая ссылка / неизвестный тип — валим только эту строку
+                    await _set_status(session, [n.id], NotificationStatus.failed, str(e)[:2000])
+                    result["failed"] += 1
+                    continue
+
+                if text is None:
+                    await _set_status(session, [n.id], NotificationStatus.skipped, None)
+                    result["skipped"] += 1
+                    continue
+
+                if n.type in NOT_COALESCED:
+                    standalone.append(([n.id], text, notification_markup(n)))
                 else:
-                    # неизвестный тип уведомления
-                    await session.execute(
-                        update(Notification).where(Notification.id == n.id)
-                        .values(status=NotificationStatus.failed, last_error=f"Unknown notification type: {n.type}")
-                    )
-                    await session.commit()
+                    rendered.append((n.id, text))
+
+            if not rendered and not standalone:
+                continue
+
+            chunks = [(ids, msg, None) for ids, msg in coalesce_texts(rendered)] + standalone
+
+            # файлы выданных ДЗ идут следом за текстом, по file_id; один запрос на получателя
+            hw_of = {n.id: n.entity_id for n in group if n.type == "hw_assigned"}
+            hw_files = await files_by_homework(session, list(set(hw_of.values())))
+
+            blocked = False
+            for ids, msg, markup in chunks:
+                if blocked:
+                    await _set_status(session, ids, NotificationStatus.failed, "User blocked the bot")
+                    result["suppressed"] += len(ids)
                     continue
 
-                await session.execute(
-                    update(Notification).where(Notification.id == n.id)
-                    .values(status=NotificationStatus.sent, last_error=None)
-                )
-                await session.commit()
+                try:
+                    if markup is None:
+                        await bot.send_message(u.tg_id, msg)
+                    else:
+                        await bot.send_message(u.tg_id, msg, reply_markup=markup)
+                except TelegramForbiddenError as e:
+                    # пользователь заблокировал бота: помечаем его
+                    await mark_user_blocked(session, u.id, now)
+                    await _set_status(session, ids, NotificationStatus.failed, str(e)[:2000])
+                    result["failed"] += len(ids)
+                    blocked = True
+                    continue
+                except Exception as e:
+                    await _set_status(session, ids, NotificationStatus.failed, str(e)[:2000])
+                    result["failed"] += len(ids)
+                    continue
 
-            except Exception as e:
-                await session.execute(
-                    update(Notification).where(Notification.id == n.id)
-                    .values(status=NotificationStatus.failed, last_error=str(e)[:2000])
-                )
-                await session.commit()
+                await _set_status(session, ids, NotificationStatus.sent, None)
+                result["sent"] += len(ids)
+                result["messages"] += 1
+                result["saved"] += len(ids) - 1
+
+                for nid in ids:
+                    if hw_of.get(nid) not in hw_files:
+                        continue
+                    try:
+                        await send_files(bot, u.tg_id, hw_files[hw_of[nid]])
+                    except Exception as e:
+                        # текст уже доставлен — строку очереди не трогаем
+                        log.warning("Homework %s attachments to user %s failed: %s", hw_of[nid], u.id, e)
+
+    log.info(
+        "Notifications: sent=%d in %d messages (saved=%d) failed=%d suppressed(blocked)=%d skipped=%d",
+        result["sent"], result["messages"], result["saved"], result["failed"], result["suppressed"],
+        result["skipped"],
+    )
+    return result
@@ -0,0 +1,161 @@
+import logging
+from datetime import datetime, date, timedelta, timezone
+
+from sqlalchemy import select, union, values, column, cast, func, and_, Date, DateTime
+from sqlalchemy.dialects.postgresql import insert
+
+from . import db
+from .config import settings
+from .models import (
+    Lesson, LessonStatus, LessonCharge, ChargeStatus, GroupLesson, BalanceEntry, BalanceReason, Homework,
+    DailyStats, JobState,
+)
+
+log = logging.getLogger(__name__)
+
+DAILY_STATS_JOB = "daily_stats"
+# updated_at ставится временем начала транзакции: запись, закоммиченная уже после прошлого
+# прогона, может оказаться «старше» водяного знака — поэтому берём окно с запасом
+ROLLUP_OVERLAP = timedelta(minutes=5)
+
+
+def _local_day(col, tz: str):
+    return cast(func.timezone(tz, col), Date)
+
+
+async def changed_days(session, since: datetime | None) -> list[date]:
+    """Локальные дни, затронутые изменениями после since (None — вся история)."""
+    tz = settings.stats_timezone
+    parts = [
+        select(_local_day(Lesson.start_at, tz)),
+        # групповые занятия: начисления по ним появляются при отметке «Проведено»
+        select(_local_day(GroupLesson.start_at, tz)),
+        select(_local_day(BalanceEntry.created_at, tz)).where(BalanceEntry.reason == BalanceReason.package),
+        # ДЗ учитываются в день выдачи: он не меняется, поэтому переоценка правит ровно один день
+        select(_local_day(Homework.created_at, tz)),
+    ]
+    if since is not None:
+        parts[0] = parts[0].where(Lesson.updated_at > since)
+        parts[1] = parts[1].where(GroupLesson.updated_at > since)
+        parts[2] = parts[2].where(BalanceEntry.created_at > since)
+        parts[3] = parts[3].where(Homework.updated_at > since)
+
+    return list((await session.execute(union(*parts))).scalars().all())
+
+
+async def student_days(session, student_id: int) -> list[date]:
+    """
+    Дни, в статистику которых входит ученик. Удалённые строки не оставляют updated_at для
+    changed_days — поэтому удаляющий код берёт дни до удаления и сам вызывает rollup_days.
+    """
+    tz = settings.stats_timezone
+    return list((await session.execute(union(
+        select(_local_day(Lesson.start_at, tz)).where(Lesson.student_id == student_id),
+        select(_local_day(BalanceEntry.created_at, tz))
+        .where(BalanceEntry.student_id == student_id, BalanceEntry.reason == BalanceReason.package),
+        select(_local_day(Homework.created_at, tz)).where(Homework.student_id == student_id),
+        # его начисления за групповые занятия
+        select(_local_day(GroupLesson.start_at, tz))
+        .join(LessonCharge, LessonCharge.group_lesson_id == GroupLesson.id)
+        .where(LessonCharge.student_id == student_id),
+    ))).scalars().all())
+
+
+async def lesson_days(session, *criteria) -> list[date]:
+    # то же для удаляемых уроков
+    tz = settings.stats_timezone
+    return list((await session.execute(
+        select(_local_day(Lesson.start_at, tz)).where(*criteria).distinct()
+    )).scalars().all())
+
+
+async def rollup_days(session, days: list[date]) -> None:
+    # один INSERT ... SELECT ... ON CONFLICT: каждый день пересчитывается целиком из исходных таблиц
+    tz = settings.stats_timezone
+    days_v = values(column("day", Date), name="days").data([(d,) for d in days])
+    day_start = func.timezone(tz, cast(days_v.c.day, DateTime))
+    day_end = func.timezone(tz, cast(days_v.c.day, DateTime) + timedelta(days=1))
+
+    def in_day(col):
+        return and_(col >= day_start, col < day_end)
+
+    def lessons_with(status: LessonStatus):
+        return select(func.count()).where(Lesson.status == status, in_day(Lesson.start_at)).scalar_subquery()
+
+    # выручка — начисления за проведённые уроки и групповые занятия, без отменённых
+    # и без предоплаты за ещё не прошедшие
+    start_at = func.coalesce(Lesson.start_at, GroupLesson.start_at)
+    revenue = (
+        select(func.coalesce(func.sum(LessonCharge.amount), 0))
+        .select_from(LessonCharge)
+        .outerjoin(Lesson, Lesson.id == LessonCharge.lesson_id)
+        .outerjoin(GroupLesson, GroupLesson.id == LessonCharge.group_lesson_id)
+        .where(
+            LessonCharge.status != ChargeStatus.canceled,
+            func.coalesce(Lesson.status, GroupLesson.status) == LessonStatus.done,
+            in_day(start_at),
+        )
+        .scalar_subquery()
+    )
+    packages = (
+        select(func.count())
+        .where(BalanceEntry.reason == BalanceReason.package, in_day(BalanceEntry.created_at))
+        .scalar_subquery()
+    )
+    hw_graded = (
+        select(func.count())
+        .where(Homework.grade.is_not(None), in_day(Homework.created_at))
+        .scalar_subquery()
+    )
+    hw_grade_sum = (
+        select(func.coalesce(func.sum(Homework.grade), 0))
+        .where(in_day(Homework.created_at))
+        .scalar_subquery()
+    )
+
+    sel = select(
+        days_v.c.day,
+        lessons_with(LessonStatus.done),
+        lessons_with(LessonStatus.canceled),
+        revenue,
+        packages,
+        hw_graded,
+        hw_grade_sum,
+    )
+    cols = ["day", "lessons_done", "lessons_canceled", "revenue", "packages_sold", "hw_graded", "hw_grade_sum"]
+    stmt = insert(DailyStats).from_select(cols, sel)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyStats.day],
+        set_={**{c: stmt.excluded[c] for c in cols[1:]}, "updated_at": func.now()},
+    )
+    await session.execute(stmt)
+
+
+async def rollup_daily_stats(session, now: datetime) -> int:
+    """
+    Инкрементальный пересчёт daily_stats: только дни, где что-то изменилось с прошлого прогона.
+    Возвращает число пересчитанных дней.
+    """
+    watermark = (await session.execute(
+        select(JobState.watermark).where(JobState.key == DAILY_STATS_JOB).with_for_update()
+    )).scalar_one_or_none()
+    since = watermark - ROLLUP_OVERLAP if watermark is not None else None
+
+    days = await changed_days(session, since)
+    if days:
+        await rollup_days(session, days)
+
+    stmt = insert(JobState).values(key=DAILY_STATS_JOB, watermark=now)
+    stmt = stmt.on_conflict_do_update(index_elements=[JobState.key], set_={"watermark": now})
+    await session.execute(stmt)
+    return len(days)
+
+
+async def rollup_daily_stats_job():
+    async with db.SessionMaker() as session:
+        now = datetime.now(timezone.utc)
+        days = await rollup_daily_stats(session, now)
+        await session.commit()
+
+    if days:
+        log.info("Daily stats rolled up: days=%s", days)
@@ -4,7 +4,8 @@ from aiogram.types import InlineKeyboardButton
 
 from .callbacks import (
     MenuCb, AdminCb, LessonCb, LessonPayCb,
-    TzCb, ChildCb, FsmNavCb, HomeworkCb, SubCb, BoardCb
+    TzCb, ChildCb, FsmNavCb, HomeworkCb, SubCb, BoardCb, NotifyCb, TodayCb, PromptCb, UnpaidCb, ExportCb,
+    HomeworkListCb, HwGroupCb, GradeQueueCb, HwSearchCb, GroupCb,
 )
 
 TZ_LIST = [
@@ -29,12 +30,44 @@ def main_menu(role: str) -> InlineKeyboardMarkup:
     if role == "parent":
         kb.button(text="Дети", callback_data=MenuCb(section="parent_children").pack())
 
+    if role in ("student", "parent"):
+        kb.button(text="Календарь", callback_data=MenuCb(section="calendar").pack())
+
     kb.button(text="Часовой пояс", callback_data=MenuCb(section="tz").pack())
+    kb.button(text="Уведомления", callback_data=MenuCb(section="notify").pack())
     kb.button(text="Помощь", callback_data=MenuCb(section="help").pack())
     kb.adjust(2)
     return kb.as_markup()
 
 
+def notify_settings_kb(ns) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    kb.button(
+        text=f"За 24 часа: {'вкл' if ns.lesson_24h else 'выкл'}",
+        callback_data=NotifyCb(action="lesson_24h").pack(),
+    )
+    kb.button(
+        text=f"За 1 час: {'вкл' if ns.lesson_1h else 'выкл'}",
+        callback_data=NotifyCb(action="lesson_1h").pack(),
+    )
+    kb.button(
+        text=f"Дайджест на день: {'вкл' if ns.daily_digest else 'выкл'}",
+        callback_data=NotifyCb(action="digest").pack(),
+    )
+    kb.button(text="Тихие часы", callback_data=NotifyCb(action="quiet").pack())
+    kb.button(text="Назад", callback_data=MenuCb(section="menu").pack())
+    kb.adjust(1)
+    return kb.as_markup()
+
+
+def calendar_kb() -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    kb.button(text="Перевыпустить ссылку", callback_data=MenuCb(section="calendar_reset").pack())
+    kb.button(text="Назад", callback_data=MenuCb(section="menu").pack())
+    kb.adjust(1)
+    return kb.as_markup()
+
+
 def tz_kb() -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
     for tz in TZ_LIST:
@@ -47,6 +80,255 @@ def admin_menu() -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
     kb.button(text="Ученики", callback_data=AdminCb(action="students", page=1).pack())
     kb.button(text="Создать ученика", callback_data=AdminCb(action="create_student").pack())
+    kb.button(text="Уроки сегодня", callback_data=AdminCb(action="today").pack())
+    kb.button(text="Неоплаченные", callback_data=UnpaidCb(action="page").pack())
+    kb.button(text="ДЗ группе", callback_data=AdminCb(action="hw_group").pack())
+    kb.button(text="Проверка ДЗ", callback_data=AdminCb(action="grading").pack())
+    kb.button(text="Группы", callback_data=AdminCb(action="groups").pack())
+    kb.button(text="Аналитика", callback_data=AdminCb(action="analytics").pack())
+    kb.button(text="Выгрузка данных", callback_data=AdminCb(action="export").pack())
+    kb.adjust(1)
+    return kb.as_markup()
+
+
+def hw_group_templates_kb(templates) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    kb.button(text="✏️ Новое задание", callback_data=HwGroupCb(action="new").pack())
+    for tpl in templates:
+        kb.button(text=f"📄 {tpl.title}", callback_data=HwGroupCb(action="tpl", item_id=tpl.id).pack())
+    kb.button(text="Назад", callback_data=MenuCb(section="admin").pack())
+    kb.adjust(1)
+    return kb.as_markup()
+
+
+def hw_group_students_kb(
+    rows: list[tuple[int, str]], selected: set[int], page: int, has_next: bool,
+) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    for sid, name in rows:
+        kb.button(
+            text=("✅ " if sid in selected else "▫️ ") + name,
+            callback_data=HwGroupCb(action="toggle", item_id=sid, page=page).pack(),
+        )
+    kb.adjust(2)
+
+    nav = []
+    if page > 1:
+        nav.append(InlineKeyboardButton(text="◀", callback_data=HwGroupCb(action="page", page=page - 1).pack()))
+    if has_next:
+        nav.append(InlineKeyboardButton(text="▶", callback_data=HwGroupCb(action="page", page=page + 1).pack()))
+    if nav:
+        kb.row(*nav)
+
+    kb.row(
+        InlineKeyboardButton(text="Выбрать всех", callback_data=HwGroupCb(action="all", page=page).pack()),
+        InlineKeyboardButton(text="Снять выбор", callback_data=HwGroupCb(action="none", page=page).pack()),
+    )
+    kb.row(InlineKeyboardButton(
+        text=f"Выдать ({len(selected)})", callback_data=HwGroupCb(action="assign", page=page).pack(),
+    ))
+    kb.row(InlineKeyboardButton(text="✖ Отмена", callback_data=HwGroupCb(action="cancel").pack()))
+    return kb.as_markup()
+
+
+def grading_kb(homework_id: int | None, buffered: int, *, restart: bool = False) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    if homework_id is not None:
+        kb.row(*[
+            InlineKeyboardButton(
+                text=str(g), callback_data=GradeQueueCb(action="grade", homework_id=homework_id, grade=g).pack(),
+            )
+            for g in range(1, 6)
+        ])
+        kb.row(*[
+            InlineKeyboardButton(
+                text=str(g), callback_data=GradeQueueCb(action="grade", homework_id=homework_id, grade=g).pack(),
+            )
+            for g in range(6, 11)
+        ])
+        kb.row(InlineKeyboardButton(
+            text="Пропустить", callback_data=GradeQueueCb(action="skip", homework_id=homework_id).pack(),
+        ))
+    if restart:
+        kb.row(InlineKeyboardButton(text="К пропущенным", callback_data=GradeQueueCb(action="restart").pack()))
+    if buffered:
+        kb.row(InlineKeyboardButton(
+            text=f"Разослать оценки ({buffered})", callback_data=GradeQueueCb(action="finish").pack(),
+        ))
+    kb.row(InlineKeyboardButton(text="Назад", callback_data=MenuCb(section="admin").pack()))
+    return kb.as_markup()
+
+
+def hw_search_kb(hits, page: int, has_next: bool, *, start: int = 1) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    for n, hit in enumerate(hits, start=start):
+        kb.row(
+            InlineKeyboardButton(
+                text=f"{n}. {hit.title}",
+                callback_data=HomeworkCb(
+                    action="view", homework_id=hit.homework_id, student_id=hit.student_id, offset=0,
+                ).pack(),
+            ),
+            InlineKeyboardButton(
+                text="↻ Выдать", callback_data=HwGroupCb(action="copy", item_id=hit.homework_id).pack(),
+            ),
+        )
+    nav = []
+    if page > 1:
+        nav.append(InlineKeyboardButton(text="◀", callback_data=HwSearchCb(page=page - 1).pack()))
+    if has_next:
+        nav.append(InlineKeyboardButton(text="▶", callback_data=HwSearchCb(page=page + 1).pack()))
+    if nav:
+        kb.row(*nav)
+    return kb.as_markup()
+
+
+def hw_group_cancel_kb() -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    kb.button(text="✖ Отмена", callback_data=HwGroupCb(action="cancel").pack())
+    return kb.as_markup()
+
+
+def groups_kb(groups) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    kb.button(text="➕ Новая группа", callback_data=GroupCb(action="new").pack())
+    for g in groups:
+        kb.button(text=f"👥 {g.title} ({g.members})", callback_data=GroupCb(action="view", group_id=g.id).pack())
+    kb.button(text="Назад", callback_data=MenuCb(section="admin").pack())
+    kb.adjust(1)
+    return kb.as_markup()
+
+
+def group_card_kb(group_id: int, lessons: list[tuple[int, str]]) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    for lesson_id, label in lessons:
+        kb.button(
+            text=f"✅ {label}", callback_data=GroupCb(action="done", group_id=group_id, item_id=lesson_id).pack(),
+        )
+    kb.button(text="👥 Участники", callback_data=GroupCb(action="members", group_id=group_id).pack())
+    kb.button(text="➕ Расписание", callback_data=GroupCb(action="rule", group_id=group_id).pack())
+    kb.button(text="Назад", callback_data=AdminCb(action="groups").pack())
+    kb.adjust(1)
+    return kb.as_markup()
+
+
+def group_members_kb(
+    group_id: int, rows: list[tuple[int, str]], selected: set[int], page: int, has_next: bool,
+) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    for sid, name in rows:
+        kb.button(
+            text=("✅ " if sid in selected else "▫️ ") + name,
+            callback_data=GroupCb(action="toggle", group_id=group_id, item_id=sid, page=page).pack(),
+        )
+    kb.adjust(2)
+
+    nav = []
+    if page > 1:
+        nav.append(InlineKeyboardButton(
+            text="◀", callback_data=GroupCb(action="page", group_id=group_id, page=page - 1).pack(),
+        ))
+    if has_next:
+        nav.append(InlineKeyboardButton(
+            text="▶", callback_data=GroupCb(action="page", group_id=group_id, page=page + 1).pack(),
+        ))
+    if nav:
+        kb.row(*nav)
+
+    kb.row(
+        InlineKeyboardButton(text="Выбрать всех", callback_data=GroupCb(action="all", group_id=group_id, page=page).pack()),
+        InlineKeyboardButton(text="Снять выбор", callback_data=GroupCb(action="none", group_id=group_id, page=page).pack()),
+    )
+    kb.row(InlineKeyboardButton(
+        text=f"Сохранить ({len(selected)})", callback_data=GroupCb(action="save", group_id=group_id).pack(),
+    ))
+    kb.row(InlineKeyboardButton(text="✖ Отмена", callback_data=GroupCb(action="cancel", group_id=group_id).pack()))
+    return kb.as_markup()
+
+
+def group_cancel_kb(group_id: int = 0) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    kb.button(text="✖ Отмена", callback_data=GroupCb(action="cancel", group_id=group_id).pack())
+    return kb.as_markup()
+
+
+EXPORT_PERIOD_TITLES = {
+    "month": "Этот месяц",
+    "prev_month": "Прошлый месяц",
+    "year": "Этот год",
+}
+
+
+def export_kb(with_xlsx: bool) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    fmts = ["csv", "xlsx"] if with_xlsx else ["csv"]
+    for period, title in EXPORT_PERIOD_TITLES.items():
+        kb.row(*[
+            InlineKeyboardButton(text=f"{title} · {fmt.upper()}", callback_data=ExportCb(period=period, fmt=fmt).pack())
+            for fmt in fmts
+        ])
+    kb.row(InlineKeyboardButton(text="Назад", callback_data=MenuCb(section="admin").pack()))
+    return kb.as_markup()
+
+
+def analytics_kb() -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    kb.button(text="Назад", callback_data=MenuCb(section="admin").pack())
+    return kb.as_markup()
+
+
+def unpaid_kb(rows, after: int, next_after: int | None) -> InlineKeyboardMarkup:
+    # rows: (student_id, full_name, cnt, total)
+    kb = InlineKeyboardBuilder()
+    for student_id, name, cnt, total in rows:
+        kb.row(InlineKeyboardButton(
+            text=f"{name}: {cnt} ур. / {total}",
+            callback_data=UnpaidCb(action="pay", student_id=student_id, after=after).pack(),
+        ))
+
+    nav = []
+    if after:
+        nav.append(InlineKeyboardButton(text="⏮ В начало", callback_data=UnpaidCb(action="page").pack()))
+    if next_after is not None:
+        nav.append(InlineKeyboardButton(text="▶", callback_data=UnpaidCb(action="page", after=next_after).pack()))
+    if nav:
+        kb.row(*nav)
+
+    kb.row(InlineKeyboardButton(text="📄 Загрузить выписку", callback_data=UnpaidCb(action="import").pack()))
+    kb.row(InlineKeyboardButton(text="Назад", callback_data=MenuCb(section="admin").pack()))
+    return kb.as_markup()
+
+
+def unpaid_pay_confirm_kb(student_id: int, after: int) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    kb.button(
+        text="✅ Да, всё оплачено",
+        callback_data=UnpaidCb(action="pay_confirm", student_id=student_id, after=after).pack(),
+    )
+    kb.button(text="⬅ Нет, назад", callback_data=UnpaidCb(action="page", after=after).pack())
+    kb.adjust(1)
+    return kb.as_markup()
+
+
+def lesson_prompt_kb(lesson_id: int) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    kb.button(text="Проведён", callback_data=PromptCb(action="done", lesson_id=lesson_id).pack())
+    kb.button(text="Отменён", callback_data=PromptCb(action="cancel", lesson_id=lesson_id).pack())
+    kb.adjust(2)
+    return kb.as_markup()
+
+
+def today_lessons_kb(rows: list[tuple[int, str]], excluded: set[int]) -> InlineKeyboardMarkup:
+    # rows: (lesson_id, подпись); исключённые помечаются и не будут отмечены проведёнными
+    kb = InlineKeyboardBuilder()
+    for lesson_id, label in rows:
+        mark = "⛔" if lesson_id in excluded else "✅"
+        kb.button(text=f"{mark} {label}", callback_data=TodayCb(action="toggle", lesson_id=lesson_id).pack())
+
+    selected = len([1 for lesson_id, _ in rows if lesson_id not in excluded])
+    if selected:
+        kb.button(text=f"Отметить проведёнными ({selected})", callback_data=TodayCb(action="done").pack())
+    kb.button(text="Назад", callback_data=MenuCb(section="admin").pack())
     kb.adjust(1)
     return kb.as_markup()
 
@@ -72,7 +354,16 @@ def students_list_kb(rows: list[tuple[int, str]], page: int) -> InlineKeyboardMa
     return kb.as_markup()
 
 
-def student_card_kb(student_id: int, *, show_subscription: bool = False) -> InlineKeyboardMarkup:
+INVOICE_PERIOD_TITLES = {
+    "per_lesson": "после каждого урока",
+    "weekly": "раз в неделю",
+    "monthly": "раз в месяц",
+}
+
+
+def student_card_kb(
+    student_id: int, *, show_subscription: bool = False, invoice_period: str | None = None
+) -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
 
     kb.button(text="Добавить занятие", callback_data=AdminCb(action="lessons_add", student_id=student_id).pack())
@@ -80,6 +371,15 @@ def student_card_kb(student_id: int, *, show_subscription: bool = False) -> Inli
     if show_subscription:
         kb.button(text="Абонемент +8", callback_data=SubCb(action="add", student_id=student_id, qty=8).pack())
         kb.button(text="Абонемент +12", callback_data=SubCb(action="add", student_id=student_id, qty=12).pack())
+        kb.button(text="Коррекция −1", callback_data=SubCb(action="fix", student_id=student_id, qty=-1).pack())
+        kb.button(text="Коррекция +1", callback_data=SubCb(action="fix", student_id=student_id, qty=1).pack())
+        kb.button(text="История баланса", callback_data=SubCb(action="history", student_id=student_id, qty=0).pack())
+
+    if invoice_period is not None:
+        kb.button(
+            text=f"Счета родителям: {INVOICE_PERIOD_TITLES[invoice_period]}",
+            callback_data=AdminCb(action="invoice_period", student_id=student_id).pack(),
+        )
 
     kb.button(text="Ключ для ученика", callback_data=AdminCb(action="keys_student", student_id=student_id).pack())
     kb.button(text="Ключ для родителя", callback_data=AdminCb(action="keys_parent", student_id=student_id).pack())
@@ -89,7 +389,12 @@ def student_card_kb(student_id: int, *, show_subscription: bool = False) -> Inli
     kb.button(text="Удалить ученика", callback_data=AdminCb(action="student_delete", student_id=student_id).pack())
     kb.button(text="Назад к списку", callback_data=AdminCb(action="students", page=1).pack())
 
-    kb.adjust(1, 2, 1, 1, 1, 1, 1, 1)
+    if show_subscription:
+        kb.adjust(1, 2, 2, 1, 1, 1, 1, 1, 1, 1, 1)
+    elif invoice_period is not None:
+        kb.adjust(1, 1, 2, 1, 1, 1, 1, 1)
+    else:
+        kb.adjust(1, 2, 1, 1, 1, 1, 1, 1)
     return kb.as_markup()
 
 
@@ -177,6 +482,12 @@ def after_single_added_kb(student_id: int) -> InlineKeyboardMarkup:
     kb.adjust(1)
     return kb.as_markup()
 
+def back_to_student_kb(student_id: int) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    kb.button(text="⬅ Назад", callback_data=AdminCb(action="student", student_id=student_id).pack())
+    kb.adjust(1)
+    return kb.as_markup()
+
 def student_delete_confirm_kb(student_id: int) -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
     kb.button(text="✅ Да, удалить", callback_data=AdminCb(action="student_delete_confirm", student_id=student_id).pack())
@@ -184,7 +495,7 @@ def student_delete_confirm_kb(student_id: int) -> InlineKeyboardMarkup:
     kb.adjust(1)
     return kb.as_markup()
 
-def homework_kb(homework_id: int, student_id: int, offset: int) -> InlineKeyboardMarkup:
+def homework_kb(homework_id: int, student_id: int, offset: int, files: int = 0) -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
     kb.button(
         text="✏️ Задать/Изменить",
@@ -194,6 +505,15 @@ def homework_kb(homework_id: int, student_id: int, offset: int) -> InlineKeyboar
         text="✅ Поставить оценку",
         callback_data=HomeworkCb(action="grade", homework_id=homework_id, student_id=student_id, offset=offset).pack(),
     )
+    kb.button(
+        text="📎 Прикрепить файлы",
+        callback_data=HomeworkCb(action="attach", homework_id=homework_id, student_id=student_id, offset=offset).pack(),
+    )
+    if files:
+        kb.button(
+            text=f"📎 Файлы ({files})",
+            callback_data=HomeworkCb(action="files", homework_id=homework_id, student_id=student_id, offset=offset).pack(),
+        )
     kb.button(
         text="⬅ Назад",
         callback_data=HomeworkCb(action="back", homework_id=homework_id, student_id=student_id, offset=offset).pack(),
@@ -239,8 +559,13 @@ def student_homework_back_kb() -> InlineKeyboardMarkup:
     kb.adjust(1)
     return kb.as_markup()
 
-def student_homework_kb(homework_id: int, student_id: int) -> InlineKeyboardMarkup:
+def student_homework_kb(homework_id: int, student_id: int, files: int = 0) -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
+    if files:
+        kb.button(
+            text=f"📎 Файлы ({files})",
+            callback_data=HomeworkCb(action="files", homework_id=homework_id, student_id=student_id, offset=0).pack(),
+        )
     kb.button(
         text="Задание выполнено",
         callback_data=HomeworkCb(
@@ -251,22 +576,66 @@ def student_homework_kb(homework_id: int, student_id: int) -> InlineKeyboardMark
         ).pack(),
     )
     kb.button(text="Назад к расписанию", callback_data=MenuCb(section="student_schedule").pack())
-    kb.adjust(1, 1)
+    kb.adjust(1)
     return kb.as_markup()
 
-def student_homeworks_list_kb(student_id: int, homeworks) -> InlineKeyboardMarkup:
+
+def hw_attach_kb(homework_id: int, student_id: int, offset: int) -> InlineKeyboardMarkup:
     kb = InlineKeyboardBuilder()
+    kb.button(
+        text="Готово",
+        callback_data=HomeworkCb(action="view", homework_id=homework_id, student_id=student_id, offset=offset).pack(),
+    )
+    kb.button(
+        text="Убрать все вложения",
+        callback_data=HomeworkCb(action="detach", homework_id=homework_id, student_id=student_id, offset=offset).pack(),
+    )
+    kb.adjust(1)
+    return kb.as_markup()
 
-    kb.button(text="➕ Добавить ДЗ", callback_data=AdminCb(action="hw_create", student_id=student_id).pack())
+HW_FILTER_TITLES = {"all": "Все", "open": "Открытые", "done": "Сданы", "graded": "С оценкой"}
+
+def student_homeworks_list_kb(
+    student_id: int, homeworks, *, flt: str = "all", next_after: int | None = None, paged: bool = False,
+) -> InlineKeyboardMarkup:
+    """
+    homeworks: ДЗ одной страницы; next_after — id последнего ДЗ, если есть следующая страница,
+    paged — открыта не первая страница.
+    """
+    kb = InlineKeyboardBuilder()
+
+    kb.row(InlineKeyboardButton(
+        text="➕ Добавить ДЗ", callback_data=AdminCb(action="hw_create", student_id=student_id).pack(),
+    ))
+    kb.row(*[
+        InlineKeyboardButton(
+            text=("• " if key == flt else "") + title,
+            callback_data=HomeworkListCb(student_id=student_id, flt=key).pack(),
+        )
+        for key, title in HW_FILTER_TITLES.items()
+    ])
 
     for hw in homeworks:
-        kb.button(
+        kb.row(InlineKeyboardButton(
             text=hw.title or "ДЗ",
             callback_data=HomeworkCb(action="view", homework_id=hw.id, student_id=student_id, offset=0).pack(),
-        )
-
-    kb.button(text="Назад", callback_data=AdminCb(action="student", student_id=student_id).pack())
-    kb.adjust(1)
+        ))
+
+    nav = []
+    if paged:
+        nav.append(InlineKeyboardButton(
+            text="⏮ В начало", callback_data=HomeworkListCb(student_id=student_id, flt=flt).pack(),
+        ))
+    if next_after is not None:
+        nav.append(InlineKeyboardButton(
+            text="Далее ▶", callback_data=HomeworkListCb(student_id=student_id, flt=flt, after=next_after).pack(),
+        ))
+    if nav:
+        kb.row(*nav)
+
+    kb.row(InlineKeyboardButton(
+        text="Назад", callback_data=AdminCb(action="student", student_id=student_id).pack(),
+    ))
     return kb.as_markup()
 
 def after_hw_added_kb(student_id: int) -> InlineKeyboardMarkup:
@@ -9,6 +9,7 @@ from .db import init_db, create_tables
 from .middlewares import DbSessionMiddleware
 from .handlers import routers
 from .logging_conf import setup_logging
+from .web import start_web_app
 
 
 async def main():
@@ -27,7 +28,12 @@ async def main():
     for r in routers:
         dp.include_router(r)
 
-    await dp.start_polling(bot)
+    # iCal-ленты отдаёт aiohttp в том же event loop, что и бот
+    runner = await start_web_app()
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await runner.cleanup()
 
 
 if __name__ == "__main__":
@@ -5,10 +5,11 @@ from datetime import datetime, date, time
 from typing import Optional
 
 from sqlalchemy import (
-    BigInteger, Boolean, Date, DateTime, Enum, ForeignKey,
-    Integer, Numeric, String, Text, Time, UniqueConstraint,
-    func, Index
+    BigInteger, Boolean, CheckConstraint, Computed, Date, DateTime, Enum, ForeignKey,
+    Integer, Numeric, SmallInteger, String, Text, Time, UniqueConstraint,
+    func, Index, text
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -27,6 +28,12 @@ class BillingMode(str, enum.Enum):
     single = "single"              # разово (оплата после "Проведён")
 
 
+class InvoicePeriod(str, enum.Enum):
+    per_lesson = "per_lesson"  # сообщение родителям после каждого урока
+    weekly = "weekly"          # начисления копятся, по понедельникам — одна сводка
+    monthly = "monthly"        # начисления копятся, 1-го числа — одна сводка
+
+
 class LessonStatus(str, enum.Enum):
     planned = "planned"
     done = "done"
@@ -39,10 +46,51 @@ class ChargeStatus(str, enum.Enum):
     canceled = "canceled"
 
 
+class BalanceReason(str, enum.Enum):
+    package = "package"        # покупка абонемента
+    lesson = "lesson"          # списание за проведённый урок
+    correction = "correction"  # ручная корректировка учителем
+    opening = "opening"        # начальный остаток (баланс был до появления журнала)
+
+
 class NotificationStatus(str, enum.Enum):
     pending = "pending"
     sent = "sent"
     failed = "failed"
+    skipped = "skipped"  # к моменту отправки стало неактуально (нечего отправлять)
+
+
+class NotificationPriority(enum.IntEnum):
+    # меньше = важнее; каждая полоса отправляется по своим правилам (см. services/notifications.py)
+    urgent = 0   # lesson_1h
+    normal = 1   # lesson_24h
+    bulk = 2     # hw_graded и прочие массовые
+
+
+NOTIFICATION_PRIORITY = {
+    "lesson_1h": NotificationPriority.urgent,
+    "lesson_24h": NotificationPriority.normal,
+    "daily_digest": NotificationPriority.normal,
+    "lesson_done": NotificationPriority.normal,
+    "lesson_prompt": NotificationPriority.normal,
+    "low_balance": NotificationPriority.normal,
+    "invoice_weekly": NotificationPriority.bulk,
+    "invoice_monthly": NotificationPriority.bulk,
+    "hw_graded": NotificationPriority.bulk,
+    "hw_assigned": NotificationPriority.bulk,
+    "hw_due": NotificationPriority.normal,
+    "group_lesson_1h": NotificationPriority.urgent,
+    "group_lesson_24h": NotificationPriority.normal,
+    "group_lesson_done": NotificationPriority.normal,
+}
+
+
+def notification_priority(kind: str) -> NotificationPriority:
+    return NOTIFICATION_PRIORITY.get(kind, NotificationPriority.bulk)
+
+
+def _default_notification_priority(context) -> int:
+    return int(notification_priority(context.get_current_parameters().get("type") or ""))
 
 
 class User(Base):
@@ -55,9 +103,35 @@ class User(Base):
     name: Mapped[Optional[str]] = mapped_column(String(255))
     timezone: Mapped[Optional[str]] = mapped_column(String(64))  # IANA timezone, напр. Europe/Moscow
 
+    # пользователь заблокировал бота (TelegramForbiddenError); сбрасывается на /start
+    blocked_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+
+    # секрет в ссылке на iCal-ленту уроков (выдаётся по запросу, можно перевыпустить)
+    ical_token: Mapped[Optional[str]] = mapped_column(String(64), unique=True)
+
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
 
 
+class NotificationSettings(Base):
+    __tablename__ = "notification_settings"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+
+    # какие напоминания об уроках нужны
+    lesson_24h: Mapped[bool] = mapped_column(Boolean, default=True)
+    lesson_1h: Mapped[bool] = mapped_column(Boolean, default=True)
+
+    # утренний дайджест уроков на день вместо отдельных напоминаний за 24ч
+    daily_digest: Mapped[bool] = mapped_column(Boolean, default=False)
+    digest_hour: Mapped[int] = mapped_column(Integer, default=8)  # локальный час (TZ пользователя)
+
+    # тихие часы в локальном времени пользователя, [start, end); может переходить через полночь
+    quiet_start: Mapped[Optional[time]] = mapped_column(Time)
+    quiet_end: Mapped[Optional[time]] = mapped_column(Time)
+
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class Student(Base):
     __tablename__ = "students"
 
@@ -73,6 +147,11 @@ class Student(Base):
 
     billing_mode: Mapped[BillingMode] = mapped_column(Enum(BillingMode), default=BillingMode.subscription)
     price_per_lesson: Mapped[Optional[float]] = mapped_column(Numeric(10, 2))
+    # только для single: как сообщать родителям о начислениях
+    invoice_period: Mapped[InvoicePeriod] = mapped_column(Enum(InvoicePeriod), default=InvoicePeriod.per_lesson)
+    # растёт при любом изменении уроков, оценок ДЗ или доски ученика (services.schedule.bump_schedule_version):
+    # ETag iCal-ленты и ключ кэша экранов расписания (services.schedule_cache)
+    schedule_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
     user: Mapped[Optional[User]] = relationship()
 
@@ -115,9 +194,12 @@ class RegistrationKey(Base):
 
 class ScheduleRule(Base):
     __tablename__ = "schedule_rules"
+    # правило — либо индивидуальных уроков ученика, либо занятий группы
+    __table_args__ = (CheckConstraint("(student_id IS NULL) <> (group_id IS NULL)", name="ck_schedule_rules_owner"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    student_id: Mapped[int] = mapped_column(ForeignKey("students.id", ondelete="CASCADE"), index=True)
+    student_id: Mapped[Optional[int]] = mapped_column(ForeignKey("students.id", ondelete="CASCADE"), index=True)
+    group_id: Mapped[Optional[int]] = mapped_column(ForeignKey("lesson_groups.id", ondelete="CASCADE"), index=True)
 
     weekday: Mapped[int] = mapped_column(Integer)  # 0=Mon ... 6=Sun
     time_local: Mapped[time] = mapped_column(Time)
@@ -144,22 +226,108 @@ class Lesson(Base):
 
     done_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    # по нему rollup аналитики находит изменённые дни
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True
+    )
+
+
+class LessonGroup(Base):
+    # групповые занятия: занятие — одна строка group_lessons, на учеников оно раскладывается
+    # через участников (lesson_group_members) только в SQL — в напоминаниях, расписании и биллинге
+    __tablename__ = "lesson_groups"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    title: Mapped[str] = mapped_column(String(255), unique=True)
+    timezone: Mapped[str] = mapped_column(String(64), default="Europe/Moscow")  # в нём заданы правила расписания
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class LessonGroupMember(Base):
+    __tablename__ = "lesson_group_members"
+
+    group_id: Mapped[int] = mapped_column(ForeignKey("lesson_groups.id", ondelete="CASCADE"), primary_key=True)
+    student_id: Mapped[int] = mapped_column(ForeignKey("students.id", ondelete="CASCADE"), primary_key=True, index=True)
+
+
+class GroupLesson(Base):
+    __tablename__ = "group_lessons"
+    __table_args__ = (UniqueConstraint("group_id", "start_at"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    group_id: Mapped[int] = mapped_column(ForeignKey("lesson_groups.id", ondelete="CASCADE"))
+
+    start_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    duration_min: Mapped[int] = mapped_column(Integer, default=60)
+    status: Mapped[LessonStatus] = mapped_column(Enum(LessonStatus), default=LessonStatus.planned)
+
+    source_rule_id: Mapped[Optional[int]] = mapped_column(ForeignKey("schedule_rules.id", ondelete="SET NULL"))
+
+    done_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 
 class StudentBalance(Base):
+    # снимок: сумма BalanceEntry.delta по ученику, поддерживается вместе с журналом
     __tablename__ = "student_balance"
 
     student_id: Mapped[int] = mapped_column(ForeignKey("students.id", ondelete="CASCADE"), primary_key=True)
     lessons_left: Mapped[int] = mapped_column(Integer, default=0)
+    # когда ушло предупреждение «абонемент заканчивается»; сбрасывается, когда остатка снова хватает
+    low_balance_notified_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True))
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
 
+class BalanceEntry(Base):
+    # журнал движений абонемента: только INSERT, строки не меняются и не удаляются
+    __tablename__ = "balance_ledger"
+    __table_args__ = (
+        Index("ix_balance_ledger_student", "student_id", "id"),
+        # урок списывается не больше одного раза
+        Index(
+            "uq_balance_ledger_lesson", "lesson_id",
+            unique=True, postgresql_where=text("reason = 'lesson'"),
+        ),
+        # групповое занятие списывается с каждого участника не больше одного раза
+        Index(
+            "uq_balance_ledger_group_lesson", "group_lesson_id", "student_id",
+            unique=True, postgresql_where=text("reason = 'lesson' AND group_lesson_id IS NOT NULL"),
+        ),
+        # продажи пакетов по дням (аналитика)
+        Index("ix_balance_ledger_package_created", "created_at", postgresql_where=text("reason = 'package'")),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    student_id: Mapped[int] = mapped_column(ForeignKey("students.id", ondelete="CASCADE"))
+
+    delta: Mapped[int] = mapped_column(Integer)  # +N пакет, -1 урок, ±N корректировка
+    reason: Mapped[BalanceReason] = mapped_column(Enum(BalanceReason))
+    lesson_id: Mapped[Optional[int]] = mapped_column(ForeignKey("lessons.id", ondelete="SET NULL"))
+    group_lesson_id: Mapped[Optional[int]] = mapped_column(ForeignKey("group_lessons.id", ondelete="SET NULL"))
+    comment: Mapped[Optional[str]] = mapped_column(String(255))
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
 class LessonCharge(Base):
     __tablename__ = "lesson_charges"
-    __table_args__ = (UniqueConstraint("lesson_id"),)
+    __table_args__ = (
+        UniqueConstraint("lesson_id"),
+        # сводка неоплаченного: status='pending' GROUP BY student_id (amount — для index-only scan)
+        Index("ix_lesson_charges_status_student", "status", "student_id", postgresql_include=["amount"]),
+        # начисление за групповое занятие — по одному на участника
+        Index(
+            "uq_lesson_charges_group_lesson", "group_lesson_id", "student_id",
+            unique=True, postgresql_where=text("group_lesson_id IS NOT NULL"),
+        ),
+        CheckConstraint("(lesson_id IS NULL) <> (group_lesson_id IS NULL)", name="ck_lesson_charges_lesson"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    lesson_id: Mapped[int] = mapped_column(ForeignKey("lessons.id", ondelete="CASCADE"))
+    lesson_id: Mapped[Optional[int]] = mapped_column(ForeignKey("lessons.id", ondelete="CASCADE"))
+    group_lesson_id: Mapped[Optional[int]] = mapped_column(ForeignKey("group_lessons.id", ondelete="CASCADE"))
     student_id: Mapped[int] = mapped_column(ForeignKey("students.id", ondelete="CASCADE"), index=True)
 
     amount: Mapped[float] = mapped_column(Numeric(10, 2))
@@ -171,14 +339,19 @@ class LessonCharge(Base):
 
 class Notification(Base):
     __tablename__ = "notifications"
-    __table_args__ = (UniqueConstraint("user_id", "type", "entity_id", "send_at"),)
+    __table_args__ = (
+        UniqueConstraint("user_id", "type", "entity_id", "send_at"),
+        # выборка очереди по полосам: pending + priority + send_at
+        Index("ix_notifications_lane", "status", "priority", "send_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), index=True)
 
-    type: Mapped[str] = mapped_column(String(64))      # lesson_24h, lesson_1h
-    entity_id: Mapped[int] = mapped_column(Integer)    # lesson_id
+    type: Mapped[str] = mapped_column(String(64))      # lesson_24h, lesson_1h, lesson_done, lesson_prompt, hw_graded, daily_digest, invoice_*, low_balance, group_lesson_*
+    entity_id: Mapped[int] = mapped_column(Integer)    # lesson_id (для group_lesson_* — group_lesson_id, для daily_digest/invoice_* — дата YYYYMMDD, для low_balance — student_id)
     send_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
+    priority: Mapped[int] = mapped_column(SmallInteger, default=_default_notification_priority)
 
     payload: Mapped[Optional[str]] = mapped_column(Text)
     status: Mapped[NotificationStatus] = mapped_column(Enum(NotificationStatus), default=NotificationStatus.pending)
@@ -191,6 +364,27 @@ class Homework(Base):
     # частый запрос: домашки ученика + сортировка по дедлайну
     __table_args__ = (
         Index("ix_homeworks_student_due", "student_id", "due_at"),
+        # список ДЗ в админке: keyset-пагинация в порядке (due_at DESC NULLS LAST, created_at DESC, id DESC)
+        Index(
+            "ix_homeworks_student_list", "student_id",
+            text("due_at DESC NULLS LAST"), text("created_at DESC"), text("id DESC"),
+        ),
+        # очередь проверки: сданные и ещё не оценённые, по времени сдачи
+        Index(
+            "ix_homeworks_grading_queue", "student_done_at", "id",
+            postgresql_where=text("student_done_at IS NOT NULL AND grade IS NULL"),
+        ),
+        Index("ix_homeworks_grade_notify_pending", "id", postgresql_where=text("grade_notify_pending")),
+        # полнотекстовый поиск по названию и описанию (services.homework.search_homework)
+        Index("ix_homeworks_search", "search_tsv", postgresql_using="gin"),
+        # планировщик напоминаний о дедлайне смотрит только открытые ДЗ
+        Index(
+            "ix_homeworks_open_due", "due_at",
+            postgresql_where=text("student_done_at IS NULL AND grade IS NULL AND due_at IS NOT NULL"),
+        ),
+        # rollup аналитики: изменённые ДЗ и их дни
+        Index("ix_homeworks_updated_at", "updated_at"),
+        Index("ix_homeworks_created_at", "created_at"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -214,6 +408,19 @@ class Homework(Base):
     # оценка/проверка учителем
     grade: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)  # 1..10
     graded_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # название весомее описания; колонку считает Postgres, из кода не пишется
+    search_tsv: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+        deferred=True,
+    )
+
+    # оценка выставлена в очереди проверки, уведомление ещё не разослано (уходит одним сообщением в конце)
+    grade_notify_pending: Mapped[bool] = mapped_column(Boolean, default=False, server_default="false")
 
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
     updated_at: Mapped[datetime] = mapped_column(
@@ -221,3 +428,71 @@ class Homework(Base):
         server_default=func.now(),
         onupdate=func.now(),
     )
+
+
+class HomeworkTemplate(Base):
+    # библиотека заданий для выдачи группе учеников; пополняется при выдаче нового задания
+    __tablename__ = "homework_templates"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    title: Mapped[str] = mapped_column(String(255), unique=True)
+    description: Mapped[str] = mapped_column(Text)
+
+    # список шаблонов в боте — по последнему использованию
+    last_used_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class TelegramFile(Base):
+    # файл, уже лежащий у Telegram: храним только file_id и шлём по нему, байты через бота не ходят.
+    # file_unique_id одинаков у всех копий файла — одна строка на файл, сколько бы ДЗ его ни использовали
+    __tablename__ = "telegram_files"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    file_unique_id: Mapped[str] = mapped_column(String(128), unique=True)
+    file_id: Mapped[str] = mapped_column(String(256))
+    kind: Mapped[str] = mapped_column(String(16))  # photo | document
+    file_name: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+
+class HomeworkAttachment(Base):
+    __tablename__ = "homework_attachments"
+
+    homework_id: Mapped[int] = mapped_column(ForeignKey("homeworks.id", ondelete="CASCADE"), primary_key=True)
+    file_id: Mapped[int] = mapped_column(ForeignKey("telegram_files.id", ondelete="CASCADE"), primary_key=True)
+    position: Mapped[int] = mapped_column(SmallInteger, default=0)
+
+
+class HomeworkTemplateAttachment(Base):
+    __tablename__ = "homework_template_attachments"
+
+    template_id: Mapped[int] = mapped_column(ForeignKey("homework_templates.id", ondelete="CASCADE"), primary_key=True)
+    file_id: Mapped[int] = mapped_column(ForeignKey("telegram_files.id", ondelete="CASCADE"), primary_key=True)
+    position: Mapped[int] = mapped_column(SmallInteger, default=0)
+
+
+class DailyStats(Base):
+    # rollup для аналитики: строка на локальный день (settings.stats_timezone), пересчитывается инкрементально
+    __tablename__ = "daily_stats"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+
+    lessons_done: Mapped[int] = mapped_column(Integer, default=0)
+    lessons_canceled: Mapped[int] = mapped_column(Integer, default=0)
+    revenue: Mapped[float] = mapped_column(Numeric(12, 2), default=0)  # начисления за проведённые в этот день уроки
+    packages_sold: Mapped[int] = mapped_column(Integer, default=0)
+    # оценки ДЗ, выданных в этот день: среднее = сумма / количество
+    hw_graded: Mapped[int] = mapped_column(Integer, default=0)
+    hw_grade_sum: Mapped[int] = mapped_column(Integer, default=0)
+
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class JobState(Base):
+    # водяные знаки фоновых задач: до какого момента изменения уже обработаны
+    __tablename__ = "job_state"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    watermark: Mapped[datetime] = mapped_column(DateTime(timezone=True))
@@ -0,0 +1,29 @@
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import select, func, Date, cast
+
+from ..models import DailyStats
+
+
+async def monthly_stats(session, months: int = 12) -> list[tuple[date, int, int, Decimal, int, Decimal | None]]:
+    """
+    Помесячная сводка из rollup daily_stats (не из исходных таблиц): стоимость — O(дней в окне).
+    (месяц, проведено, отменено, выручка, пакетов продано, средняя оценка ДЗ), свежие месяцы первыми.
+    """
+    month = cast(func.date_trunc("month", DailyStats.day), Date).label("month")
+    graded = func.sum(DailyStats.hw_graded)
+    rows = (await session.execute(
+        select(
+            month,
+            func.sum(DailyStats.lessons_done),
+            func.sum(DailyStats.lessons_canceled),
+            func.sum(DailyStats.revenue),
+            func.sum(DailyStats.packages_sold),
+            func.round(func.sum(DailyStats.hw_grade_sum) / func.nullif(graded, 0), 1),
+        )
+        .group_by(month)
+        .order_by(month.desc())
+        .limit(months)
+    )).all()
+    return [tuple(r) for r in rows]
@@ -0,0 +1,121 @@
+from typing import NamedTuple
+
+from aiogram.types import InputMediaDocument, InputMediaPhoto
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+
+from app.models import TelegramFile, HomeworkAttachment, HomeworkTemplateAttachment
+
+# столько же помещается в один альбом Telegram
+MAX_ATTACHMENTS = 10
+
+
+class IncomingFile(NamedTuple):
+    kind: str  # photo | document
+    file_id: str
+    file_unique_id: str
+    file_name: str | None
+
+
+def incoming_file(message) -> IncomingFile | None:
+    # у фото Telegram присылает несколько размеров — берём самый большой
+    if message.photo:
+        p = message.photo[-1]
+        return IncomingFile("photo", p.file_id, p.file_unique_id, None)
+    if message.document:
+        d = message.document
+        return IncomingFile("document", d.file_id, d.file_unique_id, d.file_name)
+    return None
+
+
+async def save_file(session, f: IncomingFile) -> int:
+    # тот же файл, присланный повторно, — та же строка (file_id просто освежаем)
+    stmt = insert(TelegramFile).values(**f._asdict())
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TelegramFile.file_unique_id],
+        set_={"file_id": stmt.excluded.file_id},
+    )
+    return (await session.execute(stmt.returning(TelegramFile.id))).scalar_one()
+
+
+async def attach_files(session, homework_ids: list[int], file_ids: list[int], *, start: int = 0) -> None:
+    # файлы × ДЗ группы — один многострочный INSERT ссылок, сами файлы не копируются
+    rows = [
+        {"homework_id": hw_id, "file_id": fid, "position": start + i}
+        for hw_id in homework_ids
+        for i, fid in enumerate(file_ids)
+    ]
+    if rows:
+        await session.execute(insert(HomeworkAttachment).values(rows).on_conflict_do_nothing())
+
+
+async def detach_files(session, homework_id: int) -> None:
+    await session.execute(delete(HomeworkAttachment).where(HomeworkAttachment.homework_id == homework_id))
+
+
+async def files_by_homework(session, homework_ids: list[int]) -> dict[int, list[TelegramFile]]:
+    if not homework_ids:
+        return {}
+    rows = (await session.execute(
+        select(HomeworkAttachment.homework_id, TelegramFile)
+        .join(TelegramFile, TelegramFile.id == HomeworkAttachment.file_id)
+        .where(HomeworkAttachment.homework_id.in_(homework_ids))
+        .order_by(HomeworkAttachment.homework_id, HomeworkAttachment.position)
+    )).all()
+    out: dict[int, list[TelegramFile]] = {}
+    for hw_id, f in rows:
+        out.setdefault(hw_id, []).append(f)
+    return out
+
+
+async def homework_files(session, homework_id: int) -> list[TelegramFile]:
+    return (await files_by_homework(session, [homework_id])).get(homework_id, [])
+
+
+async def attachment_count(session, homework_id: int) -> int:
+    return (await session.execute(
+        select(func.count()).where(HomeworkAttachment.homework_id == homework_id)
+    )).scalar_one()
+
+
+async def homework_file_ids(session, homework_id: int) -> list[int]:
+    return list((await session.execute(
+        select(HomeworkAttachment.file_id)
+        .where(HomeworkAttachment.homework_id == homework_id)
+        .order_by(HomeworkAttachment.position)
+    )).scalars().all())
+
+
+async def template_file_ids(session, template_id: int) -> list[int]:
+    return list((await session.execute(
+        select(HomeworkTemplateAttachment.file_id)
+        .where(HomeworkTemplateAttachment.template_id == template_id)
+        .order_by(HomeworkTemplateAttachment.position)
+    )).scalars().all())
+
+
+async def set_template_files(session, template_id: int, file_ids: list[int]) -> None:
+    # у шаблона — вложения последней выдачи
+    await session.execute(
+        delete(HomeworkTemplateAttachment).where(HomeworkTemplateAttachment.template_id == template_id)
+    )
+    if file_ids:
+        await session.execute(insert(HomeworkTemplateAttachment).values([
+            {"template_id": template_id, "file_id": fid, "position": i} for i, fid in enumerate(file_ids)
+        ]))
+
+
+async def send_files(bot, chat_id: int, files: list[TelegramFile]) -> None:
+    """
+    Отправка по file_id: Telegram пересылает файл со своих серверов, бот байты не скачивает и не загружает.
+    Фото и документы в один альбом не смешиваются — по альбому на каждый вид.
+    """
+    for kind, send_one, media in (
+        ("photo", bot.send_photo, InputMediaPhoto),
+        ("document", bot.send_document, InputMediaDocument),
+    ):
+        group = [f.file_id for f in files if f.kind == kind]
+        if len(group) == 1:
+            await send_one(chat_id, group[0])
+        elif group:
+            await bot.send_media_group(chat_id, [media(media=fid) for fid in group])
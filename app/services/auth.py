@@ -18,6 +18,16 @@ async def ensure_teacher_user(session, tg_id: int, full_name: str, teacher_tg_id
     return user
 
 
+async def unblock_user(session, user: User) -> bool:
+    # пользователь снова написал /start — значит, бот разблокирован
+    if user.blocked_at is None:
+        return False
+
+    user.blocked_at = None
+    await session.commit()
+    return True
+
+
 async def register_by_key(session, tg_id: int, full_name: str, key_value: str) -> tuple[bool, str]:
     now = datetime.now(timezone.utc)
 
@@ -0,0 +1,262 @@
+import asyncio
+import csv
+import re
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Iterator, NamedTuple
+
+from sqlalchemy import select, update, values, column, func, Integer, DateTime
+
+from ..models import Lesson, GroupLesson, Student, LessonCharge, ChargeStatus
+
+# заголовки колонок в выгрузках разных банков (сравниваем в нижнем регистре)
+DATE_COLUMNS = ("дата", "дата операции", "дата платежа", "date")
+AMOUNT_COLUMNS = ("сумма", "сумма операции", "сумма платежа", "amount")
+TEXT_COLUMNS = ("назначение платежа", "назначение", "описание", "комментарий", "плательщик", "description", "payer")
+
+DATE_FORMATS = ("%d.%m.%Y", "%Y-%m-%d", "%d.%m.%Y %H:%M", "%d.%m.%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S")
+
+# оплата может прийти заранее (до урока) или с опозданием
+PAID_BEFORE_LESSON = timedelta(days=7)
+PAID_AFTER_LESSON = timedelta(days=60)
+
+
+class StatementLine(NamedTuple):
+    line_no: int
+    paid_on: date
+    amount: Decimal
+    text: str
+
+
+class PendingCharge(NamedTuple):
+    charge_id: int
+    student_id: int
+    amount: Decimal
+    lesson_on: date
+
+
+def normalize(text: str) -> str:
+    return (text or "").lower().replace("ё", "е")
+
+
+def name_tokens(full_name: str) -> set[str]:
+    # инициалы и короткие части имени дают ложные совпадения — не используем
+    return {t for t in re.findall(r"\w+", normalize(full_name)) if len(t) >= 3}
+
+
+def _parse_date(raw: str) -> date | None:
+    raw = (raw or "").strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(raw, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _parse_amount(raw: str) -> Decimal | None:
+    # "1 500,00" / "1500.00" / "-1500" (списания пропускаем)
+    raw = (raw or "").replace("\xa0", "").replace(" ", "").replace(",", ".")
+    try:
+        amount = Decimal(raw)
+    except InvalidOperation:
+        return None
+    return amount if amount > 0 else None
+
+
+def _find_column(header: list[str], names: tuple[str, ...]) -> int | None:
+    normalized = [normalize(h).strip() for h in header]
+    for name in names:
+        if name in normalized:
+            return normalized.index(name)
+    return None
+
+
+def iter_statement_file(path: str) -> Iterator[str]:
+    # выгрузки бывают в utf-8 (часто с BOM) и в cp1251 — определяем по первому куску
+    with open(path, "rb") as f:
+        head = f.read(64 * 1024)
+    try:
+        head.decode("utf-8-sig")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as e:
+        # кусок мог оборваться посреди многобайтного символа
+        encoding = "utf-8-sig" if e.start >= len(head) - 3 else "cp1251"
+
+    with open(path, encoding=encoding, errors="replace", newline="") as f:
+        yield from f
+
+
+def parse_statement(lines: Iterable[str]) -> Iterator[StatementLine | int]:
+    """
+    Потоковый разбор CSV-выписки: строки читаются по одной, файл целиком в память не грузится.
+    Отдаёт StatementLine для распознанных поступлений и номер строки — для нераспознанных.
+    """
+    it = iter(lines)
+    first = next(it, None)
+    if first is None:
+        return
+
+    delimiter = ";" if first.count(";") >= first.count(",") else ","
+    header = next(csv.reader([first], delimiter=delimiter))
+    date_col = _find_column(header, DATE_COLUMNS)
+    amount_col = _find_column(header, AMOUNT_COLUMNS)
+    text_cols = [i for i in (_find_column(header, (name,)) for name in TEXT_COLUMNS) if i is not None]
+    if date_col is None or amount_col is None:
+        raise ValueError("Не нашёл колонки с датой и суммой в заголовке выписки")
+
+    for line_no, row in enumerate(csv.reader(it, delimiter=delimiter), start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        if len(row) <= max(date_col, amount_col):
+            yield line_no
+            continue
+
+        paid_on = _parse_date(row[date_col])
+        amount = _parse_amount(row[amount_col])
+        if paid_on is None or amount is None:
+            yield line_no
+            continue
+
+        text = " ".join(row[i] for i in text_cols if i < len(row))
+        yield StatementLine(line_no, paid_on, amount, text)
+
+
+class ChargeIndex:
+    """
+    In-memory индекс pending-начислений: сумма -> начисления, ученик -> начисления (по дате урока),
+    токен имени -> ученики. Совпавшие начисления вычёркиваются, чтобы одна оплата не закрыла урок дважды.
+    """
+
+    def __init__(self, charges: list[PendingCharge], students: dict[int, str]):
+        self.by_amount: dict[Decimal, list[PendingCharge]] = defaultdict(list)
+        self.by_student: dict[int, list[PendingCharge]] = defaultdict(list)
+        for ch in sorted(charges, key=lambda c: (c.lesson_on, c.charge_id)):
+            self.by_amount[ch.amount].append(ch)
+            self.by_student[ch.student_id].append(ch)
+
+        self.by_token: dict[str, set[int]] = defaultdict(set)
+        for student_id, full_name in students.items():
+            for token in name_tokens(full_name):
+                self.by_token[token].add(student_id)
+
+        self.used: set[int] = set()
+
+    def students_in(self, text: str) -> set[int]:
+        found: set[int] = set()
+        for token in set(re.findall(r"\w+", normalize(text))):
+            found |= self.by_token.get(token, set())
+        return found
+
+    def match(self, line: StatementLine) -> list[PendingCharge]:
+        student_ids = self.students_in(line.text)
+        if not student_ids:
+            return []
+
+        def fits(ch: PendingCharge) -> bool:
+            return (
+                ch.charge_id not in self.used
+                and line.paid_on - PAID_AFTER_LESSON <= ch.lesson_on <= line.paid_on + PAID_BEFORE_LESSON
+            )
+
+        # 1) одно начисление на ту же сумму — ближайшее по дате
+        single = [ch for ch in self.by_amount.get(line.amount, []) if ch.student_id in student_ids and fits(ch)]
+        if single:
+            best = min(single, key=lambda ch: (abs((line.paid_on - ch.lesson_on).days), ch.lesson_on))
+            self.used.add(best.charge_id)
+            return [best]
+
+        # 2) оплата за несколько уроков одного ученика: самые ранние неоплаченные в сумме дают платёж
+        for student_id in sorted(student_ids):
+            picked, total = [], Decimal(0)
+            for ch in self.by_student.get(student_id, []):
+                if not fits(ch):
+                    continue
+                picked.append(ch)
+                total += ch.amount
+                if total >= line.amount:
+                    break
+            if len(picked) > 1 and total == line.amount:
+                self.used.update(ch.charge_id for ch in picked)
+                return picked
+
+        return []
+
+
+def match_statement(
+    lines: Iterable[str], index: ChargeIndex
+) -> tuple[list[tuple[int, date]], list[StatementLine | int], Decimal]:
+    """
+    Синхронная часть импорта (гоняется в asyncio.to_thread).
+    Возвращает ([(charge_id, дата оплаты)], несопоставленные строки, сумма сопоставленного);
+    нераспознанная строка в unmatched — просто её номер.
+    """
+    matched: list[tuple[int, date]] = []
+    unmatched: list[StatementLine | int] = []
+    matched_sum = Decimal(0)
+
+    for item in parse_statement(lines):
+        if isinstance(item, int):
+            unmatched.append(item)
+            continue
+        charges = index.match(item)
+        if not charges:
+            unmatched.append(item)
+            continue
+        matched.extend((ch.charge_id, item.paid_on) for ch in charges)
+        matched_sum += item.amount
+
+    return matched, unmatched, matched_sum
+
+
+async def load_charge_index(session) -> ChargeIndex:
+    rows = (await session.execute(
+        select(
+            LessonCharge.id, LessonCharge.student_id, LessonCharge.amount,
+            # начисление — за индивидуальный урок или за групповое занятие
+            func.coalesce(Lesson.start_at, GroupLesson.start_at),
+            Student.full_name,
+        )
+        .outerjoin(Lesson, Lesson.id == LessonCharge.lesson_id)
+        .outerjoin(GroupLesson, GroupLesson.id == LessonCharge.group_lesson_id)
+        .join(Student, Student.id == LessonCharge.student_id)
+        .where(LessonCharge.status == ChargeStatus.pending)
+    )).all()
+
+    charges = [
+        PendingCharge(charge_id, student_id, Decimal(amount), start_at.date())
+        for charge_id, student_id, amount, start_at, _name in rows
+    ]
+    students = {student_id: name for _cid, student_id, _a, _s, name in rows}
+    return ChargeIndex(charges, students)
+
+
+async def apply_matches(session, matched: list[tuple[int, date]]) -> int:
+    """Все сопоставленные начисления -> paid одним UPDATE ... FROM (VALUES ...)."""
+    if not matched:
+        return 0
+
+    paid = values(column("charge_id", Integer), column("paid_at", DateTime(timezone=True)), name="paid").data([
+        (charge_id, datetime(d.year, d.month, d.day, tzinfo=timezone.utc)) for charge_id, d in matched
+    ])
+    updated = (await session.execute(
+        update(LessonCharge)
+        .where(LessonCharge.id == paid.c.charge_id, LessonCharge.status == ChargeStatus.pending)
+        .values(status=ChargeStatus.paid, paid_at=paid.c.paid_at)
+        .returning(LessonCharge.id)
+        .execution_options(synchronize_session=False)
+    )).scalars().all()
+    await session.commit()
+    return len(updated)
+
+
+async def import_statement(session, path: str) -> dict:
+    """
+    Импорт выписки: индекс pending-начислений строится одним запросом, разбор и сопоставление
+    идут в отдельном потоке, все совпадения применяются одной транзакцией.
+    """
+    index = await load_charge_index(session)
+    matched, unmatched, matched_sum = await asyncio.to_thread(match_statement, iter_statement_file(path), index)
+    paid = await apply_matches(session, matched)
+    return {"paid": paid, "sum": matched_sum, "unmatched": unmatched}
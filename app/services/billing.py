@@ -1,103 +1,455 @@
 from datetime import datetime, timezone
-from sqlalchemy import select, update
+from typing import NamedTuple
+
+from aiogram.exceptions import TelegramForbiddenError
+from sqlalchemy import select, update, or_, literal, func, exists, values, column, Integer
 from sqlalchemy.dialects.postgresql import insert
 
 from ..models import (
-    Lesson, LessonStatus, Student, BillingMode,
-    StudentBalance, LessonCharge, ChargeStatus,
-    ParentStudent, Parent, User
+    Lesson, LessonStatus, Student, BillingMode, InvoicePeriod,
+    StudentBalance, BalanceEntry, BalanceReason, LessonCharge, ChargeStatus,
+    ParentStudent, Parent, User, Notification, notification_priority,
+    GroupLesson, LessonGroupMember,
 )
 from ..utils_time import fmt_dt_for_tz
+from .notifications import mark_user_blocked
+from .schedule import bump_schedule_version, bump_group_schedule_version
 
 
-async def mark_lesson_done(session, bot, lesson_id: int) -> int | None:
-    lesson = (await session.execute(select(Lesson).where(Lesson.id == lesson_id))).scalar_one()
+class LessonDone(NamedTuple):
+    done: bool  # False — урок уже не был planned, нажатие ничего не изменило
+    charge_id: int | None  # pending-начисление за урок (single)
 
-    if lesson.status != LessonStatus.planned:
-        return None
 
-    student = (await session.execute(select(Student).where(Student.id == lesson.student_id))).scalar_one()
+def lesson_done_text(full_name: str, when: str, tzname: str, charge_status: ChargeStatus, amount) -> str:
+    if charge_status == ChargeStatus.paid:
+        pay_line = "Оплата: отмечена"
+    else:
+        pay_line = f"К оплате: {amount}"
+    return (
+        f"Урок проведён.\n"
+        f"Ученик: {full_name}\n"
+        f"Дата/время: {when} ({tzname})\n"
+        f"{pay_line}"
+    )
+
+
+async def _open_ledger(session, before: dict[int, int]) -> None:
+    """
+    Первое движение по балансу, заведённому до журнала: сначала фиксируем остаток «до движения»
+    записью opening — иначе сверка заменит снимок суммой одних только новых записей.
+    before: student_id -> остаток до движения. Вызывать под блокировкой строки баланса,
+    до записи самого движения.
+    """
+    rows = [(sid, left) for sid, left in before.items() if left != 0]
+    if not rows:
+        return
+    src = values(column("student_id", Integer), column("delta", Integer), name="opening").data(rows)
+    await session.execute(
+        insert(BalanceEntry).from_select(
+            ["student_id", "delta", "reason"],
+            select(src.c.student_id, src.c.delta, literal(BalanceReason.opening, BalanceEntry.reason.type))
+            .where(~exists().where(BalanceEntry.student_id == src.c.student_id)),
+        )
+    )
+
 
-    lesson.status = LessonStatus.done
-    lesson.done_at = datetime.now(timezone.utc)
+async def mark_lesson_done(session, bot, lesson_id: int) -> LessonDone:
+    now = datetime.now(timezone.utc)
+
+    # planned -> done одним условным UPDATE: из двух параллельных нажатий (или реплик бота)
+    # строку получит только один, второй увидит уже done и ничего не сделает
+    done = (await session.execute(
+        update(Lesson)
+        .where(
+            Lesson.id == lesson_id,
+            Lesson.status == LessonStatus.planned,
+            Student.id == Lesson.student_id,
+        )
+        .values(status=LessonStatus.done, done_at=now)
+        .returning(
+            Lesson.start_at,
+            Student.id,
+            Student.full_name,
+            Student.billing_mode,
+            Student.price_per_lesson,
+            Student.invoice_period,
+        )
+    )).one_or_none()
+
+    if done is None:
+        return LessonDone(False, None)
+
+    start_at, student_id, full_name, billing_mode, price_per_lesson, invoice_period = done
+    # урок ушёл из «ближайших» — кэш экранов расписания должен пересобраться
+    await bump_schedule_version(session, [student_id])
 
     # subscription -> списание
-    if student.billing_mode == BillingMode.subscription:
-        bal = (await session.execute(
-            select(StudentBalance).where(StudentBalance.student_id == student.id)
+    if billing_mode == BillingMode.subscription:
+        # декремент в БД под блокировкой строки: не уходит в минус и не теряет параллельные списания
+        left = (await session.execute(
+            update(StudentBalance)
+            .where(StudentBalance.student_id == student_id, StudentBalance.lessons_left > 0)
+            .values(lessons_left=StudentBalance.lessons_left - 1)
+            .returning(StudentBalance.lessons_left)
         )).scalar_one_or_none()
 
-        if not bal:
-            bal = StudentBalance(student_id=student.id, lessons_left=0)
-            session.add(bal)
-            await session.flush()
-
-        if bal.lessons_left > 0:
-            bal.lessons_left -= 1
+        if left is not None:
+            await _open_ledger(session, {student_id: left + 1})
+            session.add(BalanceEntry(
+                student_id=student_id, delta=-1, reason=BalanceReason.lesson, lesson_id=lesson_id,
+            ))
+        else:
+            # баланса нет или он нулевой — гарантируем строку, ничего не списывая
+            await session.execute(
+                insert(StudentBalance)
+                .values(student_id=student_id, lessons_left=0)
+                .on_conflict_do_nothing(index_elements=[StudentBalance.student_id])
+            )
 
         await session.commit()
-        return None
+        return LessonDone(True, None)
 
     # single -> начисление (если ещё не было) + уведомление родителям
-    if not student.price_per_lesson:
+    if not price_per_lesson:
         raise ValueError("Для single нужен price_per_lesson у ученика")
 
     # если оплатили заранее (или уже есть pending) — не создаём новый charge
-    existing = (await session.execute(
-        select(LessonCharge).where(LessonCharge.lesson_id == lesson.id)
-    )).scalar_one_or_none()
-
-    if existing is None:
-        charge = LessonCharge(
-            lesson_id=lesson.id,
-            student_id=student.id,
-            amount=float(student.price_per_lesson),
-            status=ChargeStatus.pending
+    charge = (await session.execute(
+        insert(LessonCharge)
+        .values(
+            lesson_id=lesson_id,
+            student_id=student_id,
+            amount=float(price_per_lesson),
+            status=ChargeStatus.pending,
         )
-        session.add(charge)
-        await session.flush()
-    else:
-        charge = existing  # pending или paid
+        .on_conflict_do_nothing(index_elements=[LessonCharge.lesson_id])
+        .returning(LessonCharge.id, LessonCharge.status, LessonCharge.amount)
+    )).one_or_none()
 
-    # всем родителям
-    parent_ids = (await session.execute(
-        select(ParentStudent.parent_id).where(ParentStudent.student_id == student.id)
+    if charge is None:
+        charge = (await session.execute(
+            select(LessonCharge.id, LessonCharge.status, LessonCharge.amount)
+            .where(LessonCharge.lesson_id == lesson_id)
+        )).one()  # pending или paid
+
+    charge_id, charge_status, charge_amount = charge
+
+    if invoice_period != InvoicePeriod.per_lesson:
+        # начисление копится до периодической сводки (jobs_billing.plan_invoices_job)
+        await session.commit()
+        return LessonDone(True, charge_id if charge_status == ChargeStatus.pending else None)
+
+    # всем родителям; заблокировавшим бота не пишем
+    parent_users = (await session.execute(
+        select(User)
+        .join(Parent, Parent.user_id == User.id)
+        .join(ParentStudent, ParentStudent.parent_id == Parent.id)
+        .where(ParentStudent.student_id == student_id, User.blocked_at.is_(None))
     )).scalars().all()
 
-    if parent_ids:
-        parent_user_ids = (await session.execute(
-            select(Parent.user_id).where(Parent.id.in_(parent_ids))
-        )).scalars().all()
-
-        parent_users = (await session.execute(
-            select(User).where(User.id.in_(parent_user_ids))
-        )).scalars().all()
-
-        for pu in parent_users:
-            when = fmt_dt_for_tz(lesson.start_at, pu.timezone)
-            tzname = pu.timezone or "Europe/Moscow"
-
-            if charge.status == ChargeStatus.paid:
-                text = (
-                    f"Урок проведён.\n"
-                    f"Ученик: {student.full_name}\n"
-                    f"Дата/время: {when} ({tzname})\n"
-                    f"Оплата: отмечена"
-                )
-            else:
-                text = (
-                    f"Урок проведён.\n"
-                    f"Ученик: {student.full_name}\n"
-                    f"Дата/время: {when} ({tzname})\n"
-                    f"К оплате: {charge.amount}"
-                )
+    # фиксируем переход до рассылки: сообщения уходят только после того, как урок точно наш
+    await session.commit()
+
+    for pu in parent_users:
+        when = fmt_dt_for_tz(start_at, pu.timezone)
+        tzname = pu.timezone or "Europe/Moscow"
+
+        text = lesson_done_text(full_name, when, tzname, charge_status, charge_amount)
 
+        try:
             await bot.send_message(pu.tg_id, text)
+        except TelegramForbiddenError:
+            await mark_user_blocked(session, pu.id, datetime.now(timezone.utc))
+            await session.commit()
+
+    # charge.id — только если он pending (может пригодиться, но в новой схеме не обязательно)
+    return LessonDone(True, charge_id if charge_status == ChargeStatus.pending else None)
+
+
+async def mark_lessons_done_bulk(session, lesson_ids: list[int]) -> dict:
+    """
+    «Провести» сразу много уроков одной транзакцией, без поштучных mark_lesson_done:
+    один UPDATE уроков, пакетное списание абонементов (+ журнал), один INSERT начислений
+    и один INSERT уведомлений родителям (уходят через очередь, склеиваются по получателю).
+    single-уроки без цены не трогаем — они остаются planned и возвращаются в "skipped".
+    """
+    now = datetime.now(timezone.utc)
+    result = {"done": 0, "charged": 0, "charges": 0, "skipped": []}
+    if not lesson_ids:
+        return result
+
+    done_rows = (await session.execute(
+        update(Lesson)
+        .where(
+            Lesson.id.in_(lesson_ids),
+            Lesson.status == LessonStatus.planned,
+            Student.id == Lesson.student_id,
+            or_(Student.billing_mode == BillingMode.subscription, Student.price_per_lesson.is_not(None)),
+        )
+        .values(status=LessonStatus.done, done_at=now)
+        .returning(Lesson.id, Lesson.student_id, Lesson.start_at, Student.billing_mode)
+    )).all()
+
+    done_ids = [r.id for r in done_rows]
+    result["done"] = len(done_ids)
+    result["skipped"] = (await session.execute(
+        select(Lesson.id)
+        .join(Student, Student.id == Lesson.student_id)
+        .where(
+            Lesson.id.in_(lesson_ids),
+            Lesson.status == LessonStatus.planned,
+            Student.billing_mode == BillingMode.single,
+            Student.price_per_lesson.is_(None),
+        )
+        .order_by(Lesson.start_at)
+    )).scalars().all()
+
+    if not done_ids:
+        await session.commit()
+        return result
+    await bump_schedule_version(session, {r.student_id for r in done_rows})
+
+    # subscription: по ученику списываем столько уроков, сколько покрывает остаток (раньше — раньше)
+    sub_lessons: dict[int, list[int]] = {}
+    for r in sorted(done_rows, key=lambda r: r.start_at):
+        if r.billing_mode == BillingMode.subscription:
+            sub_lessons.setdefault(r.student_id, []).append(r.id)
+
+    if sub_lessons:
+        await session.execute(
+            insert(StudentBalance)
+            .values([{"student_id": sid, "lessons_left": 0} for sid in sub_lessons])
+            .on_conflict_do_nothing(index_elements=[StudentBalance.student_id])
+        )
+        balances = dict((await session.execute(
+            select(StudentBalance.student_id, StudentBalance.lessons_left)
+            .where(StudentBalance.student_id.in_(sub_lessons))
+            .with_for_update()
+        )).all())
+
+        new_left, entries = [], []
+        for sid, lids in sub_lessons.items():
+            charged = lids[:max(0, balances[sid])]
+            if not charged:
+                continue
+            new_left.append({"student_id": sid, "lessons_left": balances[sid] - len(charged)})
+            entries.extend(
+                {"student_id": sid, "delta": -1, "reason": BalanceReason.lesson, "lesson_id": lid}
+                for lid in charged
+            )
+
+        if new_left:
+            await _open_ledger(session, {r["student_id"]: balances[r["student_id"]] for r in new_left})
+            await session.execute(update(StudentBalance), new_left)  # bulk UPDATE по PK
+            await session.execute(insert(BalanceEntry), entries)
+        result["charged"] = len(entries)
+
+    # single: начисления одним INSERT ... SELECT (заранее оплаченные/существующие не трогаем)
+    charge_ids = (await session.execute(
+        insert(LessonCharge)
+        .from_select(
+            ["lesson_id", "student_id", "amount", "status"],
+            select(
+                Lesson.id, Lesson.student_id, Student.price_per_lesson,
+                literal(ChargeStatus.pending, LessonCharge.status.type),
+            )
+            .join(Student, Student.id == Lesson.student_id)
+            .where(Lesson.id.in_(done_ids), Student.billing_mode == BillingMode.single),
+        )
+        .on_conflict_do_nothing(index_elements=[LessonCharge.lesson_id])
+        .returning(LessonCharge.id)
+    )).scalars().all()
+    result["charges"] = len(charge_ids)
+
+    # уведомления родителям single-учеников (без периодических счетов): в очередь, текст соберётся при отправке
+    await session.execute(
+        insert(Notification)
+        .from_select(
+            ["user_id", "type", "entity_id", "send_at", "priority"],
+            select(
+                User.id,
+                literal("lesson_done"),
+                Lesson.id,
+                literal(now),
+                literal(int(notification_priority("lesson_done"))),
+            )
+            .select_from(Lesson)
+            .join(Student, Student.id == Lesson.student_id)
+            .join(ParentStudent, ParentStudent.student_id == Lesson.student_id)
+            .join(Parent, Parent.id == ParentStudent.parent_id)
+            .join(User, User.id == Parent.user_id)
+            .where(
+                Lesson.id.in_(done_ids),
+                Student.billing_mode == BillingMode.single,
+                Student.invoice_period == InvoicePeriod.per_lesson,
+                User.blocked_at.is_(None),
+            )
+        )
+        .on_conflict_do_nothing(index_elements=["user_id", "type", "entity_id", "send_at"])
+    )
+
+    await session.commit()
+    return result
+
+
+async def mark_group_lesson_done(session, group_lesson_id: int) -> dict | None:
+    """
+    «Проведено» для группового занятия: биллинг раскладывается на участников пакетными запросами,
+    число запросов не зависит от размера группы. Каждый участник — по своему тарифу:
+    subscription — списание (кому хватает остатка), single — начисление, родителям single
+    с per_lesson — одно уведомление через очередь. single без цены пропускаются ("skipped").
+    None — занятие уже отмечено.
+    """
+    now = datetime.now(timezone.utc)
+    group_id = (await session.execute(
+        update(GroupLesson)
+        .where(GroupLesson.id == group_lesson_id, GroupLesson.status == LessonStatus.planned)
+        .values(status=LessonStatus.done, done_at=now)
+        .returning(GroupLesson.group_id)
+    )).scalar_one_or_none()
+    if group_id is None:
+        return None
+
+    result = {"charged": 0, "charges": 0, "skipped": []}
+    members = select(LessonGroupMember.student_id).where(LessonGroupMember.group_id == group_id)
+    subscribers = select(Student.id).where(Student.id.in_(members), Student.billing_mode == BillingMode.subscription)
+    await bump_group_schedule_version(session, [group_id])
+
+    # subscription: строка баланса гарантирована, списание — одним условным UPDATE (в минус не уходит)
+    await session.execute(
+        insert(StudentBalance)
+        .from_select(
+            ["student_id", "lessons_left"],
+            select(Student.id, literal(0)).where(Student.id.in_(members), Student.billing_mode == BillingMode.subscription),
+        )
+        .on_conflict_do_nothing(index_elements=[StudentBalance.student_id])
+    )
+    charged = dict((await session.execute(
+        update(StudentBalance)
+        .where(StudentBalance.student_id.in_(subscribers), StudentBalance.lessons_left > 0)
+        .values(lessons_left=StudentBalance.lessons_left - 1)
+        .returning(StudentBalance.student_id, StudentBalance.lessons_left)
+    )).all())
+    if charged:
+        await _open_ledger(session, {sid: left + 1 for sid, left in charged.items()})
+        await session.execute(insert(BalanceEntry), [
+            {"student_id": sid, "delta": -1, "reason": BalanceReason.lesson, "group_lesson_id": group_lesson_id}
+            for sid in charged
+        ])
+    result["charged"] = len(charged)
+
+    # single: начисления одним INSERT ... SELECT
+    charge_ids = (await session.execute(
+        insert(LessonCharge)
+        .from_select(
+            ["group_lesson_id", "student_id", "amount", "status"],
+            select(
+                literal(group_lesson_id), Student.id, Student.price_per_lesson,
+                literal(ChargeStatus.pending, LessonCharge.status.type),
+            )
+            .where(
+                Student.id.in_(members),
+                Student.billing_mode == BillingMode.single,
+                Student.price_per_lesson.is_not(None),
+            ),
+        )
+        .on_conflict_do_nothing(
+            index_elements=[LessonCharge.group_lesson_id, LessonCharge.student_id],
+            index_where=LessonCharge.group_lesson_id.is_not(None),
+        )
+        .returning(LessonCharge.id)
+    )).scalars().all()
+    result["charges"] = len(charge_ids)
+    result["skipped"] = (await session.execute(
+        select(Student.id)
+        .where(
+            Student.id.in_(members),
+            Student.billing_mode == BillingMode.single,
+            Student.price_per_lesson.is_(None),
+        )
+        .order_by(Student.id)
+    )).scalars().all()
+
+    # родителям: одна строка очереди на родителя, текст по всем его детям соберётся при отправке
+    await session.execute(
+        insert(Notification)
+        .from_select(
+            ["user_id", "type", "entity_id", "send_at", "priority"],
+            select(
+                User.id,
+                literal("group_lesson_done"),
+                literal(group_lesson_id),
+                literal(now),
+                literal(int(notification_priority("group_lesson_done"))),
+            )
+            .select_from(LessonCharge)
+            .join(Student, Student.id == LessonCharge.student_id)
+            .join(ParentStudent, ParentStudent.student_id == Student.id)
+            .join(Parent, Parent.id == ParentStudent.parent_id)
+            .join(User, User.id == Parent.user_id)
+            .where(
+                LessonCharge.group_lesson_id == group_lesson_id,
+                Student.invoice_period == InvoicePeriod.per_lesson,
+                User.blocked_at.is_(None),
+            )
+            .distinct()
+        )
+        .on_conflict_do_nothing(index_elements=["user_id", "type", "entity_id", "send_at"])
+    )
 
     await session.commit()
+    return result
+
 
-    # Возвращаем charge.id только если он pending (может пригодиться, но в новой схеме не обязательно)
-    return charge.id if charge.status == ChargeStatus.pending else None
+async def unpaid_totals(session) -> tuple[int, int, float]:
+    # (учеников, начислений, сумма) по всем pending
+    students, charges, total = (await session.execute(
+        select(
+            func.count(func.distinct(LessonCharge.student_id)),
+            func.count(),
+            func.coalesce(func.sum(LessonCharge.amount), 0),
+        )
+        .where(LessonCharge.status == ChargeStatus.pending)
+    )).one()
+    return students, charges, total
+
+
+async def unpaid_by_student(
+    session, after_student_id: int = 0, limit: int = 10, *, student_id: int | None = None
+) -> list:
+    """
+    Неоплаченные начисления по ученикам одним GROUP BY.
+    Keyset-пагинация по student_id: следующая страница — after_student_id = последний id.
+    """
+    stmt = (
+        select(
+            LessonCharge.student_id,
+            Student.full_name,
+            func.count().label("cnt"),
+            func.sum(LessonCharge.amount).label("total"),
+        )
+        .join(Student, Student.id == LessonCharge.student_id)
+        .where(LessonCharge.status == ChargeStatus.pending, LessonCharge.student_id > after_student_id)
+        .group_by(LessonCharge.student_id, Student.full_name)
+        .order_by(LessonCharge.student_id)
+        .limit(limit)
+    )
+    if student_id is not None:
+        stmt = stmt.where(LessonCharge.student_id == student_id)
+    return (await session.execute(stmt)).all()
+
+
+async def mark_student_charges_paid(session, student_id: int) -> tuple[int, float]:
+    # все pending ученика -> paid одним UPDATE; возвращает (сколько, на какую сумму)
+    amounts = (await session.execute(
+        update(LessonCharge)
+        .where(LessonCharge.student_id == student_id, LessonCharge.status == ChargeStatus.pending)
+        .values(status=ChargeStatus.paid, paid_at=datetime.now(timezone.utc))
+        .returning(LessonCharge.amount)
+    )).scalars().all()
+    await session.commit()
+    return len(amounts), sum(amounts, 0)
 
 
 async def mark_charge_paid(session, charge_id: int):
@@ -110,6 +462,35 @@ async def mark_charge_paid(session, charge_id: int):
     await session.commit()
 
 
+async def _apply_balance_delta(
+    session, student_id: int, delta: int, reason: BalanceReason, comment: str | None = None
+) -> int | None:
+    """
+    Движение по абонементу: запись в журнал + изменение снимка в одной транзакции.
+    Снимок не уходит в минус: если списание больше остатка — ничего не меняем и возвращаем None.
+    """
+    if delta >= 0:
+        stmt = insert(StudentBalance).values(student_id=student_id, lessons_left=delta)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[StudentBalance.student_id],   # PK
+            set_={"lessons_left": StudentBalance.lessons_left + delta},
+        )
+    else:
+        stmt = (
+            update(StudentBalance)
+            .where(StudentBalance.student_id == student_id, StudentBalance.lessons_left + delta >= 0)
+            .values(lessons_left=StudentBalance.lessons_left + delta)
+        )
+    left = (await session.execute(stmt.returning(StudentBalance.lessons_left))).scalar_one_or_none()
+    if left is None:
+        return None
+
+    await _open_ledger(session, {student_id: left - delta})
+    session.add(BalanceEntry(student_id=student_id, delta=delta, reason=reason, comment=comment))
+    await session.flush()
+    return left
+
+
 async def add_subscription_package(session, student_id: int, lessons: int) -> int:
     if lessons not in (8, 12):
         raise ValueError("Пакет может быть только 8 или 12 уроков")
@@ -118,18 +499,35 @@ async def add_subscription_package(session, student_id: int, lessons: int) -> in
     if st.billing_mode != BillingMode.subscription:
         raise ValueError("Пополнение пакетом доступно только для subscription")
 
-    stmt = insert(StudentBalance).values(student_id=student_id, lessons_left=lessons)
-    stmt = stmt.on_conflict_do_update(
-        index_elements=[StudentBalance.student_id],   # PK
-        set_={"lessons_left": StudentBalance.lessons_left + lessons},
-    )
-    await session.execute(stmt)
+    left = await _apply_balance_delta(session, student_id, lessons, BalanceReason.package)
     await session.commit()
+    return left
+
+
+async def correct_balance(session, student_id: int, delta: int, comment: str | None = None) -> int:
+    st = (await session.execute(select(Student).where(Student.id == student_id))).scalar_one()
+    if st.billing_mode != BillingMode.subscription:
+        raise ValueError("Корректировка доступна только для subscription")
+    if delta == 0:
+        raise ValueError("Корректировка на 0 уроков не имеет смысла")
+
+    left = await _apply_balance_delta(session, student_id, delta, BalanceReason.correction, comment)
+    if left is None:
+        raise ValueError("Нельзя списать больше, чем осталось уроков")
+
+    await session.commit()
+    return left
+
+
+async def balance_history(session, student_id: int, limit: int = 20) -> list[BalanceEntry]:
+    # последние движения, новые сверху
+    return list((await session.execute(
+        select(BalanceEntry)
+        .where(BalanceEntry.student_id == student_id)
+        .order_by(BalanceEntry.id.desc())
+        .limit(limit)
+    )).scalars().all())
 
-    bal = (await session.execute(
-        select(StudentBalance).where(StudentBalance.student_id == student_id)
-    )).scalar_one()
-    return bal.lessons_left
 
 async def mark_lesson_paid_anytime(session, lesson_id: int) -> int:
     lesson = (await session.execute(select(Lesson).where(Lesson.id == lesson_id))).scalar_one()
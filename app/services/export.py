@@ -0,0 +1,175 @@
+import asyncio
+import csv
+import enum
+import os
+from datetime import datetime
+from decimal import Decimal
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import select, func, literal, literal_column, union_all
+
+from ..models import Lesson, LessonCharge, Homework, Student, GroupLesson, LessonGroup
+
+try:
+    import openpyxl
+except ImportError:  # XLSX — опционально: без openpyxl доступна только выгрузка в CSV
+    openpyxl = None
+
+# сколько строк за раз тянуть курсором и отдавать писателю: память ограничена одной пачкой
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_HEADERS = {
+    "lessons": ["id", "ученик", "группа", "начало", "длительность, мин", "статус", "тема", "проведён"],
+    "charges": ["id", "урок", "групповое занятие", "ученик", "начало урока", "сумма", "статус", "оплачено"],
+    "homeworks": ["id", "ученик", "название", "выдано", "дедлайн", "сдано", "оценка", "проверено"],
+}
+
+
+def xlsx_available() -> bool:
+    return openpyxl is not None
+
+
+def export_query(kind: str, start: datetime, end: datetime):
+    if kind == "lessons":
+        lessons = (
+            select(
+                Lesson.id.label("id"), Student.full_name, literal(None).label("group_title"),
+                Lesson.start_at.label("start_at"), Lesson.duration_min, Lesson.status, Lesson.topic, Lesson.done_at,
+            )
+            .join(Student, Student.id == Lesson.student_id)
+            .where(Lesson.start_at >= start, Lesson.start_at < end)
+        )
+        # групповое занятие — одной строкой, без ученика: участники видны в начислениях
+        group_lessons = (
+            select(
+                GroupLesson.id, literal(None), LessonGroup.title,
+                GroupLesson.start_at, GroupLesson.duration_min, GroupLesson.status, literal(None), GroupLesson.done_at,
+            )
+            .join(LessonGroup, LessonGroup.id == GroupLesson.group_id)
+            .where(GroupLesson.start_at >= start, GroupLesson.start_at < end)
+        )
+        return union_all(lessons, group_lessons).order_by(
+            "start_at", literal_column("group_title").nulls_first(), "id",
+        )
+    if kind == "charges":
+        # начисление — либо за урок, либо за групповое занятие
+        start_at = func.coalesce(Lesson.start_at, GroupLesson.start_at)
+        return (
+            select(
+                LessonCharge.id, LessonCharge.lesson_id, LessonCharge.group_lesson_id, Student.full_name, start_at,
+                LessonCharge.amount, LessonCharge.status, LessonCharge.paid_at,
+            )
+            .outerjoin(Lesson, Lesson.id == LessonCharge.lesson_id)
+            .outerjoin(GroupLesson, GroupLesson.id == LessonCharge.group_lesson_id)
+            .join(Student, Student.id == LessonCharge.student_id)
+            .where(start_at >= start, start_at < end)
+            .order_by(start_at, LessonCharge.id)
+        )
+    if kind == "homeworks":
+        return (
+            select(
+                Homework.id, Student.full_name, Homework.title, Homework.created_at,
+                Homework.due_at, Homework.student_done_at, Homework.grade, Homework.graded_at,
+            )
+            .join(Student, Student.id == Homework.student_id)
+            .where(Homework.created_at >= start, Homework.created_at < end)
+            .order_by(Homework.created_at, Homework.id)
+        )
+    raise ValueError(f"Unknown export kind: {kind}")
+
+
+async def stream_batches(session, stmt, batch_size: int = EXPORT_BATCH_SIZE):
+    # серверный курсор: строки приходят пачками по batch_size, весь результат в память не грузится
+    result = await session.stream(stmt.execution_options(yield_per=batch_size))
+    async for part in result.partitions(batch_size):
+        yield part
+
+
+def format_cell(value, tz: ZoneInfo):
+    if isinstance(value, datetime):
+        return value.astimezone(tz).strftime("%Y-%m-%d %H:%M")
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return str(value)
+    return "" if value is None else value
+
+
+class CsvSink:
+    # все методы синхронные и вызываются через asyncio.to_thread
+    def __init__(self, path: str):
+        # utf-8-sig: Excel открывает кириллицу без танцев с кодировкой
+        self.f = open(path, "w", encoding="utf-8-sig", newline="")
+        self.writer = csv.writer(self.f, delimiter=";")
+
+    def sheet(self, header: list[str]) -> None:
+        self.writer.writerow(header)
+
+    def write(self, rows, tz: ZoneInfo) -> None:
+        self.writer.writerows([format_cell(v, tz) for v in row] for row in rows)
+
+    def close(self) -> None:
+        self.f.close()
+
+
+class XlsxSink:
+    # write_only: строки сбрасываются во временные файлы openpyxl, а не копятся в памяти
+    def __init__(self, path: str):
+        self.path = path
+        self.wb = openpyxl.Workbook(write_only=True)
+        self.ws = None
+
+    def sheet(self, header: list[str], title: str = "") -> None:
+        self.ws = self.wb.create_sheet(title=title)
+        self.ws.append(header)
+
+    def write(self, rows, tz: ZoneInfo) -> None:
+        for row in rows:
+            self.ws.append([format_cell(v, tz) for v in row])
+
+    def close(self) -> None:
+        self.wb.save(self.path)
+
+
+async def _write_kind(session, sink, kind: str, start: datetime, end: datetime, tz: ZoneInfo, batch_size: int) -> int:
+    count = 0
+    async for batch in stream_batches(session, export_query(kind, start, end), batch_size):
+        # форматирование и запись — в пуле потоков, event loop занят только чтением из БД
+        await asyncio.to_thread(sink.write, batch, tz)
+        count += len(batch)
+    return count
+
+
+async def export_data(
+    session, start: datetime, end: datetime, tzname: str, fmt: str, directory: str,
+    *, batch_size: int = EXPORT_BATCH_SIZE,
+) -> list[str]:
+    """
+    Выгрузка уроков, начислений и ДЗ за [start, end) в directory.
+    csv — по файлу на раздел, xlsx — одна книга с листами. Возвращает пути к файлам.
+    """
+    tz = ZoneInfo(tzname)
+    suffix = f"{start.astimezone(tz):%Y%m%d}-{end.astimezone(tz):%Y%m%d}"
+
+    if fmt == "xlsx":
+        if openpyxl is None:
+            raise RuntimeError("openpyxl is not installed")
+        path = os.path.join(directory, f"export_{suffix}.xlsx")
+        sink = await asyncio.to_thread(XlsxSink, path)
+        for kind, header in EXPORT_HEADERS.items():
+            await asyncio.to_thread(sink.sheet, header, kind)
+            await _write_kind(session, sink, kind, start, end, tz, batch_size)
+        await asyncio.to_thread(sink.close)
+        return [path]
+
+    paths = []
+    for kind, header in EXPORT_HEADERS.items():
+        path = os.path.join(directory, f"{kind}_{suffix}.csv")
+        sink = await asyncio.to_thread(CsvSink, path)
+        try:
+            await asyncio.to_thread(sink.sheet, header)
+            await _write_kind(session, sink, kind, start, end, tz, batch_size)
+        finally:
+            await asyncio.to_thread(sink.close)
+        paths.append(path)
+    return paths
@@ -0,0 +1,87 @@
+from datetime import date, time
+from typing import NamedTuple
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+
+from app.models import LessonGroup, LessonGroupMember, GroupLesson, LessonStatus, ScheduleRule, Student
+from .schedule import bump_schedule_version, generate_group_lessons
+
+
+class GroupSummary(NamedTuple):
+    id: int
+    title: str
+    members: int
+
+
+async def list_groups(session) -> list[GroupSummary]:
+    return [GroupSummary(*r) for r in (await session.execute(
+        select(LessonGroup.id, LessonGroup.title, func.count(LessonGroupMember.student_id))
+        .outerjoin(LessonGroupMember, LessonGroupMember.group_id == LessonGroup.id)
+        .group_by(LessonGroup.id)
+        .order_by(LessonGroup.title)
+    )).all()]
+
+
+async def create_group(session, title: str, tz: str) -> int:
+    group = LessonGroup(title=title, timezone=tz)
+    session.add(group)
+    await session.flush()
+    return group.id
+
+
+async def group_members(session, group_id: int) -> list[tuple[int, str]]:
+    return [tuple(r) for r in (await session.execute(
+        select(Student.id, Student.full_name)
+        .join(LessonGroupMember, LessonGroupMember.student_id == Student.id)
+        .where(LessonGroupMember.group_id == group_id)
+        .order_by(Student.full_name, Student.id)
+    )).all()]
+
+
+async def set_group_members(session, group_id: int, student_ids: list[int]) -> None:
+    # состав меняется двумя запросами; расписание меняется и у ушедших, и у пришедших
+    left = (await session.execute(
+        delete(LessonGroupMember)
+        .where(LessonGroupMember.group_id == group_id, LessonGroupMember.student_id.not_in(student_ids))
+        .returning(LessonGroupMember.student_id)
+    )).scalars().all()
+    joined = []
+    if student_ids:
+        joined = (await session.execute(
+            insert(LessonGroupMember)
+            .values([{"group_id": group_id, "student_id": sid} for sid in student_ids])
+            .on_conflict_do_nothing()
+            .returning(LessonGroupMember.student_id)
+        )).scalars().all()
+    await bump_schedule_version(session, [*left, *joined])
+
+
+async def add_group_rule(
+    session, group_id: int, weekday: int, time_local: time, duration_min: int, start_date: date,
+) -> int:
+    # правило группы разворачивается сразу; возвращает число новых занятий
+    session.add(ScheduleRule(
+        group_id=group_id, weekday=weekday, time_local=time_local, duration_min=duration_min,
+        start_date=start_date, end_date=None, active=True,
+    ))
+    await session.flush()
+    return await generate_group_lessons(session, group_id=group_id)
+
+
+async def group_rules(session, group_id: int) -> list[ScheduleRule]:
+    return list((await session.execute(
+        select(ScheduleRule)
+        .where(ScheduleRule.group_id == group_id, ScheduleRule.active.is_(True))
+        .order_by(ScheduleRule.weekday, ScheduleRule.time_local)
+    )).scalars().all())
+
+
+async def next_group_lessons(session, group_id: int, limit: int = 5) -> list[GroupLesson]:
+    # planned по времени: неотмеченные прошедшие идут первыми — их и нужно отметить «Проведено»
+    return list((await session.execute(
+        select(GroupLesson)
+        .where(GroupLesson.group_id == group_id, GroupLesson.status == LessonStatus.planned)
+        .order_by(GroupLesson.start_at)
+        .limit(limit)
+    )).scalars().all())
@@ -1,7 +1,23 @@
-from sqlalchemy import select, func
-from app.models import Homework
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy import select, update, func, and_, or_, tuple_, true, values, column, Integer
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql import nulls_last
+from app.models import Homework, HomeworkTemplate, Student
 
 DEFAULT_HW_AVG_N = 10  # если у вас уже определён - оставьте
+HW_PAGE_SIZE = 10
+HW_TEMPLATES_SHOWN = 10
+
+# фильтры списка ДЗ: open — не сдано и без оценки, done — сдано и ждёт проверки, graded — оценено
+HW_FILTERS = {
+    "all": None,
+    "open": and_(Homework.student_done_at.is_(None), Homework.grade.is_(None)),
+    "done": and_(Homework.student_done_at.is_not(None), Homework.grade.is_(None)),
+    "graded": Homework.grade.is_not(None),
+}
+
 
 async def homework_avg_last_n(session, student_id: int, n: int = DEFAULT_HW_AVG_N) -> float | None:
     # берём последние N выставленных оценок по ДЗ этого ученика
@@ -15,3 +31,177 @@ async def homework_avg_last_n(session, student_id: int, n: int = DEFAULT_HW_AVG_
 
     avg = (await session.execute(select(func.avg(subq.c.grade)))).scalar_one()
     return float(avg) if avg is not None else None
+
+
+async def homework_page(
+    session, student_id: int, flt: str = "all", after_id: int | None = None, limit: int = HW_PAGE_SIZE,
+) -> tuple[list[Homework], bool]:
+    """
+    Страница ДЗ ученика в порядке (due_at DESC NULLS LAST, created_at DESC, id DESC).
+    Keyset: курсор — id последнего ДЗ прошлой страницы, его ключ подтягивается подзапросом,
+    так что и первая, и сотая страница — один индексный запрос на limit + 1 строк.
+    Возвращает (ДЗ страницы, есть ли следующая).
+    """
+    q = select(Homework).where(Homework.student_id == student_id)
+    if HW_FILTERS[flt] is not None:
+        q = q.where(HW_FILTERS[flt])
+
+    if after_id:
+        cur = (
+            select(Homework.due_at, Homework.created_at, Homework.id)
+            .where(Homework.id == after_id, Homework.student_id == student_id)
+            .subquery("cur")
+        )
+        key = tuple_(Homework.created_at, Homework.id) < tuple_(cur.c.created_at, cur.c.id)
+        q = q.join(cur, true()).where(or_(
+            # курсор с дедлайном: дальше более ранние дедлайны, затем все ДЗ без дедлайна
+            and_(cur.c.due_at.is_not(None), or_(
+                Homework.due_at < cur.c.due_at,
+                and_(Homework.due_at == cur.c.due_at, key),
+                Homework.due_at.is_(None),
+            )),
+            # курсор уже среди ДЗ без дедлайна
+            and_(cur.c.due_at.is_(None), Homework.due_at.is_(None), key),
+        ))
+
+    rows = (await session.execute(
+        q.order_by(nulls_last(Homework.due_at.desc()), Homework.created_at.desc(), Homework.id.desc())
+        .limit(limit + 1)
+    )).scalars().all()
+    return list(rows[:limit]), len(rows) > limit
+
+
+async def create_homework_bulk(
+    session, student_ids: list[int], title: str, description: str, due_at: datetime | None,
+) -> list[int]:
+    # одно и то же ДЗ группе учеников — один многострочный INSERT
+    if not student_ids:
+        return []
+    return list((await session.execute(
+        insert(Homework)
+        .values([
+            {"student_id": sid, "title": title, "description": description, "due_at": due_at}
+            for sid in student_ids
+        ])
+        .returning(Homework.id)
+    )).scalars().all())
+
+
+async def recent_templates(session, limit: int = HW_TEMPLATES_SHOWN) -> list[HomeworkTemplate]:
+    return list((await session.execute(
+        select(HomeworkTemplate).order_by(HomeworkTemplate.last_used_at.desc(), HomeworkTemplate.id.desc()).limit(limit)
+    )).scalars().all())
+
+
+async def touch_template(session, title: str, description: str, now: datetime) -> int:
+    # шаблон с тем же названием обновляется, а не дублируется
+    stmt = insert(HomeworkTemplate).values(title=title, description=description, last_used_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[HomeworkTemplate.title],
+        set_={"description": stmt.excluded.description, "last_used_at": stmt.excluded.last_used_at},
+    )
+    return (await session.execute(stmt.returning(HomeworkTemplate.id))).scalar_one()
+
+
+# очередь проверки: сданные учеником и ещё не оценённые ДЗ всех учеников, по времени сдачи
+GRADING_QUEUE = and_(Homework.student_done_at.is_not(None), Homework.grade.is_(None))
+
+
+class GradingItem(NamedTuple):
+    homework_id: int
+    title: str
+    description: str
+    student_done_at: datetime
+    full_name: str
+
+
+class GradingState(NamedTuple):
+    item: GradingItem | None  # None — до конца очереди ничего не осталось
+    remaining: int            # всего в очереди (вместе с пропущенными)
+    buffered: int             # оценки, ждущие рассылки
+
+
+async def grading_queue_next(session, after_id: int | None = None) -> GradingState:
+    """
+    Следующее ДЗ очереди после after_id (keyset по (student_done_at, id)) и счётчики — одним запросом.
+    """
+    nxt = (
+        select(
+            Homework.id, Homework.title, Homework.description, Homework.student_done_at,
+            Student.full_name,
+        )
+        .join(Student, Student.id == Homework.student_id)
+        .where(GRADING_QUEUE)
+        .order_by(Homework.student_done_at, Homework.id)
+        .limit(1)
+    )
+    if after_id:
+        cur = select(Homework.student_done_at, Homework.id).where(Homework.id == after_id).subquery("cur")
+        nxt = nxt.join(cur, true()).where(
+            tuple_(Homework.student_done_at, Homework.id) > tuple_(cur.c.student_done_at, cur.c.id)
+        )
+    nxt = nxt.subquery("nxt")
+
+    remaining = select(func.count()).select_from(Homework).where(GRADING_QUEUE).scalar_subquery()
+    buffered = (
+        select(func.count()).select_from(Homework).where(Homework.grade_notify_pending.is_(True)).scalar_subquery()
+    )
+    one = values(column("x", Integer), name="one").data([(1,)])
+
+    row = (await session.execute(
+        select(remaining, buffered, nxt.c.id, nxt.c.title, nxt.c.description, nxt.c.student_done_at, nxt.c.full_name)
+        .select_from(one)
+        .outerjoin(nxt, true())
+    )).one()
+    item = GradingItem(*row[2:]) if row[2] is not None else None
+    return GradingState(item, row[0], row[1])
+
+
+async def grade_from_queue(session, homework_id: int, grade: int, now: datetime) -> int | None:
+    """
+    Одним UPDATE: оценка + отметка «уведомление ждёт рассылки». Возвращает student_id,
+    None — ДЗ уже оценено (повторное нажатие) или не в очереди.
+    """
+    return (await session.execute(
+        update(Homework)
+        .where(Homework.id == homework_id, GRADING_QUEUE)
+        .values(grade=grade, graded_at=now, grade_notify_pending=True)
+        .returning(Homework.student_id)
+    )).scalar_one_or_none()
+
+
+HW_SEARCH_PAGE_SIZE = 5
+
+
+class HomeworkHit(NamedTuple):
+    homework_id: int
+    student_id: int
+    full_name: str
+    title: str
+    created_at: datetime
+    rank: float
+
+
+async def search_homework(
+    session, query: str, page: int = 1, page_size: int = HW_SEARCH_PAGE_SIZE,
+) -> tuple[list[HomeworkHit], int]:
+    """
+    Поиск ДЗ всех учеников по названию и описанию (GIN-индекс по search_tsv).
+    websearch_to_tsquery понимает «фразы в кавычках», OR и -исключение и не падает на мусорном вводе.
+    Одним запросом: страница, отсортированная по релевантности, и общее число найденных.
+    """
+    tsq = func.websearch_to_tsquery("russian", query)
+    rank = func.ts_rank(Homework.search_tsv, tsq)
+    rows = (await session.execute(
+        select(
+            Homework.id, Homework.student_id, Student.full_name, Homework.title, Homework.created_at, rank,
+            func.count().over(),
+        )
+        .join(Student, Student.id == Homework.student_id)
+        .where(Homework.search_tsv.op("@@")(tsq))
+        .order_by(rank.desc(), Homework.created_at.desc(), Homework.id.desc())
+        .offset((page - 1) * page_size)
+        .limit(page_size)
+    )).all()
+    total = rows[0][-1] if rows else 0
+    return [HomeworkHit(*row[:-1]) for row in rows], total
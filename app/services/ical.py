@@ -0,0 +1,109 @@
+import hashlib
+import secrets
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, or_
+
+from ..models import User, Student, Parent, ParentStudent, Lesson, LessonStatus
+
+# окно ленты: недавние уроки (чтобы календарь не терял только что прошедшие) + всё запланированное
+FEED_PAST_DAYS = 30
+
+# готовые ленты по токену (заполняет web.ical_feed). Бот и веб-сервер живут в одном процессе,
+# поэтому перевыпуск токена может сразу выбросить ленту старого — иначе она жила бы до конца TTL
+FEED_CACHE: dict[str, object] = {}
+
+
+async def ensure_ical_token(session, user: User) -> str:
+    if user.ical_token:
+        return user.ical_token
+    return await reset_ical_token(session, user)
+
+
+async def reset_ical_token(session, user: User) -> str:
+    # старая ссылка перестаёт работать сразу — в том числе из кэша лент
+    old = user.ical_token
+    user.ical_token = secrets.token_urlsafe(24)
+    await session.commit()
+    if old:
+        FEED_CACHE.pop(old, None)
+    return user.ical_token
+
+
+async def feed_versions(session, token: str) -> tuple[int, tuple[tuple[int, int], ...]] | None:
+    """
+    Одним запросом: владелец ленты и (student_id, schedule_version) его учеников/детей.
+    None — токен не найден.
+    """
+    rows = (await session.execute(
+        select(User.id, Student.id, Student.schedule_version)
+        .select_from(User)
+        .outerjoin(Parent, Parent.user_id == User.id)
+        .outerjoin(ParentStudent, ParentStudent.parent_id == Parent.id)
+        .outerjoin(Student, or_(Student.user_id == User.id, Student.id == ParentStudent.student_id))
+        .where(User.ical_token == token)
+    )).all()
+    if not rows:
+        return None
+    versions = tuple(sorted({(sid, ver) for _uid, sid, ver in rows if sid is not None}))
+    return rows[0][0], versions
+
+
+def feed_etag(user_id: int, versions: tuple[tuple[int, int], ...]) -> str:
+    raw = f"{user_id}:" + ",".join(f"{sid}.{ver}" for sid, ver in versions)
+    return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+
+def _ics_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+def _ics_fold(line: str) -> str:
+    # RFC 5545: строки длиннее 75 октетов переносятся с пробелом в начале продолжения
+    data = line.encode()
+    if len(data) <= 75:
+        return line
+    parts, chunk = [], b""
+    for ch in line:
+        b = ch.encode()
+        if len(chunk) + len(b) > (75 if not parts else 74):
+            parts.append(chunk.decode())
+            chunk = b""
+        chunk += b
+    parts.append(chunk.decode())
+    return "\r\n ".join(parts)
+
+
+def _ics_dt(dt: datetime) -> str:
+    return dt.strftime("%Y%m%dT%H%M%SZ")
+
+
+async def render_feed(session, student_ids: list[int], now: datetime) -> str:
+    rows = (await session.execute(
+        select(Lesson.id, Lesson.start_at, Lesson.duration_min, Lesson.status, Lesson.updated_at, Student.full_name)
+        .join(Student, Student.id == Lesson.student_id)
+        .where(Lesson.student_id.in_(student_ids), Lesson.start_at >= now - timedelta(days=FEED_PAST_DAYS))
+        .order_by(Lesson.start_at, Lesson.id)
+    )).all() if student_ids else []
+
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//tutor-bot//lessons//RU",
+        "CALSCALE:GREGORIAN",
+        "X-WR-CALNAME:Уроки",
+    ]
+    for lesson_id, start_at, duration_min, status, updated_at, full_name in rows:
+        # отменённые отдаём со STATUS:CANCELLED — клиенты уберут событие, а не оставят «висеть»
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:lesson-{lesson_id}@tutor-bot",
+            f"DTSTAMP:{_ics_dt(updated_at)}",
+            f"DTSTART:{_ics_dt(start_at)}",
+            f"DTEND:{_ics_dt(start_at + timedelta(minutes=duration_min))}",
+            f"SUMMARY:{_ics_escape(f'Урок: {full_name}')}",
+            f"STATUS:{'CANCELLED' if status == LessonStatus.canceled else 'CONFIRMED'}",
+            "END:VEVENT",
+        ]
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(_ics_fold(line) for line in lines) + "\r\n"
@@ -0,0 +1,115 @@
+from datetime import datetime
+
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.postgresql import insert
+
+from ..models import Notification, NotificationStatus, NotificationPriority, NotificationSettings, User
+
+# Полосы очереди: priority -> вес в weighted fair scheduling.
+# None = строгая полоса: забирает сколько нужно из batch раньше всех остальных.
+LANE_WEIGHTS: dict[int, int | None] = {
+    NotificationPriority.urgent: None,
+    NotificationPriority.normal: 3,
+    NotificationPriority.bulk: 1,
+}
+DEFAULT_LANE_WEIGHT = 1
+
+
+def lane_name(priority: int) -> str:
+    try:
+        return NotificationPriority(priority).name
+    except ValueError:
+        return f"p{priority}"
+
+
+def allocate_batch(depths: dict[int, int], batch_size: int) -> dict[int, int]:
+    """
+    Делит batch между полосами.
+    Строгие полосы (вес None) забирают всё, что им нужно, по порядку priority;
+    остаток делится между остальными пропорционально весам, неиспользованная
+    доля пустых полос перераспределяется.
+    """
+    alloc = {p: 0 for p in depths}
+    left = batch_size
+
+    for p in sorted(depths):
+        if LANE_WEIGHTS.get(p, DEFAULT_LANE_WEIGHT) is None:
+            take = min(depths[p], left)
+            alloc[p] = take
+            left -= take
+
+    active = [
+        p for p in sorted(depths)
+        if LANE_WEIGHTS.get(p, DEFAULT_LANE_WEIGHT) is not None and depths[p] > 0
+    ]
+    while left > 0 and active:
+        total_w = sum(LANE_WEIGHTS.get(p, DEFAULT_LANE_WEIGHT) for p in active)
+        budget = left
+        for p in list(active):
+            share = max(1, budget * LANE_WEIGHTS.get(p, DEFAULT_LANE_WEIGHT) // total_w)
+            take = min(share, depths[p] - alloc[p], left)
+            alloc[p] += take
+            left -= take
+            if alloc[p] >= depths[p]:
+                active.remove(p)
+            if left == 0:
+                break
+
+    return alloc
+
+
+async def queue_stats(session, now: datetime) -> dict[int, tuple[int, float]]:
+    """priority -> (сколько pending уже пора отправить, lag самого старого в секундах)."""
+    rows = (await session.execute(
+        select(Notification.priority, func.count(), func.min(Notification.send_at))
+        .where(Notification.status == NotificationStatus.pending, Notification.send_at <= now)
+        .group_by(Notification.priority)
+    )).all()
+
+    return {p: (cnt, max(0.0, (now - oldest).total_seconds())) for p, cnt, oldest in rows}
+
+
+def format_queue_stats(stats: dict[int, tuple[int, float]]) -> str:
+    return ", ".join(
+        f"{lane_name(p)}: depth={depth} lag={lag:.0f}s"
+        for p, (depth, lag) in sorted(stats.items())
+    )
+
+
+async def mark_user_blocked(session, user_id: int, now: datetime) -> None:
+    # первая отметка сохраняется: blocked_at = когда бот впервые получил Forbidden
+    await session.execute(
+        update(User)
+        .where(User.id == user_id, User.blocked_at.is_(None))
+        .values(blocked_at=now)
+    )
+
+
+async def get_notification_settings(session, user_id: int) -> NotificationSettings:
+    ns = (await session.execute(
+        select(NotificationSettings)
+        .where(NotificationSettings.user_id == user_id)
+        .execution_options(populate_existing=True)  # настройки меняются upsert'ом в обход ORM
+    )).scalar_one_or_none()
+    if ns:
+        return ns
+    # настроек ещё нет — значения по умолчанию (в БД не пишем)
+    return NotificationSettings(
+        user_id=user_id,
+        lesson_24h=True,
+        lesson_1h=True,
+        daily_digest=False,
+        digest_hour=8,
+        quiet_start=None,
+        quiet_end=None,
+    )
+
+
+async def save_notification_settings(session, user_id: int, **values) -> None:
+    # upsert только переданных полей; commit — на вызывающем
+    stmt = insert(NotificationSettings).values(user_id=user_id, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[NotificationSettings.user_id],
+        set_={**values, "updated_at": func.now()},
+    )
+    await session.execute(stmt)
@@ -0,0 +1,94 @@
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy import select, func, DateTime, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from ..models import (
+    User, Role, Parent, ParentStudent, Student, BillingMode, StudentBalance,
+    Lesson, LessonStatus, LessonCharge, ChargeStatus, Homework,
+)
+from .homework import DEFAULT_HW_AVG_N
+
+OVERVIEW_NEXT_LESSONS = 3
+
+
+class ChildOverview(NamedTuple):
+    student_id: int
+    full_name: str
+    billing_mode: BillingMode
+    lessons_left: int | None
+    unpaid_count: int
+    unpaid_sum: float
+    next_lessons: list[datetime]
+    hw_avg: float | None
+
+
+class ParentOverview(NamedTuple):
+    role: Role
+    timezone: str | None
+    children: list[ChildOverview]
+
+
+def _array(stmt, item_type):
+    # ARRAY(SELECT ...) — коррелированный список без LATERAL и без отдельного запроса на ребёнка
+    return func.array(stmt.scalar_subquery(), type_=ARRAY(item_type))
+
+
+async def parent_overview(session, tg_id: int, now: datetime) -> ParentOverview | None:
+    """
+    Всё для экрана «Дети» одним запросом: роль/TZ зрителя и по каждому ребёнку — ближайшие уроки,
+    остаток абонемента, неоплаченные начисления и последние оценки ДЗ.
+    None — пользователь не найден.
+    """
+    next_lessons = _array(
+        select(Lesson.start_at)
+        .where(Lesson.student_id == Student.id, Lesson.status == LessonStatus.planned, Lesson.start_at >= now)
+        .order_by(Lesson.start_at)
+        .limit(OVERVIEW_NEXT_LESSONS),
+        DateTime(timezone=True),
+    )
+    # те же последние N оценок, что и homework_avg_last_n; среднее считаем на стороне Python
+    last_grades = _array(
+        select(Homework.grade)
+        .where(Homework.student_id == Student.id, Homework.grade.is_not(None))
+        .order_by(Homework.graded_at.desc())
+        .limit(DEFAULT_HW_AVG_N),
+        Integer,
+    )
+    pending = (LessonCharge.student_id == Student.id, LessonCharge.status == ChargeStatus.pending)
+    unpaid_count = select(func.count()).select_from(LessonCharge).where(*pending).scalar_subquery()
+    unpaid_sum = select(func.coalesce(func.sum(LessonCharge.amount), 0)).where(*pending).scalar_subquery()
+
+    rows = (await session.execute(
+        select(
+            User.role, User.timezone,
+            Student.id, Student.full_name, Student.billing_mode, StudentBalance.lessons_left,
+            unpaid_count, unpaid_sum, next_lessons, last_grades,
+        )
+        .select_from(User)
+        .outerjoin(Parent, Parent.user_id == User.id)
+        .outerjoin(ParentStudent, ParentStudent.parent_id == Parent.id)
+        .outerjoin(Student, Student.id == ParentStudent.student_id)
+        .outerjoin(StudentBalance, StudentBalance.student_id == Student.id)
+        .where(User.tg_id == tg_id)
+        .order_by(Student.full_name, Student.id)
+    )).all()
+    if not rows:
+        return None
+
+    children = [
+        ChildOverview(
+            student_id=sid,
+            full_name=full_name,
+            billing_mode=billing_mode,
+            lessons_left=lessons_left,
+            unpaid_count=cnt,
+            unpaid_sum=float(total),
+            next_lessons=list(starts or []),
+            hw_avg=sum(grades) / len(grades) if grades else None,
+        )
+        for _role, _tz, sid, full_name, billing_mode, lessons_left, cnt, total, starts, grades in rows
+        if sid is not None
+    ]
+    return ParentOverview(rows[0].role, rows[0].timezone, children)
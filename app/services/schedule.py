@@ -1,15 +1,69 @@
 from datetime import datetime, timedelta, timezone, date
 from zoneinfo import ZoneInfo
 
-from sqlalchemy import select
+from sqlalchemy import select, update, delete, union_all, literal, exists
 from sqlalchemy.dialects.postgresql import insert
 
-from ..models import ScheduleRule, Student, Lesson, LessonStatus
+from ..models import (
+    ScheduleRule, Student, Lesson, LessonStatus, LessonCharge, LessonGroup, LessonGroupMember, GroupLesson,
+)
 
 
 HORIZON_DAYS = 60
 
 
+async def bump_schedule_version(session, student_ids) -> None:
+    # вызывается в той же транзакции, что и изменение уроков; commit — на вызывающем
+    ids = set(student_ids)
+    if not ids:
+        return
+    await session.execute(
+        update(Student)
+        .where(Student.id.in_(ids))
+        .values(schedule_version=Student.schedule_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def bump_group_schedule_version(session, group_ids) -> None:
+    # у участников групп — одним UPDATE с подзапросом, без выборки учеников в Python
+    ids = set(group_ids)
+    if not ids:
+        return
+    await session.execute(
+        update(Student)
+        .where(Student.id.in_(
+            select(LessonGroupMember.student_id).where(LessonGroupMember.group_id.in_(ids))
+        ))
+        .values(schedule_version=Student.schedule_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def lesson_occurrences():
+    """
+    (source, entity_id, student_id, start_at, status): индивидуальные уроки и групповые занятия,
+    разложенные на участников. Условия по status/start_at Postgres проталкивает в обе ветки.
+    """
+    return union_all(
+        select(
+            literal("lesson").label("source"),
+            Lesson.id.label("entity_id"),
+            Lesson.student_id.label("student_id"),
+            Lesson.start_at.label("start_at"),
+            Lesson.status.label("status"),
+        ),
+        select(
+            literal("group"),
+            GroupLesson.id,
+            LessonGroupMember.student_id,
+            GroupLesson.start_at,
+            GroupLesson.status,
+        )
+        .join(LessonGroupMember, LessonGroupMember.group_id == GroupLesson.group_id),
+    ).subquery("occurrences")
+
+
 def _date_range(start: date, end: date):
     d = start
     while d <= end:
@@ -73,8 +127,95 @@ async def generate_lessons_for_student(
         return 0
 
     stmt = insert(Lesson).values(rows)
-    stmt = stmt.on_conflict_do_nothing(index_elements=["student_id", "start_at"])
-    await session.execute(stmt)
+    stmt = stmt.on_conflict_do_nothing(index_elements=["student_id", "start_at"]).returning(Lesson.id)
+    if (await session.execute(stmt)).first() is not None:
+        await bump_schedule_version(session, [student_id])
 
     # как и было: "сколько пытались вставить"
     return len(rows)
+
+
+async def cancel_planned_lesson(session, lesson_id: int) -> str | None:
+    """
+    Единственный путь отмены planned-урока (карточка урока и вопрос после урока).
+    Разовый удаляется из календаря, урок из цикла помечается canceled (не удаляем, чтобы
+    генератор его не пересоздал). Разовый с начислением (оплачен заранее) тоже только
+    помечается canceled: удаление каскадом стёрло бы запись об оплате.
+    Проведённые и уже отменённые не трогаем. Возвращает "deleted" / "canceled" / None.
+    """
+    deleted = (await session.execute(
+        delete(Lesson)
+        .where(
+            Lesson.id == lesson_id,
+            Lesson.status == LessonStatus.planned,
+            Lesson.source_rule_id.is_(None),
+            ~exists().where(LessonCharge.lesson_id == Lesson.id),
+        )
+        .returning(Lesson.student_id)
+    )).scalar_one_or_none()
+    if deleted is not None:
+        await bump_schedule_version(session, [deleted])
+        await session.commit()
+        return "deleted"
+
+    canceled = (await session.execute(
+        update(Lesson)
+        .where(Lesson.id == lesson_id, Lesson.status == LessonStatus.planned)
+        .values(status=LessonStatus.canceled)
+        .returning(Lesson.student_id)
+    )).scalar_one_or_none()
+    if canceled is not None:
+        await bump_schedule_version(session, [canceled])
+    await session.commit()
+    return "canceled" if canceled is not None else None
+
+
+async def generate_group_lessons(
+    session,
+    *,
+    group_id: int | None = None,
+    now_utc: datetime | None = None,
+    horizon_days: int = HORIZON_DAYS,
+) -> int:
+    """
+    Разворачивает правила групп: одно занятие — одна строка, сколько бы в группе ни было учеников.
+    Возвращает число новых занятий.
+    """
+    q = (
+        select(ScheduleRule, LessonGroup.timezone)
+        .join(LessonGroup, LessonGroup.id == ScheduleRule.group_id)
+        .where(ScheduleRule.active.is_(True))
+    )
+    if group_id is not None:
+        q = q.where(ScheduleRule.group_id == group_id)
+    rules = (await session.execute(q)).all()
+    if not rules:
+        return 0
+
+    if now_utc is None:
+        now_utc = datetime.now(timezone.utc)
+    start_day = now_utc.date()
+    end_day = (now_utc + timedelta(days=horizon_days)).date()
+
+    rows = []
+    for r, tz in rules:
+        rule_to = min(r.end_date, end_day) if r.end_date else end_day
+        for d in _date_range(max(r.start_date, start_day), rule_to):
+            if d.weekday() != r.weekday:
+                continue
+            rows.append({
+                "group_id": r.group_id,
+                "start_at": _to_utc(tz, d, r.time_local),
+                "duration_min": r.duration_min,
+                "status": LessonStatus.planned,
+                "source_rule_id": r.id,
+            })
+
+    if not rows:
+        return 0
+
+    stmt = insert(GroupLesson).values(rows)
+    stmt = stmt.on_conflict_do_nothing(index_elements=["group_id", "start_at"]).returning(GroupLesson.group_id)
+    inserted = (await session.execute(stmt)).scalars().all()
+    await bump_group_schedule_version(session, inserted)
+    return len(inserted)
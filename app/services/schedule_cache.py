@@ -0,0 +1,150 @@
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, NamedTuple
+
+from sqlalchemy import select
+
+from ..models import Lesson, LessonStatus, LessonGroup, LessonGroupMember, GroupLesson
+
+log = logging.getLogger(__name__)
+
+SCHEDULE_VIEW_DAYS = 7
+
+
+class CachedView(NamedTuple):
+    version: int
+    valid_until: datetime | None  # когда окно «7 дней» сдвинется и состав уроков изменится
+    text: str
+    markup: object
+
+
+class ScheduleViewCache:
+    """
+    Отрисованные экраны расписания (текст + клавиатура) по ключу (экран, student_id, TZ зрителя).
+    Запись годна, пока не выросла Student.schedule_version и не наступил valid_until.
+    LRU: при переполнении вытесняются давно не открывавшиеся экраны.
+    """
+
+    def __init__(self, max_size: int = 2000, log_every: int = 500):
+        self.max_size = max_size
+        self.log_every = log_every
+        self.entries: OrderedDict[tuple, CachedView] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple, version: int, now: datetime) -> CachedView | None:
+        entry = self.entries.get(key)
+        if entry is None or entry.version != version or (entry.valid_until is not None and now >= entry.valid_until):
+            self._count(hit=False)
+            return None
+        self.entries.move_to_end(key)
+        self._count(hit=True)
+        return entry
+
+    def put(self, key: tuple, entry: CachedView) -> None:
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def format_stats(self) -> str:
+        return f"hits={self.hits} misses={self.misses} hit_rate={self.hit_rate():.0%} size={len(self.entries)}"
+
+    def _count(self, *, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        if self.log_every and (self.hits + self.misses) % self.log_every == 0:
+            log.info("Schedule view cache: %s", self.format_stats())
+
+    async def get_or_build(
+        self, key: tuple, version: int, now: datetime, build: Callable[[], Awaitable[CachedView]],
+    ) -> CachedView:
+        entry = self.get(key, version, now)
+        if entry is None:
+            entry = await build()
+            self.put(key, entry)
+        return entry
+
+
+schedule_views = ScheduleViewCache()
+
+
+async def upcoming_lessons(session, student_id: int, now: datetime) -> tuple[list[Lesson], datetime | None]:
+    """
+    Запланированные уроки на SCHEDULE_VIEW_DAYS вперёд и момент, до которого этот список верен без
+    изменений в БД: начало первого показанного урока (он уйдёт из списка) или момент, когда
+    в окно войдёт следующий урок за горизонтом.
+    """
+    window = timedelta(days=SCHEDULE_VIEW_DAYS)
+    lessons = (await session.execute(
+        select(Lesson)
+        .where(
+            Lesson.student_id == student_id,
+            Lesson.status == LessonStatus.planned,
+            Lesson.start_at >= now,
+            Lesson.start_at <= now + window,
+        )
+        .order_by(Lesson.start_at)
+    )).scalars().all()
+
+    next_start = (await session.execute(
+        select(Lesson.start_at)
+        .where(
+            Lesson.student_id == student_id,
+            Lesson.status == LessonStatus.planned,
+            Lesson.start_at > now + window,
+        )
+        .order_by(Lesson.start_at)
+        .limit(1)
+    )).scalar_one_or_none()
+
+    bounds = []
+    if lessons:
+        bounds.append(lessons[0].start_at)
+    if next_start is not None:
+        bounds.append(next_start - window)
+    return list(lessons), min(bounds) if bounds else None
+
+
+class GroupLessonView(NamedTuple):
+    start_at: datetime
+    title: str
+
+
+async def upcoming_group_lessons(
+    session, student_id: int, now: datetime,
+) -> tuple[list[GroupLessonView], datetime | None]:
+    # то же, что upcoming_lessons, для групповых занятий ученика; valid_until — по тем же правилам
+    window = timedelta(days=SCHEDULE_VIEW_DAYS)
+    mine = (
+        select(GroupLesson.start_at, LessonGroup.title)
+        .join(LessonGroup, LessonGroup.id == GroupLesson.group_id)
+        .join(LessonGroupMember, LessonGroupMember.group_id == GroupLesson.group_id)
+        .where(LessonGroupMember.student_id == student_id, GroupLesson.status == LessonStatus.planned)
+        .order_by(GroupLesson.start_at)
+    )
+    shown = [GroupLessonView(*r) for r in (await session.execute(
+        mine.where(GroupLesson.start_at >= now, GroupLesson.start_at <= now + window)
+    )).all()]
+    next_start = (await session.execute(
+        mine.with_only_columns(GroupLesson.start_at).where(GroupLesson.start_at > now + window).limit(1)
+    )).scalar_one_or_none()
+
+    bounds = []
+    if shown:
+        bounds.append(shown[0].start_at)
+    if next_start is not None:
+        bounds.append(next_start - window)
+    return shown, min(bounds) if bounds else None
+
+
+def earliest(*moments: datetime | None) -> datetime | None:
+    known = [m for m in moments if m is not None]
+    return min(known) if known else None
@@ -0,0 +1,91 @@
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import NamedTuple
+
+from aiohttp import web
+
+from . import db
+from .config import settings
+from .services.ical import FEED_CACHE, feed_versions, feed_etag, render_feed
+
+
+class CachedFeed(NamedTuple):
+    etag: str
+    last_modified: datetime
+    body: str
+    checked_at: float  # time.monotonic() последней сверки версий с БД
+
+
+ICAL_CACHE = web.AppKey("ical_cache", dict)
+
+
+def _not_modified(request: web.Request, feed: CachedFeed) -> bool:
+    inm = request.headers.get("If-None-Match")
+    if inm is not None:
+        return feed.etag in {t.strip() for t in inm.split(",")} or inm.strip() == "*"
+    ims = request.headers.get("If-Modified-Since")
+    if ims:
+        try:
+            return feed.last_modified.replace(microsecond=0) <= parsedate_to_datetime(ims)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _respond(request: web.Request, feed: CachedFeed) -> web.Response:
+    headers = {
+        "ETag": feed.etag,
+        "Last-Modified": format_datetime(feed.last_modified, usegmt=True),
+        "Cache-Control": "private, max-age=0",
+    }
+    if _not_modified(request, feed):
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=feed.body.encode(), content_type="text/calendar", charset="utf-8", headers=headers)
+
+
+async def ical_feed(request: web.Request) -> web.Response:
+    """
+    Лента уроков по секретному токену. Клиенты опрашивают её каждые несколько минут:
+    в пределах TTL ответ (или 304) отдаётся из памяти без БД; после TTL — один лёгкий запрос
+    версий расписания, и только если они изменились, лента пересобирается.
+    """
+    token = request.match_info["token"]
+    cache: dict[str, CachedFeed] = request.app[ICAL_CACHE]
+    cached = cache.get(token)
+    now_mono = time.monotonic()
+
+    if cached and now_mono - cached.checked_at < settings.ical_cache_ttl_sec:
+        return _respond(request, cached)
+
+    async with db.SessionMaker() as session:
+        found = await feed_versions(session, token)
+        if found is None:
+            cache.pop(token, None)
+            raise web.HTTPNotFound()
+
+        user_id, versions = found
+        etag = feed_etag(user_id, versions)
+        if cached and cached.etag == etag:
+            feed = cached._replace(checked_at=now_mono)
+        else:
+            now = datetime.now(timezone.utc)
+            body = await render_feed(session, [sid for sid, _ver in versions], now)
+            feed = CachedFeed(etag, now.replace(microsecond=0), body, now_mono)
+
+    cache[token] = feed
+    return _respond(request, feed)
+
+
+def build_web_app() -> web.Application:
+    app = web.Application()
+    app[ICAL_CACHE] = FEED_CACHE
+    app.router.add_get("/ical/{token}.ics", ical_feed)
+    return app
+
+
+async def start_web_app() -> web.AppRunner:
+    runner = web.AppRunner(build_web_app())
+    await runner.setup()
+    await web.TCPSite(runner, settings.web_host, settings.web_port).start()
+    return runner
@@ -8,7 +8,12 @@ from .config import settings
 from .db import init_db
 from .logging_conf import setup_logging
 from .jobs_lessons import generate_lessons_job
-from .jobs_notifications import plan_lesson_notifications_job, send_notifications_job
+from .jobs_billing import reconcile_balances_job, plan_invoices_job, plan_low_balance_alerts_job
+from .jobs_stats import rollup_daily_stats_job
+from .jobs_notifications import (
+    plan_lesson_notifications_job, plan_daily_digest_job, plan_lesson_prompts_job, send_notifications_job,
+    plan_hw_due_notifications_job, flush_stale_grade_notifications_job,
+)
 
 
 async def main():
@@ -23,6 +28,14 @@ async def main():
     scheduler = AsyncIOScheduler()
     scheduler.add_job(generate_lessons_job, "interval", hours=24)
     scheduler.add_job(plan_lesson_notifications_job, "interval", minutes=30)
+    scheduler.add_job(plan_daily_digest_job, "interval", minutes=30)
+    scheduler.add_job(plan_lesson_prompts_job, "interval", minutes=10)
+    scheduler.add_job(plan_hw_due_notifications_job, "interval", minutes=10)
+    scheduler.add_job(flush_stale_grade_notifications_job, "interval", minutes=5)
+    scheduler.add_job(reconcile_balances_job, "cron", hour=3, minute=30)
+    scheduler.add_job(plan_invoices_job, "cron", minute=5)  # в день сводки — первый запуск планирует, остальные no-op
+    scheduler.add_job(plan_low_balance_alerts_job, "interval", minutes=10)
+    scheduler.add_job(rollup_daily_stats_job, "interval", minutes=10)
 
     async def _send_notifs():
         await send_notifications_job(bot)
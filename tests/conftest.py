@@ -4,6 +4,7 @@ from pathlib import Path
 
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(ROOT))
+import pytest
 import pytest_asyncio
 from dotenv import load_dotenv
 
@@ -46,6 +47,23 @@ async def _clean_db(engine):
         await conn.execute(text(stmt))
 
 
+@pytest.fixture(autouse=True)
+def _clean_schedule_views():
+    # id после TRUNCATE ... RESTART IDENTITY повторяются — кэш экранов не должен переживать тест
+    from app.services.schedule_cache import schedule_views
+
+    schedule_views.entries.clear()
+    schedule_views.hits = schedule_views.misses = 0
+
+
+@pytest.fixture(autouse=True)
+def _clean_feed_cache():
+    # ленты iCal кэшируются на уровне процесса, токены в тестах повторяются
+    from app.services.ical import FEED_CACHE
+
+    FEED_CACHE.clear()
+
+
 @pytest_asyncio.fixture
 async def sessionmaker(engine):
     return async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
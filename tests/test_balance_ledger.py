@@ -0,0 +1,213 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, update, func
+
+from app.callbacks import SubCb
+from app.models import (
+    User, Role, Student, BillingMode, Lesson, LessonStatus,
+    StudentBalance, BalanceEntry, BalanceReason,
+)
+from app.services.billing import add_subscription_package, correct_balance, mark_lesson_done
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, tg_id: int, text: str):
+        self.sent.append((tg_id, text))
+
+
+class FakeFromUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text: str, **kwargs):
+        self.edits.append((text, kwargs))
+
+
+class FakeCallbackQuery:
+    def __init__(self, user_id: int):
+        self.from_user = FakeFromUser(user_id)
+        self.message = FakeMessage()
+        self.answered = []
+
+    async def answer(self, text: str | None = None, show_alert: bool = False):
+        self.answered.append((text, show_alert))
+
+
+async def _ledger(session, student_id: int):
+    return (await session.execute(
+        select(BalanceEntry.delta, BalanceEntry.reason, BalanceEntry.lesson_id)
+        .where(BalanceEntry.student_id == student_id)
+        .order_by(BalanceEntry.id)
+    )).all()
+
+
+async def _left(session, student_id: int) -> int:
+    return (await session.execute(
+        select(StudentBalance.lessons_left)
+        .where(StudentBalance.student_id == student_id)
+        .execution_options(populate_existing=True)
+    )).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_every_balance_movement_is_journaled(session):
+    st = Student(full_name="A", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    session.add(st)
+    await session.flush()
+    lesson = Lesson(student_id=st.id, start_at=datetime.now(timezone.utc) + timedelta(days=1),
+                    status=LessonStatus.planned)
+    session.add(lesson)
+    await session.commit()
+
+    assert await add_subscription_package(session, st.id, 8) == 8
+    await mark_lesson_done(session, FakeBot(), lesson.id)
+    await mark_lesson_done(session, FakeBot(), lesson.id)  # повтор не списывает
+    assert await correct_balance(session, st.id, -2, comment="пропуск") == 5
+
+    assert await _ledger(session, st.id) == [
+        (8, BalanceReason.package, None),
+        (-1, BalanceReason.lesson, lesson.id),
+        (-2, BalanceReason.correction, None),
+    ]
+    total = (await session.execute(
+        select(func.sum(BalanceEntry.delta)).where(BalanceEntry.student_id == st.id)
+    )).scalar_one()
+    assert total == await _left(session, st.id) == 5
+
+
+@pytest.mark.asyncio
+async def test_lesson_on_empty_balance_writes_no_entry(session):
+    st = Student(full_name="A", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    session.add(st)
+    await session.flush()
+    lesson = Lesson(student_id=st.id, start_at=datetime.now(timezone.utc), status=LessonStatus.planned)
+    session.add(lesson)
+    await session.commit()
+
+    await mark_lesson_done(session, FakeBot(), lesson.id)
+
+    assert await _left(session, st.id) == 0
+    assert await _ledger(session, st.id) == []
+
+
+@pytest.mark.asyncio
+async def test_correction_cannot_go_negative(session):
+    st = Student(full_name="A", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    session.add(st)
+    await session.commit()
+    await add_subscription_package(session, st.id, 8)
+
+    with pytest.raises(ValueError):
+        await correct_balance(session, st.id, -9)
+
+    assert await _left(session, st.id) == 8
+    assert [d for d, _, _ in await _ledger(session, st.id)] == [8]
+
+
+@pytest.mark.asyncio
+async def test_reconcile_fixes_drift_and_records_opening_balances(monkeypatch, sessionmaker, session):
+    import app.jobs_billing as jobs
+
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+
+    journaled = Student(full_name="J", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    legacy = Student(full_name="L", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    clean = Student(full_name="C", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    session.add_all([journaled, legacy, clean])
+    await session.flush()
+    # баланс до появления журнала — истории нет
+    session.add(StudentBalance(student_id=legacy.id, lessons_left=4))
+    await session.commit()
+
+    await add_subscription_package(session, journaled.id, 12)
+    await add_subscription_package(session, clean.id, 8)
+    # «баг» испортил снимок в обход журнала
+    await session.execute(
+        update(StudentBalance).where(StudentBalance.student_id == journaled.id).values(lessons_left=3)
+    )
+    await session.commit()
+
+    async with sessionmaker() as s:
+        drifted = await jobs.reconcile_balances(s)
+        await s.commit()
+    assert drifted == [journaled.id]
+
+    assert await _left(session, journaled.id) == 12
+    assert await _left(session, legacy.id) == 4
+    assert await _left(session, clean.id) == 8
+    assert await _ledger(session, legacy.id) == [(4, BalanceReason.opening, None)]
+
+    # повторная сверка ничего не меняет и не дублирует начальные остатки
+    await jobs.reconcile_balances_job()
+    assert len(await _ledger(session, legacy.id)) == 1
+
+
+@pytest.mark.asyncio
+async def test_legacy_balance_survives_movement_before_first_reconcile(sessionmaker, session):
+    from app.jobs_billing import reconcile_balances
+    from app.services.billing import mark_lessons_done_bulk
+
+    topped = Student(full_name="T", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    taught = Student(full_name="L", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    session.add_all([topped, taught])
+    await session.flush()
+    # балансы до появления журнала, сверка ещё ни разу не запускалась
+    session.add_all([
+        StudentBalance(student_id=topped.id, lessons_left=5),
+        StudentBalance(student_id=taught.id, lessons_left=3),
+    ])
+    lessons = [
+        Lesson(student_id=taught.id, start_at=datetime.now(timezone.utc) - timedelta(hours=h),
+               status=LessonStatus.planned)
+        for h in (1, 2)
+    ]
+    session.add_all(lessons)
+    await session.commit()
+
+    assert await add_subscription_package(session, topped.id, 8) == 13
+    await mark_lessons_done_bulk(session, [lessons[0].id])
+    await mark_lesson_done(session, FakeBot(), lessons[1].id)
+
+    async with sessionmaker() as s:
+        assert await reconcile_balances(s) == []
+        await s.commit()
+
+    assert await _left(session, topped.id) == 13
+    assert await _left(session, taught.id) == 1
+    assert [(d, r) for d, r, _ in await _ledger(session, topped.id)] == [
+        (5, BalanceReason.opening), (8, BalanceReason.package),
+    ]
+    assert [(d, r) for d, r, _ in await _ledger(session, taught.id)] == [
+        (3, BalanceReason.opening), (-1, BalanceReason.lesson), (-1, BalanceReason.lesson),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_admin_balance_history_and_correction(session):
+    import app.handlers.admin.subscription as sub_mod
+
+    teacher = User(tg_id=9301, role=Role.teacher, name="T", timezone="Europe/Moscow")
+    st = Student(full_name="Kid", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    session.add_all([teacher, st])
+    await session.commit()
+    await add_subscription_package(session, st.id, 8)
+
+    call = FakeCallbackQuery(9301)
+    await sub_mod.sub_fix(call, SubCb(action="fix", student_id=st.id, qty=-1), session)
+    assert call.answered[-1] == ("Корректировка -1. Осталось: 7 уроков", True)
+
+    await sub_mod.sub_history(call, SubCb(action="history", student_id=st.id, qty=0), session)
+    text = call.message.edits[-1][0]
+    assert text.startswith("История баланса: Kid")
+    assert "-1  корректировка (вручную)" in text
+    assert "+8  абонемент" in text
+    assert text.index("корректировка") < text.index("абонемент")  # новые сверху
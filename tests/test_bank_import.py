@@ -0,0 +1,187 @@
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select, text
+
+from app.models import User, Role, Student, BillingMode, Lesson, LessonStatus, LessonCharge, ChargeStatus
+from app.services.bank_import import (
+    ChargeIndex, PendingCharge, StatementLine, parse_statement, match_statement, import_statement,
+)
+
+
+class FakeFromUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class FakeMessage:
+    def __init__(self, user_id: int, document=None):
+        self.from_user = FakeFromUser(user_id)
+        self.document = document
+        self.answers = []
+
+    async def answer(self, text: str, **kwargs):
+        self.answers.append(text)
+
+
+class FakeState:
+    def __init__(self):
+        self.cleared = False
+
+    async def clear(self):
+        self.cleared = True
+
+
+class FakeBot:
+    def __init__(self, content: bytes):
+        self.content = content
+
+    async def download(self, file, destination):
+        with open(destination, "wb") as f:
+            f.write(self.content)
+
+
+async def _student_with_charges(session, name: str, amounts: list[int]) -> list[LessonCharge]:
+    st = Student(full_name=name, timezone="Europe/Moscow", billing_mode=BillingMode.single, price_per_lesson=1000)
+    session.add(st)
+    await session.flush()
+    charges = []
+    base = datetime(2026, 1, 5, 7, 0, tzinfo=timezone.utc)
+    for i, amount in enumerate(amounts):
+        lesson = Lesson(student_id=st.id, start_at=base + timedelta(days=i), status=LessonStatus.done)
+        session.add(lesson)
+        await session.flush()
+        ch = LessonCharge(lesson_id=lesson.id, student_id=st.id, amount=amount, status=ChargeStatus.pending)
+        session.add(ch)
+        charges.append(ch)
+    await session.flush()
+    return charges
+
+
+def test_parse_statement_streams_rows_and_reports_broken_lines():
+    lines = iter([
+        "Дата;Сумма;Назначение платежа\r\n",
+        "06.01.2026;1 500,00;Оплата за Анну\r\n",
+        "07.01.2026;-300,00;Комиссия\r\n",
+        "\r\n",
+        "кривая строка\r\n",
+    ])
+    items = list(parse_statement(lines))
+    assert items == [
+        StatementLine(2, date(2026, 1, 6), Decimal("1500.00"), "Оплата за Анну"),
+        3,  # списание — не поступление
+        5,
+    ]
+
+    with pytest.raises(ValueError):
+        list(parse_statement(["foo,bar\n", "1,2\n"]))
+
+
+def test_charge_index_matches_single_and_multi_lesson_payments():
+    index = ChargeIndex(
+        [
+            PendingCharge(1, 10, Decimal(1000), date(2026, 1, 5)),
+            PendingCharge(2, 10, Decimal(1000), date(2026, 1, 12)),
+            PendingCharge(3, 20, Decimal(1000), date(2026, 1, 5)),
+            PendingCharge(4, 20, Decimal(1500), date(2026, 1, 6)),
+        ],
+        {10: "Анна Петрова", 20: "Борис Сидоров"},
+    )
+    lines = [
+        "date,amount,description\n",
+        # ближайший по дате урок Анны
+        "2026-01-13,1000,Петрова А. за урок\n",
+        # 1000 + 1500 = два урока Бориса сразу
+        "2026-01-07,2500,СИДОРОВ Борис\n",
+        # второго урока на 1000 за эти даты у Анны уже нет... кроме 5-го
+        "2026-01-06,1000,Анна\n",
+        # повтор — всё уже закрыто
+        "2026-01-06,1000,Анна\n",
+        "2026-01-06,1000,Неизвестный\n",
+    ]
+    matched, unmatched, total = match_statement(lines, index)
+
+    assert matched == [(2, date(2026, 1, 13)), (3, date(2026, 1, 7)), (4, date(2026, 1, 7)), (1, date(2026, 1, 6))]
+    assert [u.line_no for u in unmatched] == [5, 6]
+    assert total == Decimal(4500)
+
+
+@pytest.mark.asyncio
+async def test_import_statement_applies_matches_in_one_update(session, tmp_path):
+    anna = await _student_with_charges(session, "Анна Петрова", [1000, 1000])
+    boris = await _student_with_charges(session, "Борис Сидоров", [1500])
+    await session.commit()
+
+    path = tmp_path / "statement.csv"
+    path.write_bytes((
+        "Дата;Сумма;Плательщик;Назначение платежа\n"
+        "05.01.2026;1000,00;Петрова Елена;за Анну\n"
+        "20.01.2026;777,00;Сидоров;прочее\n"
+    ).encode("cp1251"))
+
+    result = await import_statement(session, str(path))
+
+    assert result["paid"] == 1
+    assert result["sum"] == Decimal("1000.00")
+    assert [u.line_no for u in result["unmatched"]] == [3]
+
+    rows = (await session.execute(
+        select(LessonCharge.id, LessonCharge.status, LessonCharge.paid_at).order_by(LessonCharge.id)
+    )).all()
+    assert rows == [
+        (anna[0].id, ChargeStatus.paid, datetime(2026, 1, 5, tzinfo=timezone.utc)),
+        (anna[1].id, ChargeStatus.pending, None),
+        (boris[0].id, ChargeStatus.pending, None),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_import_statement_matches_group_lesson_charge(session, tmp_path):
+    from app.models import LessonGroup, GroupLesson
+
+    st = Student(full_name="Вера Иванова", timezone="Europe/Moscow", billing_mode=BillingMode.single,
+                 price_per_lesson=600)
+    group = LessonGroup(title="Английский", timezone="Europe/Moscow")
+    session.add_all([st, group])
+    await session.flush()
+    gl = GroupLesson(group_id=group.id, start_at=datetime(2026, 1, 7, 15, 0, tzinfo=timezone.utc),
+                     status=LessonStatus.done)
+    session.add(gl)
+    await session.flush()
+    ch = LessonCharge(group_lesson_id=gl.id, student_id=st.id, amount=600, status=ChargeStatus.pending)
+    session.add(ch)
+    await session.commit()
+
+    path = tmp_path / "statement.csv"
+    path.write_bytes("Дата;Сумма;Назначение платежа\n08.01.2026;600,00;Иванова за группу\n".encode("cp1251"))
+
+    result = await import_statement(session, str(path))
+
+    assert result["paid"] == 1 and result["unmatched"] == []
+    assert (await session.execute(
+        select(LessonCharge.status).where(LessonCharge.id == ch.id).execution_options(populate_existing=True)
+    )).scalar_one() == ChargeStatus.paid
+
+
+@pytest.mark.asyncio
+async def test_import_handler_downloads_document_and_reports(session):
+    import app.handlers.admin.unpaid as unpaid_mod
+
+    session.add(User(tg_id=9700, role=Role.teacher, name="T", timezone="Europe/Moscow"))
+    await _student_with_charges(session, "Clara Schmidt", [700])
+    await session.commit()
+
+    content = "\ufeffDate,Amount,Description\n2026-01-05,700,Schmidt lesson\n2026-01-05,50,tips\n".encode("utf-8")
+    message = FakeMessage(9700, document=object())
+    state = FakeState()
+    await unpaid_mod.unpaid_import_file(message, state, session, FakeBot(content))
+
+    assert state.cleared
+    report = message.answers[-1]
+    assert report.startswith("Импорт выписки: оплачено 1 ур. на сумму 700")
+    assert "Не сопоставлено строк: 1" in report
+    assert "стр. 3: 2026-01-05 50 tips" in report
+
+    pending = (await session.execute(text("select count(*) from lesson_charges where status = 'pending'"))).scalar()
+    assert pending == 0
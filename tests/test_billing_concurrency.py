@@ -0,0 +1,110 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, func
+
+from app.models import (
+    Student, BillingMode, Lesson, LessonStatus,
+    StudentBalance, LessonCharge, ParentStudent, Parent, User, Role,
+)
+from app.services.billing import mark_lesson_done
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []  # list[(tg_id, text)]
+
+    async def send_message(self, tg_id: int, text: str):
+        await asyncio.sleep(0)
+        self.sent.append((tg_id, text))
+
+
+async def _complete_in_parallel(sessionmaker, bot, lesson_ids: list[int]):
+    # у каждого «нажатия» своя сессия/соединение — как у двух реплик бота
+    async def one(lesson_id: int):
+        async with sessionmaker() as s:
+            return await mark_lesson_done(s, bot, lesson_id)
+
+    return await asyncio.gather(*(one(lid) for lid in lesson_ids))
+
+
+@pytest.mark.asyncio
+async def test_parallel_done_on_same_lesson_decrements_once(sessionmaker, session):
+    st = Student(full_name="A", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    session.add(st)
+    await session.flush()
+    session.add(StudentBalance(student_id=st.id, lessons_left=5))
+    lesson = Lesson(student_id=st.id, start_at=datetime.now(timezone.utc) + timedelta(days=1),
+                    status=LessonStatus.planned)
+    session.add(lesson)
+    await session.commit()
+
+    await _complete_in_parallel(sessionmaker, FakeBot(), [lesson.id] * 8)
+
+    async with sessionmaker() as s2:
+        left = (await s2.execute(
+            select(StudentBalance.lessons_left).where(StudentBalance.student_id == st.id)
+        )).scalar_one()
+    assert left == 4
+
+
+@pytest.mark.asyncio
+async def test_parallel_done_on_different_lessons_has_no_lost_updates(sessionmaker, session):
+    st = Student(full_name="A", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    session.add(st)
+    await session.flush()
+    session.add(StudentBalance(student_id=st.id, lessons_left=3))
+    lessons = [
+        Lesson(student_id=st.id, start_at=datetime(2026, 1, 5 + i, 7, 0, tzinfo=timezone.utc),
+               status=LessonStatus.planned)
+        for i in range(5)
+    ]
+    session.add_all(lessons)
+    await session.commit()
+
+    await _complete_in_parallel(sessionmaker, FakeBot(), [lesson.id for lesson in lessons])
+
+    async with sessionmaker() as s2:
+        left = (await s2.execute(
+            select(StudentBalance.lessons_left).where(StudentBalance.student_id == st.id)
+        )).scalar_one()
+        done = (await s2.execute(
+            select(func.count()).select_from(Lesson).where(Lesson.status == LessonStatus.done)
+        )).scalar_one()
+    # 5 уроков при остатке 3: ровно 3 списания, в минус не уходим
+    assert left == 0
+    assert done == 5
+
+
+@pytest.mark.asyncio
+async def test_parallel_done_single_charges_and_notifies_once(sessionmaker, session):
+    st = Student(full_name="Student", timezone="Europe/Moscow", billing_mode=BillingMode.single,
+                 price_per_lesson=1000)
+    session.add(st)
+    await session.flush()
+
+    u = User(tg_id=9101, role=Role.parent, name="P", timezone="Europe/Moscow")
+    session.add(u)
+    await session.flush()
+    p = Parent(user_id=u.id, full_name="Parent")
+    session.add(p)
+    await session.flush()
+    session.add(ParentStudent(parent_id=p.id, student_id=st.id))
+
+    lesson = Lesson(student_id=st.id, start_at=datetime(2026, 1, 5, 7, 0, tzinfo=timezone.utc),
+                    status=LessonStatus.planned)
+    session.add(lesson)
+    await session.commit()
+
+    bot = FakeBot()
+    results = await _complete_in_parallel(sessionmaker, bot, [lesson.id] * 4)
+
+    assert len([r for r in results if r.done]) == 1
+    assert [tg for tg, _ in bot.sent] == [9101]
+
+    async with sessionmaker() as s2:
+        cnt = (await s2.execute(
+            select(func.count()).select_from(LessonCharge).where(LessonCharge.lesson_id == lesson.id)
+        )).scalar_one()
+    assert cnt == 1
@@ -8,7 +8,7 @@ from app.models import (
     StudentBalance, LessonCharge, ChargeStatus,
     ParentStudent, Parent, User, Role
 )
-from app.services.billing import mark_lesson_done
+from app.services.billing import LessonDone, mark_lesson_done
 
 
 class FakeBot:
@@ -42,7 +42,7 @@ async def test_mark_lesson_done_subscription_creates_balance_if_missing_and_does
     bot = FakeBot()
     res = await mark_lesson_done(session, bot, lesson.id)
 
-    assert res is None
+    assert res == LessonDone(True, None)
     assert bot.sent == []
 
     # урок стал done
@@ -134,9 +134,10 @@ async def test_mark_lesson_done_single_creates_charge_and_notifies_parents(sessi
     await session.commit()
 
     bot = FakeBot()
-    charge_id = await mark_lesson_done(session, bot, lesson.id)
+    res = await mark_lesson_done(session, bot, lesson.id)
+    charge_id = res.charge_id
 
-    assert isinstance(charge_id, int)
+    assert res.done and isinstance(charge_id, int)
     assert len(bot.sent) == 2
     assert {tg for tg, _ in bot.sent} == {1001, 1002}
     assert all("К оплате:" in text for _, text in bot.sent)
@@ -173,7 +174,7 @@ async def test_mark_lesson_done_returns_none_if_not_planned(session):
     bot = FakeBot()
     res = await mark_lesson_done(session, bot, lesson.id)
 
-    assert res is None
+    assert res == LessonDone(False, None)
     assert bot.sent == []
 
 
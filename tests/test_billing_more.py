@@ -10,7 +10,7 @@ from app.models import (
     LessonCharge, ChargeStatus,
     ParentStudent, Parent, User, Role,
 )
-from app.services.billing import mark_lesson_done, mark_charge_paid
+from app.services.billing import LessonDone, mark_lesson_done, mark_charge_paid
 
 
 class FakeBot:
@@ -54,14 +54,14 @@ async def test_mark_lesson_done_single_is_idempotent(session):
 
     bot = FakeBot()
 
-    charge_id_1 = await mark_lesson_done(session, bot, lesson.id)
+    charge_id_1 = (await mark_lesson_done(session, bot, lesson.id)).charge_id
     await session.commit()
 
-    charge_id_2 = await mark_lesson_done(session, bot, lesson.id)
+    res_2 = await mark_lesson_done(session, bot, lesson.id)
     await session.commit()
 
     assert isinstance(charge_id_1, int)
-    assert charge_id_2 is None
+    assert res_2 == LessonDone(False, None)
 
     assert len(bot.sent) == 1
 
@@ -98,8 +98,8 @@ async def test_mark_lesson_done_subscription_is_idempotent(session):
     r1 = await mark_lesson_done(session, bot, lesson.id)
     r2 = await mark_lesson_done(session, bot, lesson.id)
 
-    assert r1 is None
-    assert r2 is None
+    assert r1 == LessonDone(True, None)
+    assert r2 == LessonDone(False, None)
     assert bot.sent == []  # в subscription уведомлений нет
 
     bal_db = (await session.execute(
@@ -0,0 +1,219 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError
+from sqlalchemy import select
+
+from app.models import (
+    User, Role, Student, BillingMode, Parent, ParentStudent,
+    Lesson, LessonStatus, Notification, NotificationStatus,
+)
+
+
+def _freeze_datetime(monkeypatch, module, fixed: datetime):
+    class FixedDateTime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return fixed if tz is not None else fixed.replace(tzinfo=None)
+
+    monkeypatch.setattr(module, "datetime", FixedDateTime)
+
+
+class FakeBot:
+    def __init__(self, blocked_tg_ids=()):
+        self.blocked = set(blocked_tg_ids)
+        self.sent = []
+        self.calls = 0
+
+    async def send_message(self, tg_id: int, text: str):
+        self.calls += 1
+        if tg_id in self.blocked:
+            raise TelegramForbiddenError(method=None, message="Forbidden: bot was blocked by the user")
+        self.sent.append((tg_id, text))
+
+
+class FakeFromUser:
+    def __init__(self, user_id: int, full_name: str):
+        self.id = user_id
+        self.full_name = full_name
+
+
+class FakeMessage:
+    def __init__(self, from_user: FakeFromUser, text: str | None = None):
+        self.from_user = from_user
+        self.text = text
+        self.answers = []
+
+    async def answer(self, text: str, reply_markup=None):
+        self.answers.append((text, reply_markup))
+
+
+class FakeFSMContext:
+    def __init__(self):
+        self.state = None
+
+    async def set_state(self, state):
+        self.state = state
+
+    async def clear(self):
+        self.state = None
+
+
+@pytest.mark.asyncio
+async def test_send_forbidden_marks_user_blocked(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, jobs, now)
+
+    u = User(tg_id=7701, role=Role.parent, name="P", timezone="Europe/Moscow")
+    session.add(u)
+    await session.flush()
+
+    n = Notification(user_id=u.id, type="hw_graded", entity_id=1, send_at=now - timedelta(minutes=1),
+                     payload="n", status=NotificationStatus.pending)
+    session.add(n)
+    await session.commit()
+
+    bot = FakeBot(blocked_tg_ids={7701})
+    result = await jobs.send_notifications_job(bot, batch_size=50)
+
+    assert bot.calls == 1
+    assert result["failed"] == 1
+
+    async with sessionmaker() as s2:
+        u2 = (await s2.execute(select(User).where(User.id == u.id))).scalar_one()
+        assert u2.blocked_at == now
+
+        n2 = (await s2.execute(select(Notification).where(Notification.id == n.id))).scalar_one()
+        assert n2.status == NotificationStatus.failed
+        assert "Forbidden" in n2.last_error
+
+
+@pytest.mark.asyncio
+async def test_send_to_blocked_user_is_suppressed_without_telegram_call(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, jobs, now)
+
+    blocked = User(tg_id=7711, role=Role.parent, name="B", timezone="Europe/Moscow", blocked_at=now - timedelta(days=1))
+    ok = User(tg_id=7712, role=Role.parent, name="OK", timezone="Europe/Moscow")
+    session.add_all([blocked, ok])
+    await session.flush()
+
+    session.add_all([
+        Notification(user_id=blocked.id, type="hw_graded", entity_id=1, send_at=now - timedelta(minutes=2),
+                     payload="b1", status=NotificationStatus.pending),
+        Notification(user_id=blocked.id, type="hw_graded", entity_id=2, send_at=now - timedelta(minutes=1),
+                     payload="b2", status=NotificationStatus.pending),
+        Notification(user_id=ok.id, type="hw_graded", entity_id=3, send_at=now - timedelta(minutes=1),
+                     payload="ok", status=NotificationStatus.pending),
+    ])
+    await session.commit()
+
+    bot = FakeBot()
+    result = await jobs.send_notifications_job(bot, batch_size=50)
+
+    assert bot.calls == 1
+    assert bot.sent == [(7712, "ok")]
+    assert result["suppressed"] == 2
+    assert result["sent"] == 1
+
+    async with sessionmaker() as s2:
+        errors = (await s2.execute(
+            select(Notification.last_error).where(Notification.user_id == blocked.id)
+        )).scalars().all()
+        assert errors == ["User blocked the bot", "User blocked the bot"]
+
+
+@pytest.mark.asyncio
+async def test_plan_lesson_notifications_skips_blocked_users(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, jobs, now)
+
+    student_user = User(tg_id=7801, role=Role.student, name="S", timezone="Europe/Moscow",
+                        blocked_at=now - timedelta(days=1))
+    parent_user = User(tg_id=7802, role=Role.parent, name="P", timezone="Europe/Moscow")
+    session.add_all([student_user, parent_user])
+    await session.flush()
+
+    st = Student(full_name="Student", timezone="Europe/Moscow", user_id=student_user.id)
+    session.add(st)
+    await session.flush()
+
+    p = Parent(user_id=parent_user.id, full_name="Parent")
+    session.add(p)
+    await session.flush()
+    session.add(ParentStudent(parent_id=p.id, student_id=st.id))
+
+    session.add(Lesson(student_id=st.id, start_at=now + timedelta(days=2), status=LessonStatus.planned))
+    await session.commit()
+
+    await jobs.plan_lesson_notifications_job()
+
+    async with sessionmaker() as s2:
+        user_ids = set((await s2.execute(select(Notification.user_id))).scalars().all())
+        assert user_ids == {parent_user.id}
+
+
+@pytest.mark.asyncio
+async def test_mark_lesson_done_skips_blocked_parent_and_marks_on_forbidden(session):
+    from app.services.billing import mark_lesson_done
+
+    st = Student(full_name="Student", timezone="Europe/Moscow", billing_mode=BillingMode.single, price_per_lesson=1000)
+    session.add(st)
+    await session.flush()
+
+    already_blocked = User(tg_id=7901, role=Role.parent, name="P1", timezone="Europe/Moscow",
+                           blocked_at=datetime(2025, 12, 1, tzinfo=timezone.utc))
+    will_block = User(tg_id=7902, role=Role.parent, name="P2", timezone="Europe/Moscow")
+    ok = User(tg_id=7903, role=Role.parent, name="P3", timezone="Europe/Moscow")
+    session.add_all([already_blocked, will_block, ok])
+    await session.flush()
+
+    for u in (already_blocked, will_block, ok):
+        p = Parent(user_id=u.id, full_name=u.name)
+        session.add(p)
+        await session.flush()
+        session.add(ParentStudent(parent_id=p.id, student_id=st.id))
+
+    lesson = Lesson(student_id=st.id, start_at=datetime(2026, 1, 5, 7, 0, tzinfo=timezone.utc),
+                    status=LessonStatus.planned)
+    session.add(lesson)
+    await session.commit()
+
+    bot = FakeBot(blocked_tg_ids={7902})
+    await mark_lesson_done(session, bot, lesson.id)
+
+    # уже заблокированному даже не пытались писать
+    assert bot.calls == 2
+    assert [tg for tg, _ in bot.sent] == [7903]
+
+    blocked = (await session.execute(
+        select(User.tg_id).where(User.blocked_at.is_not(None)).order_by(User.tg_id)
+    )).scalars().all()
+    assert blocked == [7901, 7902]
+
+
+@pytest.mark.asyncio
+async def test_start_unblocks_user(session):
+    import app.handlers.start as start_mod
+
+    u = User(tg_id=7951, role=Role.parent, name="P", timezone="Europe/Moscow",
+             blocked_at=datetime(2025, 12, 1, tzinfo=timezone.utc))
+    session.add(u)
+    await session.commit()
+
+    msg = FakeMessage(FakeFromUser(7951, "Parent"), text="/start")
+    await start_mod.start(msg, FakeFSMContext(), session)
+
+    assert "Вы уже зарегистрированы" in msg.answers[-1][0]
+
+    u2 = (await session.execute(select(User).where(User.tg_id == 7951))).scalar_one()
+    assert u2.blocked_at is None
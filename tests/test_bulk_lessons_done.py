@@ -0,0 +1,289 @@
+import logging
+import time as _time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event, select, func
+
+from app.callbacks import TodayCb
+from app.models import (
+    User, Role, Student, BillingMode, Parent, ParentStudent,
+    Lesson, LessonStatus, StudentBalance, BalanceEntry, BalanceReason, LessonCharge, ChargeStatus,
+    Notification,
+)
+from app.services.billing import mark_lessons_done_bulk
+
+log = logging.getLogger(__name__)
+
+
+def _freeze_datetime(monkeypatch, module, fixed: datetime):
+    class FixedDateTime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return fixed if tz is not None else fixed.replace(tzinfo=None)
+
+    monkeypatch.setattr(module, "datetime", FixedDateTime)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, tg_id: int, text: str):
+        self.sent.append((tg_id, text))
+
+
+class FakeFromUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text: str, **kwargs):
+        self.edits.append((text, kwargs))
+
+
+class FakeCallbackQuery:
+    def __init__(self, user_id: int):
+        self.from_user = FakeFromUser(user_id)
+        self.message = FakeMessage()
+        self.answered = []
+
+    async def answer(self, text: str | None = None, show_alert: bool = False):
+        self.answered.append(text)
+
+
+class FakeFSMContext:
+    def __init__(self):
+        self.data = {}
+
+    async def update_data(self, **kwargs):
+        self.data.update(kwargs)
+
+    async def get_data(self):
+        return dict(self.data)
+
+
+DAY = datetime(2026, 1, 5, 6, 0, tzinfo=timezone.utc)  # 09:00 МСК
+
+
+async def _parent_of(session, tg_id: int, *students):
+    u = User(tg_id=tg_id, role=Role.parent, name="P", timezone="Europe/Moscow")
+    session.add(u)
+    await session.flush()
+    p = Parent(user_id=u.id, full_name="Parent")
+    session.add(p)
+    await session.flush()
+    session.add_all([ParentStudent(parent_id=p.id, student_id=st.id) for st in students])
+    return u
+
+
+@pytest.mark.asyncio
+async def test_bulk_done_bills_everything_in_one_transaction(monkeypatch, sessionmaker, session):
+    sub = Student(full_name="Sub", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    one = Student(full_name="One", timezone="Europe/Moscow", billing_mode=BillingMode.single, price_per_lesson=1500)
+    two = Student(full_name="Two", timezone="Europe/Moscow", billing_mode=BillingMode.single, price_per_lesson=1000)
+    noprice = Student(full_name="NoPrice", timezone="Europe/Moscow", billing_mode=BillingMode.single)
+    session.add_all([sub, one, two, noprice])
+    await session.flush()
+    session.add(StudentBalance(student_id=sub.id, lessons_left=1))
+    parent = await _parent_of(session, 9501, one, two)
+
+    lessons = {
+        "sub1": Lesson(student_id=sub.id, start_at=DAY, status=LessonStatus.planned),
+        "sub2": Lesson(student_id=sub.id, start_at=DAY + timedelta(hours=2), status=LessonStatus.planned),
+        "one": Lesson(student_id=one.id, start_at=DAY + timedelta(hours=1), status=LessonStatus.planned),
+        "two": Lesson(student_id=two.id, start_at=DAY + timedelta(hours=3), status=LessonStatus.planned),
+        "noprice": Lesson(student_id=noprice.id, start_at=DAY + timedelta(hours=4), status=LessonStatus.planned),
+        "already": Lesson(student_id=one.id, start_at=DAY - timedelta(days=1), status=LessonStatus.done),
+    }
+    session.add_all(lessons.values())
+    await session.commit()
+
+    res = await mark_lessons_done_bulk(session, [lesson.id for lesson in lessons.values()])
+
+    assert res == {"done": 4, "charged": 1, "charges": 2, "skipped": [lessons["noprice"].id]}
+
+    async with sessionmaker() as s2:
+        statuses = dict((await s2.execute(select(Lesson.id, Lesson.status))).all())
+        assert statuses[lessons["noprice"].id] == LessonStatus.planned
+        assert statuses[lessons["sub2"].id] == LessonStatus.done
+
+        assert (await s2.execute(select(StudentBalance.lessons_left))).scalar_one() == 0
+        # остаток покрыл только более ранний урок; баланс заведён до журнала —
+        # первым движением записан и начальный остаток
+        assert (await s2.execute(
+            select(BalanceEntry.reason, BalanceEntry.lesson_id).order_by(BalanceEntry.id)
+        )).all() == [(BalanceReason.opening, None), (BalanceReason.lesson, lessons["sub1"].id)]
+
+        charges = (await s2.execute(
+            select(LessonCharge.lesson_id, LessonCharge.amount, LessonCharge.status).order_by(LessonCharge.lesson_id)
+        )).all()
+        assert charges == [
+            (lessons["one"].id, 1500, ChargeStatus.pending),
+            (lessons["two"].id, 1000, ChargeStatus.pending),
+        ]
+
+        queued = (await s2.execute(
+            select(Notification.user_id, Notification.type, Notification.entity_id).order_by(Notification.entity_id)
+        )).all()
+        assert queued == [
+            (parent.id, "lesson_done", lessons["one"].id),
+            (parent.id, "lesson_done", lessons["two"].id),
+        ]
+
+    # родитель получает одно склеенное сообщение по обоим детям
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+    _freeze_datetime(monkeypatch, jobs, datetime.now(timezone.utc) + timedelta(seconds=1))
+
+    bot = FakeBot()
+    await jobs.send_notifications_job(bot)
+
+    assert len(bot.sent) == 1
+    tg_id, text = bot.sent[0]
+    assert tg_id == 9501
+    assert "Ученик: One" in text and "К оплате: 1500.00" in text
+    assert "Ученик: Two" in text and "К оплате: 1000.00" in text
+
+
+@pytest.mark.asyncio
+async def test_today_screen_excludes_picked_lessons(monkeypatch, session):
+    import app.handlers.admin.today as today_mod
+
+    now = datetime(2026, 1, 5, 15, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, today_mod, now)
+
+    teacher = User(tg_id=9601, role=Role.teacher, name="T", timezone="Europe/Moscow")
+    a = Student(full_name="Anna", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    b = Student(full_name="Boris", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    session.add_all([teacher, a, b])
+    await session.flush()
+    la = Lesson(student_id=a.id, start_at=DAY, status=LessonStatus.planned)
+    lb = Lesson(student_id=b.id, start_at=DAY + timedelta(hours=1), status=LessonStatus.planned)
+    tomorrow = Lesson(student_id=a.id, start_at=DAY + timedelta(days=1), status=LessonStatus.planned)
+    session.add_all([la, lb, tomorrow])
+    await session.commit()
+
+    call = FakeCallbackQuery(9601)
+    state = FakeFSMContext()
+
+    await today_mod.admin_today(call, state, session)
+    kb = call.message.edits[-1][1]["reply_markup"]
+    labels = [btn.text for row in kb.inline_keyboard for btn in row]
+    assert labels == ["✅ 09:00 Anna", "✅ 10:00 Boris", "Отметить проведёнными (2)", "Назад"]
+
+    await today_mod.today_toggle(call, TodayCb(action="toggle", lesson_id=lb.id), state, session)
+    kb = call.message.edits[-1][1]["reply_markup"]
+    labels = [btn.text for row in kb.inline_keyboard for btn in row]
+    assert labels == ["✅ 09:00 Anna", "⛔ 10:00 Boris", "Отметить проведёнными (1)", "Назад"]
+
+    await today_mod.today_done(call, state, session)
+    assert call.message.edits[-1][0].startswith("Отмечено проведёнными: 1")
+
+    statuses = dict((await session.execute(
+        select(Lesson.id, Lesson.status).execution_options(populate_existing=True)
+    )).all())
+    assert statuses == {la.id: LessonStatus.done, lb.id: LessonStatus.planned, tomorrow.id: LessonStatus.planned}
+
+
+@pytest.mark.asyncio
+async def test_today_done_marks_only_lessons_shown_on_screen(monkeypatch, session):
+    import app.handlers.admin.today as today_mod
+
+    now = datetime(2026, 1, 5, 15, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, today_mod, now)
+
+    teacher = User(tg_id=9602, role=Role.teacher, name="T", timezone="Europe/Moscow")
+    a = Student(full_name="Anna", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    session.add_all([teacher, a])
+    await session.flush()
+    shown = Lesson(student_id=a.id, start_at=DAY, status=LessonStatus.planned)
+    session.add(shown)
+    await session.commit()
+
+    call = FakeCallbackQuery(9602)
+    state = FakeFSMContext()
+    await today_mod.admin_today(call, state, session)
+
+    # урок появился в этом дне уже после того, как экран был показан
+    late = Lesson(student_id=a.id, start_at=DAY + timedelta(hours=2), status=LessonStatus.planned)
+    session.add(late)
+    await session.commit()
+
+    await today_mod.today_done(call, state, session)
+    assert call.message.edits[-1][0].startswith("Отмечено проведёнными: 1")
+    statuses = dict((await session.execute(
+        select(Lesson.id, Lesson.status).execution_options(populate_existing=True)
+    )).all())
+    assert statuses == {shown.id: LessonStatus.done, late.id: LessonStatus.planned}
+    # теперь он на экране — следующая отметка его включит
+    assert state.data["today_shown"] == [late.id]
+
+
+async def _seed_day(session, n_lessons: int, tg_base: int, n_students: int = 20):
+    students = []
+    for i in range(n_students):
+        mode = BillingMode.subscription if i % 2 else BillingMode.single
+        st = Student(full_name=f"S{i}", timezone="Europe/Moscow", billing_mode=mode,
+                     price_per_lesson=None if i % 2 else 1000)
+        students.append(st)
+    session.add_all(students)
+    await session.flush()
+    session.add_all([StudentBalance(student_id=st.id, lessons_left=3) for st in students[1::2]])
+    for i, st in enumerate(students[::2]):
+        await _parent_of(session, tg_base + i, st)
+
+    lessons = [
+        Lesson(student_id=students[i % n_students].id, start_at=DAY + timedelta(minutes=i), status=LessonStatus.planned)
+        for i in range(n_lessons)
+    ]
+    session.add_all(lessons)
+    await session.commit()
+    return [lesson.id for lesson in lessons]
+
+
+async def _run_counted(engine, session, lesson_ids):
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", _count)
+    try:
+        started = _time.perf_counter()
+        res = await mark_lessons_done_bulk(session, lesson_ids)
+        elapsed = _time.perf_counter() - started
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", _count)
+    return res, len(statements), elapsed
+
+
+@pytest.mark.asyncio
+async def test_bulk_done_benchmark_100_lessons_constant_round_trips(engine, sessionmaker):
+    async with sessionmaker() as s:
+        ids_small = await _seed_day(s, 10, tg_base=9700)
+        res_small, stmts_small, _ = await _run_counted(engine, s, ids_small)
+
+    async with sessionmaker() as s:
+        ids = await _seed_day(s, 100, tg_base=9800)
+        res, stmts, elapsed = await _run_counted(engine, s, ids)
+        # замер — в лог (pytest --log-cli-level=INFO), проверяется же число запросов
+        log.info("mark_lessons_done_bulk: 100 lessons, %s statements, %.1f ms", stmts, elapsed * 1000)
+
+        assert res["done"] == 100
+        # 10 абонементных учеников по 5 уроков при остатке 3
+        assert res["charged"] == 30
+        assert res["charges"] == 50
+        notified = (await s.execute(
+            select(func.count()).select_from(Notification).where(Notification.entity_id.in_(ids))
+        )).scalar_one()
+        assert notified == 50
+
+    assert res_small["done"] == 10
+    # число запросов не зависит от числа уроков
+    assert stmts == stmts_small
+    assert stmts <= 10
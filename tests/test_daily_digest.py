@@ -0,0 +1,244 @@
+from datetime import datetime, time, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import select
+
+from app.models import (
+    User, Role, Student, Parent, ParentStudent, Lesson, LessonStatus,
+    Notification, NotificationStatus, NotificationSettings,
+)
+
+
+def _freeze_datetime(monkeypatch, module, fixed: datetime):
+    class FixedDateTime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return fixed if tz is not None else fixed.replace(tzinfo=None)
+
+    monkeypatch.setattr(module, "datetime", FixedDateTime)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, tg_id: int, text: str):
+        self.sent.append((tg_id, text))
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text: str, reply_markup=None):
+        self.edits.append((text, reply_markup))
+
+
+async def _setup_family(session, now):
+    teacher = User(tg_id=4400, role=Role.teacher, name="T", timezone="Europe/Moscow")
+    student_user = User(tg_id=4401, role=Role.student, name="S", timezone="Europe/Moscow")
+    parent_user = User(tg_id=4402, role=Role.parent, name="P", timezone="Asia/Novosibirsk")
+    session.add_all([teacher, student_user, parent_user])
+    await session.flush()
+
+    kid1 = Student(full_name="Kid One", timezone="Europe/Moscow", user_id=student_user.id)
+    kid2 = Student(full_name="Kid Two", timezone="Europe/Moscow")
+    session.add_all([kid1, kid2])
+    await session.flush()
+
+    p = Parent(user_id=parent_user.id, full_name="Parent")
+    session.add(p)
+    await session.flush()
+    session.add_all([
+        ParentStudent(parent_id=p.id, student_id=kid1.id),
+        ParentStudent(parent_id=p.id, student_id=kid2.id),
+    ])
+
+    # 2026-01-02: 10:00 и 12:00 UTC -> 13:00/15:00 МСК, 17:00/19:00 НСК
+    session.add_all([
+        Lesson(student_id=kid1.id, start_at=datetime(2026, 1, 2, 10, 0, tzinfo=timezone.utc), status=LessonStatus.planned),
+        Lesson(student_id=kid2.id, start_at=datetime(2026, 1, 2, 12, 0, tzinfo=timezone.utc), status=LessonStatus.planned),
+    ])
+    await session.flush()
+    return teacher, student_user, parent_user
+
+
+@pytest.mark.asyncio
+async def test_plan_daily_digest_one_row_per_user_per_local_day(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+    monkeypatch.setattr(jobs.settings, "teacher_tg_id", 4400)
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, jobs, now)
+
+    teacher, student_user, parent_user = await _setup_family(session, now)
+    session.add_all([
+        NotificationSettings(user_id=teacher.id, daily_digest=True, digest_hour=8),
+        NotificationSettings(user_id=parent_user.id, daily_digest=True, digest_hour=7),
+        # у ученика дайджест выключен
+        NotificationSettings(user_id=student_user.id, daily_digest=False),
+    ])
+    await session.commit()
+
+    await jobs.plan_daily_digest_job()
+    await jobs.plan_daily_digest_job()  # идемпотентно
+
+    async with sessionmaker() as s2:
+        rows = (await s2.execute(
+            select(Notification).where(Notification.type == "daily_digest").order_by(Notification.user_id)
+        )).scalars().all()
+
+    assert [(n.user_id, n.entity_id, n.send_at) for n in rows] == [
+        # 08:00 МСК = 05:00 UTC
+        (teacher.id, 20260102, datetime(2026, 1, 2, 5, 0, tzinfo=timezone.utc)),
+        # 07:00 НСК = 00:00 UTC
+        (parent_user.id, 20260102, datetime(2026, 1, 2, 0, 0, tzinfo=timezone.utc)),
+    ]
+    assert all(n.status == NotificationStatus.pending for n in rows)
+
+
+@pytest.mark.asyncio
+async def test_plan_daily_digest_shifts_out_of_quiet_hours(session):
+    from app.jobs_notifications import plan_daily_digest
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    teacher, student_user, parent_user = await _setup_family(session, now)
+    # дайджест в 07:00 НСК попадает в тихие часы 22:00–09:00 -> уходит в 09:00 НСК
+    session.add(NotificationSettings(
+        user_id=parent_user.id, daily_digest=True, digest_hour=7, quiet_start=time(22, 0), quiet_end=time(9, 0),
+    ))
+    await session.commit()
+
+    await plan_daily_digest(session, now)
+    await session.commit()
+
+    send_at = (await session.execute(
+        select(Notification.send_at).where(Notification.type == "daily_digest")
+    )).scalar_one()
+    assert send_at == datetime(2026, 1, 2, 2, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_quiet_hours_change_replaces_pending_digest(monkeypatch, session):
+    import app.handlers.notify_settings as ns_mod
+    from app.jobs_notifications import plan_daily_digest
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, ns_mod, now)
+
+    _teacher, _student_user, parent_user = await _setup_family(session, now)
+    session.add(NotificationSettings(user_id=parent_user.id, daily_digest=True, digest_hour=7))
+    await session.commit()
+    await plan_daily_digest(session, now)
+    await session.commit()
+
+    # выкл -> 22–08: дайджест в 07:00 НСК уходит на 08:00 НСК, старая строка не остаётся
+    call = SimpleNamespace(from_user=SimpleNamespace(id=4402), message=FakeMessage(), answer=AsyncMock())
+    await ns_mod.notify_cycle_quiet(call, session)
+
+    rows = (await session.execute(
+        select(Notification.send_at).where(Notification.type == "daily_digest")
+    )).scalars().all()
+    assert rows == [datetime(2026, 1, 2, 1, 0, tzinfo=timezone.utc)]
+
+
+@pytest.mark.asyncio
+async def test_lesson_planner_skips_24h_for_digest_users(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, jobs, now)
+
+    u = User(tg_id=4501, role=Role.student, name="S", timezone="Europe/Moscow")
+    session.add(u)
+    await session.flush()
+    st = Student(full_name="S", timezone="Europe/Moscow", user_id=u.id)
+    session.add(st)
+    await session.flush()
+    session.add(Lesson(student_id=st.id, start_at=now + timedelta(days=2), status=LessonStatus.planned))
+    session.add(NotificationSettings(user_id=u.id, daily_digest=True))
+    await session.commit()
+
+    await jobs.plan_lesson_notifications_job()
+
+    kinds = (await session.execute(select(Notification.type))).scalars().all()
+    assert kinds == ["lesson_1h"]
+
+
+@pytest.mark.asyncio
+async def test_send_daily_digest_lists_all_children_in_user_tz(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+
+    now = datetime(2026, 1, 2, 0, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, jobs, now)
+
+    _teacher, _student_user, parent_user = await _setup_family(session, now)
+    session.add(Notification(user_id=parent_user.id, type="daily_digest", entity_id=20260102, send_at=now))
+    await session.commit()
+
+    bot = FakeBot()
+    await jobs.send_notifications_job(bot)
+
+    assert bot.sent == [(4402, "Уроки на 2026-01-02 (Asia/Novosibirsk):\n- 17:00 Kid One\n- 19:00 Kid Two")]
+
+
+@pytest.mark.asyncio
+async def test_send_daily_digest_without_lessons_is_skipped(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+
+    now = datetime(2026, 1, 2, 5, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, jobs, now)
+
+    u = User(tg_id=4601, role=Role.parent, name="P", timezone="Europe/Moscow")
+    session.add(u)
+    await session.flush()
+    n = Notification(user_id=u.id, type="daily_digest", entity_id=20260102, send_at=now)
+    session.add(n)
+    await session.commit()
+
+    bot = FakeBot()
+    result = await jobs.send_notifications_job(bot)
+
+    assert bot.sent == []
+    assert result["skipped"] == 1
+
+    async with sessionmaker() as s2:
+        n2 = (await s2.execute(select(Notification).where(Notification.id == n.id))).scalar_one()
+        assert n2.status == NotificationStatus.skipped
+
+
+@pytest.mark.asyncio
+async def test_toggle_digest_handler_replaces_pending_24h(session):
+    import app.handlers.notify_settings as ns_mod
+
+    u = User(tg_id=4701, role=Role.parent, name="P", timezone="Europe/Moscow")
+    session.add(u)
+    await session.flush()
+    now = datetime.now(timezone.utc)
+    session.add_all([
+        Notification(user_id=u.id, type="lesson_24h", entity_id=1, send_at=now + timedelta(hours=5)),
+        Notification(user_id=u.id, type="lesson_1h", entity_id=1, send_at=now + timedelta(hours=28)),
+    ])
+    await session.commit()
+
+    call = SimpleNamespace(from_user=SimpleNamespace(id=4701), message=FakeMessage(), answer=AsyncMock())
+    await ns_mod.notify_toggle_digest(call, session)
+
+    assert "Дайджест на день: включён" in call.message.edits[-1][0]
+    call.answer.assert_awaited_with("Дайджест включён")
+
+    ns = (await session.execute(select(NotificationSettings).where(NotificationSettings.user_id == u.id))).scalar_one()
+    assert ns.daily_digest is True
+
+    kinds = (await session.execute(select(Notification.type).where(Notification.user_id == u.id))).scalars().all()
+    assert kinds == ["lesson_1h"]
+
+    # выключаем обратно
+    await ns_mod.notify_toggle_digest(call, session)
+    assert "Дайджест на день: выключен" in call.message.edits[-1][0]
@@ -0,0 +1,169 @@
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import select, update
+
+from app.models import (
+    User, Role, Student, BillingMode, Lesson, LessonStatus, LessonCharge, ChargeStatus,
+    BalanceEntry, BalanceReason, Homework, DailyStats,
+)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text: str, reply_markup=None):
+        self.edits.append((text, reply_markup))
+
+
+async def _seed(session):
+    st = Student(full_name="Kid", timezone="Europe/Moscow", billing_mode=BillingMode.single, price_per_lesson=1000)
+    session.add(st)
+    await session.flush()
+
+    # 2026-03-10 22:30 UTC = 11 марта 01:30 МСК
+    done = Lesson(student_id=st.id, start_at=datetime(2026, 3, 10, 22, 30, tzinfo=timezone.utc), status=LessonStatus.done)
+    canceled = Lesson(student_id=st.id, start_at=datetime(2026, 3, 12, 10, 0, tzinfo=timezone.utc), status=LessonStatus.canceled)
+    april = Lesson(student_id=st.id, start_at=datetime(2026, 4, 2, 10, 0, tzinfo=timezone.utc), status=LessonStatus.done)
+    planned = Lesson(student_id=st.id, start_at=datetime(2026, 4, 3, 10, 0, tzinfo=timezone.utc), status=LessonStatus.planned)
+    session.add_all([done, canceled, april, planned])
+    await session.flush()
+    session.add_all([
+        LessonCharge(lesson_id=done.id, student_id=st.id, amount=1000, status=ChargeStatus.paid),
+        LessonCharge(lesson_id=april.id, student_id=st.id, amount=1500, status=ChargeStatus.pending),
+        BalanceEntry(student_id=st.id, delta=8, reason=BalanceReason.package,
+                     created_at=datetime(2026, 3, 1, 9, 0, tzinfo=timezone.utc)),
+        BalanceEntry(student_id=st.id, delta=1, reason=BalanceReason.correction,
+                     created_at=datetime(2026, 3, 1, 9, 0, tzinfo=timezone.utc)),
+        Homework(student_id=st.id, title="a", description="-", grade=8,
+                 created_at=datetime(2026, 3, 5, 9, 0, tzinfo=timezone.utc)),
+        Homework(student_id=st.id, title="b", description="-", grade=9,
+                 created_at=datetime(2026, 3, 6, 9, 0, tzinfo=timezone.utc)),
+        Homework(student_id=st.id, title="c", description="-", grade=None,
+                 created_at=datetime(2026, 3, 6, 9, 0, tzinfo=timezone.utc)),
+    ])
+    await session.commit()
+    return st, done, canceled, april, planned
+
+
+@pytest.mark.asyncio
+async def test_rollup_builds_days_and_monthly_report(session):
+    from app.jobs_stats import rollup_daily_stats
+    from app.services.analytics import monthly_stats
+
+    await _seed(session)
+    now = datetime.now(timezone.utc)
+    assert await rollup_daily_stats(session, now) == 7
+    await session.commit()
+
+    mar11 = (await session.execute(select(DailyStats).where(DailyStats.day == date(2026, 3, 11)))).scalar_one()
+    assert (mar11.lessons_done, mar11.revenue) == (1, Decimal("1000.00"))
+
+    assert await monthly_stats(session) == [
+        (date(2026, 4, 1), 1, 0, Decimal("1500.00"), 0, None),
+        (date(2026, 3, 1), 1, 1, Decimal("1000.00"), 1, Decimal("8.5")),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_rollup_recomputes_only_changed_days(session):
+    from app.jobs_stats import rollup_daily_stats, ROLLUP_OVERLAP
+
+    *_rest, planned = await _seed(session)
+    first = datetime.now(timezone.utc)
+    await rollup_daily_stats(session, first)
+    await session.commit()
+
+    # изменения в окне запаса перед водяным знаком пересчитываются ещё раз (пакет — старый, не попадает)
+    assert await rollup_daily_stats(session, first + ROLLUP_OVERLAP * 2) == 6
+    await session.commit()
+    # дальше — без изменений пересчитывать нечего
+    assert await rollup_daily_stats(session, first + ROLLUP_OVERLAP * 4) == 0
+    await session.commit()
+
+    await session.execute(
+        update(Lesson).where(Lesson.id == planned.id)
+        .values(status=LessonStatus.canceled, updated_at=first + ROLLUP_OVERLAP * 5)
+    )
+    await session.commit()
+
+    assert await rollup_daily_stats(session, first + ROLLUP_OVERLAP * 6) == 1
+    await session.commit()
+
+    apr3 = (await session.execute(select(DailyStats).where(DailyStats.day == date(2026, 4, 3)))).scalar_one()
+    assert apr3.lessons_canceled == 1
+
+
+@pytest.mark.asyncio
+async def test_admin_analytics_screen(session):
+    import app.handlers.admin.analytics as analytics_mod
+    from app.jobs_stats import rollup_daily_stats
+
+    session.add(User(tg_id=9900, role=Role.teacher, name="T", timezone="Europe/Moscow"))
+    await _seed(session)
+    await rollup_daily_stats(session, datetime.now(timezone.utc))
+    await session.commit()
+
+    call = SimpleNamespace(from_user=SimpleNamespace(id=9900), message=FakeMessage(), answer=AsyncMock())
+    await analytics_mod.admin_analytics(call, session)
+
+    text = call.message.edits[-1][0]
+    assert "2026-04: проведено 1, отменено 0, выручка 1500.00, пакетов 0, ср. оценка ДЗ -" in text
+    assert "2026-03: проведено 1, отменено 1, выручка 1000.00, пакетов 1, ср. оценка ДЗ 8.5" in text
+    assert text.index("2026-04") < text.index("2026-03")
+
+
+@pytest.mark.asyncio
+async def test_revenue_counts_done_lessons_and_group_charges_only(session):
+    from app.jobs_stats import rollup_daily_stats
+    from app.models import LessonGroup, GroupLesson
+
+    st, done, canceled, april, planned = await _seed(session)
+    group = LessonGroup(title="G", timezone="Europe/Moscow")
+    session.add(group)
+    await session.flush()
+    # 2026-03-11 15:00 МСК — в тот же день, что и урок done
+    gl = GroupLesson(group_id=group.id, start_at=datetime(2026, 3, 11, 12, 0, tzinfo=timezone.utc),
+                     status=LessonStatus.done)
+    session.add(gl)
+    await session.flush()
+    session.add_all([
+        LessonCharge(group_lesson_id=gl.id, student_id=st.id, amount=400, status=ChargeStatus.pending),
+        # предоплата ещё не прошедшего урока и отменённое начисление — не выручка
+        LessonCharge(lesson_id=planned.id, student_id=st.id, amount=700, status=ChargeStatus.paid),
+        LessonCharge(lesson_id=canceled.id, student_id=st.id, amount=900, status=ChargeStatus.canceled),
+    ])
+    await session.commit()
+
+    await rollup_daily_stats(session, datetime.now(timezone.utc))
+    await session.commit()
+
+    revenue = dict((await session.execute(select(DailyStats.day, DailyStats.revenue))).all())
+    assert revenue[date(2026, 3, 11)] == Decimal("1400.00")
+    assert revenue[date(2026, 3, 12)] == revenue[date(2026, 4, 3)] == Decimal("0.00")
+
+
+@pytest.mark.asyncio
+async def test_student_delete_rolls_up_their_days(session):
+    import app.handlers.admin.student_delete as del_mod
+    from app.callbacks import AdminCb
+    from app.jobs_stats import rollup_daily_stats
+
+    session.add(User(tg_id=9901, role=Role.teacher, name="T", timezone="Europe/Moscow"))
+    st, *_lessons = await _seed(session)
+    await rollup_daily_stats(session, datetime.now(timezone.utc))
+    await session.commit()
+
+    call = SimpleNamespace(from_user=SimpleNamespace(id=9901), message=FakeMessage(), answer=AsyncMock())
+    await del_mod.student_delete_confirm(call, AdminCb(action="student_delete_confirm", student_id=st.id), session)
+
+    stats = (await session.execute(
+        select(DailyStats.lessons_done, DailyStats.lessons_canceled, DailyStats.revenue,
+               DailyStats.packages_sold, DailyStats.hw_graded)
+        .execution_options(populate_existing=True)
+    )).all()
+    assert stats and all(row == (0, 0, 0, 0, 0) for row in stats)
@@ -0,0 +1,188 @@
+import csv
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.models import (
+    User, Role, Student, BillingMode, Lesson, LessonStatus, LessonCharge, ChargeStatus, Homework,
+    LessonGroup, GroupLesson,
+)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.answers = []
+
+    async def answer(self, text: str, **kwargs):
+        self.answers.append(text)
+
+
+class FakeBot:
+    def __init__(self):
+        self.documents = []
+
+    async def send_document(self, chat_id: int, document, **kwargs):
+        # файл удаляется после выгрузки — читаем сразу
+        with open(document.path, encoding="utf-8-sig") as f:
+            self.documents.append((chat_id, document.filename, f.read()))
+
+
+async def _seed(session):
+    st = Student(full_name="Kid", timezone="Europe/Moscow", billing_mode=BillingMode.single, price_per_lesson=1000)
+    session.add(st)
+    await session.flush()
+    lessons = [
+        Lesson(student_id=st.id, start_at=datetime(2026, 3, d, 10, 0, tzinfo=timezone.utc),
+               status=LessonStatus.done, topic=f"t{d}")
+        for d in (2, 3, 4)
+    ]
+    # вне периода
+    lessons.append(Lesson(student_id=st.id, start_at=datetime(2026, 4, 1, 10, 0, tzinfo=timezone.utc)))
+    session.add_all(lessons)
+    await session.flush()
+    session.add_all([
+        LessonCharge(lesson_id=lessons[0].id, student_id=st.id, amount=1000, status=ChargeStatus.paid,
+                     paid_at=datetime(2026, 3, 5, 8, 0, tzinfo=timezone.utc)),
+        LessonCharge(lesson_id=lessons[1].id, student_id=st.id, amount=1500, status=ChargeStatus.pending),
+        Homework(student_id=st.id, title="Эссе", description="-", grade=9,
+                 created_at=datetime(2026, 3, 2, 12, 0, tzinfo=timezone.utc)),
+    ])
+    await session.commit()
+    return st, lessons
+
+
+def _read_csv(path):
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        return list(csv.reader(f, delimiter=";"))
+
+
+def test_export_period_bounds():
+    from app.handlers.admin.export import export_period_bounds
+
+    assert export_period_bounds("month", date(2026, 12, 15)) == (date(2026, 12, 1), date(2027, 1, 1))
+    assert export_period_bounds("prev_month", date(2026, 1, 15)) == (date(2025, 12, 1), date(2026, 1, 1))
+    assert export_period_bounds("prev_month", date(2026, 3, 1)) == (date(2026, 2, 1), date(2026, 3, 1))
+    assert export_period_bounds("year", date(2026, 3, 1)) == (date(2026, 1, 1), date(2027, 1, 1))
+
+
+@pytest.mark.asyncio
+async def test_export_csv_streams_in_batches(session, tmp_path, monkeypatch):
+    import app.services.export as export_mod
+
+    _st, lessons = await _seed(session)
+
+    batches = []
+    orig_write = export_mod.CsvSink.write
+
+    def spy_write(self, rows, tz):
+        batches.append(len(rows))
+        orig_write(self, rows, tz)
+
+    monkeypatch.setattr(export_mod.CsvSink, "write", spy_write)
+
+    paths = await export_mod.export_data(
+        session,
+        datetime(2026, 2, 28, 21, 0, tzinfo=timezone.utc),
+        datetime(2026, 3, 31, 21, 0, tzinfo=timezone.utc),
+        "Europe/Moscow", "csv", str(tmp_path), batch_size=2,
+    )
+
+    assert [p.rsplit("/", 1)[-1] for p in paths] == [
+        "lessons_20260301-20260401.csv", "charges_20260301-20260401.csv", "homeworks_20260301-20260401.csv",
+    ]
+    # 3 урока пачками по 2, 2 начисления, 1 ДЗ
+    assert batches == [2, 1, 2, 1]
+
+    assert _read_csv(paths[0]) == [
+        export_mod.EXPORT_HEADERS["lessons"],
+        [str(lessons[0].id), "Kid", "", "2026-03-02 13:00", "60", "done", "t2", ""],
+        [str(lessons[1].id), "Kid", "", "2026-03-03 13:00", "60", "done", "t3", ""],
+        [str(lessons[2].id), "Kid", "", "2026-03-04 13:00", "60", "done", "t4", ""],
+    ]
+    charges = _read_csv(paths[1])
+    assert [row[5:] for row in charges[1:]] == [["1000.00", "paid", "2026-03-05 11:00"], ["1500.00", "pending", ""]]
+    homeworks = _read_csv(paths[2])
+    assert homeworks[1][1:4] + homeworks[1][6:7] == ["Kid", "Эссе", "2026-03-02 15:00", "9"]
+
+
+@pytest.mark.asyncio
+async def test_export_includes_group_lessons_and_charges(session, tmp_path):
+    from app.services.export import export_data
+
+    st, lessons = await _seed(session)
+    group = LessonGroup(title="Английский", timezone="Europe/Moscow")
+    session.add(group)
+    await session.flush()
+    gl = GroupLesson(group_id=group.id, start_at=datetime(2026, 3, 3, 10, 0, tzinfo=timezone.utc),
+                     duration_min=90, status=LessonStatus.done)
+    session.add(gl)
+    await session.flush()
+    session.add(LessonCharge(group_lesson_id=gl.id, student_id=st.id, amount=600, status=ChargeStatus.pending))
+    await session.commit()
+
+    paths = await export_data(
+        session,
+        datetime(2026, 2, 28, 21, 0, tzinfo=timezone.utc),
+        datetime(2026, 3, 31, 21, 0, tzinfo=timezone.utc),
+        "Europe/Moscow", "csv", str(tmp_path),
+    )
+
+    rows = _read_csv(paths[0])[1:]
+    # в одно время с уроком — после него
+    assert [row[0] for row in rows] == [str(lessons[0].id), str(lessons[1].id), str(gl.id), str(lessons[2].id)]
+    assert rows[2] == [str(gl.id), "", "Английский", "2026-03-03 13:00", "90", "done", "", ""]
+
+    charges = _read_csv(paths[1])[1:]
+    assert [row[1:5] for row in charges] == [
+        [str(lessons[0].id), "", "Kid", "2026-03-02 13:00"],
+        [str(lessons[1].id), "", "Kid", "2026-03-03 13:00"],
+        ["", str(gl.id), "Kid", "2026-03-03 13:00"],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_export_xlsx_one_workbook(session, tmp_path):
+    openpyxl = pytest.importorskip("openpyxl")
+    from app.services.export import export_data
+
+    await _seed(session)
+    paths = await export_data(
+        session,
+        datetime(2026, 2, 28, 21, 0, tzinfo=timezone.utc),
+        datetime(2026, 3, 31, 21, 0, tzinfo=timezone.utc),
+        "Europe/Moscow", "xlsx", str(tmp_path),
+    )
+
+    wb = openpyxl.load_workbook(paths[0], read_only=True)
+    assert wb.sheetnames == ["lessons", "charges", "homeworks"]
+    assert len(list(wb["lessons"].rows)) == 4
+
+
+@pytest.mark.asyncio
+async def test_export_handler_sends_documents(session, monkeypatch):
+    import app.handlers.admin.export as export_handler
+    from app.callbacks import ExportCb
+
+    class FixedDateTime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2026, 4, 10, 12, 0, tzinfo=timezone.utc)
+
+    monkeypatch.setattr(export_handler, "datetime", FixedDateTime)
+
+    session.add(User(tg_id=9950, role=Role.teacher, name="T", timezone="Europe/Moscow"))
+    await _seed(session)
+
+    bot = FakeBot()
+    call = SimpleNamespace(from_user=SimpleNamespace(id=9950), message=FakeMessage(), answer=AsyncMock())
+    await export_handler.export_run(call, ExportCb(period="prev_month", fmt="csv"), session, bot)
+
+    assert [(chat, name) for chat, name, _ in bot.documents] == [
+        (9950, "lessons_20260301-20260401.csv"),
+        (9950, "charges_20260301-20260401.csv"),
+        (9950, "homeworks_20260301-20260401.csv"),
+    ]
+    assert bot.documents[0][2].count("\n") == 4  # заголовок + 3 урока
+    assert call.message.answers == ["Выгрузка готова: прошлый месяц (2026-03-01 — 2026-04-01, не включая)."]
@@ -0,0 +1,160 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import event, select
+
+from app.callbacks import GradeQueueCb
+from app.models import User, Role, Student, Parent, ParentStudent, Homework, Notification
+
+DONE = datetime(2026, 3, 1, 9, 0, tzinfo=timezone.utc)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text: str, reply_markup=None):
+        self.edits.append((text, reply_markup))
+
+
+def _call(tg_id: int = 9800):
+    return SimpleNamespace(from_user=SimpleNamespace(id=tg_id), message=FakeMessage(), answer=AsyncMock())
+
+
+def _button_texts(markup):
+    return [b.text for row in markup.inline_keyboard for b in row]
+
+
+async def _seed(session):
+    session.add(User(tg_id=9800, role=Role.teacher, name="T", timezone="Europe/Moscow"))
+    su = User(tg_id=9801, role=Role.student, name="A")
+    pu = User(tg_id=9802, role=Role.parent, name="P")
+    session.add_all([su, pu])
+    await session.flush()
+    anna = Student(full_name="Anna", user_id=su.id)
+    boris = Student(full_name="Boris")
+    p = Parent(user_id=pu.id, full_name="Parent")
+    session.add_all([anna, boris, p])
+    await session.flush()
+    # родитель у обоих детей — получит одно сообщение на всё
+    session.add_all([ParentStudent(parent_id=p.id, student_id=s.id) for s in (anna, boris)])
+
+    hws = [
+        Homework(student_id=anna.id, title="Эссе", description="Про лето", student_done_at=DONE),
+        Homework(student_id=boris.id, title="Тест", description="Стр. 5", student_done_at=DONE + timedelta(hours=1)),
+        Homework(student_id=anna.id, title="Диктант", description="-", student_done_at=DONE + timedelta(hours=2)),
+        # не в очереди: не сдано / уже оценено
+        Homework(student_id=anna.id, title="open", description="-"),
+        Homework(student_id=boris.id, title="graded", description="-", student_done_at=DONE, grade=5),
+    ]
+    session.add_all(hws)
+    await session.commit()
+    return su, pu, anna, boris, hws
+
+
+@pytest.mark.asyncio
+async def test_grading_queue_walk_and_single_update(engine, session):
+    import app.handlers.admin.grading as mod
+
+    su, pu, anna, boris, hws = await _seed(session)
+    call = _call()
+
+    await mod.admin_grading(call, session)
+    text, markup = call.message.edits[-1]
+    assert text.startswith("Проверка ДЗ (в очереди: 3)\n\nУченик: Anna\nДЗ: Эссе\nСдано: 2026-03-01 12:00")
+    assert _button_texts(markup)[:10] == [str(g) for g in range(1, 11)]
+
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", _count)
+    try:
+        await mod.grading_action(call, GradeQueueCb(action="grade", homework_id=hws[0].id, grade=9), session)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", _count)
+    writes = [s for s in statements if s.lstrip().upper().startswith(("UPDATE", "INSERT"))]
+    assert len(writes) == 1
+    call.answer.assert_awaited_with("Сохранено")
+
+    text, markup = call.message.edits[-1]
+    assert "Ученик: Boris\nДЗ: Тест" in text
+    assert "Разослать оценки (1)" in _button_texts(markup)
+    # пока оценки копятся — никаких уведомлений
+    assert (await session.execute(select(Notification))).scalars().all() == []
+
+    # повторное нажатие по уже оценённому — без изменений
+    await mod.grading_action(call, GradeQueueCb(action="grade", homework_id=hws[0].id, grade=3), session)
+    call.answer.assert_awaited_with("Уже оценено")
+
+    await mod.grading_action(call, GradeQueueCb(action="skip", homework_id=hws[1].id), session)
+    assert "ДЗ: Диктант" in call.message.edits[-1][0]
+
+    # последнее ДЗ — конец прохода, оценки разосланы автоматически
+    await mod.grading_action(call, GradeQueueCb(action="grade", homework_id=hws[2].id, grade=7), session)
+    text, markup = call.message.edits[-1]
+    assert text == "Оценки разосланы ученикам и родителям: 2.\n\nОчередь проверки пройдена. Пропущено: 1."
+    assert "К пропущенным" in _button_texts(markup)
+
+    grades = dict((await session.execute(select(Homework.id, Homework.grade))).all())
+    assert (grades[hws[0].id], grades[hws[1].id], grades[hws[2].id]) == (9, None, 7)
+
+    notes = (await session.execute(
+        select(Notification.user_id, Notification.type, Notification.payload).order_by(Notification.user_id)
+    )).all()
+    combined = "Выставлены оценки за домашние задания:\n• Anna: Эссе — 9/10\n• Anna: Диктант — 7/10"
+    assert notes == [(su.id, "hw_graded", combined), (pu.id, "hw_graded", combined)]
+
+    schedule_versions = dict((await session.execute(select(Student.id, Student.schedule_version))).all())
+    assert schedule_versions == {anna.id: 1, boris.id: 0}
+
+    # к пропущенному — снова с начала очереди
+    await mod.grading_action(call, GradeQueueCb(action="restart"), session)
+    assert "ДЗ: Тест" in call.message.edits[-1][0]
+
+
+@pytest.mark.asyncio
+async def test_grading_finish_flushes_early(session):
+    import app.handlers.admin.grading as mod
+
+    _su, pu, anna, boris, hws = await _seed(session)
+    call = _call()
+
+    await mod.grading_action(call, GradeQueueCb(action="grade", homework_id=hws[0].id, grade=8), session)
+    await mod.grading_action(call, GradeQueueCb(action="grade", homework_id=hws[1].id, grade=6), session)
+    await mod.grading_action(call, GradeQueueCb(action="finish"), session)
+
+    text, markup = call.message.edits[-1]
+    assert text.startswith("Оценки разосланы ученикам и родителям: 2.\n\nПроверка ДЗ (в очереди: 1)")
+    assert not any(t.startswith("Разослать") for t in _button_texts(markup))
+
+    parent_payload = (await session.execute(
+        select(Notification.payload).where(Notification.user_id == pu.id)
+    )).scalar_one()
+    assert parent_payload == (
+        "Выставлены оценки за домашние задания:\n• Anna: Эссе — 8/10\n• Boris: Тест — 6/10"
+    )
+
+
+@pytest.mark.asyncio
+async def test_abandoned_grading_pass_is_flushed_by_worker(session):
+    import app.handlers.admin.grading as mod
+    from app.jobs_notifications import GRADE_NOTIFY_IDLE, flush_stale_grade_notifications
+
+    _su, pu, anna, boris, hws = await _seed(session)
+    # оценили одно ДЗ и ушли с экрана проверки
+    await mod.grading_action(_call(), GradeQueueCb(action="grade", homework_id=hws[0].id, grade=8), session)
+
+    now = datetime.now(timezone.utc)
+    assert await flush_stale_grade_notifications(session, now) == 0  # учитель, возможно, ещё проверяет
+    assert await flush_stale_grade_notifications(session, now + GRADE_NOTIFY_IDLE + timedelta(minutes=1)) == 1
+    await session.commit()
+
+    parent_payload = (await session.execute(
+        select(Notification.payload).where(Notification.user_id == pu.id)
+    )).scalar_one()
+    assert parent_payload == "Выставлены оценки за домашние задания:\n• Anna: Эссе — 8/10"
+    assert await flush_stale_grade_notifications(session, now + timedelta(hours=1)) == 0
@@ -0,0 +1,346 @@
+from datetime import date, datetime, time, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import event, select, func
+
+from app.callbacks import GroupCb, NotifyCb
+from app.models import (
+    User, Role, Student, BillingMode, InvoicePeriod, Parent, ParentStudent, StudentBalance, BalanceEntry, BalanceReason,
+    Lesson, LessonGroup, LessonGroupMember, GroupLesson, LessonStatus, LessonCharge, Notification,
+    ScheduleRule,
+)
+from app.services.groups import create_group, set_group_members, add_group_rule
+
+
+class FakeMessage:
+    def __init__(self, text: str = "", tg_id: int = 0):
+        self.text = text
+        self.from_user = SimpleNamespace(id=tg_id)
+        self.edits = []
+        self.answers = []
+
+    async def edit_text(self, text: str, reply_markup=None, **kwargs):
+        self.edits.append((text, reply_markup))
+
+    async def answer(self, text: str, reply_markup=None, **kwargs):
+        self.answers.append((text, reply_markup))
+
+
+class FakeFSMContext:
+    def __init__(self):
+        self.state = None
+        self.data = {}
+
+    async def set_state(self, state):
+        self.state = getattr(state, "state", state)
+
+    async def get_state(self):
+        return self.state
+
+    async def update_data(self, **kwargs):
+        self.data.update(kwargs)
+
+    async def get_data(self):
+        return dict(self.data)
+
+    async def clear(self):
+        self.state = None
+        self.data = {}
+
+
+def _call(tg_id: int):
+    return SimpleNamespace(from_user=SimpleNamespace(id=tg_id), message=FakeMessage(), answer=AsyncMock())
+
+
+def _buttons(markup) -> list[str]:
+    return [b.text for row in markup.inline_keyboard for b in row]
+
+
+async def _kid(session, name: str, **kw) -> Student:
+    st = Student(full_name=name, timezone="Europe/Moscow", **kw)
+    session.add(st)
+    await session.flush()
+    return st
+
+
+async def _user(session, tg_id: int, role: Role) -> User:
+    u = User(tg_id=tg_id, role=role, name="U", timezone="Europe/Moscow")
+    session.add(u)
+    await session.flush()
+    return u
+
+
+async def _parent(session, tg_id: int, *kids) -> User:
+    u = await _user(session, tg_id, Role.parent)
+    p = Parent(user_id=u.id, full_name="Parent")
+    session.add(p)
+    await session.flush()
+    session.add_all([ParentStudent(parent_id=p.id, student_id=k.id) for k in kids])
+    await session.flush()
+    return u
+
+
+async def _group_lesson(session, title: str, kids, start_at: datetime) -> GroupLesson:
+    group_id = await create_group(session, title, "Europe/Moscow")
+    await set_group_members(session, group_id, [k.id for k in kids])
+    gl = GroupLesson(group_id=group_id, start_at=start_at, status=LessonStatus.planned)
+    session.add(gl)
+    await session.commit()
+    return gl
+
+
+@pytest.mark.asyncio
+async def test_group_rule_creates_one_lesson_per_occurrence(session):
+    kids = [await _kid(session, f"Kid{i}") for i in range(3)]
+    group_id = await create_group(session, "Английский", "Europe/Moscow")
+    await set_group_members(session, group_id, [k.id for k in kids])
+    await session.commit()
+    versions = {k.id: k.schedule_version for k in kids}
+
+    start = date.today()
+    created = await add_group_rule(session, group_id, start.weekday(), time(18, 30), 90, start)
+    await session.commit()
+
+    lessons = (await session.execute(select(GroupLesson).order_by(GroupLesson.start_at))).scalars().all()
+    assert created == len(lessons) > 0
+    assert all(gl.group_id == group_id and gl.duration_min == 90 for gl in lessons)
+    # участников трое, а индивидуальных уроков — ни одного
+    assert (await session.execute(select(func.count()).select_from(Lesson))).scalar_one() == 0
+    assert (await session.execute(
+        select(ScheduleRule.student_id).where(ScheduleRule.group_id == group_id)
+    )).scalar_one() is None
+
+    for k in kids:
+        await session.refresh(k)
+        assert k.schedule_version > versions[k.id]
+
+    # повторная генерация ничего не дублирует
+    from app.services.schedule import generate_group_lessons
+    assert await generate_group_lessons(session, group_id=group_id) == 0
+
+
+@pytest.mark.asyncio
+async def test_group_reminders_fan_out_to_members_and_parents(session):
+    from app.jobs_notifications import plan_lesson_notifications, render_notification
+
+    su1 = await _user(session, 9301, Role.student)
+    su2 = await _user(session, 9302, Role.student)
+    anna = await _kid(session, "Anna", user_id=su1.id)
+    boris = await _kid(session, "Boris")
+    carl = await _kid(session, "Carl", user_id=su2.id)
+    # у Анны и Бориса общий родитель
+    pu = await _parent(session, 9303, anna, boris)
+
+    now = datetime.now(timezone.utc)
+    gl = await _group_lesson(session, "Химия", [anna, boris, carl], now + timedelta(hours=30))
+
+    await plan_lesson_notifications(session, now)
+    await session.commit()
+
+    rows = (await session.execute(
+        select(Notification.user_id, Notification.type).where(Notification.entity_id == gl.id)
+    )).all()
+    for kind in ("group_lesson_24h", "group_lesson_1h"):
+        assert sorted(uid for uid, t in rows if t == kind) == sorted([su1.id, su2.id, pu.id])
+
+    n = (await session.execute(
+        select(Notification).where(Notification.user_id == pu.id, Notification.type == "group_lesson_1h")
+    )).scalar_one()
+    text = await render_notification(session, n, pu)
+    assert "групповое занятие" in text and "Химия" in text
+
+    # отменённое занятие не напоминается
+    gl.status = LessonStatus.canceled
+    await session.commit()
+    assert await render_notification(session, n, pu) is None
+
+
+@pytest.mark.asyncio
+async def test_notify_settings_replan_group_reminders(session):
+    import app.handlers.notify_settings as ns_mod
+    from app.jobs_notifications import plan_lesson_notifications
+
+    su = await _user(session, 9305, Role.student)
+    kid = await _kid(session, "Kid", user_id=su.id)
+    now = datetime.now(timezone.utc)
+    gl = await _group_lesson(session, "Химия", [kid], now + timedelta(hours=30))
+    await plan_lesson_notifications(session, now)
+    await session.commit()
+
+    async def _kinds() -> list[str]:
+        return sorted((await session.execute(
+            select(Notification.type).where(Notification.user_id == su.id, Notification.entity_id == gl.id)
+        )).scalars().all())
+
+    assert await _kinds() == ["group_lesson_1h", "group_lesson_24h"]
+
+    call = _call(9305)
+    await ns_mod.notify_toggle_reminder(call, NotifyCb(action="lesson_1h"), session)
+    assert await _kinds() == ["group_lesson_24h"]
+
+    # тихие часы пересобирают, а не дублируют
+    await ns_mod.notify_cycle_quiet(call, session)
+    assert await _kinds() == ["group_lesson_24h"]
+
+    # дайджест заменяет напоминание за 24 часа и для групповых занятий
+    await ns_mod.notify_toggle_digest(call, session)
+    assert await _kinds() == []
+
+
+@pytest.mark.asyncio
+async def test_mark_group_lesson_done_bills_each_member(session):
+    from app.services.billing import mark_group_lesson_done
+    from app.jobs_notifications import render_notification
+
+    subs = await _kid(session, "Sub", billing_mode=BillingMode.subscription)
+    empty = await _kid(session, "Empty", billing_mode=BillingMode.subscription)
+    single = await _kid(session, "Single", billing_mode=BillingMode.single, price_per_lesson=700)
+    sibling = await _kid(session, "Sibling", billing_mode=BillingMode.single, price_per_lesson=500)
+    monthly = await _kid(session, "Monthly", billing_mode=BillingMode.single, price_per_lesson=900,
+                         invoice_period=InvoicePeriod.monthly)
+    free = await _kid(session, "Free", billing_mode=BillingMode.single)
+    session.add(StudentBalance(student_id=subs.id, lessons_left=2))
+    pu = await _parent(session, 9311, single, sibling, monthly)
+    gl = await _group_lesson(
+        session, "Физика", [subs, empty, single, sibling, monthly, free],
+        datetime(2026, 6, 1, 15, 0, tzinfo=timezone.utc),
+    )
+
+    result = await mark_group_lesson_done(session, gl.id)
+    assert result == {"charged": 1, "charges": 3, "skipped": [free.id]}
+
+    balances = dict((await session.execute(select(StudentBalance.student_id, StudentBalance.lessons_left))).all())
+    assert balances == {subs.id: 1, empty.id: 0}
+    ledger = (await session.execute(
+        select(BalanceEntry.student_id, BalanceEntry.reason, BalanceEntry.group_lesson_id).order_by(BalanceEntry.id)
+    )).all()
+    # остаток был заведён до журнала — первым движением записан как opening
+    assert ledger == [(subs.id, BalanceReason.opening, None), (subs.id, BalanceReason.lesson, gl.id)]
+    charges = dict((await session.execute(select(LessonCharge.student_id, LessonCharge.amount))).all())
+    assert charges == {single.id: 700, sibling.id: 500, monthly.id: 900}
+
+    # один родитель двух детей группы — одно сообщение; ежемесячный счёт придёт сводкой
+    n = (await session.execute(select(Notification).where(Notification.type == "group_lesson_done"))).scalar_one()
+    assert n.user_id == pu.id
+    text = await render_notification(session, n, pu)
+    assert "Физика" in text and "Single — к оплате: 700" in text and "Sibling — к оплате: 500" in text
+    assert "Monthly" not in text
+
+    # повторная отметка ничего не делает
+    assert await mark_group_lesson_done(session, gl.id) is None
+    assert (await session.execute(select(func.count()).select_from(LessonCharge))).scalar_one() == 3
+
+
+@pytest.mark.asyncio
+async def test_mark_group_lesson_done_statement_count_independent_of_size(engine, session):
+    from app.services.billing import mark_group_lesson_done
+
+    start = datetime(2026, 6, 1, 15, 0, tzinfo=timezone.utc)
+    small = [await _kid(session, f"S{i}", billing_mode=BillingMode.single, price_per_lesson=100) for i in range(2)]
+    large = [await _kid(session, f"L{i}", billing_mode=BillingMode.single, price_per_lesson=100) for i in range(12)]
+    gl_small = await _group_lesson(session, "Малая", small, start)
+    gl_large = await _group_lesson(session, "Большая", large, start)
+
+    async def _statements(group_lesson_id: int) -> int:
+        statements = []
+
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine.sync_engine, "before_cursor_execute", _count)
+        try:
+            await mark_group_lesson_done(session, group_lesson_id)
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", _count)
+        return len(statements)
+
+    assert await _statements(gl_small.id) == await _statements(gl_large.id)
+    assert (await session.execute(select(func.count()).select_from(LessonCharge))).scalar_one() == 14
+
+
+@pytest.mark.asyncio
+async def test_invoice_includes_group_charges(session):
+    from app.services.billing import mark_group_lesson_done
+    from app.jobs_billing import plan_invoices
+
+    kid = await _kid(session, "Kid", billing_mode=BillingMode.single, price_per_lesson=800,
+                     invoice_period=InvoicePeriod.weekly)
+    pu = await _parent(session, 9321, kid)
+    gl = await _group_lesson(session, "Математика", [kid], datetime(2026, 6, 2, 15, 0, tzinfo=timezone.utc))
+    await mark_group_lesson_done(session, gl.id)
+
+    await plan_invoices(session, InvoicePeriod.weekly, datetime(2026, 6, 8, tzinfo=timezone.utc), date(2026, 6, 8))
+    await session.commit()
+
+    payload = (await session.execute(
+        select(Notification.payload).where(Notification.user_id == pu.id, Notification.type == "invoice_weekly")
+    )).scalar_one()
+    assert "2026-06-02 18:00 — 800" in payload
+    assert "Всего к оплате: 800" in payload
+
+
+@pytest.mark.asyncio
+async def test_student_schedule_lists_group_lessons(session):
+    from app.services.schedule_cache import upcoming_group_lessons
+
+    kid = await _kid(session, "Kid")
+    other = await _kid(session, "Other")
+    now = datetime.now(timezone.utc)
+    await _group_lesson(session, "Шахматы", [kid], now + timedelta(days=2))
+
+    shown, valid_until = await upcoming_group_lessons(session, kid.id, now)
+    assert [v.title for v in shown] == ["Шахматы"]
+    assert valid_until == shown[0].start_at
+    assert await upcoming_group_lessons(session, other.id, now) == ([], None)
+
+
+@pytest.mark.asyncio
+async def test_admin_group_flow(session):
+    import app.handlers.admin.groups as mod
+
+    session.add(User(tg_id=9330, role=Role.teacher, name="T", timezone="Europe/Moscow"))
+    anna = await _kid(session, "Anna", billing_mode=BillingMode.single, price_per_lesson=600)
+    boris = await _kid(session, "Boris", billing_mode=BillingMode.single, price_per_lesson=600)
+    await session.commit()
+
+    state = FakeFSMContext()
+    await mod.group_new(_call(9330), state, session)
+    assert state.state == mod.GroupFSM.title.state
+    msg = FakeMessage("Английский B1", 9330)
+    await mod.group_set_title(msg, state, session)
+    group = (await session.execute(select(LessonGroup))).scalar_one()
+    assert group.title == "Английский B1" and state.state is None
+    assert "Участники (0)" in msg.answers[-1][0]
+
+    # состав: отметить обоих и сохранить
+    call = _call(9330)
+    await mod.group_members_start(call, GroupCb(action="members", group_id=group.id), state, session)
+    await mod.group_members_pick(call, GroupCb(action="all", group_id=group.id), state, session)
+    assert "Сохранить (2)" in _buttons(call.message.edits[-1][1])
+    await mod.group_members_save(call, GroupCb(action="save", group_id=group.id), state, session)
+    members = (await session.execute(
+        select(LessonGroupMember.student_id).where(LessonGroupMember.group_id == group.id)
+    )).scalars().all()
+    assert sorted(members) == sorted([anna.id, boris.id])
+
+    await mod.group_rule_start(_call(9330), GroupCb(action="rule", group_id=group.id), state, session)
+    bad = FakeMessage("8 18:30 90", 9330)
+    await mod.group_rule_set(bad, state, session)
+    assert bad.answers[-1][0].startswith("Неверный формат")
+    msg = FakeMessage("3 18:30 90", 9330)
+    await mod.group_rule_set(msg, state, session)
+    assert msg.answers[0][0].startswith("Расписание добавлено")
+    card, markup = msg.answers[-1]
+    assert "• СР 18:30, 90 мин" in card
+
+    first = (await session.execute(
+        select(GroupLesson).order_by(GroupLesson.start_at).limit(1)
+    )).scalar_one()
+    call = _call(9330)
+    await mod.group_lesson_done(call, GroupCb(action="done", group_id=group.id, item_id=first.id), session)
+    assert "начислено: 2" in call.answer.await_args.args[0]
+    call = _call(9330)
+    await mod.group_lesson_done(call, GroupCb(action="done", group_id=group.id, item_id=first.id), session)
+    assert call.answer.await_args.args[0] == "Уже отмечено"
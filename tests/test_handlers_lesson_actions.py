@@ -232,6 +232,46 @@ async def test_lesson_action_cancel_recurring_marks_canceled(session):
     assert l_db.status == LessonStatus.canceled
 
 
+@pytest.mark.asyncio
+async def test_lesson_action_cancel_keeps_prepaid_one_off_and_skips_done(session):
+    import app.handlers.admin.lessons as lessons_mod
+
+    teacher = await create_teacher(session, tg_id=6009)
+    st = Student(full_name="S", timezone="Europe/Moscow", billing_mode=BillingMode.single, price_per_lesson=1000)
+    session.add(st)
+    await session.flush()
+    prepaid = Lesson(student_id=st.id, start_at=datetime(2026, 1, 1, 10, 0, tzinfo=timezone.utc),
+                     status=LessonStatus.planned)
+    done = Lesson(student_id=st.id, start_at=datetime(2025, 12, 1, 10, 0, tzinfo=timezone.utc),
+                  status=LessonStatus.done)
+    session.add_all([prepaid, done])
+    await session.flush()
+    session.add(LessonCharge(lesson_id=prepaid.id, student_id=st.id, amount=1000, status=ChargeStatus.paid))
+    await session.commit()
+
+    msg = FakeMessage(FakeFromUser(teacher.tg_id))
+    call = FakeCallbackQuery(from_user=msg.from_user, message=msg)
+    await lessons_mod.lesson_action(
+        call, LessonCb(action="cancel", lesson_id=prepaid.id, student_id=st.id, offset=0), session, bot=FakeBot(),
+    )
+    # оплата заранее не теряется: урок остаётся в истории отменённым, начисление на месте
+    assert msg.edits[-1][0] == "Занятие отменено."
+    rows = (await session.execute(
+        select(Lesson.id, Lesson.status).execution_options(populate_existing=True).order_by(Lesson.id)
+    )).all()
+    assert rows == [(prepaid.id, LessonStatus.canceled), (done.id, LessonStatus.done)]
+    assert (await session.execute(select(LessonCharge.status))).scalar_one() == ChargeStatus.paid
+
+    call = FakeCallbackQuery(from_user=msg.from_user, message=msg)
+    await lessons_mod.lesson_action(
+        call, LessonCb(action="cancel", lesson_id=done.id, student_id=st.id, offset=0), session, bot=FakeBot(),
+    )
+    call.answer.assert_awaited_with("Урок уже проведён или отменён.", show_alert=True)
+    assert (await session.execute(
+        select(Lesson.status).where(Lesson.id == done.id).execution_options(populate_existing=True)
+    )).scalar_one() == LessonStatus.done
+
+
 @pytest.mark.asyncio
 async def test_lesson_action_delete_series_deletes_future_lessons_and_rule(session):
     import app.handlers.admin.lessons as lessons_mod
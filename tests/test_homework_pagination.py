@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.callbacks import HomeworkCb, HomeworkListCb
+from app.models import User, Role, Student, Homework
+
+BASE = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text: str, reply_markup=None):
+        self.edits.append((text, reply_markup))
+
+
+async def _seed(session):
+    st = Student(full_name="Kid", timezone="Europe/Moscow")
+    other = Student(full_name="Other", timezone="Europe/Moscow")
+    session.add_all([st, other])
+    await session.flush()
+
+    hws = []
+    for i in range(23):
+        hws.append(Homework(
+            student_id=st.id, title=f"hw{i}", description="-",
+            # дубли дедлайнов и created_at, треть без дедлайна
+            due_at=None if i % 3 == 0 else BASE + timedelta(days=i // 4),
+            created_at=BASE - timedelta(hours=i // 2),
+            student_done_at=BASE if i % 5 == 1 else None,
+            grade=7 if i % 5 == 2 else None,
+        ))
+    hws.append(Homework(student_id=other.id, title="foreign", description="-"))
+    session.add_all(hws)
+    await session.commit()
+    return st, hws[:-1]
+
+
+def _expected(hws):
+    # due_at DESC NULLS LAST, created_at DESC, id DESC
+    with_due = sorted((h for h in hws if h.due_at), key=lambda h: (h.due_at, h.created_at, h.id), reverse=True)
+    no_due = sorted((h for h in hws if not h.due_at), key=lambda h: (h.created_at, h.id), reverse=True)
+    return [h.id for h in with_due + no_due]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("flt", ["all", "open", "done", "graded"])
+async def test_keyset_pages_cover_filter_in_order(session, flt):
+    from app.services.homework import homework_page
+
+    _st, hws = await _seed(session)
+    keep = {
+        "all": lambda h: True,
+        "open": lambda h: h.student_done_at is None and h.grade is None,
+        "done": lambda h: h.student_done_at is not None and h.grade is None,
+        "graded": lambda h: h.grade is not None,
+    }[flt]
+
+    seen, after, pages = [], None, 0
+    while True:
+        page, has_more = await homework_page(session, _st.id, flt, after, limit=4)
+        assert len(page) <= 4
+        seen += [h.id for h in page]
+        pages += 1
+        if not has_more:
+            break
+        after = page[-1].id
+
+    assert seen == _expected([h for h in hws if keep(h)])
+    assert pages == max(1, -(-len(seen) // 4))
+
+
+@pytest.mark.asyncio
+async def test_homework_list_screen_is_bounded_and_pages(session):
+    import app.handlers.admin.homeworks as hw_mod
+
+    session.add(User(tg_id=9995, role=Role.teacher, name="T"))
+    st, hws = await _seed(session)
+    order = _expected(hws)
+
+    def hw_buttons(markup):
+        return [
+            HomeworkCb.unpack(btn.callback_data).homework_id
+            for row in markup.inline_keyboard for btn in row if btn.callback_data.startswith("hw:")
+        ]
+
+    def nav(markup):
+        return {
+            btn.text: HomeworkListCb.unpack(btn.callback_data)
+            for row in markup.inline_keyboard for btn in row
+            if btn.callback_data.startswith("hwl:") and btn.text in ("Далее ▶", "⏮ В начало")
+        }
+
+    call = SimpleNamespace(from_user=SimpleNamespace(id=9995), message=FakeMessage(), answer=AsyncMock())
+    await hw_mod.admin_student_homeworks_page(call, HomeworkListCb(student_id=st.id), session)
+    text, markup = call.message.edits[-1]
+    assert hw_buttons(markup) == order[:10]
+    assert text.count("\n• ") == 10
+    assert set(nav(markup)) == {"Далее ▶"}
+
+    await hw_mod.admin_student_homeworks_page(call, nav(markup)["Далее ▶"], session)
+    _text, markup = call.message.edits[-1]
+    assert hw_buttons(markup) == order[10:20]
+
+    await hw_mod.admin_student_homeworks_page(call, nav(markup)["Далее ▶"], session)
+    _text, markup = call.message.edits[-1]
+    assert hw_buttons(markup) == order[20:]
+    assert set(nav(markup)) == {"⏮ В начало"}
+    assert nav(markup)["⏮ В начало"].after == 0
+
+    await hw_mod.admin_student_homeworks_page(call, HomeworkListCb(student_id=st.id, flt="graded"), session)
+    text, markup = call.message.edits[-1]
+    assert text.splitlines()[2] == "Домашние задания (с оценкой):"
+    assert all("оценка 7/10" in line for line in text.splitlines()[3:])
+    assert "• С оценкой" in [btn.text for row in markup.inline_keyboard for btn in row]
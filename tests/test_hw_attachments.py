@@ -0,0 +1,216 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import event, select, func
+
+from app.callbacks import HwGroupCb, HomeworkCb
+from app.models import (
+    User, Role, Student, Parent, ParentStudent, Homework, HomeworkTemplate,
+    TelegramFile, HomeworkAttachment, HomeworkTemplateAttachment,
+)
+from app.services.attachments import IncomingFile, save_file, homework_files
+
+
+class FakeMessage:
+    def __init__(self, text: str = "", tg_id: int = 0, *, photo=None, document=None):
+        self.text = text
+        self.from_user = SimpleNamespace(id=tg_id)
+        self.photo = photo
+        self.document = document
+        self.edits = []
+        self.answers = []
+
+    async def edit_text(self, text: str, reply_markup=None, **kwargs):
+        self.edits.append((text, reply_markup))
+
+    async def answer(self, text: str, reply_markup=None, **kwargs):
+        self.answers.append((text, reply_markup))
+
+
+class FakeFSMContext:
+    def __init__(self):
+        self.state = None
+        self.data = {}
+
+    async def set_state(self, state):
+        self.state = getattr(state, "state", state)
+
+    async def get_state(self):
+        return self.state
+
+    async def update_data(self, **kwargs):
+        self.data.update(kwargs)
+
+    async def get_data(self):
+        return dict(self.data)
+
+    async def clear(self):
+        self.state = None
+        self.data = {}
+
+
+class FakeBot:
+    def __init__(self):
+        self.calls = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls.append(("message", chat_id, text))
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        self.calls.append(("photo", chat_id, photo))
+
+    async def send_document(self, chat_id, document, **kwargs):
+        self.calls.append(("document", chat_id, document))
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        self.calls.append(("album", chat_id, [m.media for m in media]))
+
+
+def _photo(uid: str):
+    # Telegram присылает несколько размеров одного фото
+    return [SimpleNamespace(file_id=f"{uid}-small", file_unique_id=f"{uid}-s"),
+            SimpleNamespace(file_id=f"{uid}-big", file_unique_id=uid)]
+
+
+def _document(uid: str, name: str):
+    return SimpleNamespace(file_id=f"{uid}-id", file_unique_id=uid, file_name=name)
+
+
+def _call(tg_id: int, bot=None):
+    return SimpleNamespace(
+        from_user=SimpleNamespace(id=tg_id), message=FakeMessage(), answer=AsyncMock(), bot=bot or FakeBot(),
+    )
+
+
+async def _seed(session):
+    session.add(User(tg_id=9950, role=Role.teacher, name="T", timezone="Europe/Moscow"))
+    su = User(tg_id=9951, role=Role.student, name="S")
+    pu = User(tg_id=9952, role=Role.parent, name="P")
+    session.add_all([su, pu])
+    await session.flush()
+    anna = Student(full_name="Anna", user_id=su.id)
+    boris = Student(full_name="Boris")
+    p = Parent(user_id=pu.id, full_name="Parent")
+    session.add_all([anna, boris, p])
+    await session.flush()
+    session.add(ParentStudent(parent_id=p.id, student_id=anna.id))
+    await session.commit()
+    return su, pu, anna, boris
+
+
+@pytest.mark.asyncio
+async def test_save_file_dedups_by_unique_id(session):
+    first = await save_file(session, IncomingFile("document", "id-1", "u1", "a.pdf"))
+    again = await save_file(session, IncomingFile("document", "id-2", "u1", "a.pdf"))
+    other = await save_file(session, IncomingFile("photo", "id-3", "u2", None))
+    await session.commit()
+
+    assert first == again != other
+    rows = (await session.execute(select(TelegramFile.file_unique_id, TelegramFile.file_id))).all()
+    assert sorted(rows) == [("u1", "id-2"), ("u2", "id-3")]
+
+
+@pytest.mark.asyncio
+async def test_group_assignment_reuses_file_ids(engine, session, monkeypatch, sessionmaker):
+    import app.handlers.admin.hw_group as mod
+    from app import jobs_notifications
+
+    su, pu, anna, boris = await _seed(session)
+    # в библиотеке уже есть задание с файлом
+    tpl = HomeworkTemplate(title="Эссе", description="Про лето")
+    session.add(tpl)
+    await session.flush()
+    pdf = await save_file(session, IncomingFile("document", "pdf-id", "pdf", "plan.pdf"))
+    session.add(HomeworkTemplateAttachment(template_id=tpl.id, file_id=pdf, position=0))
+    await session.commit()
+
+    state = FakeFSMContext()
+    await mod.hw_group_template(_call(9950), HwGroupCb(action="tpl", item_id=tpl.id), state, session)
+    assert state.data["files"] == [pdf]
+
+    msg = FakeMessage(tg_id=9950, photo=_photo("pic"))
+    await mod.hw_group_add_file(msg, state, session)
+    assert msg.answers[-1][0].startswith("Прикреплено файлов: 2.")
+    # тот же файл повторно — не второе вложение
+    await mod.hw_group_add_file(FakeMessage(tg_id=9950, photo=_photo("pic")), state, session)
+    assert len(state.data["files"]) == 2
+
+    msg = FakeMessage("-", 9950)
+    await mod.hw_group_set_due_at(msg, state, session)
+    assert "Вложения: 2" in msg.answers[-1][0]
+    await state.update_data(selected=[anna.id, boris.id])
+
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", _count)
+    try:
+        await mod.hw_group_assign(_call(9950), state, session)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", _count)
+    attach_inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT INTO HOMEWORK_ATTACHMENTS")]
+    assert len(attach_inserts) == 1
+
+    assert (await session.execute(select(func.count()).select_from(TelegramFile))).scalar_one() == 2
+    links = (await session.execute(
+        select(Homework.student_id, TelegramFile.file_id)
+        .join(HomeworkAttachment, HomeworkAttachment.homework_id == Homework.id)
+        .join(TelegramFile, TelegramFile.id == HomeworkAttachment.file_id)
+        .order_by(Homework.student_id, HomeworkAttachment.position)
+    )).all()
+    assert links == [(anna.id, "pdf-id"), (anna.id, "pic-big"), (boris.id, "pdf-id"), (boris.id, "pic-big")]
+    tpl_files = (await session.execute(
+        select(HomeworkTemplateAttachment.file_id).order_by(HomeworkTemplateAttachment.position)
+    )).scalars().all()
+    assert len(tpl_files) == 2
+
+    # ученик и родитель получают текст и следом файлы — по file_id
+    monkeypatch.setattr(jobs_notifications.db, "SessionMaker", sessionmaker)
+    bot = FakeBot()
+    await jobs_notifications.send_notifications_job(bot, batch_size=50)
+    for tg_id in (9951, 9952):
+        mine = [c for c in bot.calls if c[1] == tg_id]
+        assert [c[0] for c in mine] == ["message", "photo", "document"]
+        assert mine[1][2] == "pic-big" and mine[2][2] == "pdf-id"
+
+
+@pytest.mark.asyncio
+async def test_teacher_attaches_and_student_receives_files(session):
+    import app.handlers.admin.homeworks as mod
+
+    su, _pu, anna, _boris = await _seed(session)
+    hw = Homework(student_id=anna.id, title="Тест", description="Стр. 5")
+    session.add(hw)
+    await session.commit()
+
+    state = FakeFSMContext()
+    call = _call(9950)
+    await mod.homework_menu(call, HomeworkCb(action="attach", homework_id=hw.id, student_id=anna.id), state, session)
+    assert state.state == mod.HomeworkFSM.files.state
+
+    for doc in (_document("d1", "a.pdf"), _document("d2", "b.pdf")):
+        msg = FakeMessage(tg_id=9950, document=doc)
+        await mod.hw_add_file(msg, state, session)
+    assert msg.answers[-1][0].startswith("Прикреплено файлов: 2.")
+
+    # «Готово» — карточка ДЗ, режим вложений закрыт
+    call = _call(9950)
+    await mod.homework_menu(call, HomeworkCb(action="view", homework_id=hw.id, student_id=anna.id), state, session)
+    assert state.state is None
+    text, markup = call.message.edits[-1]
+    assert "Вложения: 2" in text
+    assert "📎 Файлы (2)" in [b.text for row in markup.inline_keyboard for b in row]
+
+    bot = FakeBot()
+    call = _call(9951, bot)
+    await mod.homework_menu(call, HomeworkCb(action="files", homework_id=hw.id, student_id=anna.id), state, session)
+    assert bot.calls == [("album", 9951, ["d1-id", "d2-id"])]
+
+    call = _call(9950)
+    await mod.homework_menu(call, HomeworkCb(action="detach", homework_id=hw.id, student_id=anna.id), state, session)
+    assert await homework_files(session, hw.id) == []
+    # сами файлы остаются — их могут использовать другие ДЗ
+    assert (await session.execute(select(func.count()).select_from(TelegramFile))).scalar_one() == 2
@@ -0,0 +1,159 @@
+from datetime import datetime, time, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import select
+
+from app.callbacks import HomeworkCb
+from app.models import (
+    User, Role, Student, Parent, ParentStudent, Homework, Notification, NotificationStatus,
+    NotificationSettings, NotificationPriority,
+)
+
+NOW = datetime(2026, 3, 2, 9, 0, tzinfo=timezone.utc)
+
+
+def _freeze_datetime(monkeypatch, module, fixed: datetime):
+    class FixedDateTime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return fixed if tz is not None else fixed.replace(tzinfo=None)
+
+    monkeypatch.setattr(module, "datetime", FixedDateTime)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text: str, reply_markup=None):
+        self.edits.append((text, reply_markup))
+
+
+async def _seed(session):
+    su = User(tg_id=9601, role=Role.student, name="S", timezone="Europe/Moscow")
+    pu = User(tg_id=9602, role=Role.parent, name="P", timezone="Europe/Moscow")
+    session.add_all([su, pu])
+    await session.flush()
+    st = Student(user_id=su.id, full_name="Kid", timezone="Europe/Moscow")
+    p = Parent(user_id=pu.id, full_name="Parent")
+    session.add_all([st, p])
+    await session.flush()
+    session.add(ParentStudent(parent_id=p.id, student_id=st.id))
+
+    day_ago = NOW - timedelta(days=1)
+    hws = {
+        "soon": Homework(student_id=st.id, title="Эссе", description="-", due_at=NOW + timedelta(hours=30),
+                         created_at=day_ago),
+        # выдано впритык: напоминание сразу (не раньше выдачи)
+        "tight": Homework(student_id=st.id, title="Тест", description="-", due_at=NOW + timedelta(hours=2),
+                          created_at=NOW - timedelta(minutes=30)),
+        "done": Homework(student_id=st.id, title="d", description="-", due_at=NOW + timedelta(hours=5),
+                         student_done_at=NOW, created_at=day_ago),
+        "graded": Homework(student_id=st.id, title="g", description="-", due_at=NOW + timedelta(hours=5),
+                           grade=8, created_at=day_ago),
+        "no_due": Homework(student_id=st.id, title="n", description="-", created_at=day_ago),
+        "far": Homework(student_id=st.id, title="f", description="-", due_at=NOW + timedelta(days=30),
+                        created_at=day_ago),
+        "past": Homework(student_id=st.id, title="p", description="-", due_at=NOW - timedelta(hours=1),
+                         created_at=day_ago),
+    }
+    session.add_all(hws.values())
+    await session.commit()
+    return su, pu, st, hws
+
+
+async def _planned(session):
+    return sorted(
+        (n.user_id, n.entity_id, n.send_at)
+        for n in (await session.execute(select(Notification).where(Notification.type == "hw_due"))).scalars()
+    )
+
+
+@pytest.mark.asyncio
+async def test_plan_hw_due_set_based_and_idempotent(session):
+    from app.jobs_notifications import plan_hw_due_notifications
+
+    su, pu, _st, hws = await _seed(session)
+
+    await plan_hw_due_notifications(session, NOW)
+    await session.commit()
+    expected = sorted(
+        (uid, hws[key].id, send_at)
+        for uid in (su.id, pu.id)
+        for key, send_at in (("soon", NOW + timedelta(hours=6)), ("tight", NOW - timedelta(minutes=30)))
+    )
+    assert await _planned(session) == expected
+
+    prio = (await session.execute(
+        select(Notification.priority).where(Notification.type == "hw_due").limit(1)
+    )).scalar_one()
+    assert prio == NotificationPriority.normal
+
+    # повторный прогон ничего не дублирует
+    await plan_hw_due_notifications(session, NOW + timedelta(minutes=10))
+    await session.commit()
+    assert await _planned(session) == expected
+
+
+@pytest.mark.asyncio
+async def test_plan_hw_due_respects_quiet_hours(session):
+    from app.jobs_notifications import plan_hw_due_notifications
+
+    su, pu, _st, hws = await _seed(session)
+    # 18:00 МСК (send_at для "soon") попадает в тихие часы 17:00–19:00
+    session.add(NotificationSettings(user_id=pu.id, quiet_start=time(17, 0), quiet_end=time(19, 0)))
+    await session.commit()
+
+    await plan_hw_due_notifications(session, NOW)
+    await session.commit()
+    rows = {(uid, hid): send_at for uid, hid, send_at in await _planned(session)}
+    assert rows[(su.id, hws["soon"].id)] == NOW + timedelta(hours=6)
+    assert rows[(pu.id, hws["soon"].id)] == NOW + timedelta(hours=7)  # 19:00 МСК
+
+
+@pytest.mark.asyncio
+async def test_student_done_retires_hw_due_and_render_skips(session, monkeypatch):
+    import app.handlers.admin.homeworks as hw_mod
+    import app.jobs_notifications as jobs_mod
+    from app.jobs_notifications import plan_hw_due_notifications, render_notification
+
+    _freeze_datetime(monkeypatch, jobs_mod, NOW)
+    su, pu, st, hws = await _seed(session)
+    await plan_hw_due_notifications(session, NOW)
+    await session.commit()
+
+    pending = (await session.execute(
+        select(Notification).where(Notification.type == "hw_due", Notification.entity_id == hws["soon"].id)
+        .order_by(Notification.user_id)
+    )).scalars().all()
+    text = await render_notification(session, pending[1], pu)
+    assert text == (
+        "Напоминание: скоро дедлайн домашнего задания.\n"
+        "Ученик: Kid\n"
+        "ДЗ: Эссе\n"
+        "Сдать до: 2026-03-03 18:00 (Europe/Moscow)"
+    )
+
+    # одно напоминание уже ушло — его не трогаем
+    pending[0].status = NotificationStatus.sent
+    await session.commit()
+
+    monkeypatch.setattr(hw_mod, "render_homework", AsyncMock())
+    call = SimpleNamespace(
+        from_user=SimpleNamespace(id=su.tg_id), message=FakeMessage(), answer=AsyncMock(),
+        bot=SimpleNamespace(send_message=AsyncMock()),
+    )
+    await hw_mod.homework_menu(
+        call, HomeworkCb(action="done", homework_id=hws["soon"].id, student_id=st.id), SimpleNamespace(), session,
+    )
+
+    left = (await session.execute(
+        select(Notification.status).where(Notification.type == "hw_due", Notification.entity_id == hws["soon"].id)
+    )).scalars().all()
+    assert left == [NotificationStatus.sent]
+    # строку, которую отправщик уже забрал, отсеивает рендер: ДЗ сдано
+    assert await render_notification(session, pending[0], su) is None
+    # напоминания по другому ДЗ на месте
+    assert len([r for r in await _planned(session) if r[1] == hws["tight"].id]) == 2
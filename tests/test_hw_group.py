@@ -0,0 +1,178 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import event, select, func
+
+from app.callbacks import AdminCb, HwGroupCb
+from app.models import (
+    User, Role, Student, Parent, ParentStudent, Homework, HomeworkTemplate, Notification,
+)
+
+
+class FakeMessage:
+    def __init__(self, text: str = "", tg_id: int = 0):
+        self.text = text
+        self.from_user = SimpleNamespace(id=tg_id)
+        self.edits = []
+        self.answers = []
+
+    async def edit_text(self, text: str, reply_markup=None, **kwargs):
+        self.edits.append((text, reply_markup))
+
+    async def answer(self, text: str, reply_markup=None, **kwargs):
+        self.answers.append((text, reply_markup))
+
+
+class FakeFSMContext:
+    def __init__(self):
+        self.state = None
+        self.data = {}
+
+    async def set_state(self, state):
+        self.state = state
+
+    async def update_data(self, **kwargs):
+        self.data.update(kwargs)
+
+    async def get_data(self):
+        return dict(self.data)
+
+    async def clear(self):
+        self.state = None
+        self.data = {}
+
+
+def _call(tg_id: int, message=None):
+    return SimpleNamespace(from_user=SimpleNamespace(id=tg_id), message=message or FakeMessage(), answer=AsyncMock())
+
+
+def _buttons(markup):
+    return [btn for row in markup.inline_keyboard for btn in row]
+
+
+async def _seed(session, n_students: int = 25):
+    session.add(User(tg_id=9700, role=Role.teacher, name="T", timezone="Europe/Moscow"))
+    students = [Student(full_name=f"S{i:02d}", timezone="Asia/Tokyo") for i in range(n_students)]
+    session.add_all(students)
+    await session.flush()
+    # у первого ученика есть аккаунт и родитель
+    su = User(tg_id=9701, role=Role.student, name="S")
+    pu = User(tg_id=9702, role=Role.parent, name="P")
+    session.add_all([su, pu])
+    await session.flush()
+    students[0].user_id = su.id
+    p = Parent(user_id=pu.id, full_name="Parent")
+    session.add(p)
+    await session.flush()
+    session.add(ParentStudent(parent_id=p.id, student_id=students[0].id))
+    await session.commit()
+    return students, su, pu
+
+
+@pytest.mark.asyncio
+async def test_group_assignment_flow_bulk(engine, session):
+    import app.handlers.admin.hw_group as mod
+
+    students, su, pu = await _seed(session)
+    state = FakeFSMContext()
+
+    call = _call(9700)
+    await mod.hw_group_start(call, state, session)
+    assert [b.text for b in _buttons(call.message.edits[-1][1])] == ["✏️ Новое задание", "Назад"]
+
+    await mod.hw_group_new(call, state, session)
+    assert state.state == mod.HwGroupFSM.title
+    await mod.hw_group_set_title(FakeMessage("Эссе", 9700), state, session)
+    await mod.hw_group_set_description(FakeMessage("Про лето", 9700), state, session)
+    msg = FakeMessage("2026-03-10 18:00", 9700)
+    await mod.hw_group_set_due_at(msg, state, session)
+    assert state.state == mod.HwGroupFSM.students
+
+    text, markup = msg.answers[-1]
+    assert "Дедлайн: 2026-03-10 18:00 (Europe/Moscow)" in text
+    toggles = [b for b in _buttons(markup) if b.callback_data.startswith("hwg:toggle")]
+    assert len(toggles) == 20
+    assert "▶" in [b.text for b in _buttons(markup)]
+
+    picker = _call(9700, FakeMessage())
+    await mod.hw_group_pick(picker, HwGroupCb(action="all"), state, session)
+    await mod.hw_group_pick(picker, HwGroupCb(action="toggle", item_id=students[1].id), state, session)
+    await mod.hw_group_pick(picker, HwGroupCb(action="page", page=2), state, session)
+    text, markup = picker.message.edits[-1]
+    assert "Выбрано учеников: 24" in text
+    assert "Выдать (24)" in [b.text for b in _buttons(markup)]
+
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", _count)
+    try:
+        await mod.hw_group_assign(picker, state, session)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", _count)
+
+    inserts = [s for s in statements if s.lstrip().upper().startswith("INSERT")]
+    assert len(inserts) == 3  # ДЗ, уведомления, шаблон
+    assert picker.message.edits[-1][0].startswith("ДЗ «Эссе» выдано ученикам: 24.")
+    assert state.state is None
+
+    hws = (await session.execute(select(Homework).order_by(Homework.student_id))).scalars().all()
+    assert len(hws) == 24 and students[1].id not in {h.student_id for h in hws}
+    assert {h.due_at for h in hws} == {datetime(2026, 3, 10, 15, 0, tzinfo=timezone.utc)}
+
+    notes = (await session.execute(
+        select(Notification.user_id, Notification.entity_id).where(Notification.type == "hw_assigned")
+    )).all()
+    assert sorted(notes) == sorted([(su.id, hws[0].id), (pu.id, hws[0].id)])
+
+    # задание попало в библиотеку; повторная выдача из шаблона его не дублирует
+    tpl = (await session.execute(select(HomeworkTemplate))).scalar_one()
+    assert (tpl.title, tpl.description) == ("Эссе", "Про лето")
+
+    call = _call(9700)
+    await mod.hw_group_start(call, state, session)
+    assert [b.text for b in _buttons(call.message.edits[-1][1])] == ["✏️ Новое задание", "📄 Эссе", "Назад"]
+    await mod.hw_group_template(call, HwGroupCb(action="tpl", item_id=tpl.id), state, session)
+    assert state.state == mod.HwGroupFSM.due_at
+    await mod.hw_group_set_due_at(FakeMessage("-", 9700), state, session)
+    picker = _call(9700, FakeMessage())
+    await mod.hw_group_pick(picker, HwGroupCb(action="toggle", item_id=students[2].id), state, session)
+    await mod.hw_group_assign(picker, state, session)
+
+    assert (await session.execute(select(func.count()).select_from(HomeworkTemplate))).scalar_one() == 1
+    assert (await session.execute(
+        select(Homework.due_at).where(Homework.student_id == students[2].id).order_by(Homework.id.desc()).limit(1)
+    )).scalar_one() is None
+
+
+@pytest.mark.asyncio
+async def test_group_assign_requires_selection_and_renders_notification(session):
+    import app.handlers.admin.hw_group as mod
+    from app.jobs_notifications import render_notification
+
+    students, su, _pu = await _seed(session, n_students=2)
+    state = FakeFSMContext()
+    await state.set_state(mod.HwGroupFSM.students)
+    await state.update_data(title="Тест", description="Стр. 5", due_at=None, tz="Europe/Moscow", selected=[])
+
+    call = _call(9700)
+    await mod.hw_group_assign(call, state, session)
+    call.answer.assert_awaited_once_with("Не выбран ни один ученик", show_alert=True)
+
+    await state.update_data(selected=[students[0].id])
+    await mod.hw_group_assign(call, state, session)
+    n = (await session.execute(
+        select(Notification).where(Notification.type == "hw_assigned", Notification.user_id == su.id)
+    )).scalar_one()
+    assert await render_notification(session, n, su) == "Новое домашнее задание.\nУченик: S00\nДЗ: Тест\nСтр. 5"
+
+
+def test_admin_menu_has_group_homework_button():
+    from app.keyboards import admin_menu
+
+    cds = [b.callback_data for row in admin_menu().inline_keyboard for b in row]
+    assert AdminCb(action="hw_group").pack() in cds
@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from aiogram.filters import CommandObject
+from sqlalchemy import text
+
+from app.callbacks import HwGroupCb, HwSearchCb
+from app.models import User, Role, Student, Homework
+from app.services.homework import search_homework
+
+T0 = datetime(2026, 3, 1, 9, 0, tzinfo=timezone.utc)
+
+
+class FakeMessage:
+    def __init__(self, tg_id: int = 0):
+        self.from_user = SimpleNamespace(id=tg_id)
+        self.edits = []
+        self.answers = []
+
+    async def edit_text(self, text: str, reply_markup=None, **kwargs):
+        self.edits.append((text, reply_markup))
+
+    async def answer(self, text: str, reply_markup=None, **kwargs):
+        self.answers.append((text, reply_markup))
+
+
+class FakeFSMContext:
+    def __init__(self):
+        self.state = None
+        self.data = {}
+
+    async def set_state(self, state):
+        self.state = state
+
+    async def update_data(self, **kwargs):
+        self.data.update(kwargs)
+
+    async def get_data(self):
+        return dict(self.data)
+
+    async def clear(self):
+        self.state = None
+        self.data = {}
+
+
+def _call(tg_id: int = 9900):
+    return SimpleNamespace(from_user=SimpleNamespace(id=tg_id), message=FakeMessage(), answer=AsyncMock())
+
+
+def _buttons(markup):
+    return [btn for row in markup.inline_keyboard for btn in row]
+
+
+@pytest.fixture(autouse=True)
+async def _russian_fts(session):
+    # в базе с кодировкой SQL_ASCII парсер не видит кириллицу — русский поиск там не проверить
+    if (await session.execute(text("SHOW server_encoding"))).scalar_one() != "UTF8":
+        pytest.skip("для русского полнотекстового поиска нужна база в UTF8")
+
+
+async def _seed(session):
+    session.add(User(tg_id=9900, role=Role.teacher, name="T", timezone="Europe/Moscow"))
+    anna, boris = Student(full_name="Anna"), Student(full_name="Boris")
+    session.add_all([anna, boris])
+    await session.flush()
+    hws = [
+        # слово только в описании — ниже по рангу, чем в названии
+        Homework(student_id=anna.id, title="Упражнения", description="Сложение дробей, стр. 12", created_at=T0),
+        Homework(student_id=boris.id, title="Дроби", description="Задачи 1-5", created_at=T0 + timedelta(days=1)),
+        Homework(student_id=anna.id, title="Эссе", description="Про лето", created_at=T0 + timedelta(days=2)),
+    ]
+    session.add_all(hws)
+    await session.commit()
+    return anna, boris, hws
+
+
+@pytest.mark.asyncio
+async def test_search_ranks_title_over_description_and_stems(session):
+    anna, boris, hws = await _seed(session)
+
+    # «дробь» и «дробей» / «Дроби» — одна основа
+    hits, total = await search_homework(session, "дробь")
+    assert total == 2
+    assert [h.homework_id for h in hits] == [hws[1].id, hws[0].id]
+    assert (hits[0].full_name, hits[0].title) == ("Boris", "Дроби")
+
+    hits, total = await search_homework(session, "дроби -задачи")
+    assert [h.homework_id for h in hits] == [hws[0].id]
+
+    assert await search_homework(session, "математика") == ([], 0)
+    # мусорный ввод не роняет запрос
+    assert await search_homework(session, '"&|!(') == ([], 0)
+
+
+@pytest.mark.asyncio
+async def test_search_pagination_total_across_pages(session):
+    session.add(Student(full_name="Vera"))
+    await session.flush()
+    for i in range(7):
+        session.add(Homework(student_id=1, title=f"Диктант {i}", description="-", created_at=T0 + timedelta(hours=i)))
+    await session.commit()
+
+    first, total = await search_homework(session, "диктант", page=1, page_size=5)
+    second, total2 = await search_homework(session, "диктант", page=2, page_size=5)
+    assert (total, total2) == (7, 7)
+    assert len(first) == 5 and len(second) == 2
+    # одинаковый ранг — свежие первыми
+    assert [h.title for h in first + second] == [f"Диктант {i}" for i in range(6, -1, -1)]
+
+
+@pytest.mark.asyncio
+async def test_hw_search_command_paging_and_copy(session, monkeypatch):
+    import app.handlers.admin.hw_search as mod
+    import app.handlers.admin.hw_group as grp
+
+    anna, boris, hws = await _seed(session)
+    monkeypatch.setattr(mod, "HW_SEARCH_PAGE_SIZE", 1)
+
+    state = FakeFSMContext()
+    msg = FakeMessage(9900)
+    await mod.hw_search_cmd(msg, CommandObject(command="hw_search", args=""), state, session)
+    assert msg.answers[-1][0].startswith("Поиск по названию и описанию ДЗ")
+
+    await mod.hw_search_cmd(msg, CommandObject(command="hw_search", args="дроби"), state, session)
+    text, markup = msg.answers[-1]
+    assert text.startswith("Поиск ДЗ: «дроби» — найдено 2\n\n1. Дроби — Boris (2026-03-02)")
+    assert state.data["hw_search"] == "дроби"
+    texts = [b.text for b in _buttons(markup)]
+    assert texts == ["1. Дроби", "↻ Выдать", "▶"]
+
+    call = _call()
+    await mod.hw_search_page(call, HwSearchCb(page=2), state, session)
+    text, markup = call.message.edits[-1]
+    assert "2. Упражнения — Anna (2026-03-01)" in text
+    assert [b.text for b in _buttons(markup)] == ["2. Упражнения", "↻ Выдать", "◀"]
+
+    # «↻ Выдать» — старое ДЗ как образец для выдачи группе
+    copy = HwGroupCb.unpack(_buttons(markup)[1].callback_data)
+    assert (copy.action, copy.item_id) == ("copy", hws[0].id)
+    call = _call()
+    await grp.hw_group_template(call, copy, state, session)
+    assert state.state == grp.HwGroupFSM.due_at
+    assert (state.data["title"], state.data["description"]) == ("Упражнения", "Сложение дробей, стр. 12")
+    assert "hw_search" not in state.data
+
+
+@pytest.mark.asyncio
+async def test_hw_search_page_without_query(session):
+    import app.handlers.admin.hw_search as mod
+
+    await _seed(session)
+    call = _call()
+    await mod.hw_search_page(call, HwSearchCb(page=2), FakeFSMContext(), session)
+    call.answer.assert_awaited_with("Повторите поиск: /hw_search текст", show_alert=True)
+    assert call.message.edits == []
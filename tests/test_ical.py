@@ -0,0 +1,165 @@
+from datetime import date, datetime, time, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from sqlalchemy import select
+
+from app.callbacks import MenuCb
+from app.models import User, Role, Student, Parent, ParentStudent, Lesson, LessonStatus, ScheduleRule
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text: str, reply_markup=None):
+        self.edits.append((text, reply_markup))
+
+
+async def _family(session):
+    parent_user = User(tg_id=9960, role=Role.parent, name="P", timezone="Europe/Moscow", ical_token="tok-parent")
+    session.add(parent_user)
+    await session.flush()
+    kids = [Student(full_name=name, timezone="Europe/Moscow") for name in ("Kid, One", "Kid Two")]
+    session.add_all(kids)
+    await session.flush()
+    p = Parent(user_id=parent_user.id, full_name="Parent")
+    session.add(p)
+    await session.flush()
+    session.add_all([ParentStudent(parent_id=p.id, student_id=k.id) for k in kids])
+
+    start = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=1)
+    lessons = [
+        Lesson(student_id=kids[0].id, start_at=start, status=LessonStatus.planned),
+        Lesson(student_id=kids[1].id, start_at=start + timedelta(hours=2), duration_min=45, status=LessonStatus.planned),
+    ]
+    session.add_all(lessons)
+    await session.commit()
+    return parent_user, kids, lessons
+
+
+@pytest.mark.asyncio
+async def test_schedule_version_bumps_on_lesson_changes(session):
+    from app.services.schedule import generate_lessons_for_student, cancel_planned_lesson
+
+    st = Student(full_name="S", timezone="Europe/Moscow")
+    session.add(st)
+    await session.flush()
+    session.add(ScheduleRule(student_id=st.id, weekday=0, time_local=time(10, 0), start_date=date(2026, 1, 1)))
+    await session.commit()
+
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    await generate_lessons_for_student(session, st.id, now_utc=now, horizon_days=14)
+    await session.commit()
+    assert (await session.execute(select(Student.schedule_version).where(Student.id == st.id))).scalar_one() == 1
+
+    # повторная генерация ничего не вставила — версия та же
+    await generate_lessons_for_student(session, st.id, now_utc=now, horizon_days=14)
+    await session.commit()
+    assert (await session.execute(select(Student.schedule_version).where(Student.id == st.id))).scalar_one() == 1
+
+    lesson_id = (await session.execute(select(Lesson.id).where(Lesson.student_id == st.id).limit(1))).scalar_one()
+    assert await cancel_planned_lesson(session, lesson_id) == "canceled"
+    assert (await session.execute(select(Student.schedule_version).where(Student.id == st.id))).scalar_one() == 2
+
+
+@pytest.mark.asyncio
+async def test_ical_feed_render_and_304_from_cache(monkeypatch, sessionmaker, session):
+    import app.web as web_mod
+    from app.services.schedule import cancel_planned_lesson
+
+    monkeypatch.setattr(web_mod.db, "SessionMaker", sessionmaker)
+    monkeypatch.setattr(web_mod.settings, "ical_cache_ttl_sec", 3600)
+
+    version_checks, renders = [], []
+    orig_versions, orig_render = web_mod.feed_versions, web_mod.render_feed
+
+    async def counting_versions(*args):
+        version_checks.append(1)
+        return await orig_versions(*args)
+
+    async def counting_render(*args):
+        renders.append(1)
+        return await orig_render(*args)
+
+    monkeypatch.setattr(web_mod, "feed_versions", counting_versions)
+    monkeypatch.setattr(web_mod, "render_feed", counting_render)
+
+    _parent, _kids, lessons = await _family(session)
+
+    async with TestClient(TestServer(web_mod.build_web_app())) as client:
+        resp = await client.get("/ical/tok-parent.ics")
+        assert resp.status == 200
+        assert resp.headers["Content-Type"].startswith("text/calendar")
+        body = await resp.text()
+        assert body.startswith("BEGIN:VCALENDAR\r\n")
+        assert body.count("BEGIN:VEVENT") == 2
+        assert "SUMMARY:Урок: Kid\\, One\r\n" in body
+        assert f"UID:lesson-{lessons[1].id}@tutor-bot" in body
+        etag = resp.headers["ETag"]
+
+        # в пределах TTL — 304 без БД
+        resp = await client.get("/ical/tok-parent.ics", headers={"If-None-Match": etag})
+        assert resp.status == 304
+        resp = await client.get("/ical/tok-parent.ics", headers={"If-Modified-Since": resp.headers["Last-Modified"]})
+        assert resp.status == 304
+        assert (len(version_checks), len(renders)) == (1, 1)
+
+        # TTL истёк, версии те же — одна сверка версий, без пересборки
+        monkeypatch.setattr(web_mod.settings, "ical_cache_ttl_sec", 0)
+        resp = await client.get("/ical/tok-parent.ics", headers={"If-None-Match": etag})
+        assert resp.status == 304
+        assert (len(version_checks), len(renders)) == (2, 1)
+
+        # урок отменён — версия выросла, лента пересобрана
+        await cancel_planned_lesson(session, lessons[0].id)
+        resp = await client.get("/ical/tok-parent.ics", headers={"If-None-Match": etag})
+        assert resp.status == 200
+        assert resp.headers["ETag"] != etag
+        assert (await resp.text()).count("BEGIN:VEVENT") == 1  # разовый урок удалён
+        assert len(renders) == 2
+
+        resp = await client.get("/ical/unknown.ics")
+        assert resp.status == 404
+
+
+@pytest.mark.asyncio
+async def test_calendar_screen_issues_and_resets_token(session):
+    import app.handlers.calendar as calendar_mod
+
+    u = User(tg_id=9970, role=Role.student, name="S", timezone="Europe/Moscow")
+    session.add(u)
+    await session.commit()
+
+    call = SimpleNamespace(from_user=SimpleNamespace(id=9970), message=FakeMessage(), answer=AsyncMock())
+    await calendar_mod.calendar_feed(call, MenuCb(section="calendar"), session)
+    token = u.ical_token
+    assert token and f"/ical/{token}.ics" in call.message.edits[-1][0]
+
+    # повторный заход — та же ссылка
+    await calendar_mod.calendar_feed(call, MenuCb(section="calendar"), session)
+    assert u.ical_token == token
+
+    await calendar_mod.calendar_feed(call, MenuCb(section="calendar_reset"), session)
+    assert u.ical_token != token
+    call.answer.assert_awaited_with("Ссылка перевыпущена")
+
+
+@pytest.mark.asyncio
+async def test_reset_token_drops_cached_feed_immediately(monkeypatch, sessionmaker, session):
+    import app.web as web_mod
+    from app.services.ical import reset_ical_token
+
+    monkeypatch.setattr(web_mod.db, "SessionMaker", sessionmaker)
+    monkeypatch.setattr(web_mod.settings, "ical_cache_ttl_sec", 3600)
+    parent, _kids, _lessons = await _family(session)
+
+    async with TestClient(TestServer(web_mod.build_web_app())) as client:
+        assert (await client.get("/ical/tok-parent.ics")).status == 200
+
+        # ссылка утекла и перевыпущена — старая не работает даже в пределах TTL
+        new_token = await reset_ical_token(session, parent)
+        assert (await client.get("/ical/tok-parent.ics")).status == 404
+        assert (await client.get(f"/ical/{new_token}.ics")).status == 200
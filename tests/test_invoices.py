@@ -0,0 +1,209 @@
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.callbacks import AdminCb
+from app.models import (
+    User, Role, Student, BillingMode, InvoicePeriod, Parent, ParentStudent,
+    Lesson, LessonStatus, LessonCharge, ChargeStatus, Notification,
+)
+
+
+def _freeze_datetime(monkeypatch, module, fixed: datetime):
+    class FixedDateTime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return fixed if tz is not None else fixed.replace(tzinfo=None)
+
+    monkeypatch.setattr(module, "datetime", FixedDateTime)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, tg_id: int, text: str):
+        self.sent.append((tg_id, text))
+
+
+class FakeFromUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text: str, **kwargs):
+        self.edits.append((text, kwargs))
+
+
+class FakeCallbackQuery:
+    def __init__(self, user_id: int):
+        self.from_user = FakeFromUser(user_id)
+        self.message = FakeMessage()
+        self.answered = 0
+
+    async def answer(self, *args, **kwargs):
+        self.answered += 1
+
+
+async def _kid(session, name: str, period: InvoicePeriod, price: int = 1000) -> Student:
+    st = Student(full_name=name, timezone="Europe/Moscow", billing_mode=BillingMode.single,
+                 price_per_lesson=price, invoice_period=period)
+    session.add(st)
+    await session.flush()
+    return st
+
+
+async def _parent(session, tg_id: int, *kids, **user_kw) -> User:
+    u = User(tg_id=tg_id, role=Role.parent, name="P", timezone="Europe/Moscow", **user_kw)
+    session.add(u)
+    await session.flush()
+    p = Parent(user_id=u.id, full_name="Parent")
+    session.add(p)
+    await session.flush()
+    session.add_all([ParentStudent(parent_id=p.id, student_id=k.id) for k in kids])
+    await session.flush()
+    return u
+
+
+async def _charge(session, st: Student, start_at: datetime, status=ChargeStatus.pending):
+    lesson = Lesson(student_id=st.id, start_at=start_at, status=LessonStatus.done)
+    session.add(lesson)
+    await session.flush()
+    session.add(LessonCharge(lesson_id=lesson.id, student_id=st.id, amount=st.price_per_lesson, status=status))
+    await session.flush()
+
+
+def test_invoice_periods_due():
+    from app.jobs_billing import invoice_periods_due
+
+    assert invoice_periods_due(date(2026, 6, 1)) == [InvoicePeriod.weekly, InvoicePeriod.monthly]  # пн, 1-е
+    assert invoice_periods_due(date(2026, 6, 8)) == [InvoicePeriod.weekly]
+    assert invoice_periods_due(date(2026, 7, 1)) == [InvoicePeriod.monthly]
+    assert invoice_periods_due(date(2026, 6, 2)) == []
+
+
+@pytest.mark.asyncio
+async def test_mark_lesson_done_accumulates_silently_for_periodic_invoices(session):
+    from app.services.billing import mark_lesson_done
+
+    kid = await _kid(session, "Kid", InvoicePeriod.monthly)
+    await _parent(session, 10101, kid)
+    lesson = Lesson(student_id=kid.id, start_at=datetime(2026, 6, 1, 7, 0, tzinfo=timezone.utc),
+                    status=LessonStatus.planned)
+    session.add(lesson)
+    await session.commit()
+
+    bot = FakeBot()
+    charge_id = (await mark_lesson_done(session, bot, lesson.id)).charge_id
+
+    assert bot.sent == []
+    ch = (await session.execute(select(LessonCharge).where(LessonCharge.id == charge_id))).scalar_one()
+    assert ch.status == ChargeStatus.pending
+
+
+@pytest.mark.asyncio
+async def test_plan_invoices_one_statement_per_parent_and_period(monkeypatch, sessionmaker, session):
+    import app.jobs_billing as jobs
+    import app.jobs_notifications as jobs_n
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+    monkeypatch.setattr(jobs.settings, "invoice_timezone", "Europe/Moscow")
+
+    now = datetime(2026, 6, 1, 5, 0, tzinfo=timezone.utc)  # пн 1 июня, 08:00 МСК
+    _freeze_datetime(monkeypatch, jobs, now)
+
+    anna = await _kid(session, "Anna", InvoicePeriod.monthly, price=1500)
+    boris = await _kid(session, "Boris", InvoicePeriod.weekly)
+    vera = await _kid(session, "Vera", InvoicePeriod.per_lesson)
+    parent = await _parent(session, 10201, anna, boris, vera)
+    await _parent(session, 10202, anna, blocked_at=now - timedelta(days=3))
+
+    may = datetime(2026, 5, 10, 7, 0, tzinfo=timezone.utc)
+    await _charge(session, anna, may)
+    await _charge(session, anna, may + timedelta(days=7))
+    await _charge(session, anna, may + timedelta(days=14), status=ChargeStatus.paid)
+    await _charge(session, anna, now + timedelta(hours=3))  # уже новый период
+    await _charge(session, boris, datetime(2026, 5, 28, 15, 30, tzinfo=timezone.utc))
+    await _charge(session, vera, may)
+    await session.commit()
+
+    await jobs.plan_invoices_job()
+    await jobs.plan_invoices_job()  # идемпотентно
+
+    async with sessionmaker() as s2:
+        rows = (await s2.execute(
+            select(Notification.user_id, Notification.type, Notification.entity_id, Notification.payload)
+            .order_by(Notification.type)
+        )).all()
+
+    assert [(r.user_id, r.type, r.entity_id) for r in rows] == [
+        (parent.id, "invoice_monthly", 20260601),
+        (parent.id, "invoice_weekly", 20260601),
+    ]
+    assert rows[0].payload == (
+        "Сводка за месяц: неоплаченные уроки на 2026-06-01\n\n"
+        "Anna:\n"
+        "- 2026-05-10 10:00 — 1500.00\n"
+        "- 2026-05-17 10:00 — 1500.00\n"
+        "Итого: 3000.00\n\n"
+        "Всего к оплате: 3000.00"
+    )
+    assert rows[1].payload == (
+        "Сводка за неделю: неоплаченные уроки на 2026-06-01\n\n"
+        "Boris:\n"
+        "- 2026-05-28 18:30 — 1000.00\n"
+        "Итого: 1000.00\n\n"
+        "Всего к оплате: 1000.00"
+    )
+
+    # уходят обычной очередью
+    monkeypatch.setattr(jobs_n.db, "SessionMaker", sessionmaker)
+    _freeze_datetime(monkeypatch, jobs_n, now)
+    bot = FakeBot()
+    await jobs_n.send_notifications_job(bot)
+    assert len(bot.sent) == 1
+    assert "Сводка за месяц" in bot.sent[0][1] and "Сводка за неделю" in bot.sent[0][1]
+
+
+@pytest.mark.asyncio
+async def test_plan_invoices_job_noop_on_regular_day(monkeypatch, sessionmaker, session):
+    import app.jobs_billing as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+    _freeze_datetime(monkeypatch, jobs, datetime(2026, 6, 3, 5, 0, tzinfo=timezone.utc))
+
+    kid = await _kid(session, "Kid", InvoicePeriod.weekly)
+    await _parent(session, 10301, kid)
+    await _charge(session, kid, datetime(2026, 6, 2, 7, 0, tzinfo=timezone.utc))
+    await session.commit()
+
+    await jobs.plan_invoices_job()
+
+    assert (await session.execute(select(Notification))).scalars().all() == []
+
+
+@pytest.mark.asyncio
+async def test_student_card_cycles_invoice_period(session):
+    import app.handlers.admin.students as students_mod
+
+    teacher = User(tg_id=10401, role=Role.teacher, name="T", timezone="Europe/Moscow")
+    session.add(teacher)
+    kid = await _kid(session, "Kid", InvoicePeriod.per_lesson)
+    await session.commit()
+
+    call = FakeCallbackQuery(10401)
+    await students_mod.admin_student_card(call, AdminCb(action="student", student_id=kid.id), session)
+    assert "Счета родителям: после каждого урока" in call.message.edits[-1][0]
+
+    await students_mod.admin_student_invoice_period(call, AdminCb(action="invoice_period", student_id=kid.id), session)
+    text, kwargs = call.message.edits[-1]
+    assert "Счета родителям: раз в неделю" in text
+    labels = [btn.text for row in kwargs["reply_markup"].inline_keyboard for btn in row]
+    assert "Счета родителям: раз в неделю" in labels
+
+    await students_mod.admin_student_invoice_period(call, AdminCb(action="invoice_period", student_id=kid.id), session)
+    await students_mod.admin_student_invoice_period(call, AdminCb(action="invoice_period", student_id=kid.id), session)
+    assert "Счета родителям: после каждого урока" in call.message.edits[-1][0]
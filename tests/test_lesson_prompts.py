@@ -0,0 +1,195 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.callbacks import PromptCb
+from app.models import (
+    User, Role, Student, BillingMode, Lesson, LessonStatus, ScheduleRule,
+    StudentBalance, Notification, NotificationStatus,
+)
+
+
+def _freeze_datetime(monkeypatch, module, fixed: datetime):
+    class FixedDateTime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return fixed if tz is not None else fixed.replace(tzinfo=None)
+
+    monkeypatch.setattr(module, "datetime", FixedDateTime)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []  # (tg_id, text, reply_markup)
+
+    async def send_message(self, tg_id: int, text: str, reply_markup=None):
+        self.sent.append((tg_id, text, reply_markup))
+
+
+class FakeFromUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class FakeMessage:
+    def __init__(self, text: str):
+        self.text = text
+        self.edits = []
+
+    async def edit_text(self, text: str, **kwargs):
+        self.edits.append((text, kwargs))
+
+
+class FakeCallbackQuery:
+    def __init__(self, user_id: int, text: str = "Урок закончился — отметить?"):
+        self.from_user = FakeFromUser(user_id)
+        self.message = FakeMessage(text)
+        self.answered = []
+
+    async def answer(self, text: str | None = None, show_alert: bool = False):
+        self.answered.append((text, show_alert))
+
+
+NOW = datetime(2026, 1, 5, 12, 0, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_plan_lesson_prompts_one_row_per_finished_lesson(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+    monkeypatch.setattr(jobs.settings, "teacher_tg_id", 9901)
+    monkeypatch.setattr(jobs.settings, "lesson_prompt_delay_min", 5)
+    _freeze_datetime(monkeypatch, jobs, NOW)
+
+    teacher = User(tg_id=9901, role=Role.teacher, name="T", timezone="Europe/Moscow")
+    st = Student(full_name="S", timezone="Europe/Moscow")
+    session.add_all([teacher, st])
+    await session.flush()
+
+    ended = Lesson(student_id=st.id, start_at=NOW - timedelta(hours=2), duration_min=60, status=LessonStatus.planned)
+    later = Lesson(student_id=st.id, start_at=NOW + timedelta(hours=3), duration_min=90, status=LessonStatus.planned)
+    session.add_all([
+        ended,
+        later,
+        Lesson(student_id=st.id, start_at=NOW - timedelta(hours=4), status=LessonStatus.done),
+        Lesson(student_id=st.id, start_at=NOW - timedelta(days=3), status=LessonStatus.planned),
+        Lesson(student_id=st.id, start_at=NOW + timedelta(days=3), status=LessonStatus.planned),
+    ])
+    await session.commit()
+
+    await jobs.plan_lesson_prompts_job()
+    await jobs.plan_lesson_prompts_job()  # идемпотентно
+
+    async with sessionmaker() as s2:
+        rows = (await s2.execute(
+            select(Notification.user_id, Notification.type, Notification.entity_id, Notification.send_at)
+            .order_by(Notification.send_at)
+        )).all()
+
+    assert rows == [
+        (teacher.id, "lesson_prompt", ended.id, NOW - timedelta(minutes=55)),
+        (teacher.id, "lesson_prompt", later.id, NOW + timedelta(hours=4, minutes=35)),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_lesson_prompt_is_sent_alone_with_buttons(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+    monkeypatch.setattr(jobs.settings, "lesson_prompt_delay_min", 5)
+    _freeze_datetime(monkeypatch, jobs, NOW)
+
+    teacher = User(tg_id=9902, role=Role.teacher, name="T", timezone="Europe/Moscow")
+    st = Student(full_name="Kid", timezone="Europe/Moscow")
+    session.add_all([teacher, st])
+    await session.flush()
+
+    planned = Lesson(student_id=st.id, start_at=NOW - timedelta(minutes=65), duration_min=60, status=LessonStatus.planned)
+    done = Lesson(student_id=st.id, start_at=NOW - timedelta(minutes=125), duration_min=60, status=LessonStatus.done)
+    session.add_all([planned, done])
+    await session.flush()
+
+    prompt = Notification(user_id=teacher.id, type="lesson_prompt", entity_id=planned.id, send_at=NOW)
+    stale = Notification(user_id=teacher.id, type="lesson_prompt", entity_id=done.id, send_at=NOW - timedelta(hours=1))
+    other = Notification(user_id=teacher.id, type="hw_graded", entity_id=1, send_at=NOW, payload="hw")
+    session.add_all([prompt, stale, other])
+    await session.commit()
+
+    bot = FakeBot()
+    result = await jobs.send_notifications_job(bot)
+
+    assert result["skipped"] == 1
+    assert [(tg, text) for tg, text, _ in bot.sent] == [
+        (9902, "hw"),
+        (9902, "Урок закончился — отметить?\nУченик: Kid\nВремя: 2026-01-05 13:55 (Europe/Moscow)"),
+    ]
+    markup = bot.sent[1][2]
+    assert [btn.callback_data for row in markup.inline_keyboard for btn in row] == [
+        PromptCb(action="done", lesson_id=planned.id).pack(),
+        PromptCb(action="cancel", lesson_id=planned.id).pack(),
+    ]
+
+    async with sessionmaker() as s2:
+        s = (await s2.execute(select(Notification.status).where(Notification.id == stale.id))).scalar_one()
+        assert s == NotificationStatus.skipped
+
+
+@pytest.mark.asyncio
+async def test_prompt_done_button_runs_billing(session):
+    import app.handlers.admin.lessons as lessons_mod
+
+    teacher = User(tg_id=9903, role=Role.teacher, name="T", timezone="Europe/Moscow")
+    st = Student(full_name="S", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    session.add_all([teacher, st])
+    await session.flush()
+    session.add(StudentBalance(student_id=st.id, lessons_left=2))
+    lesson = Lesson(student_id=st.id, start_at=NOW, status=LessonStatus.planned)
+    session.add(lesson)
+    await session.commit()
+
+    call = FakeCallbackQuery(9903)
+    await lessons_mod.lesson_prompt_action(call, PromptCb(action="done", lesson_id=lesson.id), session, FakeBot())
+    assert call.message.edits[-1][0].endswith("✅ Отмечен проведённым.")
+
+    left = (await session.execute(select(StudentBalance.lessons_left))).scalar_one()
+    assert left == 1
+
+    # повторное нажатие ничего не списывает и так и сообщает
+    call = FakeCallbackQuery(9903)
+    await lessons_mod.lesson_prompt_action(call, PromptCb(action="done", lesson_id=lesson.id), session, FakeBot())
+    assert (await session.execute(select(StudentBalance.lessons_left))).scalar_one() == 1
+    assert call.message.edits[-1][0].endswith("Урок уже был отмечен ранее.")
+
+
+@pytest.mark.asyncio
+async def test_prompt_cancel_button_deletes_one_off_and_cancels_recurring(session):
+    import app.handlers.admin.lessons as lessons_mod
+    from datetime import date, time
+
+    teacher = User(tg_id=9904, role=Role.teacher, name="T", timezone="Europe/Moscow")
+    st = Student(full_name="S", timezone="Europe/Moscow")
+    session.add_all([teacher, st])
+    await session.flush()
+    rule = ScheduleRule(student_id=st.id, weekday=0, time_local=time(10, 0), duration_min=60,
+                        start_date=date(2026, 1, 1), active=True)
+    session.add(rule)
+    await session.flush()
+    one_off = Lesson(student_id=st.id, start_at=NOW, status=LessonStatus.planned)
+    recurring = Lesson(student_id=st.id, start_at=NOW + timedelta(days=7), status=LessonStatus.planned,
+                       source_rule_id=rule.id)
+    session.add_all([one_off, recurring])
+    await session.commit()
+
+    call = FakeCallbackQuery(9904)
+    await lessons_mod.lesson_prompt_action(call, PromptCb(action="cancel", lesson_id=one_off.id), session, FakeBot())
+    assert "удалено из календаря" in call.message.edits[-1][0]
+
+    call = FakeCallbackQuery(9904)
+    await lessons_mod.lesson_prompt_action(call, PromptCb(action="cancel", lesson_id=recurring.id), session, FakeBot())
+    assert call.message.edits[-1][0].endswith("❌ Занятие отменено.")
+
+    rows = (await session.execute(
+        select(Lesson.id, Lesson.status).execution_options(populate_existing=True)
+    )).all()
+    assert rows == [(recurring.id, LessonStatus.canceled)]
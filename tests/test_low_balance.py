@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.models import (
+    User, Role, Student, BillingMode, Parent, ParentStudent, Lesson, LessonStatus,
+    StudentBalance, Notification,
+)
+
+
+def _freeze_datetime(monkeypatch, module, fixed: datetime):
+    class FixedDateTime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return fixed if tz is not None else fixed.replace(tzinfo=None)
+
+    monkeypatch.setattr(module, "datetime", FixedDateTime)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, tg_id: int, text: str, **kwargs):
+        self.sent.append((tg_id, text))
+
+
+async def _setup(session, now, *, lessons_left: int | None, planned: int, billing_mode=BillingMode.subscription):
+    teacher = User(tg_id=9800, role=Role.teacher, name="T", timezone="Europe/Moscow")
+    student_user = User(tg_id=9801, role=Role.student, name="S", timezone="Europe/Moscow")
+    parent_user = User(tg_id=9802, role=Role.parent, name="P", timezone="Europe/Moscow")
+    session.add_all([teacher, student_user, parent_user])
+    await session.flush()
+
+    st = Student(full_name="Kid", timezone="Europe/Moscow", user_id=student_user.id, billing_mode=billing_mode)
+    session.add(st)
+    await session.flush()
+    p = Parent(user_id=parent_user.id, full_name="Parent")
+    session.add(p)
+    await session.flush()
+    session.add(ParentStudent(parent_id=p.id, student_id=st.id))
+    if lessons_left is not None:
+        session.add(StudentBalance(student_id=st.id, lessons_left=lessons_left))
+
+    for i in range(planned):
+        session.add(Lesson(student_id=st.id, start_at=now + timedelta(days=i + 1), status=LessonStatus.planned))
+    # за окном — не считается
+    session.add(Lesson(student_id=st.id, start_at=now + timedelta(days=10), status=LessonStatus.planned))
+    await session.commit()
+    return teacher, parent_user, st
+
+
+@pytest.mark.asyncio
+async def test_low_balance_alert_once_per_crossing_to_parents_and_teacher(monkeypatch, sessionmaker, session):
+    import app.jobs_billing as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+    monkeypatch.setattr(jobs.settings, "teacher_tg_id", 9800)
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, jobs, now)
+    teacher, parent_user, st = await _setup(session, now, lessons_left=1, planned=3)
+
+    await jobs.plan_low_balance_alerts_job()
+    await jobs.plan_low_balance_alerts_job()  # тот же порог — повторно не предупреждаем
+
+    rows = (await session.execute(
+        select(Notification.user_id, Notification.entity_id, Notification.payload).order_by(Notification.user_id)
+    )).all()
+    assert [(u, e) for u, e, _ in rows] == [(teacher.id, st.id), (parent_user.id, st.id)]
+    assert "Осталось уроков: 1, запланировано на ближайшие 7 дн.: 3." in rows[0][2]
+
+    # пополнили — флаг сбрасывается
+    await session.execute(
+        StudentBalance.__table__.update().where(StudentBalance.student_id == st.id).values(lessons_left=5)
+    )
+    await session.commit()
+    await jobs.plan_low_balance_alerts_job()
+    async with sessionmaker() as s2:
+        bal = (await s2.execute(select(StudentBalance).where(StudentBalance.student_id == st.id))).scalar_one()
+        assert bal.low_balance_notified_at is None
+
+    # новое пересечение порога — новое предупреждение
+    await session.execute(
+        StudentBalance.__table__.update().where(StudentBalance.student_id == st.id).values(lessons_left=0)
+    )
+    await session.commit()
+    _freeze_datetime(monkeypatch, jobs, now + timedelta(minutes=10))
+    await jobs.plan_low_balance_alerts_job()
+
+    async with sessionmaker() as s2:
+        count = len((await s2.execute(select(Notification.id))).all())
+    assert count == 4
+
+
+@pytest.mark.asyncio
+async def test_low_balance_skips_enough_balance_and_single_billing(session):
+    from app.jobs_billing import plan_low_balance_alerts
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    await _setup(session, now, lessons_left=3, planned=3)
+    assert await plan_low_balance_alerts(session, now) == []
+
+    await session.execute(StudentBalance.__table__.update().values(lessons_left=0))
+    await session.execute(Student.__table__.update().values(billing_mode=BillingMode.single))
+    assert await plan_low_balance_alerts(session, now) == []
+
+
+@pytest.mark.asyncio
+async def test_low_balance_alerts_subscription_without_balance_row(session):
+    from app.jobs_billing import plan_low_balance_alerts
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    # абонемент оформлен, но пакетов ещё не было — строки баланса нет
+    teacher, parent_user, st = await _setup(session, now, lessons_left=None, planned=2)
+
+    assert await plan_low_balance_alerts(session, now) == [st.id]
+    await session.commit()
+    payload = (await session.execute(
+        select(Notification.payload).where(Notification.user_id == parent_user.id)
+    )).scalar_one()
+    assert "Осталось уроков: 0, запланировано на ближайшие 7 дн.: 2." in payload
+    # флаг стоит на заведённой строке — повторно не предупреждаем
+    assert await plan_low_balance_alerts(session, now) == []
+
+
+@pytest.mark.asyncio
+async def test_low_balance_alert_skipped_if_topped_up_before_send(monkeypatch, sessionmaker, session):
+    import app.jobs_billing as billing_jobs
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+    monkeypatch.setattr(billing_jobs.settings, "teacher_tg_id", 9800)
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, jobs, now)
+    _teacher, _parent_user, st = await _setup(session, now, lessons_left=0, planned=1)
+
+    await billing_jobs.plan_low_balance_alerts(session, now)
+    await session.commit()
+
+    bot = FakeBot()
+    await jobs.send_notifications_job(bot)
+    assert sorted(tg for tg, _ in bot.sent) == [9800, 9802]
+    assert bot.sent[0][1].startswith("Абонемент заканчивается.\nУченик: Kid")
+
+    # абонемент пополнили между планированием и отправкой — уведомление пропускается
+    await session.execute(Notification.__table__.delete())
+    await session.execute(StudentBalance.__table__.update().values(low_balance_notified_at=None))
+    await billing_jobs.plan_low_balance_alerts(session, now)
+    await session.execute(StudentBalance.__table__.update().values(lessons_left=5))
+    await billing_jobs.plan_low_balance_alerts(session, now)
+    await session.commit()
+    bot = FakeBot()
+    await jobs.send_notifications_job(bot)
+    assert bot.sent == []
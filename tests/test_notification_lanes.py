@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.models import (
+    User, Role, Student, Lesson, LessonStatus,
+    Notification, NotificationStatus, NotificationPriority,
+)
+from app.services.notifications import allocate_batch, queue_stats, format_queue_stats
+
+
+def _freeze_datetime(monkeypatch, module, fixed: datetime):
+    class FixedDateTime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return fixed if tz is not None else fixed.replace(tzinfo=None)
+
+    monkeypatch.setattr(module, "datetime", FixedDateTime)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, tg_id: int, text: str):
+        self.sent.append((tg_id, text))
+
+
+def test_allocate_batch_urgent_lane_is_strict():
+    alloc = allocate_batch({0: 5, 1: 100, 2: 100}, batch_size=4)
+    assert alloc == {0: 4, 1: 0, 2: 0}
+
+
+def test_allocate_batch_weighted_split_and_redistribution():
+    # normal:bulk = 3:1
+    alloc = allocate_batch({0: 2, 1: 100, 2: 100}, batch_size=10)
+    assert alloc[0] == 2
+    assert alloc[1] == 6
+    assert alloc[2] == 2
+
+    # пустая/короткая полоса отдаёт свою долю остальным
+    alloc = allocate_batch({1: 1, 2: 100}, batch_size=10)
+    assert alloc == {1: 1, 2: 9}
+
+
+def test_allocate_batch_never_exceeds_depth_or_batch():
+    depths = {0: 3, 1: 7, 2: 11, 5: 4}
+    for batch in range(0, 30):
+        alloc = allocate_batch(depths, batch)
+        assert sum(alloc.values()) == min(batch, sum(depths.values()))
+        assert all(alloc[p] <= depths[p] for p in depths)
+
+
+@pytest.mark.asyncio
+async def test_notification_priority_defaults_from_type(session):
+    u = User(tg_id=9101, role=Role.parent, name="P", timezone="Europe/Moscow")
+    session.add(u)
+    await session.flush()
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    session.add_all([
+        Notification(user_id=u.id, type="lesson_1h", entity_id=1, send_at=now),
+        Notification(user_id=u.id, type="lesson_24h", entity_id=1, send_at=now),
+        Notification(user_id=u.id, type="hw_graded", entity_id=1, send_at=now),
+    ])
+    await session.commit()
+
+    rows = dict((await session.execute(select(Notification.type, Notification.priority))).all())
+    assert rows == {
+        "lesson_1h": NotificationPriority.urgent,
+        "lesson_24h": NotificationPriority.normal,
+        "hw_graded": NotificationPriority.bulk,
+    }
+
+
+@pytest.mark.asyncio
+async def test_send_notifications_1h_reminder_goes_before_burst(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, jobs, now)
+
+    burst_user = User(tg_id=9201, role=Role.parent, name="Burst", timezone="Europe/Moscow")
+    u = User(tg_id=9202, role=Role.parent, name="P", timezone="Europe/Moscow")
+    session.add_all([burst_user, u])
+    await session.flush()
+
+    st = Student(full_name="Student", timezone="Europe/Moscow")
+    session.add(st)
+    await session.flush()
+
+    lesson = Lesson(student_id=st.id, start_at=now + timedelta(minutes=50), status=LessonStatus.planned)
+    session.add(lesson)
+    await session.flush()
+
+    # старый burst hw_graded, а напоминание появилось позже всех
+    session.add_all([
+        Notification(user_id=burst_user.id, type="hw_graded", entity_id=i,
+                     send_at=now - timedelta(minutes=30), payload=f"hw{i}")
+        for i in range(10)
+    ])
+    session.add(Notification(user_id=u.id, type="lesson_1h", entity_id=lesson.id,
+                             send_at=now - timedelta(seconds=5)))
+    await session.commit()
+
+    bot = FakeBot()
+    await jobs.send_notifications_job(bot, batch_size=1)
+
+    assert len(bot.sent) == 1
+    assert bot.sent[0][0] == 9202
+    assert "Напоминание: урок скоро" in bot.sent[0][1]
+
+    async with sessionmaker() as s2:
+        pending = (await s2.execute(
+            select(Notification).where(Notification.status == NotificationStatus.pending)
+        )).scalars().all()
+        assert len(pending) == 10
+        assert all(n.type == "hw_graded" for n in pending)
+
+
+@pytest.mark.asyncio
+async def test_queue_stats_reports_depth_and_lag_per_lane(session):
+    u = User(tg_id=9301, role=Role.parent, name="P", timezone="Europe/Moscow")
+    session.add(u)
+    await session.flush()
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    session.add_all([
+        Notification(user_id=u.id, type="lesson_1h", entity_id=1, send_at=now - timedelta(seconds=30)),
+        Notification(user_id=u.id, type="hw_graded", entity_id=1, send_at=now - timedelta(minutes=5)),
+        Notification(user_id=u.id, type="hw_graded", entity_id=2, send_at=now - timedelta(minutes=1)),
+        # не считаются: в будущем / уже отправлено
+        Notification(user_id=u.id, type="hw_graded", entity_id=3, send_at=now + timedelta(minutes=1)),
+        Notification(user_id=u.id, type="hw_graded", entity_id=4, send_at=now - timedelta(hours=1),
+                     status=NotificationStatus.sent),
+    ])
+    await session.commit()
+
+    stats = await queue_stats(session, now)
+    assert stats[NotificationPriority.urgent] == (1, 30.0)
+    assert stats[NotificationPriority.bulk] == (2, 300.0)
+    assert NotificationPriority.normal not in stats
+
+    assert format_queue_stats(stats) == "urgent: depth=1 lag=30s, bulk: depth=2 lag=300s"
@@ -0,0 +1,176 @@
+from datetime import datetime, time, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import select
+
+from app.models import (
+    User, Role, Student, Lesson, LessonStatus,
+    Notification, NotificationSettings,
+)
+
+
+def _freeze_datetime(monkeypatch, module, fixed: datetime):
+    class FixedDateTime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return fixed if tz is not None else fixed.replace(tzinfo=None)
+
+    monkeypatch.setattr(module, "datetime", FixedDateTime)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text: str, reply_markup=None):
+        self.edits.append((text, reply_markup))
+
+
+async def _student_with_lesson(session, tg_id: int, start_at: datetime, tzname: str = "Europe/Moscow"):
+    u = User(tg_id=tg_id, role=Role.student, name="S", timezone=tzname)
+    session.add(u)
+    await session.flush()
+    st = Student(full_name="S", timezone=tzname, user_id=u.id)
+    session.add(st)
+    await session.flush()
+    lesson = Lesson(student_id=st.id, start_at=start_at, status=LessonStatus.planned)
+    session.add(lesson)
+    await session.flush()
+    return u, lesson
+
+
+async def _planned(sessionmaker):
+    async with sessionmaker() as s2:
+        return (await s2.execute(
+            select(Notification.type, Notification.send_at).order_by(Notification.send_at)
+        )).all()
+
+
+@pytest.mark.asyncio
+async def test_planner_shifts_out_of_overnight_quiet_hours_and_drops_late(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, jobs, now)
+
+    # урок в 07:00 МСК 3 января
+    u, _lesson = await _student_with_lesson(session, 8101, datetime(2026, 1, 3, 4, 0, tzinfo=timezone.utc))
+    session.add(NotificationSettings(user_id=u.id, quiet_start=time(22, 0), quiet_end=time(8, 0)))
+    await session.commit()
+
+    await jobs.plan_lesson_notifications_job()
+    await jobs.plan_lesson_notifications_job()  # идемпотентно
+
+    assert await _planned(sessionmaker) == [
+        # 07:00 МСК 2 января -> конец тихих часов 08:00 МСК = 05:00 UTC
+        ("lesson_24h", datetime(2026, 1, 2, 5, 0, tzinfo=timezone.utc)),
+        # за 1 час (06:00) сдвинулось бы на 08:00 — после начала урока, не пишем
+    ]
+
+
+@pytest.mark.asyncio
+async def test_planner_shifts_within_same_day_window(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+
+    now = datetime(2026, 1, 1, 6, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, jobs, now)
+
+    # урок в 18:00 НСК (11:00 UTC) 2 января; тихие часы днём 13:00–17:30
+    u, _lesson = await _student_with_lesson(
+        session, 8201, datetime(2026, 1, 2, 11, 0, tzinfo=timezone.utc), tzname="Asia/Novosibirsk"
+    )
+    session.add(NotificationSettings(user_id=u.id, quiet_start=time(13, 0), quiet_end=time(17, 30)))
+    await session.commit()
+
+    await jobs.plan_lesson_notifications_job()
+
+    assert await _planned(sessionmaker) == [
+        # 18:00 НСК 1 января — вне окна, без сдвига
+        ("lesson_24h", datetime(2026, 1, 1, 11, 0, tzinfo=timezone.utc)),
+        # 17:00 НСК -> 17:30 НСК
+        ("lesson_1h", datetime(2026, 1, 2, 10, 30, tzinfo=timezone.utc)),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_planner_respects_disabled_reminder_types(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, jobs, now)
+
+    u1, _ = await _student_with_lesson(session, 8301, now + timedelta(days=2))
+    u2, _ = await _student_with_lesson(session, 8302, now + timedelta(days=2))
+    session.add_all([
+        NotificationSettings(user_id=u1.id, lesson_1h=False),
+        NotificationSettings(user_id=u2.id, lesson_24h=False, lesson_1h=False),
+    ])
+    await session.commit()
+
+    await jobs.plan_lesson_notifications_job()
+
+    async with sessionmaker() as s2:
+        rows = (await s2.execute(select(Notification.user_id, Notification.type))).all()
+    assert rows == [(u1.id, "lesson_24h")]
+
+
+@pytest.mark.asyncio
+async def test_quiet_hours_handler_cycles_presets_and_replans(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    import app.handlers.notify_settings as ns_mod
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, ns_mod, now)
+
+    u, lesson = await _student_with_lesson(session, 8401, datetime(2026, 1, 3, 4, 0, tzinfo=timezone.utc))
+    await session.commit()
+
+    await jobs.plan_lesson_notifications(session, now)
+    await session.commit()
+    assert await _planned(sessionmaker) == [
+        ("lesson_24h", datetime(2026, 1, 2, 4, 0, tzinfo=timezone.utc)),
+        ("lesson_1h", datetime(2026, 1, 3, 3, 0, tzinfo=timezone.utc)),
+    ]
+
+    call = SimpleNamespace(from_user=SimpleNamespace(id=8401), message=FakeMessage(), answer=AsyncMock())
+    await ns_mod.notify_cycle_quiet(call, session)
+
+    call.answer.assert_awaited_with("Тихие часы: 22:00–08:00")
+    assert "Тихие часы: 22:00–08:00 (Europe/Moscow)" in call.message.edits[-1][0]
+    assert await _planned(sessionmaker) == [
+        ("lesson_24h", datetime(2026, 1, 2, 5, 0, tzinfo=timezone.utc)),
+    ]
+
+    # по кругу до «выключены» — напоминания возвращаются на исходное время
+    for _ in range(3):
+        await ns_mod.notify_cycle_quiet(call, session)
+    call.answer.assert_awaited_with("Тихие часы: выключены")
+    assert await _planned(sessionmaker) == [
+        ("lesson_24h", datetime(2026, 1, 2, 4, 0, tzinfo=timezone.utc)),
+        ("lesson_1h", datetime(2026, 1, 3, 3, 0, tzinfo=timezone.utc)),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_toggle_reminder_handler_replans_pending_rows(session):
+    import app.handlers.notify_settings as ns_mod
+
+    u, lesson = await _student_with_lesson(session, 8501, datetime.now(timezone.utc) + timedelta(days=2))
+    session.add(Notification(user_id=u.id, type="lesson_1h", entity_id=lesson.id,
+                             send_at=lesson.start_at - timedelta(hours=1)))
+    await session.commit()
+
+    call = SimpleNamespace(from_user=SimpleNamespace(id=8501), message=FakeMessage(), answer=AsyncMock())
+    await ns_mod.notify_toggle_reminder(call, ns_mod.NotifyCb(action="lesson_1h"), session)
+
+    call.answer.assert_awaited_with("Напоминание выключено")
+    assert "Напоминание за 1 час: выключено" in call.message.edits[-1][0]
+
+    # lesson_1h больше нет; заодно допланировано недостающее по текущим настройкам
+    kinds = (await session.execute(select(Notification.type).where(Notification.user_id == u.id))).scalars().all()
+    assert kinds == ["lesson_24h"]
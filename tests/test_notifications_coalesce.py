@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app.models import (
+    User, Role, Student, Lesson, LessonStatus,
+    Notification, NotificationStatus,
+)
+
+
+def _freeze_datetime(monkeypatch, module, fixed: datetime):
+    class FixedDateTime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return fixed if tz is not None else fixed.replace(tzinfo=None)
+
+    monkeypatch.setattr(module, "datetime", FixedDateTime)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, tg_id: int, text: str):
+        self.sent.append((tg_id, text))
+
+
+def test_coalesce_texts_respects_message_limit():
+    from app.jobs_notifications import coalesce_texts
+
+    rendered = [(1, "a" * 10), (2, "b" * 10), (3, "c" * 10)]
+    assert coalesce_texts(rendered, limit=100) == [([1, 2, 3], "a" * 10 + "\n\n" + "b" * 10 + "\n\n" + "c" * 10)]
+    assert coalesce_texts(rendered, limit=25) == [([1, 2], "a" * 10 + "\n\n" + "b" * 10), ([3], "c" * 10)]
+
+
+@pytest.mark.asyncio
+async def test_send_notifications_coalesces_per_recipient(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, jobs, now)
+
+    parent = User(tg_id=6601, role=Role.parent, name="P", timezone="Europe/Moscow")
+    other = User(tg_id=6602, role=Role.parent, name="O", timezone="Europe/Moscow")
+    session.add_all([parent, other])
+    await session.flush()
+
+    # трое детей — три напоминания в одну минуту + оценка
+    lessons = []
+    for name in ("Kid A", "Kid B", "Kid C"):
+        st = Student(full_name=name, timezone="Europe/Moscow")
+        session.add(st)
+        await session.flush()
+        lesson = Lesson(student_id=st.id, start_at=now + timedelta(hours=1), status=LessonStatus.planned)
+        session.add(lesson)
+        await session.flush()
+        lessons.append(lesson)
+
+    for lesson in lessons:
+        session.add(Notification(user_id=parent.id, type="lesson_1h", entity_id=lesson.id,
+                                 send_at=now - timedelta(seconds=10)))
+    session.add(Notification(user_id=parent.id, type="hw_graded", entity_id=1,
+                             send_at=now - timedelta(seconds=5), payload="Оценка: 9/10"))
+    session.add(Notification(user_id=other.id, type="hw_graded", entity_id=2,
+                             send_at=now - timedelta(seconds=5), payload="other"))
+    await session.commit()
+
+    bot = FakeBot()
+    result = await jobs.send_notifications_job(bot, batch_size=50)
+
+    assert [tg for tg, _ in bot.sent] == [6601, 6602]
+    combined = bot.sent[0][1]
+    assert combined.count("Напоминание: урок скоро") == 3
+    assert "Kid A" in combined and "Kid B" in combined and "Kid C" in combined
+    # срочные напоминания — раньше оценки
+    assert combined.index("Kid C") < combined.index("Оценка: 9/10")
+
+    assert result["sent"] == 5
+    assert result["messages"] == 2
+    assert result["saved"] == 3
+
+    async with sessionmaker() as s2:
+        statuses = (await s2.execute(select(Notification.status))).scalars().all()
+        assert statuses == [NotificationStatus.sent] * 5
+
+
+@pytest.mark.asyncio
+async def test_send_notifications_pulls_recipient_rows_within_window(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+    monkeypatch.setattr(jobs.settings, "notify_coalesce_window_sec", 60)
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, jobs, now)
+
+    u = User(tg_id=6701, role=Role.student, name="S", timezone="Europe/Moscow")
+    idle = User(tg_id=6702, role=Role.student, name="I", timezone="Europe/Moscow")
+    session.add_all([u, idle])
+    await session.flush()
+
+    session.add_all([
+        Notification(user_id=u.id, type="hw_graded", entity_id=1, send_at=now - timedelta(seconds=1), payload="due"),
+        # в окне — уйдёт вместе с due
+        Notification(user_id=u.id, type="hw_graded", entity_id=2, send_at=now + timedelta(seconds=30), payload="soon"),
+        # за окном
+        Notification(user_id=u.id, type="hw_graded", entity_id=3, send_at=now + timedelta(minutes=5), payload="later"),
+        # у получателя нет ничего due — окно его не касается
+        Notification(user_id=idle.id, type="hw_graded", entity_id=4, send_at=now + timedelta(seconds=30), payload="idle"),
+    ])
+    await session.commit()
+
+    bot = FakeBot()
+    await jobs.send_notifications_job(bot, batch_size=50)
+
+    assert bot.sent == [(6701, "due\n\nsoon")]
+
+    async with sessionmaker() as s2:
+        pending = (await s2.execute(
+            select(Notification.payload)
+            .where(Notification.status == NotificationStatus.pending)
+            .order_by(Notification.id)
+        )).scalars().all()
+        assert pending == ["later", "idle"]
+
+
+@pytest.mark.asyncio
+async def test_send_notifications_broken_row_does_not_block_group(monkeypatch, sessionmaker, session):
+    import app.jobs_notifications as jobs
+    monkeypatch.setattr(jobs.db, "SessionMaker", sessionmaker)
+
+    now = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+    _freeze_datetime(monkeypatch, jobs, now)
+
+    u = User(tg_id=6801, role=Role.parent, name="P", timezone="Europe/Moscow")
+    session.add(u)
+    await session.flush()
+
+    bad = Notification(user_id=u.id, type="lesson_1h", entity_id=999999, send_at=now - timedelta(seconds=2))
+    good = Notification(user_id=u.id, type="hw_graded", entity_id=1, send_at=now - timedelta(seconds=1), payload="ok")
+    session.add_all([bad, good])
+    await session.commit()
+
+    bot = FakeBot()
+    await jobs.send_notifications_job(bot, batch_size=50)
+
+    assert bot.sent == [(6801, "ok")]
+
+    async with sessionmaker() as s2:
+        b = (await s2.execute(select(Notification).where(Notification.id == bad.id))).scalar_one()
+        g = (await s2.execute(select(Notification).where(Notification.id == good.id))).scalar_one()
+        assert b.status == NotificationStatus.failed
+        assert g.status == NotificationStatus.sent
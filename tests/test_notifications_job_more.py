@@ -99,11 +99,12 @@ async def test_send_notifications_respects_batch_size(monkeypatch, sessionmaker,
     bot = FakeBotOK()
     await send_notifications_job(bot, batch_size=2)
 
-    assert len(bot.sent) == 2  # отправлено только 2
+    # взято только 2 (одному получателю — одним сообщением)
+    assert bot.sent == [(222, "n1\n\nn2")]
 
     # второй прогон — должен добить остаток (идемпотентность + batch)
     await send_notifications_job(bot, batch_size=2)
-    assert len(bot.sent) == 3
+    assert bot.sent == [(222, "n1\n\nn2"), (222, "n3")]
 
 
 @pytest.mark.asyncio
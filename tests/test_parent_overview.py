@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import event
+
+from app.models import (
+    User, Role, Student, Parent, ParentStudent, Lesson, LessonStatus, BillingMode,
+    StudentBalance, LessonCharge, ChargeStatus, Homework,
+)
+
+NOW = datetime(2026, 3, 2, 9, 0, tzinfo=timezone.utc)
+
+
+def _freeze_datetime(monkeypatch, module, fixed: datetime):
+    class FixedDateTime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return fixed if tz is not None else fixed.replace(tzinfo=None)
+
+    monkeypatch.setattr(module, "datetime", FixedDateTime)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text: str, reply_markup=None):
+        self.edits.append((text, reply_markup))
+
+
+async def _family(session):
+    pu = User(tg_id=9990, role=Role.parent, name="P", timezone="Europe/Moscow")
+    session.add(pu)
+    await session.flush()
+    p = Parent(user_id=pu.id, full_name="Parent")
+    anna = Student(full_name="Anna", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    boris = Student(full_name="Boris", timezone="Europe/Moscow", billing_mode=BillingMode.single, price_per_lesson=1500)
+    session.add_all([p, anna, boris])
+    await session.flush()
+    session.add_all([ParentStudent(parent_id=p.id, student_id=s.id) for s in (boris, anna)])
+
+    session.add(StudentBalance(student_id=anna.id, lessons_left=3))
+    session.add_all([
+        Lesson(student_id=anna.id, start_at=NOW + timedelta(days=d), status=LessonStatus.planned)
+        for d in (1, 2, 3, 4)
+    ])
+    session.add(Lesson(student_id=anna.id, start_at=NOW + timedelta(hours=1), status=LessonStatus.canceled))
+    session.add_all([
+        Homework(student_id=anna.id, title=f"hw{g}", description="-", grade=g,
+                 graded_at=NOW - timedelta(days=g))
+        for g in (8, 9)
+    ])
+
+    done = Lesson(student_id=boris.id, start_at=NOW - timedelta(days=1), status=LessonStatus.done)
+    done2 = Lesson(student_id=boris.id, start_at=NOW - timedelta(days=2), status=LessonStatus.done)
+    session.add_all([done, done2])
+    await session.flush()
+    session.add_all([
+        LessonCharge(lesson_id=done.id, student_id=boris.id, amount=1500, status=ChargeStatus.pending),
+        LessonCharge(lesson_id=done2.id, student_id=boris.id, amount=1500, status=ChargeStatus.paid),
+    ])
+    await session.commit()
+    return anna, boris
+
+
+@pytest.mark.asyncio
+async def test_parent_overview_single_query(engine, session):
+    from app.services.parent_overview import parent_overview
+
+    anna, boris = await _family(session)
+
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", _count)
+    try:
+        overview = await parent_overview(session, 9990, NOW)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", _count)
+
+    assert len(statements) == 1
+    assert overview.role == Role.parent
+    a, b = overview.children
+    assert (a.student_id, a.lessons_left, a.hw_avg) == (anna.id, 3, 8.5)
+    assert a.next_lessons == [NOW + timedelta(days=d) for d in (1, 2, 3)]
+    assert (b.student_id, b.lessons_left, b.unpaid_count, b.unpaid_sum, b.next_lessons, b.hw_avg) == (
+        boris.id, None, 1, 1500.0, [], None,
+    )
+
+    assert await parent_overview(session, 12345, NOW) is None
+
+
+@pytest.mark.asyncio
+async def test_parent_children_screen(monkeypatch, session):
+    import app.handlers.parent as parent_mod
+
+    _freeze_datetime(monkeypatch, parent_mod, NOW)
+    anna, boris = await _family(session)
+    session.add(User(tg_id=9991, role=Role.parent, name="Lonely"))
+    session.add(User(tg_id=9992, role=Role.student, name="S"))
+    await session.commit()
+
+    call = SimpleNamespace(from_user=SimpleNamespace(id=9990), message=FakeMessage(), answer=AsyncMock())
+    await parent_mod.parent_children(call, session)
+    text, markup = call.message.edits[-1]
+    assert text == (
+        "Дети (время: Europe/Moscow)\n\n"
+        "Anna\n"
+        "Ближайшие уроки: 2026-03-03 12:00, 2026-03-04 12:00, 2026-03-05 12:00\n"
+        "Осталось уроков: 3\n"
+        "Средняя оценка ДЗ: 8.50/10\n\n"
+        "Boris\n"
+        "Ближайшие уроки: нет\n"
+        "К оплате: 1500.00 (1 ур.)\n"
+        "Средняя оценка ДЗ: нет данных\n\n"
+        "Подробнее — выберите ребёнка:"
+    )
+    assert [row[0].text for row in markup.inline_keyboard] == ["Anna", "Boris"]
+
+    call = SimpleNamespace(from_user=SimpleNamespace(id=9991), message=FakeMessage(), answer=AsyncMock())
+    await parent_mod.parent_children(call, session)
+    assert call.message.edits == [("К вам не привязан ни один ученик.", None)]
+
+    call = SimpleNamespace(from_user=SimpleNamespace(id=9992), message=FakeMessage(), answer=AsyncMock())
+    await parent_mod.parent_children(call, session)
+    call.answer.assert_awaited_once_with("Недоступно", show_alert=True)
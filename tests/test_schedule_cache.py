@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+from sqlalchemy import event
+
+from app.callbacks import ChildCb
+from app.models import User, Role, Student, Parent, ParentStudent, Lesson, LessonStatus, BillingMode
+from app.services.schedule_cache import ScheduleViewCache, CachedView
+
+
+def _freeze_datetime(monkeypatch, module, fixed: datetime):
+    class FixedDateTime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return fixed if tz is not None else fixed.replace(tzinfo=None)
+
+    monkeypatch.setattr(module, "datetime", FixedDateTime)
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text: str, reply_markup=None):
+        self.edits.append((text, reply_markup))
+
+
+def _call(tg_id: int):
+    return SimpleNamespace(from_user=SimpleNamespace(id=tg_id), message=FakeMessage(), answer=AsyncMock())
+
+
+async def _counted(engine, coro):
+    statements = []
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", _count)
+    try:
+        await coro
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", _count)
+    return len(statements)
+
+
+NOW = datetime(2026, 3, 2, 9, 0, tzinfo=timezone.utc)
+
+
+async def _seed(session):
+    u = User(tg_id=9980, role=Role.student, name="S", timezone="Europe/Moscow")
+    session.add(u)
+    await session.flush()
+    st = Student(user_id=u.id, full_name="Kid", timezone="Europe/Moscow", billing_mode=BillingMode.subscription)
+    session.add(st)
+    await session.flush()
+    lessons = [
+        Lesson(student_id=st.id, start_at=NOW + timedelta(days=1), status=LessonStatus.planned),
+        Lesson(student_id=st.id, start_at=NOW + timedelta(days=3), status=LessonStatus.planned),
+        # за горизонтом: войдёт в окно через 2 дня
+        Lesson(student_id=st.id, start_at=NOW + timedelta(days=9), status=LessonStatus.planned),
+    ]
+    session.add_all(lessons)
+    await session.commit()
+    return u, st, lessons
+
+
+def test_view_cache_version_expiry_and_lru():
+    cache = ScheduleViewCache(max_size=2, log_every=0)
+    cache.put(("student", 1, "UTC"), CachedView(3, NOW + timedelta(hours=1), "a", None))
+    cache.put(("student", 2, "UTC"), CachedView(0, None, "b", None))
+
+    assert cache.get(("student", 1, "UTC"), 3, NOW).text == "a"
+    assert cache.get(("student", 1, "UTC"), 4, NOW) is None  # версия выросла
+    assert cache.get(("student", 1, "UTC"), 3, NOW + timedelta(hours=1)) is None  # окно сдвинулось
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    # 1 открывали недавно — вытесняется 2
+    cache.get(("student", 1, "UTC"), 3, NOW)
+    cache.put(("parent", 1, "UTC"), CachedView(0, None, "c", None))
+    assert list(cache.entries) == [("student", 1, "UTC"), ("parent", 1, "UTC")]
+    assert cache.format_stats() == "hits=2 misses=2 hit_rate=50% size=2"
+
+
+@pytest.mark.asyncio
+async def test_student_schedule_repeat_view_served_from_cache(monkeypatch, engine, session):
+    import app.handlers.student as student_mod
+    from app.services.schedule_cache import schedule_views
+    from app.services.billing import mark_lesson_done
+
+    _freeze_datetime(monkeypatch, student_mod, NOW)
+    _u, st, lessons = await _seed(session)
+
+    call = _call(9980)
+    cold = await _counted(engine, student_mod.student_schedule(call, session))
+    text, markup = call.message.edits[-1]
+    assert text.count("\n- ") == 2
+    assert len(markup.inline_keyboard[0]) == 2
+
+    # повтор — один запрос версии, экран тот же
+    warm = await _counted(engine, student_mod.student_schedule(call, session))
+    assert warm == 1 < cold
+    assert call.message.edits[-1] == (text, markup)
+    assert (schedule_views.hits, schedule_views.misses) == (1, 1)
+
+    # урок проведён — версия выросла, список пересобран
+    await mark_lesson_done(session, bot=AsyncMock(), lesson_id=lessons[0].id)
+    await student_mod.student_schedule(call, session)
+    assert call.message.edits[-1][0].count("\n- ") == 1
+    assert schedule_views.misses == 2
+
+    # через 2 дня в окно входит урок из-за горизонта — пересборка без изменений в БД
+    _freeze_datetime(monkeypatch, student_mod, NOW + timedelta(days=2, minutes=1))
+    await student_mod.student_schedule(call, session)
+    assert call.message.edits[-1][0].count("\n- ") == 2
+    assert schedule_views.misses == 3
+
+
+@pytest.mark.asyncio
+async def test_parent_view_rebuilt_after_grade_and_keyed_by_viewer_tz(monkeypatch, session):
+    import app.handlers.parent as parent_mod
+    from app.services.schedule import bump_schedule_version
+    from app.services.schedule_cache import schedule_views
+
+    _freeze_datetime(monkeypatch, parent_mod, NOW)
+    _u, st, _lessons = await _seed(session)
+    pu = User(tg_id=9981, role=Role.parent, name="P", timezone="Asia/Tokyo")
+    session.add(pu)
+    await session.flush()
+    p = Parent(user_id=pu.id, full_name="Parent")
+    session.add(p)
+    await session.flush()
+    session.add(ParentStudent(parent_id=p.id, student_id=st.id))
+    await session.commit()
+
+    call = _call(9981)
+    await parent_mod.parent_child_schedule(call, ChildCb(student_id=st.id), session)
+    await parent_mod.parent_child_schedule(call, ChildCb(student_id=st.id), session)
+    assert "(Asia/Tokyo)" in call.message.edits[-1][0]
+    assert (schedule_views.hits, schedule_views.misses) == (1, 1)
+
+    await bump_schedule_version(session, [st.id])
+    await session.commit()
+    await parent_mod.parent_child_schedule(call, ChildCb(student_id=st.id), session)
+    assert schedule_views.misses == 2
+
+    # другая TZ зрителя — отдельная запись
+    pu.timezone = "Europe/Moscow"
+    await session.commit()
+    await parent_mod.parent_child_schedule(call, ChildCb(student_id=st.id), session)
+    assert "(Europe/Moscow)" in call.message.edits[-1][0]
+    assert len(schedule_views.entries) == 2
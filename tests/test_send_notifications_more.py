@@ -96,11 +96,12 @@ async def test_send_notifications_respects_batch_size_and_order(monkeypatch, ses
 
     bot = FakeBot()
 
+    # batch=2: два самых старых, одному получателю — одним сообщением
     await jobs.send_notifications_job(bot, batch_size=2)
-    assert [t for _, t in bot.sent] == ["old", "mid"]
+    assert [t for _, t in bot.sent] == ["old\n\nmid"]
 
     await jobs.send_notifications_job(bot, batch_size=2)
-    assert [t for _, t in bot.sent] == ["old", "mid", "new"]
+    assert [t for _, t in bot.sent] == ["old\n\nmid", "new"]
 
     async with sessionmaker() as s2:
         cnt_sent = (await s2.execute(
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select, text
+
+from app.callbacks import UnpaidCb
+from app.models import User, Role, Student, BillingMode, Lesson, LessonStatus, LessonCharge, ChargeStatus
+from app.services.billing import unpaid_by_student, unpaid_totals, mark_student_charges_paid
+
+
+class FakeFromUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+
+
+class FakeMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text: str, **kwargs):
+        self.edits.append((text, kwargs))
+
+
+class FakeCallbackQuery:
+    def __init__(self, user_id: int):
+        self.from_user = FakeFromUser(user_id)
+        self.message = FakeMessage()
+        self.answered = []
+
+    async def answer(self, text: str | None = None, show_alert: bool = False):
+        self.answered.append((text, show_alert))
+
+
+async def _student_with_charges(session, name: str, amounts: list[int], paid: int = 0) -> Student:
+    st = Student(full_name=name, timezone="Europe/Moscow", billing_mode=BillingMode.single, price_per_lesson=1000)
+    session.add(st)
+    await session.flush()
+    base = datetime(2026, 1, 5, 7, 0, tzinfo=timezone.utc)
+    for i, amount in enumerate(amounts + [1000] * paid):
+        lesson = Lesson(student_id=st.id, start_at=base + timedelta(days=i), status=LessonStatus.done)
+        session.add(lesson)
+        await session.flush()
+        session.add(LessonCharge(
+            lesson_id=lesson.id, student_id=st.id, amount=amount,
+            status=ChargeStatus.pending if i < len(amounts) else ChargeStatus.paid,
+        ))
+    await session.flush()
+    return st
+
+
+def _labels(markup):
+    return [btn.text for row in markup.inline_keyboard for btn in row]
+
+
+@pytest.mark.asyncio
+async def test_unpaid_grouped_totals_and_keyset_pages(session):
+    a = await _student_with_charges(session, "Anna", [1000, 1500], paid=1)
+    await _student_with_charges(session, "Boris", [], paid=2)  # всё оплачено — в сводку не попадает
+    c = await _student_with_charges(session, "Clara", [700])
+    await _student_with_charges(session, "Dan", [500, 500, 500])
+    await session.commit()
+
+    assert await unpaid_totals(session) == (3, 6, Decimal("4700.00"))
+
+    page1 = await unpaid_by_student(session, limit=2)
+    assert [(r.student_id, r.full_name, r.cnt, r.total) for r in page1] == [
+        (a.id, "Anna", 2, Decimal("2500.00")),
+        (c.id, "Clara", 1, Decimal("700.00")),
+    ]
+    page2 = await unpaid_by_student(session, after_student_id=page1[-1].student_id, limit=2)
+    assert [(r.full_name, r.cnt, r.total) for r in page2] == [("Dan", 3, Decimal("1500.00"))]
+
+
+@pytest.mark.asyncio
+async def test_mark_student_charges_paid_updates_all_pending_at_once(session):
+    a = await _student_with_charges(session, "Anna", [1000, 1500], paid=1)
+    other = await _student_with_charges(session, "Other", [700])
+    await session.commit()
+
+    assert await mark_student_charges_paid(session, a.id) == (2, Decimal("2500.00"))
+    assert await mark_student_charges_paid(session, a.id) == (0, 0)
+
+    rows = (await session.execute(
+        select(LessonCharge.student_id, LessonCharge.status, LessonCharge.paid_at.is_not(None))
+        .where(LessonCharge.status == ChargeStatus.pending)
+    )).all()
+    assert rows == [(other.id, ChargeStatus.pending, False)]
+
+
+@pytest.mark.asyncio
+async def test_unpaid_summary_uses_status_student_index(session):
+    await _student_with_charges(session, "Anna", [1000])
+    await session.commit()
+
+    await session.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = "\n".join((await session.execute(text(
+        "EXPLAIN SELECT student_id, count(*), sum(amount) FROM lesson_charges "
+        "WHERE status = 'pending' AND student_id > 0 GROUP BY student_id ORDER BY student_id"
+    ))).scalars().all())
+    assert "ix_lesson_charges_status_student" in plan
+
+
+@pytest.mark.asyncio
+async def test_unpaid_screen_pages_and_bulk_pay(monkeypatch, session):
+    import app.handlers.admin.unpaid as unpaid_mod
+    monkeypatch.setattr(unpaid_mod, "PAGE_SIZE", 2)
+
+    teacher = User(tg_id=9951, role=Role.teacher, name="T", timezone="Europe/Moscow")
+    session.add(teacher)
+    a = await _student_with_charges(session, "Anna", [1000, 1500])
+    c = await _student_with_charges(session, "Clara", [700])
+    await _student_with_charges(session, "Dan", [500])
+    await session.commit()
+
+    call = FakeCallbackQuery(9951)
+    await unpaid_mod.unpaid_page(call, UnpaidCb(action="page"), session)
+    text0, kw = call.message.edits[-1]
+    assert "Всего: 4 ур. на сумму 3700.00 (учеников: 3)" in text0
+    assert _labels(kw["reply_markup"]) == ["Anna: 2 ур. / 2500.00", "Clara: 1 ур. / 700.00", "▶", "📄 Загрузить выписку", "Назад"]
+
+    await unpaid_mod.unpaid_page(call, UnpaidCb(action="page", after=c.id), session)
+    assert _labels(call.message.edits[-1][1]["reply_markup"]) == ["Dan: 1 ур. / 500.00", "⏮ В начало", "📄 Загрузить выписку", "Назад"]
+
+    await unpaid_mod.unpaid_pay(call, UnpaidCb(action="pay", student_id=a.id), session)
+    assert call.message.edits[-1][0].startswith("Anna: 2 ур. на сумму 2500.00.")
+
+    await unpaid_mod.unpaid_pay_confirm(call, UnpaidCb(action="pay_confirm", student_id=a.id), session)
+    text1 = call.message.edits[-1][0]
+    assert text1.startswith("Оплачено: 2 ур. на сумму 2500.00")
+    assert "Всего: 2 ур. на сумму 1200.00 (учеников: 2)" in text1